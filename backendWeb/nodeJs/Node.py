@@ -1,14 +1,144 @@
+import datetime
+import json
+import math
 import os
-import shutil
+import re
 import subprocess
 import sys
+import time
+import urllib.request
+import yaml
+
+from containersAndOrchestration.docker.dockerEngine import (
+    DockerEngineClient, DockerEngineError, compose_down, compose_plan, compose_status, compose_up,
+    cpu_percent, project_name,
+)
+from backupAndRecovery.backupEngine import backup_paths
+from securityAndEncryption.certInventory import (
+    NGINX_CONF_PATHS, check_certificates, load_inventory, print_report, renew_due,
+)
+from webServer.nginx.staticAssets import MANIFEST_FILE, build_static, static_location
 
 # Define paths
 home_dir = os.path.expanduser("~")
 node_dir = os.path.join(home_dir, "node-docker")
-backup_dir = "/etc/eos/nginx-docker"
 docker_compose_file = os.path.join(node_dir, "docker-compose.yaml")
-backup_docker_compose_file = os.path.join(backup_dir, "docker-compose.yaml")
+nginx_conf_file = os.path.join(node_dir, "nginx.conf")
+cluster_script_file = os.path.join(node_dir, "cluster.js")
+app_dir = os.path.join(node_dir, "node-app")
+dockerfile = os.path.join(node_dir, "Dockerfile")
+build_history_file = os.path.join(node_dir, "build-history.json")
+static_dir = os.path.join(node_dir, "static")
+# Where static_dir is mounted inside the nginx container
+nginx_static_root = "/usr/share/nginx/static"
+node_port = 3000
+# Lets compose_up wait for each recreated replica before replacing the next; the node binary is in every image
+NODE_HEALTHCHECK = {
+    "test": ["CMD", "node", "-e", f"require('http').get('http://127.0.0.1:{node_port}/', "
+             "r => process.exit(r.statusCode < 500 ? 0 : 1)).on('error', () => process.exit(1))"],
+    "interval": "5s", "timeout": "3s", "retries": 3,
+}
+# Seconds a new replica gets to turn healthy before scale_node gives up without reloading nginx
+REPLICA_HEALTH_TIMEOUT = 120
+
+# Base image for production builds; pinned to its digest when the Dockerfile is generated
+NODE_BASE_IMAGE = "node:20-bookworm-slim"
+
+# Multi-stage build: production dependencies and the app build are separate stages so a
+# source change does not invalidate the dependency layers, and the runtime stage carries
+# neither dev dependencies nor build tooling.
+DOCKERFILE_TEMPLATE = """# syntax=docker/dockerfile:1
+FROM {base} AS deps
+WORKDIR /usr/src/app
+COPY package.json package-lock.json ./
+RUN --mount=type=cache,target=/root/.npm npm ci --omit=dev
+
+FROM {base} AS build
+WORKDIR /usr/src/app
+COPY package.json package-lock.json ./
+RUN --mount=type=cache,target=/root/.npm npm ci
+COPY . .
+RUN npm run build --if-present && rm -rf node_modules
+
+FROM {base} AS runtime
+ENV NODE_ENV=production
+WORKDIR /usr/src/app
+COPY --from=deps --chown=node:node /usr/src/app/node_modules ./node_modules
+COPY --from=build --chown=node:node /usr/src/app ./
+USER node
+EXPOSE {port}
+CMD {cmd}
+"""
+
+DOCKERIGNORE_CONTENT = """node_modules
+npm-debug.log
+.git
+.env
+Dockerfile
+.dockerignore
+"""
+
+# Idle connections nginx keeps open to the Node upstream, per worker
+UPSTREAM_KEEPALIVE = 32
+
+NGINX_CONF_TEMPLATE = """worker_processes auto;
+
+events {{
+    worker_connections 1024;
+}}
+
+http {{
+    upstream node_backend {{
+        least_conn;
+{servers}
+        keepalive {keepalive};
+    }}
+
+    server {{
+        listen 80;
+
+{static}        location / {{
+            proxy_pass http://node_backend;
+            proxy_http_version 1.1;
+            proxy_set_header Connection "";
+            proxy_set_header Host $host;
+            proxy_set_header X-Real-IP $remote_addr;
+            proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+            proxy_set_header X-Forwarded-Proto $scheme;
+        }}
+    }}
+}}
+"""
+
+# Node cluster entry point: forks NODE_WORKERS workers and pins each to a core
+CLUSTER_SCRIPT = """const cluster = require('cluster');
+const path = require('path');
+const { execFile } = require('child_process');
+
+const workers = parseInt(process.env.NODE_WORKERS || '1', 10);
+const cores = parseInt(process.env.NODE_CORES || String(workers), 10);
+
+function fork(slot) {
+  const worker = cluster.fork({ NODE_WORKER_SLOT: slot });
+  execFile('taskset', ['-pc', String(slot % cores), String(worker.process.pid)], () => {});
+  worker.on('exit', (code, signal) => {
+    if (!worker.exitedAfterDisconnect) {
+      console.error(`worker ${worker.process.pid} died (${signal || code}), restarting`);
+      fork(slot);
+    }
+  });
+}
+
+if (cluster.isPrimary) {
+  for (let slot = 0; slot < workers; slot++) {
+    fork(slot);
+  }
+} else {
+  const app = process.cwd();
+  const pkg = require(path.join(app, 'package.json'));
+  require(path.resolve(app, pkg.main || 'index.js'));
+}
+"""
 
 # Ensure directories exist
 def create_directory(path):
@@ -16,38 +146,311 @@ def create_directory(path):
         os.makedirs(path)
         print(f"Created directory: {path}")
 
-# Create docker-compose.yaml file for Node.js and Nginx
-def create_docker_compose():
-    compose_content = """version: '3'
-services:
-  node:
-    image: node:latest
-    container_name: node-app
-    volumes:
-      - ./node-app:/usr/src/app
-    ports:
-      - "3000:3000"
-    command: npm start
-  nginx:
-    image: nginx:latest
-    container_name: nginx-proxy
-    ports:
-      - "80:80"
-      - "443:443"
-    volumes:
-      - ./nginx.conf:/etc/nginx/nginx.conf
-    depends_on:
-      - node
-"""
+# Create docker-compose.yaml file for Node.js and Nginx.
+# With replicas > 1 each replica is its own container pinned to a core ("containers"
+# mode), or one container forks pinned workers with Node's cluster module ("cluster" mode).
+# Without an image the source is bind-mounted into node:latest for development; with an
+# image built by --build the containers run that image as-is.
+def create_docker_compose(replicas=1, mode="containers", image=None):
+    cores = os.cpu_count() or 1
+    services = {}
+    create_directory(node_dir)
+    create_directory(static_dir)
+
+    def node_service(container_name, command="npm start", extra_volumes=()):
+        service = {"image": image or "node:latest", "container_name": container_name}
+        volumes = list(extra_volumes) if image else ["./node-app:/usr/src/app"] + list(extra_volumes)
+        if volumes:
+            service["volumes"] = volumes
+        service["working_dir"] = "/usr/src/app"
+        service["healthcheck"] = NODE_HEALTHCHECK
+        if command and (not image or extra_volumes):
+            service["command"] = command
+        return service
+
+    if mode == "cluster":
+        pinned = min(replicas, cores)
+        services["node"] = node_service("node-app", "node /usr/src/eos/cluster.js",
+                                        ["./cluster.js:/usr/src/eos/cluster.js:ro"])
+        services["node"]["environment"] = [f"NODE_WORKERS={replicas}", f"NODE_CORES={pinned}"]
+        services["node"]["cpuset"] = f"0-{pinned - 1}"
+        with open(cluster_script_file, "w") as f:
+            f.write(CLUSTER_SCRIPT)
+    elif replicas == 1:
+        services["node"] = node_service("node-app")
+        services["node"]["ports"] = [f"{node_port}:{node_port}"]
+    else:
+        for replica in range(1, replicas + 1):
+            services[f"node-{replica}"] = node_service(f"node-app-{replica}")
+            services[f"node-{replica}"]["cpuset"] = str((replica - 1) % cores)
+    services["nginx"] = {
+        "image": "nginx:latest",
+        "container_name": "nginx-proxy",
+        "ports": ["80:80", "443:443"],
+        "volumes": ["./nginx.conf:/etc/nginx/nginx.conf", f"./static:{nginx_static_root}:ro"],
+        "depends_on": sorted(services),
+    }
     with open(docker_compose_file, "w") as f:
-        f.write(compose_content)
+        yaml.safe_dump({"version": "3", "services": services}, f, sort_keys=False)
     print(f"Created docker-compose.yaml in {node_dir}")
+    create_nginx_conf([f"{name}:{node_port}" for name in services if name != "nginx"])
+
+# Write nginx.conf with an upstream over all Node replicas and pooled keepalive connections
+def create_nginx_conf(upstream_servers):
+    servers = "\n".join(f"        server {server} max_fails=3 fail_timeout=10s;" for server in upstream_servers)
+    static = ""
+    if os.path.exists(os.path.join(static_dir, MANIFEST_FILE)):
+        # The stock nginx image has no brotli module, so only the .gz files are used
+        static = static_location("/static/", nginx_static_root) + "\n\n"
+    with open(nginx_conf_file, "w") as f:
+        f.write(NGINX_CONF_TEMPLATE.format(servers=servers, keepalive=UPSTREAM_KEEPALIVE, static=static))
+    print(f"Created nginx.conf with {len(upstream_servers)} upstream server(s)")
+
+# Read the current replica count, mode and Node image from docker-compose.yaml
+def current_scale():
+    with open(docker_compose_file, "r") as f:
+        services = yaml.safe_load(f).get("services", {})
+    node_services = [service for name, service in services.items() if name == "node" or name.startswith("node-")]
+    image = node_services[0]["image"] if node_services else None
+    image = None if image == "node:latest" else image
+    node = services.get("node", {})
+    if str(node.get("command", "")).endswith("cluster.js"):
+        workers = [env for env in node.get("environment", []) if env.startswith("NODE_WORKERS=")]
+        return int(workers[0].split("=", 1)[1]) if workers else 1, "cluster", image
+    return len(node_services), "containers", image
+
+# Scale Node to the given number of replicas and point nginx at all of them
+def scale_node(replicas, mode="containers"):
+    image = current_scale()[2] if os.path.exists(docker_compose_file) else None
+    create_docker_compose(replicas, mode, image)
+    project = project_name(docker_compose_file)
+    client = DockerEngineClient()
+    try:
+        project_filter = {"label": [f"com.docker.compose.project={project}"]}
+        existing = {container["Names"][0].lstrip("/") for container in client.list_containers(filters=project_filter)}
+        # Containers whose environment changed (cluster worker count) are recreated by compose_up
+        plan = compose_up(client, docker_compose_file)
+
+        # nginx.conf already lists the new replicas; wait until they serve before nginx sends them traffic
+        for service, container, config in plan:
+            if container in existing or service == "nginx" or "Healthcheck" not in config:
+                continue
+            print(f"Waiting for {container} to become healthy...")
+            if not client.wait_healthy(container, REPLICA_HEALTH_TIMEOUT):
+                print(f"{container} did not become healthy within {REPLICA_HEALTH_TIMEOUT}s; nginx was not reloaded.")
+                sys.exit(1)
+
+        # Reload first so nginx stops sending traffic to replicas that are about to go away
+        exit_code, output = client.exec_run("nginx-proxy", ["nginx", "-s", "reload"])
+        if exit_code != 0:
+            print(f"nginx reload failed: {output.strip()}")
+            sys.exit(1)
+
+        with open(docker_compose_file, "r") as f:
+            services = set(yaml.safe_load(f)["services"])
+        leftovers = client.list_containers(filters=project_filter)
+        for container in leftovers:
+            if container["Labels"].get("com.docker.compose.service") not in services:
+                name = container["Names"][0].lstrip("/")
+                client.stop_container(name)
+                client.remove_container(name)
+                print(f"Removed {name}")
+    except DockerEngineError as e:
+        print(f"Docker Engine error: {e}")
+        sys.exit(1)
+    finally:
+        client.close()
+    print(f"Node scaled to {replicas} replica(s) in {mode} mode.")
+
+# Average CPU of the Node containers, in percent of one core
+def node_cpu(client):
+    project = project_name(docker_compose_file)
+    samples = []
+    for container in client.list_containers(all=False, filters={"label": [f"com.docker.compose.project={project}"]}):
+        if container["Labels"].get("com.docker.compose.service", "").startswith("node"):
+            samples.append(cpu_percent(next(client.stats(container["Id"], stream=False))))
+    return sum(samples) / len(samples) if samples else 0.0
+
+# p95 latency in milliseconds of requests sent through nginx
+def probe_latency(url, count=20, timeout=5):
+    timings = []
+    for _ in range(count):
+        start = time.monotonic()
+        try:
+            with urllib.request.urlopen(url, timeout=timeout) as response:
+                response.read()
+            timings.append((time.monotonic() - start) * 1000)
+        except OSError:
+            timings.append(timeout * 1000)
+    timings.sort()
+    return timings[max(0, math.ceil(len(timings) * 0.95) - 1)]
+
+# Pick a replica count from observed load, clamped to [min_replicas, max_replicas]
+def desired_replicas(replicas, cpu, latency, min_replicas, max_replicas, cpu_high=70, cpu_low=25, latency_target=None):
+    if cpu > cpu_high or (latency_target and latency > latency_target):
+        desired = max(replicas + 1, math.ceil(replicas * cpu / cpu_high))
+    elif cpu < cpu_low and (not latency_target or latency < latency_target / 2):
+        desired = replicas - 1
+    else:
+        desired = replicas
+    return max(min_replicas, min(max_replicas, desired))
 
-# Backup docker-compose.yaml to /etc/eos/nginx-docker
+# Adjust the replica count from CPU (and optionally latency) until interrupted
+def autoscale(min_replicas, max_replicas, latency_target=None, interval=30, cooldown=120, url="http://localhost/"):
+    replicas, mode, _ = current_scale()
+    last_change = 0
+    client = DockerEngineClient()
+    try:
+        while True:
+            cpu = node_cpu(client)
+            latency = probe_latency(url) if latency_target else 0.0
+            desired = desired_replicas(replicas, cpu, latency, min_replicas, max_replicas,
+                                       latency_target=latency_target)
+            print(f"replicas={replicas} cpu={cpu:.1f}% p95={latency:.1f}ms desired={desired}")
+            if desired != replicas and time.monotonic() - last_change >= cooldown:
+                scale_node(desired, mode)
+                replicas = desired
+                last_change = time.monotonic()
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.close()
+
+# Resolve a base image tag to tag@digest so every build starts from the same layers
+def pin_base_image(image):
+    if "@" in image:
+        return image
+    client = DockerEngineClient()
+    try:
+        digest = client.request("GET", f"/distribution/{image}/json")["Descriptor"]["digest"]
+        return f"{image}@{digest}"
+    except (DockerEngineError, KeyError) as e:
+        print(f"Could not pin {image} to a digest ({e}); using the tag.")
+        return image
+    finally:
+        client.close()
+
+# Runtime command: run the start script's node entry point directly, without npm in between
+def runtime_command(package):
+    start = package.get("scripts", {}).get("start", "")
+    match = re.fullmatch(r"node\s+(\S+)", start.strip())
+    if match:
+        return json.dumps(["node", match.group(1)])
+    if not start and package.get("main"):
+        return json.dumps(["node", package["main"]])
+    return json.dumps(["npm", "start"])
+
+# Generate the production Dockerfile and .dockerignore for the app in node-app/
+def generate_dockerfile(base_image=NODE_BASE_IMAGE):
+    package_file = os.path.join(app_dir, "package.json")
+    if not os.path.exists(package_file):
+        print(f"No package.json found in {app_dir}.")
+        sys.exit(1)
+    if not os.path.exists(os.path.join(app_dir, "package-lock.json")):
+        print("Production builds use 'npm ci' and need a package-lock.json. Run 'npm install' once to create it.")
+        sys.exit(1)
+    with open(package_file, "r") as f:
+        package = json.load(f)
+
+    with open(dockerfile, "w") as f:
+        f.write(DOCKERFILE_TEMPLATE.format(base=pin_base_image(base_image), port=node_port,
+                                           cmd=runtime_command(package)))
+    dockerignore = os.path.join(app_dir, ".dockerignore")
+    if not os.path.exists(dockerignore):
+        with open(dockerignore, "w") as f:
+            f.write(DOCKERIGNORE_CONTENT)
+    print(f"Generated {dockerfile}")
+
+# Build the production image and record how long it took and how big it is
+def build_image(tag=None):
+    with open(os.path.join(app_dir, "package.json"), "r") as f:
+        package = json.load(f)
+    tag = tag or f"{package.get('name', 'node-app')}:{package.get('version', 'latest')}"
+    generate_dockerfile()
+
+    start = time.monotonic()
+    env = dict(os.environ, DOCKER_BUILDKIT="1")
+    subprocess.run(["docker", "build", "-f", dockerfile, "-t", tag, app_dir], check=True, env=env)
+    seconds = round(time.monotonic() - start, 1)
+
+    client = DockerEngineClient()
+    try:
+        size = client.request("GET", f"/images/{tag}/json")["Size"]
+    finally:
+        client.close()
+
+    history = []
+    if os.path.exists(build_history_file):
+        with open(build_history_file, "r") as f:
+            history = json.load(f)
+    record = {"tag": tag, "built_at": datetime.datetime.now().isoformat(timespec="seconds"),
+              "seconds": seconds, "size_bytes": size}
+    print(f"Built {tag} in {seconds}s, image size {size / 2**20:.1f} MiB")
+    if history:
+        previous = history[-1]
+        print(f"Compared to {previous['tag']}: build time {seconds - previous['seconds']:+.1f}s, "
+              f"size {(size - previous['size_bytes']) / max(previous['size_bytes'], 1) * 100:+.1f}%")
+    history.append(record)
+    with open(build_history_file, "w") as f:
+        json.dump(history, f, indent=2)
+
+    # Run the new image from now on, keeping the current scale
+    if os.path.exists(docker_compose_file):
+        replicas, mode, _ = current_scale()
+    else:
+        replicas, mode = 1, "containers"
+    create_docker_compose(replicas, mode, tag)
+    deploy_image(tag)
+    return tag
+
+# Roll a rebuilt image out to running Node containers, one replica at a time
+def deploy_image(tag):
+    project = project_name(docker_compose_file)
+    client = DockerEngineClient()
+    try:
+        running = client.list_containers(all=False, filters={"label": [f"com.docker.compose.project={project}"]})
+        if not any(c["Labels"].get("com.docker.compose.service", "").startswith("node") for c in running):
+            print(f"{tag} is built but not deployed; run --start to use it.")
+            return
+        # compose_up recreates each node service whose image changed and waits for it to turn healthy
+        compose_up(client, docker_compose_file)
+    except DockerEngineError as e:
+        print(f"Docker Engine error: {e}")
+        sys.exit(1)
+    finally:
+        client.close()
+    print(f"Deployed {tag}.")
+
+# Fingerprint and precompress the app's static build output and serve it from nginx
+def offload_static(build_dir):
+    summary = build_static(build_dir, static_dir, use_brotli=False)
+    print(f"Static assets: {summary['processed']} processed, {summary['skipped']} unchanged, "
+          f"{summary['pruned']} pruned. Manifest: {os.path.join(static_dir, MANIFEST_FILE)}")
+    print("Assets keep their original URLs (revalidated); look paths up in the manifest for immutable caching.")
+    if not os.path.exists(docker_compose_file):
+        create_nginx_conf([f"node:{node_port}"])
+        return
+    # Rewriting the compose file adds the ./static mount to setups that predate it; nginx.conf gains /static/
+    create_docker_compose(*current_scale())
+
+    client = DockerEngineClient()
+    try:
+        if client.container_status("nginx-proxy") == "running":
+            # A proxy created without the mount is recreated; one that has it only needs the new nginx.conf
+            compose_up(client, docker_compose_file)
+            exit_code, output = client.exec_run("nginx-proxy", ["nginx", "-s", "reload"])
+            print("Reloaded nginx." if exit_code == 0 else f"nginx reload failed: {output.strip()}")
+    except DockerEngineError as e:
+        print(f"Docker Engine error: {e}")
+    finally:
+        client.close()
+
+# Snapshot docker-compose.yaml and nginx.conf into the deduplicating backup store
 def backup_docker_compose():
-    create_directory(backup_dir)
-    shutil.copy2(docker_compose_file, backup_docker_compose_file)
-    print(f"Backed up docker-compose.yaml to {backup_dir}")
+    paths = [path for path in (docker_compose_file, nginx_conf_file) if os.path.exists(path)]
+    manifest = backup_paths(paths, "node-docker")
+    print(f"Backed up docker-compose.yaml and nginx.conf as snapshot {manifest['id']}")
 
 # Update UFW to allow necessary ports for Node.js and Nginx
 def update_ufw():
@@ -63,32 +466,74 @@ def manage_ssl(action, domain=None):
         subprocess.run(["sudo", "certbot", "--nginx", "-d", domain], check=True)
         print(f"Obtained SSL certificate for {domain}")
     elif action == "renew":
-        subprocess.run(["sudo", "certbot", "renew"], check=True)
-        print("Renewed SSL certificates.")
+        # Only certificates nginx serves that are close to expiry are renewed
+        results = renew_due(NGINX_CONF_PATHS + [nginx_conf_file])
+        if any(result["status"] != "ok" for result in results):
+            print("Some SSL certificates failed to renew.")
+            sys.exit(1)
+        print(f"Renewed {len(results)} SSL certificate(s).")
     elif action == "check":
-        subprocess.run(["sudo", "certbot", "certificates"], check=True)
+        certs, uncovered = check_certificates(NGINX_CONF_PATHS + [nginx_conf_file])
+        print_report(certs, uncovered)
         print("Checked SSL certificates.")
 
+# Run a Docker Engine API action, exiting on failure
+def run_engine(action, *args):
+    client = DockerEngineClient()
+    try:
+        return action(client, *args)
+    except DockerEngineError as e:
+        print(f"Docker Engine error: {e}")
+        sys.exit(1)
+    finally:
+        client.close()
+
 # Start Docker containers
 def start_containers():
-    subprocess.run(["docker-compose", "up", "-d"], check=True)
+    run_engine(compose_up, docker_compose_file)
     print("Started Node.js and Nginx containers.")
 
 # Stop Docker containers
 def stop_containers():
-    subprocess.run(["docker-compose", "down"], check=True)
+    run_engine(compose_down, docker_compose_file)
     print("Stopped Node.js and Nginx containers.")
 
+# Show container status
+def status_containers():
+    for service, state in run_engine(compose_status, docker_compose_file).items():
+        print(f"{service}: {state}")
+
 # List domains and subdomains
 def list_domains():
     print("Listing domains and subdomains...")
-    subprocess.run(["sudo", "certbot", "certificates"], check=True)
+    for cert in load_inventory():
+        print(f"{cert['name']}: {', '.join(cert['domains'])} (expires in {cert['days_left']} days)")
 
 # Check Docker and Nginx configurations
 def check_configs():
     print("Checking Docker and Nginx configurations...")
-    subprocess.run(["docker-compose", "config"], check=True)
-    subprocess.run(["nginx", "-t"], check=True)
+    try:
+        project, plan = compose_plan(docker_compose_file)
+    except (OSError, DockerEngineError) as e:
+        print(f"Invalid compose file {docker_compose_file}: {e}")
+        sys.exit(1)
+    for service, container, config in plan:
+        print(f"{project}/{service}: {container} ({config['Image']})")
+    # Validate the nginx config inside the running proxy container
+    client = DockerEngineClient()
+    try:
+        if client.container_status("nginx-proxy") != "running":
+            print("nginx-proxy is not running, skipping nginx -t.")
+            return
+        exit_code, output = client.exec_run("nginx-proxy", ["nginx", "-t"])
+    except DockerEngineError as e:
+        print(f"Docker Engine error: {e}")
+        sys.exit(1)
+    finally:
+        client.close()
+    print(output.strip())
+    if exit_code != 0:
+        sys.exit(1)
 
 # Plan deployment process
 def plan_deployment():
@@ -103,7 +548,7 @@ def implement_deployment():
 # Main function with argument parsing
 def main():
     if len(sys.argv) < 2:
-        print("Usage: setupNode.py [--list | --ssl <action> | --start | --stop | --check-configs | --backup-configs | --plan | --implement]")
+        print("Usage: eos node [--list | --ssl <action> | --start | --stop | --status | --build [tag] | --static <dir> | --scale <n> [mode] | --autoscale <min> <max> [ms] | --check-configs | --backup-configs | --plan | --implement]")
         sys.exit(1)
 
     flag = sys.argv[1]
@@ -113,7 +558,7 @@ def main():
 
     elif flag == "--ssl":
         if len(sys.argv) < 3:
-            print("Usage: setupNode.py --ssl [get|check|renew] [domain (if 'get')]")
+            print("Usage: eos node --ssl [get|check|renew] [domain (if 'get')]")
             sys.exit(1)
         action = sys.argv[2]
         domain = sys.argv[3] if len(sys.argv) > 3 else None
@@ -125,6 +570,33 @@ def main():
     elif flag == "--stop":
         stop_containers()
 
+    elif flag == "--build":
+        build_image(sys.argv[2] if len(sys.argv) > 2 else None)
+
+    elif flag == "--static":
+        if len(sys.argv) < 3:
+            print("Usage: eos node --static <build_dir>")
+            sys.exit(1)
+        offload_static(sys.argv[2])
+
+    elif flag == "--scale":
+        if len(sys.argv) < 3:
+            print("Usage: eos node --scale <replicas> [containers|cluster]")
+            sys.exit(1)
+        scale_node(int(sys.argv[2]), sys.argv[3] if len(sys.argv) > 3 else "containers")
+
+    elif flag == "--autoscale":
+        if len(sys.argv) < 4:
+            print("Usage: eos node --autoscale <min> <max> [p95 latency target ms]")
+            sys.exit(1)
+        if current_scale()[1] == "cluster":
+            print("Autoscaling needs containers mode; cluster workers are fixed per container.")
+            sys.exit(1)
+        autoscale(int(sys.argv[2]), int(sys.argv[3]), float(sys.argv[4]) if len(sys.argv) > 4 else None)
+
+    elif flag == "--status":
+        status_containers()
+
     elif flag == "--check-configs":
         check_configs()
 
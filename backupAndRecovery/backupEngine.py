@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+
+import argparse
+import datetime
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import stat
+import sys
+import zlib
+
+from utilities.loadVariables import load_variables
+
+BACKUP_STORE = load_variables().get('BACKUP_STORE') or '/opt/cyberMonkey/backups'
+
+# Content-defined chunking: boundaries follow the content, so an edit only
+# changes the chunks around it and the rest dedups against earlier snapshots.
+MIN_CHUNK = 16 * 1024
+MAX_CHUNK = 256 * 1024
+# Boundary when the top 16 bits of the rolling hash are zero: ~64 KiB past MIN_CHUNK on average
+CHUNK_MASK = ((1 << 16) - 1) << 48
+HASH_MASK = (1 << 64) - 1
+# Fixed per-byte values for the Gear rolling hash; they must never change or old chunks stop matching
+GEAR = [int.from_bytes(hashlib.sha256(bytes([value])).digest()[:8], 'big') for value in range(256)]
+
+DEFAULT_RETENTION = {'keep_last': 10, 'keep_daily': 7, 'keep_weekly': 4, 'keep_monthly': 6}
+
+class BackupError(Exception):
+    pass
+
+def chunk_boundaries(data):
+    """Yield (start, end) offsets of the content-defined chunks in data."""
+    length = len(data)
+    start = 0
+    while start < length:
+        if length - start <= MIN_CHUNK:
+            yield start, length
+            return
+        end = min(start + MAX_CHUNK, length)
+        position = start + MIN_CHUNK
+        rolling = 0
+        while position < end:
+            rolling = ((rolling << 1) + GEAR[data[position]]) & HASH_MASK
+            position += 1
+            if not rolling & CHUNK_MASK:
+                break
+        yield start, position
+        start = position
+
+class BackupStore:
+    """
+    Content-addressed backup store.
+
+    Chunks live once under chunks/<2 hex>/<sha256>, zlib-compressed. A snapshot
+    is only a JSON manifest listing each file's metadata and chunk ids, so
+    unchanged files cost nothing but a manifest line. Files whose size and
+    mtime match the previous snapshot of the same tag are not even read.
+    """
+
+    def __init__(self, path=BACKUP_STORE):
+        self.path = path
+        self.chunk_dir = os.path.join(path, 'chunks')
+        self.snapshot_dir = os.path.join(path, 'snapshots')
+        os.makedirs(self.chunk_dir, exist_ok=True)
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        self.lock_file = None
+
+    def __enter__(self):
+        self.lock_file = open(os.path.join(self.path, 'lock'), 'w')
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+        self.lock_file.close()
+        self.lock_file = None
+
+    def chunk_path(self, digest):
+        return os.path.join(self.chunk_dir, digest[:2], digest)
+
+    def put_chunk(self, data):
+        """Store a chunk unless it is already present. Returns (digest, stored bytes written)."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.chunk_path(digest)
+        if os.path.exists(path):
+            return digest, 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        compressed = zlib.compress(data, 6)
+        with open(f"{path}.tmp", 'wb') as f:
+            f.write(compressed)
+        os.replace(f"{path}.tmp", path)
+        return digest, len(compressed)
+
+    def get_chunk(self, digest):
+        with open(self.chunk_path(digest), 'rb') as f:
+            data = zlib.decompress(f.read())
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise BackupError(f"Chunk {digest} is corrupt")
+        return data
+
+    # Snapshots
+
+    def snapshot_ids(self, tag=None):
+        """Return snapshot ids oldest first, optionally only those with tag."""
+        ids = sorted(name[:-5] for name in os.listdir(self.snapshot_dir) if name.endswith('.json'))
+        if tag:
+            ids = [snapshot_id for snapshot_id in ids if snapshot_id.rsplit('_', 1)[0] == tag]
+        return ids
+
+    def load_snapshot(self, snapshot_id):
+        path = os.path.join(self.snapshot_dir, f"{snapshot_id}.json")
+        if not os.path.exists(path):
+            raise BackupError(f"Snapshot {snapshot_id} not found")
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def resolve(self, snapshot_id, tag=None):
+        """Accept 'latest' (optionally per tag) as well as explicit ids."""
+        if snapshot_id == 'latest':
+            ids = self.snapshot_ids(tag)
+            if not ids:
+                raise BackupError(f"No snapshots{f' tagged {tag}' if tag else ''}")
+            return ids[-1]
+        return snapshot_id
+
+    def backup(self, sources, tag='default'):
+        """Snapshot the given files and directories. Returns the manifest."""
+        previous = {}
+        ids = self.snapshot_ids(tag)
+        if ids:
+            previous = self.load_snapshot(ids[-1])['files']
+
+        created = datetime.datetime.now()
+        snapshot_id = f"{tag}_{created.strftime('%Y-%m-%dT%H-%M-%S')}"
+        while os.path.exists(os.path.join(self.snapshot_dir, f"{snapshot_id}.json")):
+            created += datetime.timedelta(seconds=1)
+            snapshot_id = f"{tag}_{created.strftime('%Y-%m-%dT%H-%M-%S')}"
+
+        files = {}
+        stats = {'files': 0, 'reused': 0, 'bytes': 0, 'new_chunks': 0, 'stored_bytes': 0}
+        for source in sources:
+            source = os.path.abspath(source)
+            if not os.path.lexists(source):
+                logging.warning(f"{source} does not exist, skipping.")
+                continue
+            for path in walk(source):
+                entry = self.backup_entry(path, previous.get(path), stats)
+                if entry:
+                    files[path] = entry
+
+        manifest = {'id': snapshot_id, 'tag': tag, 'created': created.isoformat(timespec='seconds'),
+                    'sources': [os.path.abspath(source) for source in sources], 'files': files, 'stats': stats}
+        path = os.path.join(self.snapshot_dir, f"{snapshot_id}.json")
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(manifest, f)
+        os.replace(f"{path}.tmp", path)
+        return manifest
+
+    def backup_entry(self, path, previous, stats):
+        st = os.lstat(path)
+        entry = {'mode': stat.S_IMODE(st.st_mode), 'uid': st.st_uid, 'gid': st.st_gid, 'mtime': st.st_mtime_ns}
+        if stat.S_ISDIR(st.st_mode):
+            return dict(entry, type='dir')
+        if stat.S_ISLNK(st.st_mode):
+            return dict(entry, type='symlink', target=os.readlink(path))
+        if not stat.S_ISREG(st.st_mode):
+            return None
+
+        stats['files'] += 1
+        stats['bytes'] += st.st_size
+        entry.update(type='file', size=st.st_size)
+        if previous and previous['type'] == 'file' and previous['size'] == st.st_size \
+                and previous['mtime'] == st.st_mtime_ns:
+            stats['reused'] += 1
+            return dict(entry, chunks=previous['chunks'])
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        chunks = []
+        for start, end in chunk_boundaries(data):
+            digest, written = self.put_chunk(data[start:end])
+            chunks.append([digest, end - start])
+            if written:
+                stats['new_chunks'] += 1
+                stats['stored_bytes'] += written
+        return dict(entry, chunks=chunks)
+
+    def restore(self, snapshot_id, target_root='/', paths=None):
+        """
+        Restore a snapshot, or only the given paths (files or directories) from it.
+
+        Files are written next to their destination and renamed into place, so
+        a restore never leaves a half-written config behind. Returns the
+        number of entries restored.
+        """
+        manifest = self.load_snapshot(snapshot_id)
+        selected = sorted(manifest['files'].items())
+        if paths:
+            prefixes = [os.path.abspath(path) for path in paths]
+            selected = [(path, entry) for path, entry in selected
+                        if any(path == prefix or path.startswith(prefix.rstrip('/') + '/') for prefix in prefixes)]
+            if not selected:
+                raise BackupError(f"None of {', '.join(paths)} are in snapshot {snapshot_id}")
+
+        is_root = os.geteuid() == 0
+        directories = []
+        for path, entry in selected:
+            destination = os.path.join(target_root, path.lstrip('/'))
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            if entry['type'] == 'dir':
+                os.makedirs(destination, exist_ok=True)
+                directories.append((destination, entry))
+                continue
+            if entry['type'] == 'symlink':
+                if os.path.lexists(destination):
+                    os.remove(destination)
+                os.symlink(entry['target'], destination)
+                continue
+            temporary = f"{destination}.eos-restore"
+            with open(temporary, 'wb') as f:
+                for digest, _ in entry['chunks']:
+                    f.write(self.get_chunk(digest))
+            os.chmod(temporary, entry['mode'])
+            if is_root:
+                os.chown(temporary, entry['uid'], entry['gid'])
+            os.utime(temporary, ns=(entry['mtime'], entry['mtime']))
+            os.replace(temporary, destination)
+        # Directory metadata last, since writing their contents changes the mtime
+        for destination, entry in reversed(directories):
+            os.chmod(destination, entry['mode'])
+            if is_root:
+                os.chown(destination, entry['uid'], entry['gid'])
+            os.utime(destination, ns=(entry['mtime'], entry['mtime']))
+        return len(selected)
+
+    # Retention
+
+    def prune(self, tag=None, keep_last=0, keep_daily=0, keep_weekly=0, keep_monthly=0):
+        """
+        Delete snapshots outside the retention policy, then unreferenced chunks.
+
+        Policies apply per tag: the newest keep_last snapshots are kept, plus
+        the newest snapshot of each of the last keep_daily days, keep_weekly
+        ISO weeks and keep_monthly months. Returns (snapshots removed, chunk bytes freed).
+        """
+        tags = [tag] if tag else sorted({snapshot_id.rsplit('_', 1)[0] for snapshot_id in self.snapshot_ids()})
+        removed = 0
+        for current_tag in tags:
+            snapshots = [self.load_snapshot(snapshot_id) for snapshot_id in reversed(self.snapshot_ids(current_tag))]
+            keep = {manifest['id'] for manifest in snapshots[:keep_last]}
+            for count, bucket in ((keep_daily, lambda created: created.date()),
+                                  (keep_weekly, lambda created: created.isocalendar()[:2]),
+                                  (keep_monthly, lambda created: (created.year, created.month))):
+                seen = []
+                for manifest in snapshots:
+                    key = bucket(datetime.datetime.fromisoformat(manifest['created']))
+                    if key not in seen and len(seen) < count:
+                        seen.append(key)
+                        keep.add(manifest['id'])
+            for manifest in snapshots:
+                if manifest['id'] not in keep:
+                    os.remove(os.path.join(self.snapshot_dir, f"{manifest['id']}.json"))
+                    removed += 1
+        freed = self.gc() if removed else 0
+        return removed, freed
+
+    def referenced_chunks(self):
+        referenced = {}
+        for snapshot_id in self.snapshot_ids():
+            for entry in self.load_snapshot(snapshot_id)['files'].values():
+                for digest, size in entry.get('chunks', []):
+                    referenced[digest] = size
+        return referenced
+
+    def gc(self):
+        """Remove chunks no snapshot references. Returns the bytes freed."""
+        referenced = self.referenced_chunks()
+        freed = 0
+        for root, dirs, names in os.walk(self.chunk_dir):
+            for name in names:
+                if name not in referenced:
+                    path = os.path.join(root, name)
+                    freed += os.path.getsize(path)
+                    os.remove(path)
+        return freed
+
+    def stats(self):
+        """
+        Measure how much the store saves.
+
+        logical_bytes is what full copies of every snapshot would take,
+        unique_bytes the deduplicated data and stored_bytes what is on disk
+        after compression.
+        """
+        logical = 0
+        snapshots = self.snapshot_ids()
+        for snapshot_id in snapshots:
+            logical += sum(entry.get('size', 0) for entry in self.load_snapshot(snapshot_id)['files'].values())
+        unique = sum(self.referenced_chunks().values())
+        stored = 0
+        for root, dirs, names in os.walk(self.chunk_dir):
+            stored += sum(os.path.getsize(os.path.join(root, name)) for name in names)
+        return {
+            'snapshots': len(snapshots),
+            'logical_bytes': logical,
+            'unique_bytes': unique,
+            'stored_bytes': stored,
+            'dedup_ratio': round(logical / unique, 2) if unique else None,
+            'total_ratio': round(logical / stored, 2) if stored else None,
+        }
+
+def walk(source):
+    """Yield source and, for directories, everything below it without following symlinks."""
+    yield source
+    if os.path.isdir(source) and not os.path.islink(source):
+        for root, dirs, names in os.walk(source):
+            dirs.sort()
+            for name in dirs + sorted(names):
+                yield os.path.join(root, name)
+
+def backup_paths(paths, tag, store_path=BACKUP_STORE, retention=DEFAULT_RETENTION):
+    """Snapshot paths under tag and apply the retention policy. Returns the manifest."""
+    with BackupStore(store_path) as store:
+        manifest = store.backup(paths, tag)
+        if retention:
+            store.prune(tag, **retention)
+    return manifest
+
+def format_bytes(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.1f} {unit}" if unit != 'B' else f"{size} B"
+        size /= 1024
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        handlers=[logging.StreamHandler()]
+    )
+    parser = argparse.ArgumentParser(description="Deduplicating snapshot backups of configs and state.")
+    parser.add_argument('--store', default=BACKUP_STORE)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    backup_parser = commands.add_parser('backup', help="Snapshot files and directories")
+    backup_parser.add_argument('paths', nargs='+')
+    backup_parser.add_argument('--tag', default='default')
+    backup_parser.add_argument('--no-prune', action='store_true', help="Skip the default retention policy")
+
+    list_parser = commands.add_parser('list', help="List snapshots")
+    list_parser.add_argument('--tag')
+
+    restore_parser = commands.add_parser('restore', help="Restore a snapshot or single paths from it")
+    restore_parser.add_argument('snapshot', help="Snapshot id, or 'latest'")
+    restore_parser.add_argument('--tag', help="Tag used to resolve 'latest'")
+    restore_parser.add_argument('--path', action='append', help="Only restore this file or directory")
+    restore_parser.add_argument('--target', default='/', help="Restore below this directory instead of in place")
+
+    prune_parser = commands.add_parser('prune', help="Apply a retention policy")
+    prune_parser.add_argument('--tag')
+    for option, default in DEFAULT_RETENTION.items():
+        prune_parser.add_argument(f"--{option.replace('_', '-')}", type=int, default=default)
+
+    stats_parser = commands.add_parser('stats', help="Show dedup and compression ratios")
+    stats_parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    try:
+        with BackupStore(args.store) as store:
+            if args.command == 'backup':
+                manifest = store.backup(args.paths, args.tag)
+                stats = manifest['stats']
+                print(f"Snapshot {manifest['id']}: {stats['files']} files ({format_bytes(stats['bytes'])}), "
+                      f"{stats['reused']} unchanged, {stats['new_chunks']} new chunks "
+                      f"({format_bytes(stats['stored_bytes'])} stored).")
+                if not args.no_prune:
+                    store.prune(args.tag, **DEFAULT_RETENTION)
+            elif args.command == 'list':
+                for snapshot_id in store.snapshot_ids(args.tag):
+                    manifest = store.load_snapshot(snapshot_id)
+                    print(f"{snapshot_id:<48} {manifest['stats']['files']:>6} files  "
+                          f"{format_bytes(manifest['stats']['bytes']):>10}  {', '.join(manifest['sources'])}")
+            elif args.command == 'restore':
+                snapshot_id = store.resolve(args.snapshot, args.tag)
+                count = store.restore(snapshot_id, args.target, args.path)
+                print(f"Restored {count} entries from {snapshot_id} to {args.target}.")
+            elif args.command == 'prune':
+                removed, freed = store.prune(args.tag, args.keep_last, args.keep_daily,
+                                             args.keep_weekly, args.keep_monthly)
+                print(f"Removed {removed} snapshots, freed {format_bytes(freed)}.")
+            elif args.command == 'stats':
+                stats = store.stats()
+                if args.json:
+                    print(json.dumps(stats))
+                else:
+                    print(f"{stats['snapshots']} snapshots: {format_bytes(stats['logical_bytes'])} logical, "
+                          f"{format_bytes(stats['unique_bytes'])} unique, {format_bytes(stats['stored_bytes'])} on disk")
+                    print(f"Dedup ratio {stats['dedup_ratio'] or '-'}x, with compression {stats['total_ratio'] or '-'}x")
+    except (BackupError, OSError) as e:
+        logging.error(str(e))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+
+import argparse
+import base64
+import datetime
+import fcntl
+import glob
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from utilities.loadVariables import load_variables
+
+LOG_ARCHIVE = load_variables().get('LOG_ARCHIVE') or '/opt/cyberMonkey/logArchive'
+
+# Where each kind of log lands. Logs named like a rotation (.1, .2.gz, -20261019) are closed;
+# closed_after marks logs that are written once and never appended to again, e.g. concurrent audit files.
+# packed_globs match many small closed files that share one segment per source and day instead of one each.
+SOURCES = {
+    'nginx-access': {'globs': ['/var/log/nginx/*access.log*']},
+    'nginx-error': {'globs': ['/var/log/nginx/*error.log*']},
+    'modsec-audit': {'globs': ['/var/log/modsec_audit.log*'], 'packed_globs': ['/var/log/modsec_audit/*/*/*'],
+                     'closed_after': 300},
+    'eos': {'globs': ['/var/log/eos/nginx-docker/nginx.log*', '/var/log/eos/fleet/*', '/var/log/CodeMonkeyCyber/*.log*']},
+}
+ROTATED_PATTERN = re.compile(r'(\.\d+|-\d{8})(\.gz)?$|\.gz$')
+
+# Uncompressed bytes per block: the unit a search decompresses
+BLOCK_BYTES = 1024 * 1024
+# Head of a log used to recognise it after renames, rotations and compression
+FINGERPRINT_BYTES = 4096
+BLOOM_BITS_PER_KEY = 10
+BLOOM_HASHES = 7
+KEY_FIELDS = ('ip', 'vhost', 'rule')
+
+TIMESTAMP_FORMATS = [
+    # nginx access: [19/Oct/2026:10:00:00 +0200]
+    (re.compile(r'\[(\d{2}/\w{3}/\d{4}:\d{2}:\d{2}:\d{2} [+-]\d{4})\]'), '%d/%b/%Y:%H:%M:%S %z'),
+    # nginx error: 2026/10/19 10:00:00
+    (re.compile(r'^(\d{4}/\d{2}/\d{2} \d{2}:\d{2}:\d{2})'), '%Y/%m/%d %H:%M:%S'),
+    # eos scripts (logging asctime) and ISO timestamps
+    (re.compile(r'(\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2})'), None),
+    # ModSecurity JSON audit: "time_stamp":"Mon Oct 19 10:00:00 2026"
+    (re.compile(r'(\w{3} \w{3} +\d{1,2} \d{2}:\d{2}:\d{2} \d{4})'), '%a %b %d %H:%M:%S %Y'),
+]
+IP_PATTERN = re.compile(r'(?:^|(?<=[\s":,\[]))((?:\d{1,3}\.){3}\d{1,3}|[0-9a-fA-F]{0,4}(?::[0-9a-fA-F]{0,4}){2,7})(?=$|[\s":,\]])')
+VHOST_PATTERNS = [re.compile(p) for p in (r'\bserver: ([^\s,]+)', r'\bhost: "([^"]+)"', r'"[Hh]ost":\s*"([^"]+)"',
+                                          r'\bhost=(\S+)')]
+RULE_PATTERNS = [re.compile(p) for p in (r'\bid "(\d+)"', r'"ruleId":\s*"(\d+)"', r'\bid:(\d+)')]
+# Per-site logs written as <vhost>.access.log or access.<vhost>.log carry their vhost in the name
+VHOST_FILE_PATTERN = re.compile(r'^(?:(?P<a>[\w.-]+\.\w+)\.(?:access|error)\.log|(?:access|error)\.(?P<b>[\w.-]+\.\w+)\.log)')
+
+class ArchiveError(Exception):
+    pass
+
+class BloomFilter:
+    """Fixed-size Bloom filter; answers 'maybe present' or 'certainly absent'."""
+
+    def __init__(self, size_bits, hashes=BLOOM_HASHES, bits=None):
+        self.size = max(64, size_bits)
+        self.hashes = hashes
+        self.bits = bytearray(bits) if bits is not None else bytearray((self.size + 7) // 8)
+
+    @classmethod
+    def for_keys(cls, keys):
+        bloom = cls(len(keys) * BLOOM_BITS_PER_KEY)
+        for key in keys:
+            bloom.add(key)
+        return bloom
+
+    def positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self.positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(key))
+
+    def to_dict(self):
+        return {'size': self.size, 'hashes': self.hashes, 'bits': base64.b64encode(bytes(self.bits)).decode()}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['size'], data['hashes'], base64.b64decode(data['bits']))
+
+def parse_timestamp(line):
+    """Return the epoch seconds of the first timestamp in line, or None."""
+    for pattern, fmt in TIMESTAMP_FORMATS:
+        match = pattern.search(line)
+        if not match:
+            continue
+        try:
+            if fmt is None:
+                return datetime.datetime.fromisoformat(match.group(1)).timestamp()
+            return datetime.datetime.strptime(match.group(1), fmt).timestamp()
+        except ValueError:
+            continue
+    return None
+
+def line_keys(line, vhost=None):
+    """The client IPs, vhosts and rule ids mentioned in a log line."""
+    keys = {'ip': set(IP_PATTERN.findall(line)), 'vhost': {vhost} if vhost else set(), 'rule': set()}
+    for pattern in VHOST_PATTERNS:
+        keys['vhost'].update(value.lower() for value in pattern.findall(line))
+    for pattern in RULE_PATTERNS:
+        keys['rule'].update(pattern.findall(line))
+    keys['ip'] = {ip for ip in keys['ip'] if '.' in ip or ip.count(':') >= 2}
+    return keys
+
+def file_vhost(path):
+    match = VHOST_FILE_PATTERN.match(os.path.basename(path))
+    return (match.group('a') or match.group('b')).lower() if match else None
+
+def is_closed(path, settings, now=None):
+    if ROTATED_PATTERN.search(os.path.basename(path)):
+        return True
+    closed_after = settings.get('closed_after')
+    return bool(closed_after) and (now or time.time()) - os.path.getmtime(path) > closed_after
+
+def read_log(path):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        return f.read()
+
+class LogArchive:
+    """
+    Compressed, indexed log archive.
+
+    Each archived log becomes a segment under <source>/<YYYY-MM>/, except packed files
+    (one ModSecurity audit file per transaction), which share a segment per day: a .blocks file of
+    independently zlib-compressed ~1 MiB blocks and a .json sidecar with, per block,
+    its offsets, time range and Bloom filters of the client IPs, vhosts and rule ids in
+    it. A search reads only sidecars until it knows which blocks can match. state.json
+    remembers how far each log was archived, keyed by a fingerprint of its head, so
+    renamed, rotated or compressed copies of a log are not archived twice.
+    """
+
+    def __init__(self, path=LOG_ARCHIVE):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.state_file = os.path.join(path, 'state.json')
+        self.lock_file = None
+
+    def __enter__(self):
+        self.lock_file = open(os.path.join(self.path, 'lock'), 'w')
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+        self.lock_file.close()
+        self.lock_file = None
+
+    def load_state(self):
+        try:
+            with open(self.state_file, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def save_state(self, state):
+        with open(f"{self.state_file}.tmp", 'w') as f:
+            json.dump(state, f)
+        os.replace(f"{self.state_file}.tmp", self.state_file)
+
+    @staticmethod
+    def archived_offset(state, data):
+        """How many bytes of this log are already archived, matched on the fingerprint of its head."""
+        head = min(len(data), FINGERPRINT_BYTES)
+        entry = state.get(hashlib.sha256(data[:head]).hexdigest())
+        if entry and entry['head'] == head:
+            return entry['offset']
+        # A live log archived while shorter than the fingerprint was known by a shorter head
+        for head_length in sorted({e['head'] for e in state.values() if e.get('grows') and e['head'] < head},
+                                  reverse=True):
+            entry = state.get(hashlib.sha256(data[:head_length]).hexdigest())
+            if entry and entry['head'] == head_length:
+                return entry['offset']
+        return 0
+
+    @staticmethod
+    def record_offset(state, data, offset, closed):
+        head = min(len(data), FINGERPRINT_BYTES)
+        for key in [k for k, entry in state.items() if entry.get('grows') and entry['head'] < head
+                    and hashlib.sha256(data[:entry['head']]).hexdigest() == k]:
+            del state[key]
+        entry = {'head': head, 'offset': offset}
+        if not closed and head < FINGERPRINT_BYTES:
+            entry['grows'] = True
+        state[hashlib.sha256(data[:head]).hexdigest()] = entry
+
+    def write_segment(self, source, origin, lines, vhost=None, fallback=None, files=1):
+        """Compress lines into blocks and write the segment with its sidecar. Returns the sidecar."""
+        blocks, chunks, offset = [], [], 0
+        fallback = fallback or time.time()
+        current, size, last_time = [], 0, None
+
+        def flush():
+            nonlocal offset, current, size
+            if not current:
+                return
+            raw = b''.join(line for line, _ in current)
+            compressed = zlib.compress(raw, 6)
+            times = [t for _, t in current if t is not None] or [fallback]
+            keys = {field: set() for field in KEY_FIELDS}
+            for line, _ in current:
+                for field, values in line_keys(line.decode('utf-8', 'replace'), vhost).items():
+                    keys[field].update(values)
+            blocks.append({'offset': offset, 'length': len(compressed), 'raw': len(raw), 'lines': len(current),
+                           'first': min(times), 'last': max(times),
+                           'bloom': {field: BloomFilter.for_keys(values).to_dict() for field, values in keys.items()}})
+            chunks.append(compressed)
+            offset += len(compressed)
+            current, size = [], 0
+
+        for line in lines:
+            # Continuation lines (stack traces, multi-line audit parts) inherit the last timestamp
+            stamp = parse_timestamp(line.decode('utf-8', 'replace')) or last_time
+            last_time = stamp
+            current.append((line, stamp))
+            size += len(line)
+            if size >= BLOCK_BYTES:
+                flush()
+        flush()
+        if not blocks:
+            return None
+
+        first = min(block['first'] for block in blocks)
+        month = datetime.datetime.fromtimestamp(first).strftime('%Y-%m')
+        directory = os.path.join(self.path, source, month)
+        os.makedirs(directory, exist_ok=True)
+        name = f"{datetime.datetime.fromtimestamp(first).strftime('%Y%m%dT%H%M%S')}-{hashlib.sha256(chunks[0]).hexdigest()[:12]}"
+        sidecar = {'source': source, 'origin': origin, 'files': files, 'vhost': vhost,
+                   'blocks_file': f"{name}.blocks",
+                   'first': first, 'last': max(block['last'] for block in blocks),
+                   'raw': sum(block['raw'] for block in blocks), 'stored': offset, 'blocks': blocks}
+        blocks_path = os.path.join(directory, f"{name}.blocks")
+        with open(f"{blocks_path}.tmp", 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{blocks_path}.tmp", blocks_path)
+        index_path = os.path.join(directory, f"{name}.json")
+        with open(f"{index_path}.tmp", 'w') as f:
+            json.dump(sidecar, f)
+        os.replace(f"{index_path}.tmp", index_path)
+        return sidecar
+
+    def archive_file(self, source, path, state, closed=True, delete=False):
+        """Archive what is new in one log. Returns the sidecar written, or None if nothing was new."""
+        data = read_log(path)
+        start = self.archived_offset(state, data)
+        # Only whole lines: a log still being written is picked up from here next time
+        end = data.rfind(b'\n') + 1
+        sidecar = None
+        if end > start:
+            sidecar = self.write_segment(source, path, data[start:end].splitlines(keepends=True),
+                                         file_vhost(path), os.path.getmtime(path))
+            self.record_offset(state, data, end, closed)
+        if delete and closed and end == len(data):
+            os.remove(path)
+        return sidecar
+
+    def pack_files(self, source, paths, state, delete=False):
+        """Archive small closed logs into one shared segment. Returns the sidecar, or None if nothing was new."""
+        lines, packed, latest = [], [], None
+        for path in paths:
+            try:
+                data = read_log(path)
+                mtime = os.path.getmtime(path)
+            except (OSError, EOFError, zlib.error) as e:
+                logging.warning(f"Skipping {path}: {e}")
+                continue
+            if data and not data.endswith(b'\n'):
+                data += b'\n'
+            if self.archived_offset(state, data) < len(data):
+                lines += data.splitlines(keepends=True)
+                latest = max(latest or mtime, mtime)
+            packed.append((path, data))
+        sidecar = None
+        if lines:
+            sidecar = self.write_segment(source, os.path.commonpath(paths), lines, fallback=latest,
+                                         files=len(packed))
+        for path, data in packed:
+            self.record_offset(state, data, len(data), True)
+            if delete:
+                os.remove(path)
+        return sidecar
+
+    def archive(self, sources=SOURCES, paths=(), source_name='eos', active=False, delete=False):
+        """Archive the closed logs of each source (and any explicit paths). Returns the sidecars written."""
+        state = self.load_state()
+        written = []
+        # Explicit paths (e.g. a cwd-relative script.log) may still be appended to
+        targets = [(source_name, path, False) for path in paths]
+        packs = {}
+        now = time.time()
+        for name, settings in sources.items():
+            for pattern in settings['globs']:
+                for path in sorted(glob.glob(pattern)):
+                    closed = os.path.isfile(path) and is_closed(path, settings, now)
+                    if os.path.isfile(path) and (active or closed):
+                        targets.append((name, path, closed))
+            for pattern in settings.get('packed_globs', []):
+                for path in sorted(glob.glob(pattern)):
+                    # Files still being written are left for the next run rather than getting a segment each
+                    if os.path.isfile(path) and is_closed(path, settings, now):
+                        day = datetime.datetime.fromtimestamp(os.path.getmtime(path)).strftime('%Y-%m-%d')
+                        packs.setdefault((name, day), []).append(path)
+        try:
+            for name, path, closed in targets:
+                try:
+                    sidecar = self.archive_file(name, path, state, closed, delete)
+                except (OSError, EOFError, zlib.error) as e:
+                    logging.warning(f"Skipping {path}: {e}")
+                    continue
+                if sidecar:
+                    logging.info(f"Archived {path}: {sidecar['raw']} bytes in {len(sidecar['blocks'])} block(s), "
+                                 f"{sidecar['stored']} stored")
+                    written.append(sidecar)
+            for (name, day), pack in sorted(packs.items()):
+                sidecar = self.pack_files(name, pack, state, delete)
+                if sidecar:
+                    logging.info(f"Packed {sidecar['files']} {name} file(s) from {day}: {sidecar['raw']} bytes in "
+                                 f"{len(sidecar['blocks'])} block(s), {sidecar['stored']} stored")
+                    written.append(sidecar)
+        finally:
+            # Once per run: rewriting the state after every file is quadratic in the number of logs
+            self.save_state(state)
+        return written
+
+    def sidecars(self, sources=None):
+        for path in sorted(glob.glob(os.path.join(self.path, '*', '*', '*.json'))):
+            if sources and path.split(os.sep)[-3] not in sources:
+                continue
+            with open(path, 'r') as f:
+                sidecar = json.load(f)
+            sidecar['directory'] = os.path.dirname(path)
+            yield sidecar
+
+    def candidate_blocks(self, query):
+        """Blocks whose time range overlaps the query and whose Bloom filters may hold every key asked for."""
+        since, until = query.get('since'), query.get('until')
+        totals = {'segments': 0, 'blocks': 0}
+        candidates = []
+        for sidecar in self.sidecars(query.get('sources')):
+            totals['segments'] += 1
+            totals['blocks'] += len(sidecar['blocks'])
+            if (since and sidecar['last'] < since) or (until and sidecar['first'] > until):
+                continue
+            for block in sidecar['blocks']:
+                if (since and block['last'] < since) or (until and block['first'] > until):
+                    continue
+                if any(query.get(field) and query[field] not in BloomFilter.from_dict(block['bloom'][field])
+                       for field in KEY_FIELDS):
+                    continue
+                candidates.append((os.path.join(sidecar['directory'], sidecar['blocks_file']), block['offset'],
+                                   block['length'], sidecar['source'], sidecar['vhost']))
+        return candidates, totals
+
+def scan_block(candidate, query):
+    """Decompress one block and return its matching lines as (time, source, line)."""
+    blocks_path, offset, length, source, vhost = candidate
+    with open(blocks_path, 'rb') as f:
+        f.seek(offset)
+        raw = zlib.decompress(f.read(length))
+    since, until = query.get('since'), query.get('until')
+    pattern = re.compile(query['grep']) if query.get('grep') else None
+    matches, last_time = [], None
+    for line in raw.decode('utf-8', 'replace').splitlines():
+        stamp = parse_timestamp(line) or last_time
+        last_time = stamp
+        if stamp is not None and ((since and stamp < since) or (until and stamp > until)):
+            continue
+        if pattern and not pattern.search(line):
+            continue
+        if any(query.get(field) for field in KEY_FIELDS):
+            keys = line_keys(line, vhost)
+            if any(query.get(field) and query[field] not in keys[field] for field in KEY_FIELDS):
+                continue
+        matches.append((stamp or 0, source, line))
+    return matches, len(raw)
+
+def search(archive, query, jobs=None):
+    """Run a query over the archive with parallel workers. Returns (matching lines in time order, stats)."""
+    started = time.perf_counter()
+    candidates, totals = archive.candidate_blocks(query)
+    matches, scanned = [], 0
+    if candidates:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            for block_matches, raw in pool.map(scan_block, candidates, [query] * len(candidates)):
+                matches += block_matches
+                scanned += raw
+    matches.sort(key=lambda match: match[0])
+    stats = dict(totals, candidates=len(candidates), decompressed=scanned, seconds=time.perf_counter() - started)
+    return matches, stats
+
+def parse_time(value):
+    """Accept 2026-10-19, '2026-10-19 14:00', or a relative 30m/6h/2d meaning that long ago."""
+    if value is None:
+        return None
+    match = re.fullmatch(r'(\d+)([smhd])', value)
+    if match:
+        return time.time() - int(match.group(1)) * {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[match.group(2)]
+    try:
+        return datetime.datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise ArchiveError(f"Invalid time '{value}', use e.g. 2026-10-19T14:00 or 6h")
+
+def format_bytes(size):
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if size < 1024 or unit == 'GiB':
+            return f"{size:.1f} {unit}" if unit != 'B' else f"{size} B"
+        size /= 1024
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Archive logs into indexed compressed blocks and search them.")
+    parser.add_argument('--archive', default=LOG_ARCHIVE, help=f"Archive directory (default {LOG_ARCHIVE})")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    archive = subparsers.add_parser('archive', help="Archive closed logs of the known sources")
+    archive.add_argument('paths', nargs='*', help="Extra logs to archive, e.g. a script.log")
+    archive.add_argument('--source', default='eos', help="Source name for the extra logs")
+    archive.add_argument('--active', action='store_true', help="Also archive what live logs have so far")
+    archive.add_argument('--delete', action='store_true', help="Remove closed logs once archived")
+    find = subparsers.add_parser('search', help="Search the archive")
+    find.add_argument('--since', help="Start time, e.g. 2026-10-19T14:00 or 6h")
+    find.add_argument('--until', help="End time")
+    find.add_argument('--ip')
+    find.add_argument('--vhost')
+    find.add_argument('--rule', help="ModSecurity rule id")
+    find.add_argument('--grep', help="Regular expression the line must match")
+    find.add_argument('--source', action='append', choices=sorted(SOURCES), help="Limit to a source (repeatable)")
+    find.add_argument('--jobs', type=int)
+    find.add_argument('--stats', action='store_true', help="Print how many blocks were skipped and scanned")
+    subparsers.add_parser('stats', help="Show the archive size per source")
+    args = parser.parse_args()
+
+    try:
+        store = LogArchive(args.archive)
+        if args.command == 'archive':
+            with store:
+                written = store.archive(paths=args.paths, source_name=args.source, active=args.active,
+                                        delete=args.delete)
+            raw = sum(sidecar['raw'] for sidecar in written)
+            stored = sum(sidecar['stored'] for sidecar in written)
+            files = sum(sidecar.get('files', 1) for sidecar in written)
+            print(f"Archived {files} log(s) into {len(written)} segment(s): "
+                  f"{format_bytes(raw)} -> {format_bytes(stored)}")
+        elif args.command == 'search':
+            query = {'since': parse_time(args.since), 'until': parse_time(args.until), 'ip': args.ip,
+                     'vhost': args.vhost.lower() if args.vhost else None, 'rule': args.rule, 'grep': args.grep,
+                     'sources': args.source}
+            matches, stats = search(store, query, args.jobs)
+            for _, source, line in matches:
+                print(f"{source}: {line}")
+            if args.stats:
+                print(f"{len(matches)} line(s); {stats['candidates']} of {stats['blocks']} blocks in "
+                      f"{stats['segments']} segments scanned, {format_bytes(stats['decompressed'])} decompressed "
+                      f"in {stats['seconds']:.2f}s", file=sys.stderr)
+        else:
+            totals = {}
+            for sidecar in store.sidecars():
+                entry = totals.setdefault(sidecar['source'], {'segments': 0, 'raw': 0, 'stored': 0})
+                entry['segments'] += 1
+                entry['raw'] += sidecar['raw']
+                entry['stored'] += sidecar['stored']
+            for source, entry in sorted(totals.items()):
+                ratio = entry['raw'] / entry['stored'] if entry['stored'] else 0
+                print(f"{source:<14} {entry['segments']:>6} segments  {format_bytes(entry['raw']):>11} -> "
+                      f"{format_bytes(entry['stored']):>11}  ({ratio:.1f}x)")
+    except (ArchiveError, OSError, re.error) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+
+import datetime
+import errno
+import fcntl
+import glob
+import logging
+import os
+import shutil
+import subprocess
+import sys
+
+from utilities.loadVariables import load_variables
+
+_variables = load_variables()
+# Older .bak snapshots of a path are pruned once they use more than this, newest first
+SNAPSHOT_BUDGET = int(_variables.get('SNAPSHOT_BUDGET_MB') or 2048) * 1024 * 1024
+SNAPSHOT_KEEP = int(_variables.get('SNAPSHOT_KEEP') or 3)
+
+# ioctl(dest_fd, FICLONE, src_fd) shares the source extents copy-on-write (btrfs, XFS, bcachefs)
+FICLONE = 0x40049409
+REFLINK_UNSUPPORTED = {errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EBADF}
+HARDLINK_UNSUPPORTED = {errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP}
+
+def snapshot_name(path):
+    """Return a `<path>_<timestamp>.bak` name no existing snapshot uses, stepping a second on collisions."""
+    created = datetime.datetime.now()
+    backup = f"{path}_{created.strftime('%Y-%m-%d_%H-%M-%S')}.bak"
+    while os.path.lexists(backup):
+        created += datetime.timedelta(seconds=1)
+        backup = f"{path}_{created.strftime('%Y-%m-%d_%H-%M-%S')}.bak"
+    return backup
+
+def reflink(src, dst):
+    with open(src, 'rb') as source, open(dst, 'wb') as destination:
+        fcntl.ioctl(destination.fileno(), FICLONE, source.fileno())
+
+def clone_file(src, dst, method, hardlinks=False):
+    """Clone one file with the cheapest method that works here. Returns the method used."""
+    if method == 'reflink':
+        try:
+            reflink(src, dst)
+            shutil.copystat(src, dst)
+            return 'reflink'
+        except OSError as e:
+            if os.path.exists(dst):
+                os.remove(dst)
+            if e.errno not in REFLINK_UNSUPPORTED:
+                raise
+            method = 'hardlink' if hardlinks else 'copy'
+    if method == 'hardlink':
+        try:
+            os.link(src, dst)
+            return 'hardlink'
+        except OSError as e:
+            if e.errno not in HARDLINK_UNSUPPORTED:
+                raise
+    shutil.copy2(src, dst)
+    return 'copy'
+
+def clone_tree(src, dst, hardlinks=False):
+    """
+    Copy src to dst as cheaply as possible: reflinks, else a real copy.
+
+    With hardlinks=True files are hardlinked when reflinks are unavailable.
+    A hardlinked file shares its inode with the original, so an in-place edit
+    of the original would show up in the snapshot too; that is only safe when
+    the original is removed right after. Returns the method used for the last file.
+    """
+    method = 'reflink'
+    if os.path.islink(src):
+        os.symlink(os.readlink(src), dst)
+        return 'symlink'
+    if not os.path.isdir(src):
+        return clone_file(src, dst, method, hardlinks)
+
+    for root, dirs, names in os.walk(src):
+        target_root = os.path.join(dst, os.path.relpath(root, src))
+        os.makedirs(target_root, exist_ok=True)
+        for name in dirs + names:
+            source = os.path.join(root, name)
+            target = os.path.join(target_root, name)
+            if os.path.islink(source):
+                os.symlink(os.readlink(source), target)
+            elif name in names:
+                method = clone_file(source, target, method, hardlinks)
+    # Directory metadata last, since creating entries updates mtimes
+    for root, dirs, names in os.walk(src, topdown=False):
+        shutil.copystat(root, os.path.join(dst, os.path.relpath(root, src)), follow_symlinks=False)
+    return method
+
+def snapshot_path(path, move=False):
+    """
+    Take a timestamped `<path>_<timestamp>.bak` snapshot of a file, symlink or directory.
+
+    With move=True the original is gone afterwards, which is what callers that
+    are about to replace it want; a rename within the same directory does that
+    atomically without touching the data. Otherwise, or when the rename is
+    impossible (e.g. path is a mount point), the tree is cloned; hardlinks
+    are only used when the original is removed afterwards.
+    Returns (snapshot path, method).
+    """
+    backup = snapshot_name(path)
+    if move:
+        try:
+            os.rename(path, backup)
+            return backup, 'rename'
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EBUSY):
+                raise
+    method = clone_tree(path, backup, hardlinks=move)
+    if move:
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    return backup, method
+
+def list_snapshots(path):
+    """Return the .bak snapshots of path, newest first."""
+    return sorted(glob.glob(f"{glob.escape(path)}_*.bak"), reverse=True)
+
+def disk_usage(path, seen):
+    """Return (bytes allocated below path, its inodes) leaving out inodes already in seen."""
+    total = 0
+    inodes = set()
+    paths = [path]
+    if os.path.isdir(path) and not os.path.islink(path):
+        paths = []
+        for root, dirs, names in os.walk(path):
+            paths += [os.path.join(root, name) for name in dirs + names]
+    for entry in paths:
+        try:
+            st = os.lstat(entry)
+        except FileNotFoundError:
+            continue
+        key = (st.st_dev, st.st_ino)
+        if key in seen or key in inodes:
+            continue
+        inodes.add(key)
+        total += st.st_blocks * 512
+    return total, inodes
+
+def remove_path(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+def prune_snapshots(path, keep=SNAPSHOT_KEEP, budget=SNAPSHOT_BUDGET):
+    """
+    Remove old snapshots of path beyond `keep` or beyond `budget` bytes.
+
+    The newest snapshot is always kept. Blocks shared with the live path
+    (hardlinks) do not count against the budget. Returns the removed paths.
+    """
+    seen = disk_usage(path, set())[1] if os.path.exists(path) else set()
+    used = 0
+    removed = []
+    for index, snapshot in enumerate(list_snapshots(path)):
+        size, inodes = disk_usage(snapshot, seen)
+        if index >= keep or (index > 0 and used + size > budget):
+            remove_path(snapshot)
+            removed.append(snapshot)
+            logging.info(f"Pruned snapshot {snapshot} ({size // (1024 * 1024)} MB).")
+            continue
+        seen |= inodes
+        used += size
+    return removed
+
+def prune_in_background(path, keep=SNAPSHOT_KEEP, budget=SNAPSHOT_BUDGET):
+    """Prune snapshots of path in a detached, low-priority process so callers do not wait on it."""
+    # Run as a module from the repository root so the package imports resolve without an install
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    command = [sys.executable, '-m', 'backupAndRecovery.pathSnapshot', '--prune', os.path.abspath(path),
+               '--keep', str(keep), '--budget', str(budget)]
+    if shutil.which('ionice'):
+        command = ['ionice', '-c', '3'] + command
+    subprocess.Popen(command, cwd=repo_root, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                     stderr=subprocess.DEVNULL, start_new_session=True, preexec_fn=lambda: os.nice(19))
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        handlers=[logging.StreamHandler()]
+    )
+    if len(sys.argv) < 3 or sys.argv[1] not in ('--snapshot', '--prune', '--list'):
+        print("Usage: eos snapshot [--snapshot <path> | --prune <path> [--keep N] [--budget BYTES] | --list <path>]")
+        sys.exit(1)
+
+    flag, path = sys.argv[1], os.path.abspath(sys.argv[2])
+    args = sys.argv[3:]
+    if flag == '--snapshot':
+        backup, method = snapshot_path(path)
+        print(f"Snapshot of {path} at {backup} ({method}).")
+    elif flag == '--prune':
+        keep = int(args[args.index('--keep') + 1]) if '--keep' in args else SNAPSHOT_KEEP
+        budget = int(args[args.index('--budget') + 1]) if '--budget' in args else SNAPSHOT_BUDGET
+        removed = prune_snapshots(path, keep, budget)
+        print(f"Removed {len(removed)} snapshot(s) of {path}.")
+    elif flag == '--list':
+        seen = disk_usage(path, set())[1] if os.path.exists(path) else set()
+        for snapshot in list_snapshots(path):
+            size, inodes = disk_usage(snapshot, seen)
+            seen |= inodes
+            print(f"{snapshot}  {size // (1024 * 1024)} MB")
+
+if __name__ == '__main__':
+    main()
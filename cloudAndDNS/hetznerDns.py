@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+
+import argparse
+import getpass
+import http.client
+import json
+import logging
+import os
+import sys
+import time
+import urllib.parse
+
+import yaml
+
+from securityAndEncryption.certInventory import NGINX_CONF_PATHS, nginx_vhosts
+
+HETZNER_DNS_API = 'https://dns.hetzner.com/api/v1'
+PER_PAGE = 100
+# Records per bulk create/update request
+BULK_BATCH = 100
+DEFAULT_TTL = 3600
+# Pause once the remaining request budget in the rate-limit window drops to this
+RATE_LIMIT_RESERVE = 2
+MAX_RETRIES = 5
+# Requests that are safe to resend when the connection drops after they were sent
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'PUT', 'DELETE'}
+
+class HetznerDnsError(Exception):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+class HetznerDnsClient:
+    """
+    Minimal Hetzner DNS API client that keeps one connection open for all calls.
+
+    api_url can point at a local mock (cloudAndDNS/mockHetznerDns.py) for dry runs.
+    Requests back off on 429 and when the Ratelimit-Remaining header shows
+    the window is nearly used up.
+    """
+
+    def __init__(self, token, api_url=HETZNER_DNS_API, timeout=30):
+        url = urllib.parse.urlsplit(api_url)
+        self.token = token
+        self.scheme = url.scheme
+        self.netloc = url.netloc
+        self.base_path = url.path.rstrip('/')
+        self.timeout = timeout
+        self.connection = None
+        self.requests = 0
+
+    def connect(self):
+        if self.connection is None:
+            connection_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+            self.connection = connection_class(self.netloc, timeout=self.timeout)
+        return self.connection
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def throttle(self, response):
+        """Sleep until the rate-limit window resets when the remaining budget is nearly spent."""
+        remaining = response.getheader('Ratelimit-Remaining')
+        reset = response.getheader('Ratelimit-Reset')
+        if remaining is not None and reset is not None and int(remaining) <= RATE_LIMIT_RESERVE:
+            logging.info(f"Rate limit nearly reached, waiting {reset}s for the window to reset.")
+            time.sleep(int(reset))
+
+    def request(self, method, path, params=None, body=None):
+        url = f"{self.base_path}{path}"
+        if params:
+            url = f"{url}?{urllib.parse.urlencode(params)}"
+        headers = {'Auth-API-Token': self.token}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+
+        for attempt in range(MAX_RETRIES):
+            connection = self.connect()
+            sent = False
+            try:
+                connection.request(method, url, body=payload, headers=headers)
+                sent = True
+                response = connection.getresponse()
+                data = response.read()
+            except (http.client.HTTPException, OSError) as e:
+                # The server may have closed the idle keep-alive connection; reconnect once. A sent
+                # POST /records/bulk may already have created its records, so only idempotent calls are resent.
+                self.close()
+                if attempt:
+                    raise
+                if sent and method not in IDEMPOTENT_METHODS:
+                    raise HetznerDnsError(f"{method} {path} lost its connection after it was sent ({e}); "
+                                          "run the sync again to re-read the zone and apply what is missing")
+                continue
+            self.requests += 1
+            if response.status == 429:
+                wait = int(response.getheader('Retry-After') or response.getheader('Ratelimit-Reset') or 2 ** attempt)
+                logging.info(f"Rate limited, retrying in {wait}s.")
+                time.sleep(wait)
+                continue
+            self.throttle(response)
+            if response.status >= 400:
+                raise HetznerDnsError(f"{method} {path} failed: {response.status} {data.decode(errors='replace')}",
+                                      response.status)
+            return json.loads(data) if data else {}
+        raise HetznerDnsError(f"{method} {path} still rate limited after {MAX_RETRIES} attempts", 429)
+
+    def paginate(self, path, key, params=None):
+        """Yield every item of a paginated list endpoint."""
+        page = 1
+        while True:
+            result = self.request('GET', path, dict(params or {}, page=page, per_page=PER_PAGE))
+            yield from result.get(key) or []
+            pagination = result.get('meta', {}).get('pagination', {})
+            if page >= pagination.get('last_page', page):
+                return
+            page += 1
+
+    def zone_id(self, zone_name):
+        for zone in self.paginate('/zones', 'zones', {'name': zone_name}):
+            if zone['name'] == zone_name:
+                return zone['id']
+        raise HetznerDnsError(f"Zone {zone_name} not found", 404)
+
+    def list_records(self, zone_id):
+        return list(self.paginate('/records', 'records', {'zone_id': zone_id}))
+
+    def bulk_create(self, records):
+        result = self.request('POST', '/records/bulk', body={'records': records})
+        if result.get('invalid_records'):
+            raise HetznerDnsError(f"Invalid records rejected: {result['invalid_records']}")
+        return result.get('records', [])
+
+    def bulk_update(self, records):
+        result = self.request('PUT', '/records/bulk', body={'records': records})
+        if result.get('failed_records'):
+            raise HetznerDnsError(f"Record updates failed: {result['failed_records']}")
+        return result.get('records', [])
+
+    def delete_record(self, record_id):
+        # The API has no bulk delete; these reuse the pooled connection
+        self.request('DELETE', f"/records/{record_id}")
+
+def record_key(record):
+    return (record['name'], record['type'].upper())
+
+def diff_records(current, desired, prune=False):
+    """
+    Compute the minimal changes that turn current into desired.
+
+    Records are grouped by (name, type) so multi-value sets such as several A
+    records for one name are compared as a whole. A surplus record of a group
+    is repointed instead of deleted and recreated. Groups absent from desired
+    are deleted only with prune, and only for record types desired manages,
+    so NS/SOA and hand-made records of other types are never touched.
+    """
+    current_groups = {}
+    for record in current:
+        current_groups.setdefault(record_key(record), []).append(record)
+    desired_groups = {}
+    for record in desired:
+        desired_groups.setdefault(record_key(record), []).append(record)
+
+    plan = {'create': [], 'update': [], 'delete': []}
+    for key, wanted in desired_groups.items():
+        existing = list(current_groups.get(key, []))
+        missing = []
+        for record in wanted:
+            match = next((entry for entry in existing if entry['value'] == record['value']), None)
+            if match is None:
+                missing.append(record)
+                continue
+            existing.remove(match)
+            if match.get('ttl', DEFAULT_TTL) != record['ttl']:
+                plan['update'].append(dict(match, ttl=record['ttl']))
+        for record in missing:
+            if existing:
+                reuse = existing.pop(0)
+                plan['update'].append(dict(reuse, value=record['value'], ttl=record['ttl']))
+            else:
+                plan['create'].append(record)
+        plan['delete'] += existing
+
+    managed_types = {record['type'].upper() for record in desired}
+    if prune:
+        for key, records in current_groups.items():
+            if key not in desired_groups and key[1] in managed_types:
+                plan['delete'] += records
+    return plan
+
+def apply_plan(client, zone_id, plan, batch_size=BULK_BATCH):
+    """Apply a plan from diff_records: bulk creates and updates in batches, then deletes."""
+    creates = [{'zone_id': zone_id, 'name': r['name'], 'type': r['type'], 'value': r['value'], 'ttl': r['ttl']}
+               for r in plan['create']]
+    for start in range(0, len(creates), batch_size):
+        client.bulk_create(creates[start:start + batch_size])
+    updates = [{'id': r['id'], 'zone_id': zone_id, 'name': r['name'], 'type': r['type'],
+                'value': r['value'], 'ttl': r['ttl']} for r in plan['update']]
+    for start in range(0, len(updates), batch_size):
+        client.bulk_update(updates[start:start + batch_size])
+    for record in plan['delete']:
+        client.delete_record(record['id'])
+
+def relative_name(host, zone_name):
+    """Turn a fully qualified host into the zone-relative name the API uses ('@' for the apex)."""
+    host = host.rstrip('.').lower()
+    if host == zone_name:
+        return '@'
+    if host.endswith(f".{zone_name}"):
+        return host[:-len(zone_name) - 1]
+    return None
+
+def load_desired(records_file=None, zone_name=None, vhost_ip=None, ttl=DEFAULT_TTL, conf_paths=NGINX_CONF_PATHS):
+    """
+    Build the desired record set from a YAML file and/or the vhosts nginx serves.
+
+    The file holds `records: [{name, type, value, ttl}]`; with vhost_ip every
+    vhost inside the zone gets an A (or AAAA) record pointing at it.
+    """
+    desired = []
+    if records_file:
+        with open(records_file, 'r') as f:
+            config = yaml.safe_load(f) or {}
+        ttl = config.get('ttl', ttl)
+        for record in config.get('records', []):
+            desired.append({'name': record['name'], 'type': record.get('type', 'A').upper(),
+                            'value': str(record['value']), 'ttl': record.get('ttl', ttl)})
+    if vhost_ip:
+        record_type = 'AAAA' if ':' in vhost_ip else 'A'
+        for host in nginx_vhosts(conf_paths):
+            name = relative_name(host, zone_name)
+            if name and not name.startswith('*'):
+                desired.append({'name': name, 'type': record_type, 'value': vhost_ip, 'ttl': ttl})
+    # Drop exact duplicates, e.g. a vhost that is also listed in the file
+    unique = {}
+    for record in desired:
+        unique.setdefault((record['name'], record['type'], record['value']), record)
+    return list(unique.values())
+
+def sync_zone(client, zone_name, desired, prune=False, dry_run=False):
+    """Fetch the zone, diff it against desired and apply the result. Returns the plan."""
+    zone_id = client.zone_id(zone_name)
+    plan = diff_records(client.list_records(zone_id), desired, prune)
+    if not dry_run:
+        apply_plan(client, zone_id, plan)
+    return plan
+
+def print_plan(plan):
+    for action, sign in (('create', '+'), ('update', '~'), ('delete', '-')):
+        for record in plan[action]:
+            print(f"{sign} {record['name']:<32} {record['type']:<6} {record['value']} (ttl {record.get('ttl', DEFAULT_TTL)})")
+    print(f"{len(plan['create'])} to create, {len(plan['update'])} to update, {len(plan['delete'])} to delete.")
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        handlers=[logging.StreamHandler()]
+    )
+    parser = argparse.ArgumentParser(description="Sync a Hetzner DNS zone to a desired record set.")
+    parser.add_argument('action', choices=['list', 'sync'])
+    parser.add_argument('zone', help="Zone name, e.g. example.com")
+    parser.add_argument('--records', help="YAML file with the desired records")
+    parser.add_argument('--from-vhosts', metavar='IP', help="Point every nginx vhost in the zone at IP")
+    parser.add_argument('--ttl', type=int, default=DEFAULT_TTL)
+    parser.add_argument('--prune', action='store_true', help="Delete records of managed types not in the desired set")
+    parser.add_argument('--dry-run', action='store_true', help="Only print the changes")
+    parser.add_argument('--api-url', default=os.environ.get('HETZNER_DNS_API', HETZNER_DNS_API))
+    args = parser.parse_args()
+
+    token = os.environ.get('HETZNER_DNS_TOKEN') or getpass.getpass("Enter your Hetzner API token: ")
+    client = HetznerDnsClient(token, args.api_url)
+    try:
+        if args.action == 'list':
+            for record in client.list_records(client.zone_id(args.zone)):
+                print(f"{record['id']:<34} {record['name']:<32} {record['type']:<6} {record['value']}")
+            return
+        if not args.records and not args.from_vhosts:
+            parser.error("sync needs --records and/or --from-vhosts")
+        desired = load_desired(args.records, args.zone, args.from_vhosts, args.ttl)
+        plan = sync_zone(client, args.zone, desired, args.prune, args.dry_run)
+        print_plan(plan)
+        logging.info(f"{'Planned' if args.dry_run else 'Synced'} {args.zone} in {client.requests} API requests.")
+    except HetznerDnsError as e:
+        logging.error(str(e))
+        sys.exit(1)
+    finally:
+        client.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+import json
+import sys
+import threading
+import urllib.parse
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# In-memory stand-in for the parts of the Hetzner DNS API hetznerDns.py uses.
+# Start it, then run: HETZNER_DNS_TOKEN=test eos dns sync <zone> --api-url http://127.0.0.1:8053/api/v1
+PREFIX = '/api/v1'
+
+class MockState:
+    def __init__(self, zones, rate_limit=3600):
+        self.lock = threading.Lock()
+        self.zones = {name: uuid.uuid4().hex for name in zones}
+        self.records = {}
+        self.rate_limit = rate_limit
+        self.requests = 0
+
+    def add_record(self, record):
+        record = dict(record, id=uuid.uuid4().hex)
+        self.records[record['id']] = record
+        return record
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, body=None):
+        data = json.dumps(body).encode() if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Ratelimit-Limit', str(self.state.rate_limit))
+        self.send_header('Ratelimit-Remaining', str(max(0, self.state.rate_limit - self.state.requests)))
+        self.send_header('Ratelimit-Reset', '1')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length)) if length else {}
+
+    def page(self, key, items, query):
+        page = int(query.get('page', ['1'])[0])
+        per_page = int(query.get('per_page', ['100'])[0])
+        last_page = max(1, -(-len(items) // per_page))
+        self.reply(200, {key: items[(page - 1) * per_page:page * per_page],
+                         'meta': {'pagination': {'page': page, 'per_page': per_page, 'last_page': last_page,
+                                                 'total_entries': len(items)}}})
+
+    def handle_request(self, method):
+        url = urllib.parse.urlsplit(self.path)
+        path = url.path[len(PREFIX):] if url.path.startswith(PREFIX) else url.path
+        query = urllib.parse.parse_qs(url.query)
+        if self.headers.get('Auth-API-Token') is None:
+            self.reply(401, {'error': {'message': 'missing token'}})
+            return
+        with self.state.lock:
+            self.state.requests += 1
+            if method == 'GET' and path == '/zones':
+                zones = [{'id': zone_id, 'name': name} for name, zone_id in self.state.zones.items()
+                         if 'name' not in query or query['name'][0] == name]
+                self.page('zones', zones, query)
+            elif method == 'GET' and path == '/records':
+                zone_id = query.get('zone_id', [None])[0]
+                records = [r for r in self.state.records.values() if r['zone_id'] == zone_id]
+                self.page('records', records, query)
+            elif method == 'POST' and path == '/records/bulk':
+                created = [self.state.add_record(r) for r in self.body()['records']]
+                self.reply(200, {'records': created, 'valid_records': created, 'invalid_records': []})
+            elif method == 'PUT' and path == '/records/bulk':
+                updated, failed = [], []
+                for record in self.body()['records']:
+                    if record['id'] in self.state.records:
+                        self.state.records[record['id']].update(record)
+                        updated.append(self.state.records[record['id']])
+                    else:
+                        failed.append(record)
+                self.reply(200, {'records': updated, 'failed_records': failed})
+            elif method == 'DELETE' and path.startswith('/records/'):
+                found = self.state.records.pop(path.rsplit('/', 1)[1], None)
+                self.reply(200 if found else 404, {} if found else {'error': {'message': 'not found'}})
+            else:
+                self.reply(404, {'error': {'message': f"{method} {path} not mocked"}})
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def do_PUT(self):
+        self.handle_request('PUT')
+
+    def do_DELETE(self):
+        self.handle_request('DELETE')
+
+def make_server(zones, port=8053, rate_limit=3600):
+    handler = type('Handler', (MockHandler,), {'state': MockState(zones, rate_limit)})
+    return ThreadingHTTPServer(('127.0.0.1', port), handler)
+
+def serve_in_background(zones, port=8053, rate_limit=3600):
+    """Return a mock server running in a daemon thread; call .shutdown() to stop it."""
+    server = make_server(zones, port, rate_limit)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python3 -m cloudAndDNS.mockHetznerDns <zone> [zone ...] [--port 8053]")
+        sys.exit(1)
+    args = sys.argv[1:]
+    port = 8053
+    if '--port' in args:
+        port = int(args[args.index('--port') + 1])
+        del args[args.index('--port'):args.index('--port') + 2]
+    server = make_server(args, port)
+    print(f"Mock Hetzner DNS API for {', '.join(args)} on http://127.0.0.1:{port}{PREFIX}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+import logging
+import time
+
+from containersAndOrchestration.docker.dockerEngine import (
+    DockerEngineError, compose_plan, service_containers,
+)
+
+COLORS = ('blue', 'green')
+
+def active_container(client, project, service):
+    """Return the running container currently serving a compose service, or None."""
+    for name in service_containers(client, project, service):
+        if client.container_status(name) == 'running':
+            return name
+    return None
+
+def next_color_name(base_name, active):
+    """Pick the container name for the next deployment, alternating blue and green."""
+    if active == f"{base_name}-blue":
+        return f"{base_name}-green"
+    return f"{base_name}-blue"
+
+def run_check(client, container, command, timeout, interval=1):
+    """Retry a command inside the container until it succeeds or the timeout passes."""
+    deadline = time.monotonic() + timeout
+    output = ''
+    while time.monotonic() < deadline:
+        if client.container_status(container) != 'running':
+            return False, f"{container} is no longer running"
+        exit_code, output = client.exec_run(container, command)
+        if exit_code == 0:
+            return True, output
+        time.sleep(interval)
+    return False, output
+
+def discard(client, container, reason):
+    """Remove a container that failed to come up, logging why and what it printed."""
+    logging.error(f"{reason}. Rolling back: removing {container}.")
+    try:
+        for line in client.container_logs(container).splitlines():
+            logging.error(f"  {container}: {line}")
+        client.remove_container(container, force=True)
+    except DockerEngineError as e:
+        logging.error(f"Failed to remove {container}: {e}")
+
+def validate_in_scratch(client, name, config, command, timeout):
+    """
+    Run command in a throwaway copy of a container and return (passed, output).
+
+    The copy has the same image, mounts and network but no published ports and
+    no compose labels, so it never takes traffic and is never mistaken for the service.
+    """
+    scratch = f"{name}-validate"
+    if client.container_status(scratch) is not None:
+        client.remove_container(scratch, force=True)
+    labels = {key: value for key, value in config['Labels'].items() if not key.startswith('com.docker.compose.')}
+    host_config = dict(config['HostConfig'], PortBindings={}, RestartPolicy={'Name': 'no'})
+    scratch_config = dict(config, Cmd=command, Labels=labels, ExposedPorts={}, HostConfig=host_config)
+    scratch_config.pop('Healthcheck', None)
+    client.create_container(scratch, scratch_config)
+    try:
+        client.start_container(scratch)
+        if not client.wait_stopped(scratch, timeout=timeout):
+            return False, f"still running after {timeout}s"
+        exit_code = client.inspect_container(scratch)['State']['ExitCode']
+        return exit_code == 0, client.container_logs(scratch)
+    finally:
+        client.remove_container(scratch, force=True)
+
+def swap_service(client, compose_file, service, validate_command=None, health_command=None,
+                 start_timeout=30, drain_signal='SIGQUIT', drain_timeout=60,
+                 standby_command=None, activate_command=None):
+    """
+    Replace the container behind a compose service without a listening gap.
+
+    validate_command runs first in a throwaway copy that serves nothing. The
+    new container is then started with standby_command, which must bring up
+    only the health listener, and has to turn healthy and pass health_command
+    while the old container still carries all traffic. activate_command
+    (exec'd in the new container) then switches it to the full config; with
+    shared listeners (host networking with reuseport) this is the moment it
+    starts taking connections. After health_command passes again, the old
+    container is sent drain_signal and given drain_timeout seconds to finish
+    in-flight requests. If any step fails the old container keeps or resumes
+    serving and the new one is removed.
+
+    Without standby_command the new container listens as soon as it starts,
+    so with reuseport it shares traffic before its health checks have run.
+
+    Returns the name of the container now serving the service.
+    """
+    project, plan = compose_plan(compose_file)
+    matches = [(container, config) for name, container, config in plan if name == service]
+    if not matches:
+        raise DockerEngineError(f"Service '{service}' not found in {compose_file}")
+    base_name, config = matches[0]
+    for color in COLORS:
+        if base_name.endswith(f"-{color}"):
+            base_name = base_name[:-len(color) - 1]
+
+    old = active_container(client, project, service)
+    new = next_color_name(base_name, old)
+    if client.container_status(new) is not None:
+        # Leftover from an interrupted swap; it is not serving traffic
+        client.remove_container(new, force=True)
+
+    config = dict(config, Labels=dict(config['Labels'], **{'eos.color': new.rsplit('-', 1)[1]}))
+    # 1. Validate the config in a container that cannot take traffic
+    if validate_command:
+        ok, output = validate_in_scratch(client, new, config, validate_command, start_timeout)
+        if not ok:
+            logging.error(f"Validation failed: {output.strip()}")
+            raise DockerEngineError(f"Swap of {service} aborted; {old or 'nothing'} is still serving.")
+        logging.info("Configuration validated.")
+
+    if standby_command:
+        config = dict(config, Cmd=standby_command)
+    logging.info(f"Starting {new} alongside {old or 'nothing'}{' on standby' if standby_command else ''}...")
+    client.create_container(new, config)
+    try:
+        client.start_container(new)
+    except DockerEngineError as e:
+        discard(client, new, f"{new} failed to start: {e}")
+        raise DockerEngineError(f"Swap of {service} aborted; {old} is still serving.")
+
+    # 2. Health-check the standby container, then switch it to the full config
+    if not client.wait_healthy(new, timeout=start_timeout):
+        discard(client, new, f"{new} did not become healthy")
+        raise DockerEngineError(f"Swap of {service} aborted; {old} is still serving.")
+    steps = [('health check', health_command)]
+    if activate_command:
+        steps += [('activation', activate_command), ('health check after activation', health_command)]
+    for label, command in steps:
+        if command:
+            ok, output = run_check(client, new, command, start_timeout)
+            if not ok:
+                discard(client, new, f"{new} failed its {label}: {output.strip()}")
+                raise DockerEngineError(f"Swap of {service} aborted; {old} is still serving.")
+    logging.info(f"{new} passed its health checks and is serving.")
+
+    if not old:
+        return new
+
+    # 3. Drain the old container; it stops accepting and finishes in-flight requests
+    logging.info(f"Draining {old} with {drain_signal} (up to {drain_timeout}s)...")
+    client.kill_container(old, drain_signal)
+    if not client.wait_stopped(old, timeout=drain_timeout):
+        logging.warning(f"{old} did not drain in {drain_timeout}s, stopping it.")
+        client.stop_container(old)
+
+    # 4. Make sure the new container is still healthy now that it carries all traffic
+    ok, output = run_check(client, new, health_command, start_timeout) if health_command else \
+        (client.container_status(new) == 'running', '')
+    if not ok:
+        logging.error(f"{new} became unhealthy after taking over: {output.strip()}")
+        client.start_container(old)
+        if client.wait_healthy(old, timeout=start_timeout):
+            discard(client, new, f"Restored {old}")
+            raise DockerEngineError(f"Swap of {service} rolled back to {old}.")
+        raise DockerEngineError(f"Swap of {service} failed and {old} could not be restarted.")
+
+    client.remove_container(old)
+    logging.info(f"{new} is now serving {service}; removed {old}.")
+    return new
@@ -18,9 +18,25 @@ const sizes = stdout.trim().split('\n');
 // Calculate the total disk usage in GB
 let total = sizes.reduce((sum, size) => sum + convertToGB(size), 0);
 
-// Calculate space needed for safe backup (10x)
-let safesize = total * 10;
-
 // Print the total Docker disk usage
 echo(`Total Docker Disk Usage: ${total.toFixed(2)} GB`);
-echo(`Total space required for safe Docker backup: ${safesize.toFixed(2)} GB`);
+
+// Snapshot count retained by the backup store, instead of assuming 10 full copies
+const repoRoot = new URL('../..', import.meta.url).pathname;
+let stats = null;
+try {
+  stats = JSON.parse((await $`cd ${repoRoot} && python3 -m backupAndRecovery.backupEngine stats --json`.quiet()).stdout);
+} catch (error) {
+  echo(`Could not read backup store stats: ${error.stderr || error.message}`);
+}
+
+if (stats && stats.snapshots) {
+  // The store's ratios are measured on the config files it backs up, not on images and volumes,
+  // so they are shown but not applied: each retained snapshot is budgeted at the raw size
+  const safesize = total * stats.snapshots;
+  echo(`Backup store: ${stats.snapshots} snapshots, dedup ${stats.dedup_ratio}x, with compression ${stats.total_ratio}x (config backups)`);
+  echo(`Total space required for ${stats.snapshots} Docker backup snapshots: ${safesize.toFixed(2)} GB`);
+} else {
+  echo('No backup snapshots yet; a first snapshot needs about the full Docker disk usage.');
+  echo(`Total space required for the first Docker backup: ${total.toFixed(2)} GB`);
+}
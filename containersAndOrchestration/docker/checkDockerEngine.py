@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+import itertools
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+from containersAndOrchestration.docker import mockDockerEngine
+from containersAndOrchestration.docker.dockerEngine import (
+    DockerEngineClient, DockerEngineError, compose_down, compose_status, compose_up)
+
+# Runs dockerEngine.py against the mock engine in mockDockerEngine.py, no Docker needed.
+# Usage: python3 -m containersAndOrchestration.docker.checkDockerEngine
+COMPOSE = """\
+services:
+  web:
+    image: nginx:latest
+    ports: ["8080:80"]
+    healthcheck:
+      test: curl -f http://localhost/
+      interval: 1s
+    depends_on: [app]
+  app:
+    image: example/app:1.0
+    environment:
+      MODE: {mode}
+"""
+
+def check_engine(client, state):
+    assert client.ping(), "ping"
+    assert client.container_status('missing') is None, "status of a missing container"
+    client.create_container('probe', {'Image': 'nginx:latest', 'Labels': {},
+                                      'Healthcheck': {'Test': ['CMD', 'true']}})
+    assert client.container_status('probe') == 'created', "status after create"
+    client.start_container('probe')
+    assert client.container_health('probe') == 'starting', "health right after start"
+    assert client.wait_healthy('probe', timeout=5, interval=0.1), "probe did not turn healthy"
+    assert client.exec_run('probe', ['echo', 'hi']) == (0, 'echo hi\n'), "exec output"
+    assert next(client.stats('probe', stream=False))['memory_stats']['usage'] > 0, "single stats sample"
+    samples = list(itertools.islice(client.stats('probe'), 3))
+    assert len(samples) == 3, "stats stream"
+
+    events = []
+    listener = threading.Thread(target=lambda: events.extend(
+        itertools.islice(client.events({'type': ['container']}), 2)), daemon=True)
+    listener.start()
+    # Give the stream time to subscribe before anything happens
+    while not any(path == '/events' for _, path in state.requests):
+        threading.Event().wait(0.05)
+    client.stop_container('probe')
+    client.remove_container('probe')
+    listener.join(5)
+    assert [event['Action'] for event in events] == ['die', 'destroy'], f"events: {events}"
+    assert client.container_status('probe') is None, "status after remove"
+
+def check_retries(client, state):
+    # A dropped read is sent again on a fresh connection
+    state.drop_next = 1
+    assert client.ping(), "GET was not retried"
+    # A dropped create may have gone through, so it must not be sent twice
+    state.drop_next = 1
+    sent = len(state.requests)
+    try:
+        client.create_container('once', {'Image': 'nginx:latest', 'Labels': {}})
+    except DockerEngineError:
+        pass
+    else:
+        raise AssertionError("POST after a dropped connection was retried")
+    assert state.requests[sent:] == [('POST', '/containers/create')], "POST was sent again"
+    assert client.container_status('once') == 'created', "dropped create did not reach the engine"
+    client.remove_container('once', force=True)
+
+def check_compose(client, directory):
+    compose_file = os.path.join(directory, 'docker-compose.yaml')
+    with open(compose_file, 'w') as f:
+        f.write(COMPOSE.format(mode='blue'))
+    compose_up(client, compose_file)
+    status = compose_status(client, compose_file)
+    assert status['app'] == 'running' and status['web'] in ('starting', 'healthy'), f"status: {status}"
+    first = client.inspect_container(f"{os.path.basename(directory).lower()}-app-1")['Id']
+
+    # Unchanged services are left alone, a changed one is recreated
+    with open(compose_file, 'w') as f:
+        f.write(COMPOSE.format(mode='green'))
+    compose_up(client, compose_file)
+    app = client.inspect_container(f"{os.path.basename(directory).lower()}-app-1")
+    assert app['Id'] != first and 'MODE=green' in app['Config']['Env'], "changed service was not recreated"
+
+    compose_down(client, compose_file)
+    assert set(compose_status(client, compose_file).values()) == {'missing'}, "compose down left containers"
+
+def main():
+    directory = tempfile.mkdtemp(prefix='eoscheck')
+    socket_path = os.path.join(directory, 'docker.sock')
+    server = mockDockerEngine.serve_in_background(socket_path)
+    client = DockerEngineClient(socket_path, timeout=10)
+    checks = [('engine', lambda: check_engine(client, server.RequestHandlerClass.state)),
+              ('retries', lambda: check_retries(client, server.RequestHandlerClass.state)),
+              ('compose', lambda: check_compose(client, directory))]
+    failed = 0
+    try:
+        for name, check in checks:
+            try:
+                check()
+                print(f"ok   {name}")
+            except (AssertionError, DockerEngineError) as e:
+                failed += 1
+                print(f"FAIL {name}: {e}")
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(directory, ignore_errors=True)
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
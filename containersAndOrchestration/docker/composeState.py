@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+import copy
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+
+# Parsed compose files are kept here between runs, one JSON file per compose path
+CACHE_DIR = os.path.expanduser('~/.cache/eos/compose-state')
+
+# In-process cache: absolute path -> (signature, parsed model)
+_models = {}
+
+class ComposeStateError(Exception):
+    """Raised when a compose file cannot be parsed."""
+
+def file_signature(path):
+    """Return (mtime, size, inode) of path; editors that save by rename change the inode."""
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size, stat.st_ino]
+
+def cache_file(path):
+    return os.path.join(CACHE_DIR, hashlib.sha1(path.encode()).hexdigest()[:16] + '.json')
+
+def read_cached(path, signature):
+    try:
+        with open(cache_file(path), 'r') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if entry.get('path') != path or entry.get('signature') != signature:
+        return None
+    return entry.get('model')
+
+def write_cached(path, signature, model):
+    """Persist the parsed model if JSON can hold it unchanged (compose files are plain maps and lists)."""
+    try:
+        data = json.dumps({'path': path, 'signature': signature, 'model': model})
+        if json.loads(data)['model'] != model:
+            return
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        handle, tmp = tempfile.mkstemp(dir=CACHE_DIR, prefix='.tmp-')
+        with os.fdopen(handle, 'w') as f:
+            f.write(data)
+        os.replace(tmp, cache_file(path))
+    except (OSError, TypeError, ValueError) as e:
+        logging.debug(f"Could not cache {path}: {e}")
+
+def parse(path):
+    """Parse a compose file with the libyaml-backed loader when available."""
+    import yaml
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    try:
+        with open(path, 'r') as f:
+            return yaml.load(f, Loader=loader) or {}
+    except yaml.YAMLError as e:
+        raise ComposeStateError(f"{path}: {e}") from e
+
+def load_compose_state(path):
+    """
+    Return the parsed compose file at path.
+
+    The model is cached in memory and on disk keyed by the file's mtime, size
+    and inode, so it is only parsed again after the file changes. Callers get
+    their own copy and may modify it freely; use save_compose_state to write it
+    back. Raises FileNotFoundError if path does not exist.
+    """
+    path = os.path.abspath(path)
+    signature = file_signature(path)
+    cached = _models.get(path)
+    if cached and cached[0] == signature:
+        return copy.deepcopy(cached[1])
+
+    model = read_cached(path, signature)
+    if model is None:
+        model = parse(path)
+        # Parse first, stat again: a write racing the parse must not be cached under the old signature
+        if file_signature(path) == signature:
+            write_cached(path, signature, model)
+    _models[path] = (signature, model)
+    return copy.deepcopy(model)
+
+def save_compose_state(path, model):
+    """
+    Write model to path atomically and make it the cached state.
+
+    The YAML goes to a temporary file in the same directory which is then
+    renamed over path, so readers (docker compose included) see either the old
+    or the new file, never a partial one. The cache is updated from the written
+    file's signature, so the next load does not parse what was just written.
+    """
+    import yaml
+    dumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+    path = os.path.abspath(path)
+    directory = os.path.dirname(path)
+    model = copy.deepcopy(model)
+    handle, tmp = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.")
+    try:
+        with os.fdopen(handle, 'w') as f:
+            yaml.dump(model, f, Dumper=dumper, default_flow_style=False, sort_keys=False)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            # Keep the replaced file's mode and owner; sudo runs would otherwise leave it root-owned
+            current = os.stat(path)
+            os.chmod(tmp, current.st_mode & 0o7777)
+            try:
+                os.chown(tmp, current.st_uid, current.st_gid)
+            except PermissionError:
+                pass
+        else:
+            os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    signature = file_signature(path)
+    _models[path] = (signature, model)
+    write_cached(path, signature, model)
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python3 -m containersAndOrchestration.docker.composeState <docker-compose.yaml> [...]")
+        sys.exit(1)
+    for path in sys.argv[1:]:
+        try:
+            services = load_compose_state(path).get('services', {})
+        except (OSError, ComposeStateError) as e:
+            print(f"{path}: {e}")
+            continue
+        print(f"{path}: {len(services)} service(s): {', '.join(services)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,571 @@
+#!/usr/bin/env python3
+
+import hashlib
+import http.client
+import json
+import logging
+import os
+import re
+import socket
+import sys
+import time
+import urllib.parse
+
+DOCKER_SOCKET = '/var/run/docker.sock'
+API_VERSION = 'v1.41'
+
+# Keys of a compose service that the interpreter knows how to translate
+SUPPORTED_SERVICE_KEYS = {
+    'image', 'container_name', 'ports', 'volumes', 'environment', 'command',
+    'depends_on', 'restart', 'working_dir', 'labels', 'healthcheck', 'network_mode',
+    'cpuset',
+}
+# eosWeb bookkeeping stored alongside services; not part of the container spec
+EOS_SERVICE_KEYS = {'domains'}
+# Requests that are safe to resend when the connection drops after they were sent
+IDEMPOTENT_METHODS = {'GET', 'HEAD'}
+# Label holding a hash of the create body, as docker compose does; a mismatch means the container is stale
+CONFIG_HASH_LABEL = 'com.docker.compose.config-hash'
+
+class DockerEngineError(Exception):
+    """Raised when the Docker Engine API returns an error or cannot be reached."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection that talks to a unix domain socket instead of TCP."""
+
+    def __init__(self, socket_path, timeout=60):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+def default_socket_path():
+    """Return the engine socket, honouring DOCKER_HOST=unix://... like the docker CLI."""
+    docker_host = os.environ.get('DOCKER_HOST', '')
+    if docker_host.startswith('unix://'):
+        return docker_host[len('unix://'):]
+    return DOCKER_SOCKET
+
+class DockerEngineClient:
+    """
+    Minimal Docker Engine API client over the unix socket.
+
+    Requests share one keep-alive connection. Streaming endpoints (stats, events,
+    logs) open their own connection so they do not block regular calls.
+    """
+
+    def __init__(self, socket_path=None, timeout=60):
+        self.socket_path = socket_path or default_socket_path()
+        self.timeout = timeout
+        self._connection = None
+
+    def close(self):
+        if self._connection:
+            self._connection.close()
+            self._connection = None
+
+    def _path(self, path, params=None):
+        query = ''
+        if params:
+            params = {k: json.dumps(v) if isinstance(v, (dict, list)) else v
+                      for k, v in params.items() if v is not None}
+            query = '?' + urllib.parse.urlencode(params)
+        return f"/{API_VERSION}{path}{query}"
+
+    def request(self, method, path, params=None, body=None, expected=(200, 201, 204, 304), raw=False):
+        """Send a request on the persistent connection and return the decoded body (bytes if raw)."""
+        headers = {'Host': 'docker'}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        for attempt in (1, 2):
+            if self._connection is None:
+                self._connection = UnixHTTPConnection(self.socket_path, self.timeout)
+            sent = False
+            try:
+                self._connection.request(method, self._path(path, params), body=payload, headers=headers)
+                sent = True
+                response = self._connection.getresponse()
+                data = response.read()
+                break
+            except (ConnectionError, http.client.HTTPException, socket.timeout, FileNotFoundError) as e:
+                self.close()
+                # The engine may have closed an idle keep-alive connection; reconnect once. A sent
+                # POST (create, start, kill, exec) may already have run, so only reads are resent.
+                retry = attempt == 1 and not isinstance(e, FileNotFoundError) and \
+                    (not sent or method in IDEMPOTENT_METHODS)
+                if not retry:
+                    raise DockerEngineError(f"Cannot reach Docker Engine at {self.socket_path}: {e}")
+        if response.status not in expected:
+            try:
+                message = json.loads(data).get('message', data.decode())
+            except ValueError:
+                message = data.decode(errors='replace')
+            raise DockerEngineError(f"{method} {path} failed ({response.status}): {message}", response.status)
+        if raw:
+            return data
+        if not data:
+            return None
+        content_type = response.getheader('Content-Type', '')
+        if content_type.startswith('application/json'):
+            return json.loads(data)
+        if content_type.startswith('text/'):
+            return data.decode(errors='replace')
+        return data
+
+    def stream(self, path, params=None):
+        """Yield decoded JSON objects from a newline-delimited streaming endpoint."""
+        connection = UnixHTTPConnection(self.socket_path, timeout=None)
+        try:
+            connection.request('GET', self._path(path, params), headers={'Host': 'docker'})
+            response = connection.getresponse()
+            if response.status != 200:
+                raise DockerEngineError(f"GET {path} failed ({response.status}): {response.read().decode()}",
+                                        response.status)
+            while True:
+                line = response.readline()
+                if not line:
+                    break
+                if line.strip():
+                    yield json.loads(line)
+        except FileNotFoundError as e:
+            raise DockerEngineError(f"Cannot reach Docker Engine at {self.socket_path}: {e}")
+        finally:
+            connection.close()
+
+    # Engine
+
+    def ping(self):
+        return self.request('GET', '/_ping') == 'OK'
+
+    def version(self):
+        return self.request('GET', '/version')
+
+    # Containers
+
+    def list_containers(self, all=True, filters=None):
+        return self.request('GET', '/containers/json', {'all': int(all), 'filters': filters})
+
+    def inspect_container(self, name):
+        return self.request('GET', f"/containers/{name}/json")
+
+    def container_status(self, name):
+        """Return the container state (running, exited, ...) or None if it does not exist."""
+        try:
+            return self.inspect_container(name)['State']['Status']
+        except DockerEngineError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    def container_health(self, name):
+        """Return the healthcheck status, falling back to the run state when no healthcheck is defined."""
+        state = self.inspect_container(name)['State']
+        return state.get('Health', {}).get('Status', state['Status'])
+
+    def wait_healthy(self, name, timeout=60, interval=0.5):
+        """Poll until the container is healthy (or running, without a healthcheck)."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            health = self.container_health(name)
+            if health in ('healthy', 'running'):
+                return True
+            if health in ('unhealthy', 'exited', 'dead'):
+                return False
+            time.sleep(interval)
+        return False
+
+    def create_container(self, name, config):
+        return self.request('POST', '/containers/create', {'name': name}, body=config)
+
+    def start_container(self, name):
+        self.request('POST', f"/containers/{name}/start")
+
+    def stop_container(self, name, timeout=10):
+        self.request('POST', f"/containers/{name}/stop", {'t': timeout})
+
+    def restart_container(self, name, timeout=10):
+        self.request('POST', f"/containers/{name}/restart", {'t': timeout})
+
+    def kill_container(self, name, signal='SIGKILL'):
+        self.request('POST', f"/containers/{name}/kill", {'signal': signal})
+
+    def remove_container(self, name, force=False):
+        self.request('DELETE', f"/containers/{name}", {'force': int(force)})
+
+    def rename_container(self, name, new_name):
+        self.request('POST', f"/containers/{name}/rename", {'name': new_name})
+
+    def wait_stopped(self, name, timeout=60, interval=0.5):
+        """Poll until the container has exited. Returns False if it is still running at the deadline."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.container_status(name) in (None, 'exited', 'dead'):
+                return True
+            time.sleep(interval)
+        return False
+
+    def container_logs(self, name, tail=50):
+        raw = self.request('GET', f"/containers/{name}/logs", {'stdout': 1, 'stderr': 1, 'tail': tail}, raw=True)
+        return demultiplex(raw)
+
+    def exec_run(self, name, command):
+        """Run a command inside a container and return (exit code, output)."""
+        exec_id = self.request('POST', f"/containers/{name}/exec", body={
+            'Cmd': command, 'AttachStdout': True, 'AttachStderr': True})['Id']
+        raw = self.request('POST', f"/exec/{exec_id}/start", body={'Detach': False, 'Tty': False}, raw=True)
+        exit_code = self.request('GET', f"/exec/{exec_id}/json")['ExitCode']
+        return exit_code, demultiplex(raw)
+
+    def stats(self, name, stream=True):
+        """Yield stats samples for a container; with stream=False yield a single sample."""
+        if stream:
+            yield from self.stream(f"/containers/{name}/stats", {'stream': 1})
+        else:
+            yield self.request('GET', f"/containers/{name}/stats", {'stream': 0})
+
+    def events(self, filters=None, since=None):
+        """Yield engine events as they happen, e.g. filters={'type': ['container']}."""
+        yield from self.stream('/events', {'filters': filters, 'since': since})
+
+    # Images, networks
+
+    def inspect_image(self, image):
+        """Return the local image's details, or None if it has not been pulled or built."""
+        try:
+            return self.request('GET', f"/images/{image}/json")
+        except DockerEngineError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    def pull_image(self, image):
+        repository, tag = split_image(image)
+        # The body is a progress stream; it has to be drained but is not needed
+        self.request('POST', '/images/create', {'fromImage': repository, 'tag': tag}, raw=True)
+
+    def ensure_network(self, name, labels=None):
+        networks = self.request('GET', '/networks', {'filters': {'name': [name]}})
+        if not any(network['Name'] == name for network in networks):
+            self.request('POST', '/networks/create', body={'Name': name, 'Labels': labels or {}})
+
+    def remove_network(self, name):
+        try:
+            self.request('DELETE', f"/networks/{name}")
+        except DockerEngineError as e:
+            if e.status != 404:
+                raise
+
+def demultiplex(raw):
+    """Strip the 8-byte stream headers Docker adds to non-TTY attach/exec output."""
+    data = raw
+    output = []
+    while len(data) >= 8 and data[0] in (0, 1, 2):
+        size = int.from_bytes(data[4:8], 'big')
+        output.append(data[8:8 + size])
+        data = data[8 + size:]
+    return (b''.join(output) or data).decode(errors='replace')
+
+def split_image(image):
+    """Split an image reference into repository and tag (default: latest)."""
+    if '@' in image:
+        return image, None
+    name, _, tag = image.rpartition(':')
+    if not name or '/' in tag:
+        return image, 'latest'
+    return name, tag
+
+def cpu_percent(sample):
+    """Compute container CPU usage in percent of one core from a stats sample."""
+    cpu = sample['cpu_stats']
+    previous = sample['precpu_stats']
+    cpu_delta = cpu['cpu_usage']['total_usage'] - previous['cpu_usage']['total_usage']
+    system_delta = cpu.get('system_cpu_usage', 0) - previous.get('system_cpu_usage', 0)
+    online = cpu.get('online_cpus') or len(cpu['cpu_usage'].get('percpu_usage') or [1])
+    if cpu_delta <= 0 or system_delta <= 0:
+        return 0.0
+    return cpu_delta / system_delta * online * 100.0
+
+# Compose interpreter
+
+def project_name(compose_file):
+    """Derive the project name the way docker compose does: the lowercased directory name."""
+    directory = os.path.basename(os.path.dirname(os.path.abspath(compose_file)))
+    return re.sub(r'[^a-z0-9_-]', '', directory.lower())
+
+def load_compose(compose_file):
+    """Load a compose file through the cached compose-state loader."""
+    from containersAndOrchestration.docker.composeState import load_compose_state
+    return load_compose_state(compose_file)
+
+def parse_port(port):
+    """Translate a compose port entry into (container port key, host binding)."""
+    port = str(port)
+    protocol = 'tcp'
+    if '/' in port:
+        port, protocol = port.split('/', 1)
+    parts = port.rsplit(':', 2)
+    container_port = f"{parts[-1]}/{protocol}"
+    if len(parts) == 1:
+        return container_port, None
+    binding = {'HostPort': parts[-2]}
+    if len(parts) == 3:
+        binding['HostIp'] = parts[0]
+    return container_port, binding
+
+def service_container_name(project, service_name, service):
+    return service.get('container_name') or f"{project}-{service_name}-1"
+
+def service_config(project, service_name, service, base_dir):
+    """Translate one compose service into a Docker Engine create-container body."""
+    unsupported = set(service) - SUPPORTED_SERVICE_KEYS - EOS_SERVICE_KEYS
+    if unsupported:
+        raise DockerEngineError(f"Service '{service_name}' uses unsupported keys: {', '.join(sorted(unsupported))}")
+
+    exposed = {}
+    bindings = {}
+    for port in service.get('ports', []):
+        container_port, binding = parse_port(port)
+        exposed[container_port] = {}
+        if binding:
+            bindings.setdefault(container_port, []).append(binding)
+
+    binds = []
+    for volume in service.get('volumes', []):
+        source, _, target = str(volume).partition(':')
+        if source.startswith(('.', '/', '~')):
+            source = os.path.abspath(os.path.join(base_dir, os.path.expanduser(source)))
+        else:
+            source = f"{project}_{source}"
+        binds.append(f"{source}:{target}")
+
+    environment = service.get('environment', [])
+    if isinstance(environment, dict):
+        environment = [f"{key}={value}" for key, value in environment.items()]
+
+    command = service.get('command')
+    if isinstance(command, str):
+        command = ['sh', '-c', command]
+
+    labels = dict(service.get('labels') or {})
+    labels.update({'com.docker.compose.project': project, 'com.docker.compose.service': service_name})
+
+    config = {
+        'Image': service['image'],
+        'Env': environment,
+        'Labels': labels,
+        'ExposedPorts': exposed,
+        'HostConfig': {
+            'PortBindings': bindings,
+            'Binds': binds,
+            'RestartPolicy': {'Name': service.get('restart', 'no')},
+        },
+        'NetworkingConfig': {'EndpointsConfig': {f"{project}_default": {'Aliases': [service_name]}}},
+    }
+    network_mode = service.get('network_mode')
+    if network_mode:
+        # Published ports and project networks do not apply outside the bridge network
+        config['HostConfig']['NetworkMode'] = network_mode
+        config['HostConfig']['PortBindings'] = {}
+        config['ExposedPorts'] = {}
+        del config['NetworkingConfig']
+    if command:
+        config['Cmd'] = command
+    if service.get('working_dir'):
+        config['WorkingDir'] = service['working_dir']
+    if service.get('cpuset') is not None:
+        config['HostConfig']['CpusetCpus'] = str(service['cpuset'])
+    healthcheck = service.get('healthcheck')
+    if healthcheck:
+        test = healthcheck['test']
+        config['Healthcheck'] = {
+            'Test': ['CMD-SHELL', test] if isinstance(test, str) else test,
+            'Interval': parse_duration(healthcheck.get('interval', '30s')),
+            'Timeout': parse_duration(healthcheck.get('timeout', '30s')),
+            'Retries': healthcheck.get('retries', 3),
+        }
+    labels[CONFIG_HASH_LABEL] = config_hash(config)
+    return config
+
+def config_hash(config):
+    """Hash of a create body, ignoring the hash label itself."""
+    labels = {key: value for key, value in config.get('Labels', {}).items() if key != CONFIG_HASH_LABEL}
+    body = dict(config, Labels=labels)
+    return hashlib.sha256(json.dumps(body, sort_keys=True).encode()).hexdigest()
+
+def container_outdated(client, container, config):
+    """
+    Return why an existing container no longer matches its service, or None.
+
+    The create body (ports, volumes, environment, image tag, ...) is compared
+    through its hash label; a tag rebuilt in place is caught by comparing
+    image IDs.
+    """
+    details = client.inspect_container(container)
+    if (details['Config'].get('Labels') or {}).get(CONFIG_HASH_LABEL) != config_hash(config):
+        return 'configuration changed'
+    image = client.inspect_image(config['Image'])
+    if image and image['Id'] != details['Image']:
+        return f"image {config['Image']} was rebuilt"
+    return None
+
+def parse_duration(value):
+    """Convert a compose duration such as 5s or 1m30s into nanoseconds."""
+    units = {'ms': 1e6, 's': 1e9, 'm': 60e9, 'h': 3600e9}
+    total = 0
+    for amount, unit in re.findall(r'(\d+(?:\.\d+)?)(ms|s|m|h)', str(value)):
+        total += float(amount) * units[unit]
+    return int(total)
+
+def service_order(services):
+    """Order services so dependencies start first."""
+    ordered = []
+    visiting = set()
+
+    def visit(name):
+        if name in ordered:
+            return
+        if name in visiting:
+            raise DockerEngineError(f"Circular depends_on involving '{name}'")
+        visiting.add(name)
+        for dependency in services[name].get('depends_on', []):
+            visit(dependency)
+        visiting.discard(name)
+        ordered.append(name)
+
+    for name in services:
+        visit(name)
+    return ordered
+
+def compose_plan(compose_file):
+    """Return (project, [(service, container name, create body)]) for a compose file."""
+    compose = load_compose(compose_file)
+    project = project_name(compose_file)
+    base_dir = os.path.dirname(os.path.abspath(compose_file))
+    services = compose.get('services') or {}
+    return project, [
+        (name, service_container_name(project, name, services[name]),
+         service_config(project, name, services[name], base_dir))
+        for name in service_order(services)
+    ]
+
+def service_containers(client, project, service):
+    """Return the names of all containers labelled as belonging to a compose service."""
+    containers = client.list_containers(filters={'label': [
+        f"com.docker.compose.project={project}", f"com.docker.compose.service={service}"]})
+    return [container['Names'][0].lstrip('/') for container in containers]
+
+def compose_up(client, compose_file, health_timeout=60):
+    """
+    Create, recreate or start every service in a compose file.
+
+    Containers whose configuration or image changed are stopped, removed and
+    created again, one service at a time; a recreated service with a
+    healthcheck has to turn healthy before the next one is touched, so
+    replicas defined as separate services are replaced in turn.
+    """
+    project, plan = compose_plan(compose_file)
+    client.ensure_network(f"{project}_default", {'com.docker.compose.project': project})
+    for service, container, config in plan:
+        # A blue/green swap may have replaced the container under a different name
+        container = (service_containers(client, project, service) or [container])[0]
+        status = client.container_status(container)
+        recreated = False
+        if status is not None:
+            reason = container_outdated(client, container, config)
+            if reason:
+                logging.info(f"Recreating {container}: {reason}.")
+                if status == 'running':
+                    client.stop_container(container)
+                client.remove_container(container)
+                status, recreated = None, True
+        if status is None:
+            try:
+                client.create_container(container, config)
+            except DockerEngineError as e:
+                if e.status != 404:
+                    raise
+                logging.info(f"Pulling {config['Image']}...")
+                client.pull_image(config['Image'])
+                client.create_container(container, config)
+        if status != 'running':
+            client.start_container(container)
+        if recreated and 'Healthcheck' in config and not client.wait_healthy(container, health_timeout):
+            raise DockerEngineError(f"Recreated {container} did not become healthy within {health_timeout}s")
+        logging.info(f"Service {service} is running as {container}.")
+    return plan
+
+def compose_down(client, compose_file, timeout=10):
+    """Stop and remove every service in a compose file, dependents first."""
+    project, plan = compose_plan(compose_file)
+    for service, _, _ in reversed(plan):
+        for container in service_containers(client, project, service):
+            client.stop_container(container, timeout)
+            client.remove_container(container)
+            logging.info(f"Removed {container}.")
+    client.remove_network(f"{project}_default")
+
+def compose_status(client, compose_file):
+    """Return {service: status} for every service in a compose file."""
+    project, plan = compose_plan(compose_file)
+    status = {}
+    for service, container, _ in plan:
+        containers = service_containers(client, project, service) or [container]
+        states = []
+        for name in containers:
+            state = client.container_status(name)
+            if state == 'running':
+                state = client.container_health(name)
+            states.append(state or 'missing')
+        status[service] = ', '.join(states) if len(containers) == 1 else \
+            ', '.join(f"{name}={state}" for name, state in zip(containers, states))
+    return status
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    if len(sys.argv) < 3:
+        print("Usage: eos docker [--up|--down|--status|--config] <compose file>\n"
+              "       eos docker [--stats|--events] <container|->")
+        sys.exit(1)
+
+    flag, target = sys.argv[1], sys.argv[2]
+    client = DockerEngineClient()
+    try:
+        if flag == '--up':
+            compose_up(client, target)
+        elif flag == '--down':
+            compose_down(client, target)
+        elif flag == '--status':
+            for service, state in compose_status(client, target).items():
+                print(f"{service}: {state}")
+        elif flag == '--config':
+            project, plan = compose_plan(target)
+            print(json.dumps({'project': project, 'containers': {c: cfg for _, c, cfg in plan}}, indent=2))
+        elif flag == '--stats':
+            for sample in client.stats(target):
+                print(f"cpu {cpu_percent(sample):6.1f}%  mem {sample['memory_stats'].get('usage', 0) / 2**20:8.1f} MiB")
+        elif flag == '--events':
+            for event in client.events({'type': ['container']}):
+                print(f"{event.get('time')} {event.get('Action')} {event.get('Actor', {}).get('Attributes', {}).get('name')}")
+        else:
+            print(f"Unknown option: {flag}")
+            sys.exit(1)
+    except DockerEngineError as e:
+        logging.error(e)
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import os
+import re
+import socketserver
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler
+
+# In-memory stand-in for the parts of the Docker Engine API dockerEngine.py uses, served on a
+# unix socket. Containers do not run anything: start marks them running, a Healthcheck turns
+# healthy after HEALTHY_AFTER seconds (or unhealthy with the label mock.health=unhealthy).
+# Start it, then run: DOCKER_HOST=unix:///tmp/mock-docker.sock eos docker --up docker-compose.yaml
+HEALTHY_AFTER = 0.3
+STATS_INTERVAL = 0.1
+# Streams end when nothing happened for this long, so a forgotten client does not hold a thread
+STREAM_IDLE = 5
+
+class MockState:
+    def __init__(self, images=()):
+        self.lock = threading.Condition()
+        self.containers = {}
+        self.images = {image: self.image_id(image) for image in images}
+        self.networks = {}
+        self.execs = {}
+        self.events = []
+        self.requests = []
+        # Number of upcoming requests to read and then drop without an answer, like a closed keep-alive
+        self.drop_next = 0
+
+    @staticmethod
+    def image_id(image):
+        return 'sha256:' + hashlib.sha256(image.encode()).hexdigest()
+
+    @staticmethod
+    def normalize(image):
+        return image if ':' in image.rsplit('/', 1)[-1] else f"{image}:latest"
+
+    def emit(self, action, name):
+        self.events.append({'Type': 'container', 'Action': action, 'time': int(time.time()),
+                            'Actor': {'ID': self.containers[name]['Id'], 'Attributes': {'name': name}}})
+        self.lock.notify_all()
+
+    def state(self, container):
+        state = dict(container['State'])
+        if container['Config'].get('Healthcheck') and state['Status'] == 'running':
+            if container['Config']['Labels'].get('mock.health') == 'unhealthy':
+                health = 'unhealthy'
+            else:
+                health = 'healthy' if time.monotonic() - container['started'] >= HEALTHY_AFTER else 'starting'
+            state['Health'] = {'Status': health}
+        return state
+
+    def inspect(self, name):
+        container = self.containers[name]
+        return {'Id': container['Id'], 'Name': f"/{name}", 'Image': container['Image'],
+                'Config': container['Config'], 'HostConfig': container['HostConfig'], 'State': self.state(container)}
+
+    def matches(self, container, filters):
+        labels = container['Config'].get('Labels') or {}
+        for label in filters.get('label', []):
+            key, _, value = label.partition('=')
+            if key not in labels or (value and labels[key] != value):
+                return False
+        return all(name.lstrip('/') == container['name'] for name in filters.get('name', []))
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def address_string(self):
+        return 'unix'
+
+    def reply(self, status, body=None, content_type='application/json', raw=None):
+        data = raw if raw is not None else (json.dumps(body).encode() if body is not None else b'')
+        self.send_response(status)
+        if data:
+            self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def error(self, status, message):
+        self.reply(status, {'message': message})
+
+    def body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length)) if length else {}
+
+    def stream(self, lines):
+        """Write newline-delimited JSON until lines is exhausted or the client goes away."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        try:
+            for line in lines:
+                self.wfile.write(json.dumps(line).encode() + b'\n')
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def handle_request(self, method):
+        url = urllib.parse.urlsplit(self.path)
+        path = re.sub(r'^/v[\d.]+', '', url.path)
+        query = {key: values[0] for key, values in urllib.parse.parse_qs(url.query).items()}
+        state = self.state
+        with state.lock:
+            state.requests.append((method, path))
+            if state.drop_next:
+                state.drop_next -= 1
+                dropped = True
+            else:
+                dropped = False
+        body = self.body() if method in ('POST', 'PUT') else {}
+        if dropped:
+            # Read the request, then hang up; a POST that got here may already have been carried out
+            if method == 'POST' and path == '/containers/create':
+                with state.lock:
+                    self.create(query, body, answer=False)
+            self.close_connection = True
+            return
+        match = re.match(r'^/containers/([^/]+)/stats$', path)
+        if method == 'GET' and match and query.get('stream') != '0':
+            return self.stream(self.stats_lines(match.group(1)))
+        if method == 'GET' and path == '/events':
+            return self.stream(self.event_lines(json.loads(query.get('filters') or '{}')))
+        with state.lock:
+            self.dispatch(method, path, query, body)
+
+    def dispatch(self, method, path, query, body):
+        state = self.state
+        parts = path.strip('/').split('/')
+        if method == 'GET' and path == '/_ping':
+            return self.reply(200, raw=b'OK', content_type='text/plain; charset=utf-8')
+        if method == 'GET' and path == '/version':
+            return self.reply(200, {'Version': 'mock', 'ApiVersion': '1.41'})
+        if method == 'GET' and path == '/containers/json':
+            filters = json.loads(query.get('filters') or '{}')
+            show_all = query.get('all') == '1'
+            return self.reply(200, [{'Id': c['Id'], 'Names': [f"/{c['name']}"], 'State': c['State']['Status'],
+                                     'Labels': c['Config'].get('Labels') or {}}
+                                    for c in state.containers.values()
+                                    if state.matches(c, filters) and (show_all or c['State']['Status'] == 'running')])
+        if method == 'POST' and path == '/containers/create':
+            return self.create(query, body)
+        if parts[0] == 'containers' and len(parts) >= 2:
+            return self.container(method, parts[1], '/'.join(parts[2:]), query, body)
+        if parts[0] == 'exec' and len(parts) == 3:
+            exec_entry = state.execs.get(parts[1])
+            if exec_entry is None:
+                return self.error(404, f"No such exec instance: {parts[1]}")
+            if method == 'POST' and parts[2] == 'start':
+                output = ' '.join(exec_entry['Cmd']).encode() + b'\n'
+                return self.reply(200, content_type='application/vnd.docker.raw-stream',
+                                  raw=b'\x01\x00\x00\x00' + len(output).to_bytes(4, 'big') + output)
+            if method == 'GET' and parts[2] == 'json':
+                return self.reply(200, {'ExitCode': exec_entry['ExitCode'], 'Running': False})
+        match = re.match(r'^/images/(.+)/json$', path)
+        if method == 'GET' and match:
+            image = state.normalize(match.group(1))
+            if image not in state.images:
+                return self.error(404, f"No such image: {image}")
+            return self.reply(200, {'Id': state.images[image], 'RepoTags': [image]})
+        if method == 'POST' and path == '/images/create':
+            image = state.normalize(f"{query['fromImage']}:{query.get('tag') or 'latest'}")
+            state.images[image] = state.image_id(image)
+            return self.reply(200, raw=b'{"status":"Pulled"}\n')
+        if method == 'GET' and path == '/networks':
+            names = json.loads(query.get('filters') or '{}').get('name', [])
+            return self.reply(200, [{'Name': name, 'Labels': labels} for name, labels in state.networks.items()
+                                    if not names or name in names])
+        if method == 'POST' and path == '/networks/create':
+            state.networks[body['Name']] = body.get('Labels') or {}
+            return self.reply(201, {'Id': body['Name']})
+        if method == 'DELETE' and parts[0] == 'networks' and len(parts) == 2:
+            if state.networks.pop(parts[1], None) is None:
+                return self.error(404, f"network {parts[1]} not found")
+            return self.reply(204)
+        self.error(404, f"{method} {path} not mocked")
+
+    def create(self, query, body, answer=True):
+        state = self.state
+        name = query.get('name') or os.urandom(6).hex()
+        if name in state.containers:
+            return answer and self.error(409, f'Conflict. The container name "/{name}" is already in use')
+        image = state.normalize(body['Image'])
+        if image not in state.images:
+            return answer and self.error(404, f"No such image: {body['Image']}")
+        container_id = os.urandom(32).hex()
+        state.containers[name] = {'Id': container_id, 'name': name, 'Image': state.images[image],
+                                  'Config': {key: value for key, value in body.items() if key != 'HostConfig'},
+                                  'HostConfig': body.get('HostConfig') or {},
+                                  'State': {'Status': 'created', 'ExitCode': 0}, 'started': None}
+        state.emit('create', name)
+        return answer and self.reply(201, {'Id': container_id, 'Warnings': []})
+
+    def container(self, method, name, action, query, body):
+        state = self.state
+        container = state.containers.get(name)
+        if container is None:
+            return self.error(404, f"No such container: {name}")
+        status = container['State']['Status']
+        if method == 'GET' and action == 'json':
+            return self.reply(200, state.inspect(name))
+        if method == 'GET' and action == 'stats':
+            return self.reply(200, self.stats_sample(name, 1))
+        if method == 'GET' and action == 'logs':
+            line = f"mock log for {name}\n".encode()
+            return self.reply(200, content_type='application/vnd.docker.raw-stream',
+                              raw=b'\x01\x00\x00\x00' + len(line).to_bytes(4, 'big') + line)
+        if method == 'POST' and action in ('start', 'restart'):
+            if status == 'running' and action == 'start':
+                return self.reply(304)
+            container['State'] = {'Status': 'running', 'ExitCode': 0}
+            container['started'] = time.monotonic()
+            state.emit(action, name)
+            return self.reply(204)
+        if method == 'POST' and action in ('stop', 'kill'):
+            if status != 'running':
+                return self.reply(304) if action == 'stop' else self.error(409, f"Container {name} is not running")
+            container['State'] = {'Status': 'exited', 'ExitCode': 0 if action == 'stop' else 137}
+            state.emit('die', name)
+            return self.reply(204)
+        if method == 'POST' and action == 'rename':
+            state.containers[query['name']] = dict(state.containers.pop(name), name=query['name'])
+            return self.reply(204)
+        if method == 'POST' and action == 'exec':
+            if status != 'running':
+                return self.error(409, f"Container {name} is not running")
+            exec_id = os.urandom(16).hex()
+            state.execs[exec_id] = {'Cmd': body['Cmd'], 'ExitCode': 0, 'container': name}
+            return self.reply(201, {'Id': exec_id})
+        if method == 'DELETE' and action == '':
+            if status == 'running' and query.get('force') != '1':
+                return self.error(409, f"You cannot remove a running container {container['Id']}. "
+                                       "Stop the container before attempting removal or force remove")
+            state.emit('destroy', name)
+            del state.containers[name]
+            return self.reply(204)
+        self.error(404, f"{method} /containers/{name}/{action} not mocked")
+
+    def stats_sample(self, name, tick):
+        # CPU grows by 10% of one of two cores per tick, memory is constant
+        return {'read': time.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'cpu_stats': {'cpu_usage': {'total_usage': tick * 10 ** 8}, 'system_cpu_usage': tick * 2 * 10 ** 9,
+                              'online_cpus': 2},
+                'precpu_stats': {'cpu_usage': {'total_usage': (tick - 1) * 10 ** 8},
+                                 'system_cpu_usage': (tick - 1) * 2 * 10 ** 9},
+                'memory_stats': {'usage': 64 * 2 ** 20, 'limit': 2 ** 30}}
+
+    def stats_lines(self, name):
+        tick = 0
+        deadline = time.monotonic() + STREAM_IDLE
+        while time.monotonic() < deadline and name in self.state.containers:
+            tick += 1
+            yield self.stats_sample(name, tick)
+            time.sleep(STATS_INTERVAL)
+
+    def event_lines(self, filters):
+        state = self.state
+        with state.lock:
+            seen = len(state.events)
+        while True:
+            with state.lock:
+                if len(state.events) == seen and not state.lock.wait_for(lambda: len(state.events) > seen,
+                                                                         timeout=STREAM_IDLE):
+                    return
+                new, seen = state.events[seen:], len(state.events)
+            for event in new:
+                if not filters.get('type') or event['Type'] in filters['type']:
+                    yield event
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def do_DELETE(self):
+        self.handle_request('DELETE')
+
+class UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler expects a (host, port) client address
+        return request, ('unix', 0)
+
+def make_server(socket_path, images=('nginx:latest',)):
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    handler = type('Handler', (MockHandler,), {'state': MockState(images)})
+    return UnixHTTPServer(socket_path, handler)
+
+def serve_in_background(socket_path, images=('nginx:latest',)):
+    """Return a mock engine running in a daemon thread; call .shutdown() to stop it."""
+    server = make_server(socket_path, images)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python3 -m containersAndOrchestration.docker.mockDockerEngine <socket path> [image ...]")
+        sys.exit(1)
+    server = make_server(sys.argv[1], sys.argv[2:] or ('nginx:latest',))
+    print(f"Mock Docker Engine on unix://{sys.argv[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+        os.remove(sys.argv[1])
+
+if __name__ == '__main__':
+    main()
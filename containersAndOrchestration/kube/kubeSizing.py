@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+
+import argparse
+import copy
+import json
+import math
+import os
+import re
+import sys
+
+import yaml
+
+KUBE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_TEMPLATE = os.path.join(KUBE_DIR, 'cluster!@#k', 'templates', 'deployment-template.yaml')
+DEFAULT_CATALOG = os.path.join(KUBE_DIR, 'serviceCatalog.yaml')
+
+# Share of the CPU request pods should run at during normal peaks; the rest absorbs bursts
+# and the time the HPA needs to add pods
+DEFAULT_TARGET_UTILIZATION = 0.7
+# CPU limits throttle within a scheduling period and show up directly in p99, so they are generous
+CPU_LIMIT_FACTOR = 2.0
+MEMORY_LIMIT_FACTOR = 1.25
+CPU_STEP_MILLICORES = 50
+MEMORY_STEP_MI = 16
+
+NAME_PATTERN = re.compile(r'^[a-z0-9]([-a-z0-9]*[a-z0-9])?$')
+CPU_PATTERN = re.compile(r'^(\d+(\.\d+)?)(m?)$')
+MEMORY_UNITS = {'Ki': 2 ** 10, 'Mi': 2 ** 20, 'Gi': 2 ** 30, 'Ti': 2 ** 40,
+                'K': 10 ** 3, 'M': 10 ** 6, 'G': 10 ** 9, 'T': 10 ** 12, '': 1}
+MEMORY_PATTERN = re.compile(r'^(\d+(\.\d+)?)(Ki|Mi|Gi|Ti|K|M|G|T|)$')
+
+class SizingError(Exception):
+    pass
+
+def round_up(value, step):
+    return int(math.ceil(value / step) * step)
+
+def size_service(name, service):
+    """
+    Derive per-pod resources and replica counts from a service's benchmark.
+
+    benchmark.rps_per_core is the rate one core sustained in the benchmark and
+    benchmark.p99_ms the p99 measured at that rate. When that p99 is above
+    the service's p99_target_ms the per-core capacity is derated
+    proportionally, a conservative approximation near the latency knee.
+    Replicas cover load.peak_rps with every pod at the target utilization.
+    """
+    bench = service.get('benchmark') or {}
+    load = service.get('load') or {}
+    for key in ('rps_per_core', 'rss_base_mb'):
+        if key not in bench:
+            raise SizingError(f"{name}: benchmark.{key} is required")
+    if 'peak_rps' not in load:
+        raise SizingError(f"{name}: load.peak_rps is required")
+
+    workers = bench.get('workers', 1)
+    cpu_cores = bench.get('cpu_per_pod', workers * bench.get('cpu_per_worker', 1.0))
+    rps_per_core = bench['rps_per_core']
+    p99_target = service.get('p99_target_ms')
+    if p99_target and bench.get('p99_ms', 0) > p99_target:
+        rps_per_core *= p99_target / bench['p99_ms']
+    utilization = service.get('target_utilization', DEFAULT_TARGET_UTILIZATION)
+    pod_rps = rps_per_core * cpu_cores * utilization
+
+    min_replicas = service.get('min_replicas', 2)
+    max_replicas = service.get('max_replicas', 10)
+    peak_replicas = math.ceil(load['peak_rps'] / pod_rps)
+    base_replicas = math.ceil(load.get('base_rps', 0) / pod_rps)
+    warnings = []
+    if peak_replicas > max_replicas:
+        warnings.append(f"peak needs {peak_replicas} pods but max_replicas is {max_replicas}")
+    hpa_min = max(min_replicas, base_replicas)
+
+    cpu_request = round_up(cpu_cores * 1000, CPU_STEP_MILLICORES)
+    memory_request = round_up(bench['rss_base_mb'] + workers * bench.get('rss_per_worker_mb', 0), MEMORY_STEP_MI)
+    resources = {
+        'requests': {'cpu': f"{cpu_request}m", 'memory': f"{memory_request}Mi"},
+        'limits': {'memory': f"{round_up(memory_request * MEMORY_LIMIT_FACTOR, MEMORY_STEP_MI)}Mi"},
+    }
+    cpu_limit_factor = service.get('cpu_limit_factor', CPU_LIMIT_FACTOR)
+    if cpu_limit_factor:
+        resources['limits']['cpu'] = f"{round_up(cpu_request * cpu_limit_factor, CPU_STEP_MILLICORES)}m"
+
+    return {
+        'name': name,
+        'pod_rps': round(pod_rps, 1),
+        'replicas': max(hpa_min, min(peak_replicas, max_replicas)),
+        'min_replicas': hpa_min,
+        'max_replicas': max(max_replicas, hpa_min),
+        'peak_replicas': peak_replicas,
+        'target_utilization': int(round(utilization * 100)),
+        'resources': resources,
+        'warnings': warnings,
+    }
+
+def load_catalog(catalog_file):
+    with open(catalog_file, 'r') as f:
+        catalog = yaml.safe_load(f) or {}
+    services = catalog.get('services') or {}
+    catalog_dir = os.path.dirname(os.path.abspath(catalog_file))
+    for name, service in services.items():
+        # Benchmark results can live in their own JSON/YAML file next to the catalog
+        if isinstance(service.get('benchmark'), str):
+            with open(os.path.join(catalog_dir, service['benchmark']), 'r') as f:
+                service['benchmark'] = yaml.safe_load(f)
+        templates = service.get('templates') or [DEFAULT_TEMPLATE]
+        service['templates'] = [os.path.join(catalog_dir, path) for path in templates]
+    return services
+
+def render_service(name, service, sizing):
+    """Fill the service's templates with its image, ports, resources and replicas and add an HPA."""
+    documents = []
+    for template in service['templates']:
+        with open(template, 'r') as f:
+            documents += [doc for doc in yaml.safe_load_all(f) if doc]
+
+    labels = {'app': name}
+    port = service.get('port', 80)
+    deployment_name = f"{name}-deployment"
+    rendered = []
+    for doc in copy.deepcopy(documents):
+        if doc.get('kind') == 'Deployment':
+            doc['metadata']['name'] = deployment_name
+            doc['metadata']['labels'] = dict(labels)
+            spec = doc['spec']
+            spec['replicas'] = sizing['replicas']
+            spec['selector'] = {'matchLabels': dict(labels)}
+            spec['template'].setdefault('metadata', {})['labels'] = dict(labels)
+            container = spec['template']['spec']['containers'][0]
+            container.update(name=name, image=service['image'], ports=[{'containerPort': port}],
+                             resources=sizing['resources'])
+        elif doc.get('kind') == 'Service':
+            doc['metadata']['name'] = f"{name}-service"
+            doc['spec']['selector'] = dict(labels)
+            doc['spec']['ports'] = [{'protocol': 'TCP', 'port': service.get('service_port', port),
+                                     'targetPort': port}]
+        rendered.append(doc)
+
+    rendered.append({
+        'apiVersion': 'autoscaling/v2',
+        'kind': 'HorizontalPodAutoscaler',
+        'metadata': {'name': f"{name}-hpa", 'labels': dict(labels)},
+        'spec': {
+            'scaleTargetRef': {'apiVersion': 'apps/v1', 'kind': 'Deployment', 'name': deployment_name},
+            'minReplicas': sizing['min_replicas'],
+            'maxReplicas': sizing['max_replicas'],
+            'metrics': [{'type': 'Resource', 'resource': {
+                'name': 'cpu', 'target': {'type': 'Utilization', 'averageUtilization': sizing['target_utilization']},
+            }}],
+        },
+    })
+    return rendered
+
+def parse_cpu(quantity):
+    match = CPU_PATTERN.match(str(quantity))
+    if not match:
+        raise SizingError(f"invalid CPU quantity {quantity!r}")
+    value = float(match.group(1))
+    return value if match.group(3) else value * 1000
+
+def parse_memory(quantity):
+    match = MEMORY_PATTERN.match(str(quantity))
+    if not match:
+        raise SizingError(f"invalid memory quantity {quantity!r}")
+    return float(match.group(1)) * MEMORY_UNITS[match.group(3)]
+
+def validate_documents(documents):
+    """
+    Check manifests offline, without a cluster or downloaded schemas.
+
+    Covers the mistakes that bite in practice: names, selectors that do not
+    match pod labels, unparsable quantities, requests above limits, Services
+    pointing at no container port and HPAs targeting a missing Deployment.
+    Returns a list of error strings.
+    """
+    errors = []
+    deployments = {}
+    for doc in documents:
+        kind = doc.get('kind')
+        name = (doc.get('metadata') or {}).get('name', '')
+        where = f"{kind}/{name}"
+        if not doc.get('apiVersion') or not kind:
+            errors.append(f"{where}: apiVersion and kind are required")
+        if not NAME_PATTERN.match(name) or len(name) > 253:
+            errors.append(f"{where}: metadata.name must be a lowercase DNS-1123 name")
+        spec = doc.get('spec') or {}
+        if kind == 'Deployment':
+            deployments[name] = doc
+            pod = (spec.get('template') or {})
+            pod_labels = (pod.get('metadata') or {}).get('labels') or {}
+            selector = (spec.get('selector') or {}).get('matchLabels') or {}
+            if not selector or any(pod_labels.get(key) != value for key, value in selector.items()):
+                errors.append(f"{where}: selector {selector} does not match pod labels {pod_labels}")
+            pod_spec = pod.get('spec') or {}
+            unknown = set(pod_spec) - {'containers', 'initContainers', 'volumes', 'nodeSelector', 'affinity',
+                                       'tolerations', 'serviceAccountName', 'securityContext',
+                                       'topologySpreadConstraints', 'terminationGracePeriodSeconds',
+                                       'imagePullSecrets', 'priorityClassName', 'hostNetwork', 'dnsPolicy'}
+            if unknown:
+                errors.append(f"{where}: unexpected pod spec fields {sorted(unknown)} (indentation?)")
+            containers = pod_spec.get('containers') or []
+            if not containers:
+                errors.append(f"{where}: no containers")
+            for container in containers:
+                if not container.get('name') or not container.get('image'):
+                    errors.append(f"{where}: every container needs a name and an image")
+                resources = container.get('resources') or {}
+                requests, limits = resources.get('requests') or {}, resources.get('limits') or {}
+                if not requests:
+                    errors.append(f"{where}: container {container.get('name')} has no resource requests")
+                try:
+                    for key, parse in (('cpu', parse_cpu), ('memory', parse_memory)):
+                        if key in requests and key in limits and parse(requests[key]) > parse(limits[key]):
+                            errors.append(f"{where}: {key} request {requests[key]} exceeds limit {limits[key]}")
+                        for quantity in (requests.get(key), limits.get(key)):
+                            if quantity is not None:
+                                parse(quantity)
+                except SizingError as e:
+                    errors.append(f"{where}: {e}")
+        elif kind == 'HorizontalPodAutoscaler':
+            if spec.get('minReplicas', 1) > spec.get('maxReplicas', 0):
+                errors.append(f"{where}: minReplicas is above maxReplicas")
+
+    for doc in documents:
+        kind = doc.get('kind')
+        name = (doc.get('metadata') or {}).get('name', '')
+        spec = doc.get('spec') or {}
+        if kind == 'HorizontalPodAutoscaler':
+            target = (spec.get('scaleTargetRef') or {}).get('name')
+            if target not in deployments:
+                errors.append(f"{kind}/{name}: scaleTargetRef {target} is not in these manifests")
+        elif kind == 'Service' and deployments:
+            selector = spec.get('selector') or {}
+            matches = [deployment for deployment in deployments.values()
+                       if selector and all(((deployment['spec']['template'].get('metadata') or {}).get('labels') or {})
+                                           .get(key) == value for key, value in selector.items())]
+            if not matches:
+                errors.append(f"{kind}/{name}: selector {selector} matches no Deployment")
+                continue
+            ports = {port.get('containerPort') for deployment in matches
+                     for container in deployment['spec']['template']['spec'].get('containers') or []
+                     for port in container.get('ports') or []}
+            for port in spec.get('ports') or []:
+                if isinstance(port.get('targetPort'), int) and port['targetPort'] not in ports:
+                    errors.append(f"{kind}/{name}: targetPort {port['targetPort']} is not a container port")
+    return errors
+
+def render_catalog(catalog_file, output_dir):
+    """Render every catalog service to <output_dir>/<service>.yaml. Returns (sizings, errors)."""
+    services = load_catalog(catalog_file)
+    os.makedirs(output_dir, exist_ok=True)
+    sizings = []
+    errors = []
+    for name, service in services.items():
+        sizing = size_service(name, service)
+        documents = render_service(name, service, sizing)
+        errors += validate_documents(documents)
+        with open(os.path.join(output_dir, f"{name}.yaml"), 'w') as f:
+            yaml.safe_dump_all(documents, f, sort_keys=False)
+        sizings.append(sizing)
+    return sizings, errors
+
+def print_plan(sizings):
+    print(f"{'SERVICE':<20} {'POD RPS':>8} {'PEAK':>5} {'REPLICAS':>8} {'HPA':>7} {'CPU':>12} {'MEMORY':>14}")
+    for sizing in sizings:
+        requests, limits = sizing['resources']['requests'], sizing['resources']['limits']
+        cpu = f"{requests['cpu']}/{limits.get('cpu', '-')}"
+        memory = f"{requests['memory']}/{limits['memory']}"
+        print(f"{sizing['name']:<20} {sizing['pod_rps']:>8} {sizing['peak_replicas']:>5} {sizing['replicas']:>8} "
+              f"{sizing['min_replicas']:>3}-{sizing['max_replicas']:<3} {cpu:>12} {memory:>14}")
+        for warning in sizing['warnings']:
+            print(f"  warning: {warning}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Size and render Kubernetes manifests from a service catalog.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    plan_parser = commands.add_parser('plan', help="Print the capacity plan")
+    plan_parser.add_argument('catalog', nargs='?', default=DEFAULT_CATALOG)
+    render_parser = commands.add_parser('render', help="Write sized manifests and validate them")
+    render_parser.add_argument('catalog', nargs='?', default=DEFAULT_CATALOG)
+    render_parser.add_argument('--out', default='k8s-generated')
+    validate_parser = commands.add_parser('validate', help="Validate manifest files offline")
+    validate_parser.add_argument('files', nargs='+')
+    validate_parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'plan':
+            services = load_catalog(args.catalog)
+            print_plan([size_service(name, service) for name, service in services.items()])
+            return
+        if args.command == 'render':
+            sizings, errors = render_catalog(args.catalog, args.out)
+            print_plan(sizings)
+            print(f"Wrote {len(sizings)} manifest(s) to {args.out}.")
+        else:
+            documents = []
+            for path in args.files:
+                with open(path, 'r') as f:
+                    documents += [doc for doc in yaml.safe_load_all(f) if doc]
+            errors = validate_documents(documents)
+            if args.json:
+                print(json.dumps(errors))
+    except (SizingError, OSError, yaml.YAMLError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    for error in errors:
+        print(f"invalid: {error}")
+    if errors:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+import difflib
+import importlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from eosCli.commands import COMMANDS
+
+# Startup budgets checked by `eos self-check`, in milliseconds
+HELP_BUDGET_MS = 150
+IMPORT_BUDGET_MS = 500
+
+def print_help():
+    print("Usage: eos <command> [args...]\n")
+    print("Commands:")
+    width = max(len(name) for name in COMMANDS)
+    for name in sorted(COMMANDS):
+        print(f"  {name:<{width}}  {COMMANDS[name][2]}")
+    print(f"  {'self-check':<{width}}  Check startup time against the budget")
+    print("\nRun 'eos <command> --help' for the options of a command.")
+
+def dispatch(name, args):
+    """Import the module behind a subcommand and run its entry point with args as its argv."""
+    module_name, function_name, _ = COMMANDS[name]
+    module = importlib.import_module(module_name)
+    sys.argv = [f"eos {name}"] + list(args)
+    return getattr(module, function_name)()
+
+def run_python(code):
+    """Run code in a fresh interpreter rooted at the repository; returns (seconds, stdout)."""
+    repo_root = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', code], cwd=repo_root,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed")
+    return elapsed, result.stdout
+
+def self_check(help_budget_ms=HELP_BUDGET_MS, import_budget_ms=IMPORT_BUDGET_MS, runs=5):
+    """
+    Time `eos --help` and the import of every subcommand module, each in a fresh interpreter.
+
+    `eos --help` must stay under help_budget_ms and must not import any
+    subcommand module. Returns the number of failures.
+    """
+    failures = 0
+    modules = sorted({module for module, _, _ in COMMANDS.values()})
+    probe = ("import io, contextlib, json, sys\n"
+             "from eosCli.cli import main\n"
+             "with contextlib.redirect_stdout(io.StringIO()):\n"
+             "    main(['--help'])\n"
+             f"print(json.dumps(sorted(set({modules!r}) & set(sys.modules))))")
+    timings = []
+    loaded = []
+    for _ in range(runs):
+        elapsed, output = run_python(probe)
+        timings.append(elapsed * 1000)
+        loaded = json.loads(output)
+    median = statistics.median(timings)
+    status = 'ok' if median <= help_budget_ms else 'OVER'
+    failures += status != 'ok'
+    print(f"{'eos --help':<52} {median:>7.1f} ms  {status} (budget {help_budget_ms} ms)")
+    if loaded:
+        failures += 1
+        print(f"  --help imported subcommand modules: {', '.join(loaded)}")
+
+    baseline = statistics.median(run_python("pass")[0] * 1000 for _ in range(runs))
+    for module in modules:
+        try:
+            elapsed, _ = run_python(f"import {module}")
+        except RuntimeError as e:
+            failures += 1
+            print(f"{module:<52} {'-':>7}     FAILED ({e})")
+            continue
+        cost = max(0.0, elapsed * 1000 - baseline)
+        status = 'ok' if cost <= import_budget_ms else 'OVER'
+        failures += status != 'ok'
+        print(f"{module:<52} {cost:>7.1f} ms  {status}")
+    print(f"Interpreter startup {baseline:.1f} ms is excluded from import times (budget {import_budget_ms} ms).")
+    return failures
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ('-h', '--help', 'help'):
+        print_help()
+        return 0
+    name, args = argv[0], argv[1:]
+    if name == 'self-check':
+        help_budget = int(args[args.index('--budget-ms') + 1]) if '--budget-ms' in args else HELP_BUDGET_MS
+        import_budget = (int(args[args.index('--import-budget-ms') + 1])
+                         if '--import-budget-ms' in args else IMPORT_BUDGET_MS)
+        return 1 if self_check(help_budget, import_budget) else 0
+    if name not in COMMANDS:
+        suggestion = difflib.get_close_matches(name, list(COMMANDS) + ['self-check'], n=1)
+        print(f"eos: unknown command '{name}'." + (f" Did you mean '{suggestion[0]}'?" if suggestion else ""))
+        print("Run 'eos --help' for the list of commands.")
+        return 2
+    result = dispatch(name, args)
+    return result if isinstance(result, int) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,53 @@
+# Subcommands of the `eos` CLI: name -> (module, function, summary).
+# Modules are imported only when their subcommand is dispatched, so keep this
+# file free of imports; `eos --help` reads nothing else.
+COMMANDS = {
+    'nginx': ('webServer.nginx.nginx', 'main',
+              "Dockerised nginx: compose, swaps, SSL, config checks and backups"),
+    'proxy': ('webServer.nginx.nginxManager', 'main',
+              "Add, remove and list host nginx reverse proxies"),
+    'vhosts': ('webServer.nginx.massVhost', 'main',
+               "Serve many tenant domains from one map-driven server block"),
+    'tls': ('webServer.nginx.tlsProfile', 'main',
+            "Write the TLS profile, rotate session ticket keys, benchmark handshakes"),
+    'ports': ('webServer.nginx.portIndex', 'main',
+              "Show ports and domains in use, hand out free ports"),
+    'limits': ('webServer.nginx.rateLimits', 'main',
+               "Generate rate/connection limit policies and load test them"),
+    'tune': ('webServer.nginx.hostTuning', 'main',
+             "Size nginx workers, listeners and kernel limits for this host"),
+    'waf-report': ('webServer.nginx.wafScope', 'main',
+                   "Report what share of a site's traffic ModSecurity inspects"),
+    'static': ('webServer.nginx.staticAssets', 'main',
+               "Fingerprint and precompress static assets"),
+    'node': ('backendWeb.nodeJs.Node', 'main',
+             "Dockerised Node.js app behind nginx"),
+    'docker': ('containersAndOrchestration.docker.dockerEngine', 'main',
+               "Compose plan/up/down/status through the Docker Engine API"),
+    'kube-size': ('containersAndOrchestration.kube.kubeSizing', 'main',
+                  "Size Kubernetes manifests from benchmarks"),
+    'certs': ('securityAndEncryption.certInventory', 'main',
+              "Certificate inventory, coverage checks and renewals"),
+    'modsec': ('securityAndEncryption.modSecurity.setupModSecurity', 'main',
+               "Build and load ModSecurity for nginx"),
+    'modsec-profile': ('securityAndEncryption.modSecurity.modsecProfile', 'main',
+                       "Write the ModSecurity throughput profile and per-site WAF limits"),
+    'waf-bench': ('securityAndEncryption.modSecurity.wafBench', 'main',
+                  "Benchmark ModSecurity overhead per CRS paranoia level"),
+    'redos': ('securityAndEncryption.modSecurity.redosScan', 'main',
+              "Find CRS and local @rx rules that backtrack badly on crafted input"),
+    'modsec-package': ('securityAndEncryption.modSecurity.packageModSecurity', 'main',
+                       "Build, publish and install prebuilt ModSecurity modules"),
+    'crs': ('securityAndEncryption.modSecurity.crsStore', 'main',
+            "Install, switch and roll back OWASP Core Rule Set versions"),
+    'dns': ('cloudAndDNS.hetznerDns', 'main',
+            "List and sync Hetzner DNS zones"),
+    'backup': ('backupAndRecovery.backupEngine', 'main',
+               "Deduplicating snapshot backups"),
+    'logs': ('backupAndRecovery.logArchive', 'main',
+             "Archive logs into indexed compressed blocks and search them"),
+    'snapshot': ('backupAndRecovery.pathSnapshot', 'main',
+                 "Take, list and prune .bak snapshots of a path"),
+    'fleet': ('fleetManagement.fleetRunner', 'main',
+              "Run eos tasks across the fleet over SSH"),
+}
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import shlex
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# The checkout --sync copies to each host
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utilities.loadVariables import load_variables
+
+FLEET_LOG_DIR = '/var/log/eos/fleet'
+REMOTE_EOS_DIR = '/opt/cyberMonkey/eosWeb'
+
+# Remote commands for each fleet task, run from REMOTE_EOS_DIR (python3 -m resolves the packages there).
+# Setup scripts prompt for confirmation, so the defaults are fed through `yes ''`.
+TASKS = {
+    'modsecurity': "yes '' | sudo python3 -m securityAndEncryption.modSecurity.setupModSecurity",
+    'crs-update': "sudo python3 -m securityAndEncryption.modSecurity.crsStore upgrade",
+    'proxy-add': "sudo python3 -m webServer.nginx.nginxManager --add {domain} {proxy_pass}",
+    'proxy-remove': "sudo python3 -m webServer.nginx.nginxManager --remove {domain}",
+    'proxy-list': "python3 -m webServer.nginx.nginxManager --list",
+    # Pair with --push /etc/nginx/tls/tickets to roll out rotated session ticket keys
+    'nginx-reload': "sudo nginx -t && sudo nginx -s reload",
+    'nginx-tune': "sudo python3 -m webServer.nginx.hostTuning apply",
+    'logs-archive': "sudo python3 -m backupAndRecovery.logArchive archive --delete",
+}
+
+def parse_host(entry):
+    """Split an inventory entry of the form [user@]host[:port] into its parts."""
+    user = None
+    port = None
+    if '@' in entry:
+        user, entry = entry.split('@', 1)
+    if entry.count(':') == 1:
+        entry, port = entry.split(':', 1)
+        port = int(port)
+    return {'name': entry, 'user': user, 'port': port}
+
+def read_inventory(inventory_files, groups=None):
+    """
+    Read hosts from one or more inventory files.
+
+    Each non-comment line is `[user@]host[:port] [group ...]`. Duplicate hosts
+    across files (e.g. the same node in hosts.conf and tailscaleHosts.conf) are
+    only kept once, in first-seen order.
+    """
+    hosts = []
+    seen = set()
+    for inventory_file in inventory_files:
+        if not os.path.exists(inventory_file):
+            logging.warning(f"Inventory file {inventory_file} not found, skipping.")
+            continue
+        with open(inventory_file, 'r') as f:
+            for line in f:
+                line = line.split('#', 1)[0].strip()
+                if not line:
+                    continue
+                fields = line.split()
+                host = parse_host(fields[0])
+                host['groups'] = fields[1:]
+                if groups and not set(groups) & set(host['groups']):
+                    continue
+                key = (host['user'], host['name'], host['port'])
+                if key not in seen:
+                    seen.add(key)
+                    hosts.append(host)
+    return hosts
+
+def default_inventory_files():
+    """Return the inventory files configured in variables.conf."""
+    variables = load_variables()
+    return [path for path in (variables.get('HOSTS_CONF'), variables.get('TAILSCALE_HOSTS_CONF')) if path]
+
+def ssh_destination(host):
+    return f"{host['user']}@{host['name']}" if host['user'] else host['name']
+
+def host_label(host):
+    """Return the inventory entry for host, [user@]host[:port], so entries sharing a name stay apart."""
+    label = ssh_destination(host)
+    return f"{label}:{host['port']}" if host['port'] else label
+
+def build_command(host, remote_command, transport, ssh_options):
+    """Build the argv that runs remote_command on host over the chosen transport."""
+    if transport == 'local':
+        # Runs the command on this machine; used to exercise the runner without real hosts
+        return ['sh', '-c', remote_command]
+    command = [os.environ.get('EOS_FLEET_SSH', 'ssh'), '-o', 'BatchMode=yes']
+    if host['port']:
+        command += ['-p', str(host['port'])]
+    command += ssh_options
+    command += [ssh_destination(host), remote_command]
+    return command
+
+def build_sync_command(host, ssh_options, local_dir, remote_dir):
+    """Build the rsync argv that mirrors local_dir to remote_dir on host."""
+    remote_shell = ' '.join([os.environ.get('EOS_FLEET_SSH', 'ssh'), '-o', 'BatchMode=yes'] +
+                            (['-p', str(host['port'])] if host['port'] else []) + ssh_options)
+    return ['rsync', '-az', '--delete', '--exclude', '.git', '-e', remote_shell,
+            f"{local_dir.rstrip('/')}/", f"{ssh_destination(host)}:{remote_dir.rstrip('/')}/"]
+
+def run_on_host(host, remote_command, log_path, transport, ssh_options, timeout, sync, remote_dir, push=()):
+    """Run the task on a single host, streaming all output to its own log file."""
+    start = time.monotonic()
+    result = {'host': host_label(host), 'log': log_path, 'exit_code': None}
+    with open(log_path, 'w') as log:
+        try:
+            transfers = [(REPO_ROOT, remote_dir)] if sync else []
+            transfers += [(path, path) for path in push]
+            for local_dir, target_dir in (transfers if transport == 'ssh' else []):
+                sync_command = build_sync_command(host, ssh_options, local_dir, target_dir)
+                log.write(f"$ {' '.join(sync_command)}\n")
+                log.flush()
+                sync_result = subprocess.run(sync_command, stdout=log, stderr=subprocess.STDOUT,
+                                             stdin=subprocess.DEVNULL, timeout=timeout)
+                if sync_result.returncode != 0:
+                    result.update(status='failed', exit_code=sync_result.returncode)
+                    return result
+
+            command = build_command(host, remote_command, transport, ssh_options)
+            log.write(f"$ {' '.join(command)}\n")
+            log.flush()
+            completed = subprocess.run(command, stdout=log, stderr=subprocess.STDOUT,
+                                       stdin=subprocess.DEVNULL, timeout=timeout)
+            result['exit_code'] = completed.returncode
+            result['status'] = 'ok' if completed.returncode == 0 else 'failed'
+        except subprocess.TimeoutExpired:
+            log.write(f"Timed out after {timeout}s\n")
+            result['status'] = 'timeout'
+        except OSError as e:
+            log.write(f"Failed to start command: {e}\n")
+            result['status'] = 'failed'
+        finally:
+            result['duration'] = round(time.monotonic() - start, 2)
+    return result
+
+def failure_limit(max_failures, host_count):
+    """Translate a failure threshold such as `3` or `10%` into a host count."""
+    if max_failures.endswith('%'):
+        return int(host_count * float(max_failures[:-1]) / 100)
+    return int(max_failures)
+
+def run_fleet(hosts, remote_command, parallel=10, batch_size=None, max_failures='0',
+              transport='ssh', ssh_options=None, timeout=3600, sync=False,
+              remote_dir=REMOTE_EOS_DIR, log_dir=FLEET_LOG_DIR, push=()):
+    """
+    Run remote_command across hosts in rolling batches.
+
+    Each batch runs with at most `parallel` concurrent connections. Once the
+    number of failed hosts exceeds `max_failures`, the remaining batches are
+    skipped so a broken change does not roll out to the whole fleet.
+    """
+    ssh_options = ssh_options or []
+    batch_size = batch_size or parallel
+    limit = failure_limit(max_failures, len(hosts))
+
+    run_id = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    run_log_dir = os.path.join(log_dir, run_id)
+    os.makedirs(run_log_dir, exist_ok=True)
+    logging.info(f"Fleet run {run_id}: {len(hosts)} hosts, batches of {batch_size}, "
+                 f"{parallel} in parallel, logs in {run_log_dir}")
+
+    results = []
+    failures = 0
+    batches = [hosts[i:i + batch_size] for i in range(0, len(hosts), batch_size)]
+    for number, batch in enumerate(batches, 1):
+        if failures > limit:
+            results += [{'host': host_label(host), 'status': 'skipped', 'exit_code': None,
+                         'duration': 0, 'log': None} for host in batch]
+            continue
+
+        logging.info(f"Batch {number}/{len(batches)}: {', '.join(host_label(host) for host in batch)}")
+        with ThreadPoolExecutor(max_workers=parallel) as executor:
+            futures = [
+                executor.submit(run_on_host, host, remote_command,
+                                os.path.join(run_log_dir, f"{host_label(host)}.log"),
+                                transport, ssh_options, timeout, sync, remote_dir, push)
+                for host in batch
+            ]
+            for future in futures:
+                result = future.result()
+                results.append(result)
+                if result['status'] != 'ok':
+                    failures += 1
+                logging.info(f"{result['host']}: {result['status']} ({result['duration']}s)")
+
+        if failures > limit:
+            logging.error(f"{failures} hosts failed, above the threshold of {limit}. "
+                          f"Stopping the rollout.")
+
+    summary_file = os.path.join(run_log_dir, 'summary.json')
+    with open(summary_file, 'w') as f:
+        json.dump({'run_id': run_id, 'command': remote_command, 'results': results}, f, indent=2)
+    return results
+
+def print_summary(results):
+    """Print a per-host result table and totals."""
+    print(f"{'HOST':<32} {'STATUS':<8} {'EXIT':>4} {'TIME':>8}  LOG")
+    for result in results:
+        exit_code = '' if result['exit_code'] is None else result['exit_code']
+        print(f"{result['host']:<32} {result['status']:<8} {exit_code:>4} "
+              f"{result['duration']:>7}s  {result['log'] or '-'}")
+    totals = {}
+    for result in results:
+        totals[result['status']] = totals.get(result['status'], 0) + 1
+    print(", ".join(f"{count} {status}" for status, count in sorted(totals.items())))
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        handlers=[logging.StreamHandler()]
+    )
+    parser = argparse.ArgumentParser(description="Run eosWeb tasks across the fleet over SSH.")
+    parser.add_argument('task', choices=sorted(TASKS) + ['command'],
+                        help="Task to run, or 'command' to run --command as-is")
+    parser.add_argument('--command', help="Raw shell command for the 'command' task")
+    parser.add_argument('--domain', help="Domain for proxy tasks")
+    parser.add_argument('--proxy-pass', help="Upstream for proxy-add, e.g. http://localhost:3000")
+    parser.add_argument('--inventory', action='append',
+                        help="Inventory file (default: HOSTS_CONF and TAILSCALE_HOSTS_CONF)")
+    parser.add_argument('--group', action='append', help="Only run on hosts tagged with this group")
+    parser.add_argument('--parallel', type=int, default=10, help="Maximum concurrent hosts")
+    parser.add_argument('--batch-size', type=int, help="Hosts per rolling batch (default: --parallel)")
+    parser.add_argument('--max-failures', default='0', help="Failures tolerated before stopping, e.g. 2 or 10%%")
+    parser.add_argument('--timeout', type=int, default=3600, help="Per-host timeout in seconds")
+    parser.add_argument('--transport', choices=['ssh', 'local'], default='ssh')
+    parser.add_argument('--ssh-option', action='append', default=[],
+                        help="Extra argument passed to ssh, e.g. -i ~/.ssh/fleet")
+    parser.add_argument('--sync', action='store_true', help="rsync this repository to each host first")
+    parser.add_argument('--push', action='append', default=[],
+                        help="Directory to rsync to the same path on each host first, e.g. MODSEC_ARTIFACT_DIR")
+    parser.add_argument('--remote-dir', default=REMOTE_EOS_DIR)
+    parser.add_argument('--log-dir', default=FLEET_LOG_DIR)
+    args = parser.parse_args()
+
+    if args.task == 'command':
+        if not args.command:
+            parser.error("the 'command' task requires --command")
+        task_command = args.command
+    else:
+        if args.task.startswith('proxy-') and args.task != 'proxy-list' and not args.domain:
+            parser.error(f"{args.task} requires --domain")
+        if args.task == 'proxy-add' and not args.proxy_pass:
+            parser.error("proxy-add requires --proxy-pass")
+        task_command = TASKS[args.task].format(domain=shlex.quote(args.domain or ''),
+                                               proxy_pass=shlex.quote(args.proxy_pass or ''))
+    remote_command = f"cd {shlex.quote(args.remote_dir)} && {task_command}"
+
+    hosts = read_inventory(args.inventory or default_inventory_files(), args.group)
+    if not hosts:
+        logging.error("No hosts found in the inventory.")
+        sys.exit(1)
+
+    ssh_options = [option for value in args.ssh_option for option in shlex.split(value)]
+    results = run_fleet(hosts, remote_command, args.parallel, args.batch_size, args.max_failures,
+                        args.transport, ssh_options, args.timeout, args.sync,
+                        args.remote_dir, args.log_dir, args.push)
+    print_summary(results)
+    if any(result['status'] != 'ok' for result in results):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import re
+import shlex
+import shutil
+import ssl
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from cryptography import x509
+except ImportError:
+    x509 = None
+
+from utilities.loadVariables import load_variables
+
+LIVE_DIR = '/etc/letsencrypt/live'
+CERTBOT_LOGS_DIR = '/var/log/letsencrypt'
+CACHE_FILE = '/var/cache/eos/cert-inventory.json'
+NGINX_CONF_PATHS = ['/etc/nginx/sites-enabled', '/etc/nginx/conf.d']
+LINEAGE_FILES = ('cert.pem', 'chain.pem', 'fullchain.pem')
+
+RENEW_BEFORE_DAYS = 30
+RENEW_PARALLEL = 4
+RENEW_TIMEOUT = 600
+# {name}, {domains} and {server} are filled in per certificate; RENEW_COMMAND in variables.conf or
+# --command replaces it, e.g. with another ACME client
+RENEW_COMMAND = 'certbot renew --cert-name {name} --force-renewal --non-interactive --no-random-sleep-on-renew'
+# Authenticators that edit the web server config or bind port 80 cannot run side by side
+SERIAL_AUTHENTICATORS = {'nginx', 'apache', 'standalone'}
+
+PEM_CERT_PATTERN = re.compile(r'-----BEGIN CERTIFICATE-----.+?-----END CERTIFICATE-----', re.DOTALL)
+SERVER_NAME_PATTERN = re.compile(r'^\s*server_name\s+([^;]+);', re.MULTILINE)
+
+# DER-encoded OIDs of the public key algorithms in SubjectPublicKeyInfo. The
+# signature algorithm OIDs (sha256WithRSAEncryption, ecdsa-with-SHA256) differ,
+# so the first match in the certificate is the subject key.
+KEY_OIDS = {
+    bytes.fromhex('06092a864886f70d010101'): 'RSA',
+    bytes.fromhex('06072a8648ce3d0201'): 'ECDSA',
+    bytes.fromhex('06032b6570'): 'Ed25519',
+}
+CURVE_OIDS = {
+    bytes.fromhex('06082a8648ce3d030107'): 'P-256',
+    bytes.fromhex('06052b81040022'): 'P-384',
+    bytes.fromhex('06052b81040023'): 'P-521',
+}
+
+def der_length(der, pos):
+    """Return (length, content offset) for the DER length field at pos."""
+    first = der[pos]
+    if first < 0x80:
+        return first, pos + 1
+    count = first & 0x7f
+    return int.from_bytes(der[pos + 1:pos + 1 + count], 'big'), pos + 1 + count
+
+def public_key_type(der):
+    """Return a description of the certificate's key such as 'RSA 2048' or 'ECDSA P-256'."""
+    found = sorted((der.find(oid), oid, name) for oid, name in KEY_OIDS.items() if oid in der)
+    if not found:
+        return 'unknown'
+    pos, oid, name = found[0]
+    pos += len(oid)
+    if name == 'ECDSA':
+        curve = next((curve for curve_oid, curve in CURVE_OIDS.items() if der.startswith(curve_oid, pos)), None)
+        return f"ECDSA {curve}" if curve else 'ECDSA'
+    if name == 'RSA':
+        # NULL parameters, then BIT STRING { SEQUENCE { INTEGER modulus, INTEGER exponent } }
+        if der.startswith(b'\x05\x00', pos):
+            pos += 2
+        if der[pos] != 0x03:
+            return 'RSA'
+        _, pos = der_length(der, pos + 1)
+        pos += 1
+        if der[pos] != 0x30:
+            return 'RSA'
+        _, pos = der_length(der, pos + 1)
+        if der[pos] != 0x02:
+            return 'RSA'
+        length, pos = der_length(der, pos + 1)
+        modulus = der[pos:pos + length].lstrip(b'\x00')
+        return f"RSA {len(modulus) * 8}"
+    return name
+
+def parse_distinguished_name(text):
+    """Split an RFC 4514 name such as 'CN=R11,O=Let\'s Encrypt,C=US' into {attribute: value}."""
+    attributes = {}
+    for part in re.split(r'(?<!\\),', text):
+        key, _, value = part.partition('=')
+        attributes.setdefault(key.strip(), re.sub(r'\\(.)', r'\1', value.strip()))
+    return attributes
+
+def decode_with_cryptography(data):
+    cert = x509.load_pem_x509_certificate(data)
+    try:
+        domains = cert.extensions.get_extension_for_class(x509.SubjectAlternativeName).value \
+            .get_values_for_type(x509.DNSName)
+    except x509.ExtensionNotFound:
+        domains = []
+    try:
+        access = cert.extensions.get_extension_for_class(x509.AuthorityInformationAccess).value
+        ocsp = [entry.access_location.value for entry in access
+                if entry.access_method == x509.oid.AuthorityInformationAccessOID.OCSP]
+    except x509.ExtensionNotFound:
+        ocsp = []
+    # not_valid_after_utc arrived in cryptography 42; the older attribute is naive UTC
+    not_after = getattr(cert, 'not_valid_after_utc', None) or \
+        cert.not_valid_after.replace(tzinfo=datetime.timezone.utc)
+    return {'subject': cert.subject.rfc4514_string(), 'issuer': cert.issuer.rfc4514_string(),
+            'not_after': not_after.timestamp(), 'domains': domains, 'ocsp': ocsp}
+
+def decode_with_openssl(path):
+    result = subprocess.run(['openssl', 'x509', '-in', path, '-noout', '-enddate', '-subject', '-issuer',
+                             '-nameopt', 'RFC2253', '-ext', 'subjectAltName,authorityInfoAccess'],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise ValueError(f"openssl x509 failed on {path}: {result.stderr.strip()}")
+    fields = dict(re.findall(r'^(notAfter|subject|issuer)=\s*(.*)$', result.stdout, re.MULTILINE))
+    not_after = datetime.datetime.strptime(re.sub(r'\s+', ' ', fields['notAfter']), '%b %d %H:%M:%S %Y GMT')
+    return {
+        'subject': fields['subject'], 'issuer': fields['issuer'],
+        'not_after': not_after.replace(tzinfo=datetime.timezone.utc).timestamp(),
+        'domains': re.findall(r'DNS:([^,\s]+)', result.stdout),
+        'ocsp': re.findall(r'OCSP - URI:(\S+)', result.stdout),
+    }
+
+def decode_certificate(path):
+    """
+    Return the subject and issuer (RFC 4514), not_after (epoch), DNS names and OCSP URLs of a PEM file's first cert.
+
+    Uses the cryptography package when it is installed, the openssl CLI otherwise.
+    """
+    if x509 is None:
+        return decode_with_openssl(path)
+    with open(path, 'rb') as f:
+        return decode_with_cryptography(f.read())
+
+def read_lineage(lineage_dir):
+    """Read expiry, names, key type and chain details from a certbot lineage directory."""
+    cert_path = os.path.join(lineage_dir, 'cert.pem')
+    decoded = decode_certificate(cert_path)
+    with open(cert_path, 'r') as f:
+        leaf = PEM_CERT_PATTERN.findall(f.read())[0]
+
+    chain_length = 0
+    chain_ok = False
+    fullchain_path = os.path.join(lineage_dir, 'fullchain.pem')
+    if os.path.exists(fullchain_path):
+        with open(fullchain_path, 'r') as f:
+            chain_length = len(PEM_CERT_PATTERN.findall(f.read())) - 1
+    chain_path = os.path.join(lineage_dir, 'chain.pem')
+    if os.path.exists(chain_path):
+        chain_ok = decode_certificate(chain_path)['subject'] == decoded['issuer']
+
+    expires = decoded['not_after']
+    issuer = parse_distinguished_name(decoded['issuer'])
+    return {
+        'name': os.path.basename(lineage_dir),
+        'path': lineage_dir,
+        'domains': decoded['domains'],
+        'expires': expires,
+        'not_after': datetime.datetime.fromtimestamp(expires, datetime.timezone.utc).isoformat(),
+        'key_type': public_key_type(ssl.PEM_cert_to_DER_cert(leaf)),
+        'issuer': issuer.get('CN') or issuer.get('O'),
+        'chain_length': chain_length,
+        'chain_ok': chain_ok,
+        'ocsp': decoded['ocsp'],
+    }
+
+def lineage_signature(lineage_dir):
+    """Return the (mtime, size) of each lineage file; renewals repoint the live symlinks."""
+    signature = []
+    for name in LINEAGE_FILES:
+        try:
+            stat = os.stat(os.path.join(lineage_dir, name))
+            signature.append([stat.st_mtime_ns, stat.st_size])
+        except FileNotFoundError:
+            signature.append(None)
+    return signature
+
+def load_cache(cache_file):
+    try:
+        with open(cache_file, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_cache(cache, cache_file):
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(f"{cache_file}.tmp", 'w') as f:
+            json.dump(cache, f)
+        os.replace(f"{cache_file}.tmp", cache_file)
+    except OSError as e:
+        logging.debug(f"Could not write {cache_file}: {e}")
+
+def load_inventory(live_dir=LIVE_DIR, cache_file=CACHE_FILE):
+    """
+    Return the certificates under live_dir, sorted by name.
+
+    Parsed details are cached per lineage and reused until one of its files
+    changes, so repeated checks only stat the files. days_left is always
+    computed fresh.
+    """
+    if not os.path.isdir(live_dir):
+        logging.warning(f"{live_dir} not found, no certificates to inventory.")
+        return []
+    cache = load_cache(cache_file)
+    entries = {}
+    certs = []
+    now = time.time()
+    for name in sorted(os.listdir(live_dir)):
+        lineage_dir = os.path.join(live_dir, name)
+        if not os.path.isfile(os.path.join(lineage_dir, 'cert.pem')):
+            continue
+        signature = lineage_signature(lineage_dir)
+        cached = cache.get(lineage_dir)
+        if cached and cached['signature'] == signature:
+            info = cached['info']
+        else:
+            try:
+                info = read_lineage(lineage_dir)
+            except (OSError, ValueError, IndexError, ssl.SSLError) as e:
+                logging.warning(f"Could not read certificate in {lineage_dir}: {e}")
+                continue
+        entries[lineage_dir] = {'signature': signature, 'info': info}
+        certs.append(dict(info, days_left=round((info['expires'] - now) / 86400, 1)))
+    if entries != cache:
+        save_cache(entries, cache_file)
+    return certs
+
+def nginx_vhosts(conf_paths=NGINX_CONF_PATHS, extra_domains=()):
+    """Collect the host names nginx serves from server_name directives in files or directories."""
+    names = {domain.lower() for domain in extra_domains}
+    files = []
+    for path in conf_paths:
+        if os.path.isdir(path):
+            files += [os.path.join(path, name) for name in sorted(os.listdir(path))]
+        elif os.path.isfile(path):
+            files.append(path)
+    for path in files:
+        try:
+            with open(path, 'r') as f:
+                content = f.read()
+        except OSError:
+            continue
+        for match in SERVER_NAME_PATTERN.finditer(content):
+            for name in match.group(1).split():
+                # Skip the catch-all, regex names and bare hostnames that cannot carry a public cert
+                if name == '_' or name.startswith('~') or '.' not in name:
+                    continue
+                names.add(name.lower().lstrip('.'))
+    return sorted(names)
+
+def covers(cert_domain, host):
+    """Check whether a certificate name covers host; wildcards match exactly one label."""
+    cert_domain = cert_domain.lower()
+    if cert_domain.startswith('*.'):
+        return host.count('.') == cert_domain.count('.') and host.endswith(cert_domain[1:])
+    return host == cert_domain
+
+def match_vhosts(certs, vhosts):
+    """Record the vhosts each certificate serves and return the vhosts no certificate covers."""
+    covered = set()
+    for cert in certs:
+        cert['vhosts'] = [host for host in vhosts if any(covers(domain, host) for domain in cert['domains'])]
+        covered.update(cert['vhosts'])
+    return [host for host in vhosts if host not in covered]
+
+def due_for_renewal(certs, days=RENEW_BEFORE_DAYS, include_unused=False):
+    """Certificates expiring within days; by default only those nginx actually serves."""
+    return [cert for cert in certs
+            if cert['days_left'] <= days and (include_unused or cert.get('vhosts'))]
+
+def is_certbot(command):
+    return os.path.basename(shlex.split(command)[0]) == 'certbot'
+
+def renewal_authenticator(name, config_dir):
+    try:
+        with open(os.path.join(config_dir, 'renewal', f"{name}.conf"), 'r') as f:
+            match = re.search(r'^\s*authenticator\s*=\s*(\S+)', f.read(), re.MULTILINE)
+    except OSError:
+        return None
+    return match.group(1) if match else None
+
+def certbot_sandbox(name, config_dir, scratch):
+    """
+    Build a config dir for renewing one lineage without taking certbot's lock on config_dir.
+
+    certbot locks its config, work and logs directories for the whole run.
+    The sandbox links everything in config_dir (accounts, archive, live,
+    hooks) except renewal/, which only gets a copy of this lineage's conf;
+    archive and live paths in that conf are absolute, so new certificates
+    land in the real tree. Returns the extra certbot arguments.
+    """
+    sandbox = os.path.join(scratch, 'config')
+    os.makedirs(os.path.join(sandbox, 'renewal'))
+    for entry in os.listdir(config_dir):
+        if entry != 'renewal' and not entry.startswith('.certbot.lock'):
+            os.symlink(os.path.join(config_dir, entry), os.path.join(sandbox, entry))
+    shutil.copy2(os.path.join(config_dir, 'renewal', f"{name}.conf"), os.path.join(sandbox, 'renewal'))
+    logs_dir = os.path.join(CERTBOT_LOGS_DIR, 'eos-parallel', name)
+    os.makedirs(logs_dir, exist_ok=True)
+    return ['--config-dir', sandbox, '--work-dir', os.path.join(scratch, 'work'), '--logs-dir', logs_dir]
+
+def sync_renewal_conf(name, config_dir, scratch):
+    """Copy the lineage's renewal conf back if certbot updated it in the sandbox."""
+    updated = os.path.join(scratch, 'config', 'renewal', f"{name}.conf")
+    target = os.path.join(config_dir, 'renewal', f"{name}.conf")
+    with open(updated, 'rb') as f:
+        content = f.read()
+    with open(target, 'rb') as f:
+        if f.read() == content:
+            return
+    with open(f"{target}.eos-tmp", 'wb') as f:
+        f.write(content)
+    os.replace(f"{target}.eos-tmp", target)
+
+def renew_one(cert, command, server, no_verify_ssl, timeout, config_dir=None):
+    """Run the renewal command for one certificate; with config_dir, certbot runs in its own sandbox."""
+    argv = shlex.split(command.format(name=cert['name'], domains=','.join(cert['domains']), server=server or ''))
+    if server and '{server}' not in command:
+        argv += ['--server', server]
+    if no_verify_ssl:
+        argv.append('--no-verify-ssl')
+    start = time.monotonic()
+    scratch = tempfile.mkdtemp(prefix=f"eos-renew-{cert['name']}-") if config_dir else None
+    try:
+        if scratch:
+            argv += certbot_sandbox(cert['name'], config_dir, scratch)
+        completed = subprocess.run(argv, capture_output=True, text=True, timeout=timeout)
+        status = 'ok' if completed.returncode == 0 else 'failed'
+        output = (completed.stdout + completed.stderr).strip()
+        if scratch and status == 'ok':
+            sync_renewal_conf(cert['name'], config_dir, scratch)
+    except subprocess.TimeoutExpired:
+        status, output = 'timeout', f"Timed out after {timeout}s"
+    except OSError as e:
+        status, output = 'failed', str(e)
+    finally:
+        if scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
+    return {'name': cert['name'], 'status': status, 'output': output,
+            'duration': round(time.monotonic() - start, 2)}
+
+def renew_lane(certs, command, server, no_verify_ssl, timeout, config_dir):
+    return [renew_one(cert, command, server, no_verify_ssl, timeout, config_dir) for cert in certs]
+
+def renewal_lanes(certs, command, parallel, config_dir):
+    """
+    Group certificates into lanes that may run concurrently; each lane renews its certificates in turn.
+
+    Other clients get a lane per certificate. certbot does too, through a
+    sandboxed config dir, except for the authenticators in
+    SERIAL_AUTHENTICATORS, which share one lane.
+    """
+    if parallel <= 1:
+        return [certs]
+    if not is_certbot(command):
+        return [[cert] for cert in certs]
+    serial = [cert for cert in certs if renewal_authenticator(cert['name'], config_dir) in SERIAL_AUTHENTICATORS]
+    lanes = [[cert] for cert in certs if cert not in serial]
+    return lanes + [serial] if serial else lanes
+
+def renew_certificates(certs, parallel=RENEW_PARALLEL, server=None, no_verify_ssl=False,
+                       command=RENEW_COMMAND, timeout=RENEW_TIMEOUT, config_dir=os.path.dirname(LIVE_DIR)):
+    """
+    Renew the given certificates with at most `parallel` renewals in flight.
+
+    server points the client at another ACME directory, e.g. a local Pebble
+    (https://localhost:14000/dir, which also needs no_verify_ssl).
+    """
+    if not certs:
+        return []
+    lanes = renewal_lanes(certs, command, parallel, config_dir)
+    sandboxed = config_dir if len(lanes) > 1 and is_certbot(command) else None
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, min(parallel, len(lanes)))) as executor:
+        futures = [executor.submit(renew_lane, lane, command, server, no_verify_ssl, timeout, sandboxed)
+                   for lane in lanes]
+        for future in futures:
+            for result in future.result():
+                results.append(result)
+                logging.info(f"{result['name']}: {result['status']} ({result['duration']}s)")
+                if result['status'] != 'ok':
+                    for line in result['output'].splitlines()[-5:]:
+                        logging.error(f"  {result['name']}: {line}")
+    return results
+
+def check_certificates(conf_paths=NGINX_CONF_PATHS, extra_domains=(), live_dir=LIVE_DIR, cache_file=CACHE_FILE):
+    """Return (certificates with their vhosts, vhosts without a certificate)."""
+    certs = load_inventory(live_dir, cache_file)
+    uncovered = match_vhosts(certs, nginx_vhosts(conf_paths, extra_domains))
+    return certs, uncovered
+
+def renew_due(conf_paths=NGINX_CONF_PATHS, extra_domains=(), days=RENEW_BEFORE_DAYS, parallel=RENEW_PARALLEL,
+              server=None, no_verify_ssl=False, include_unused=False, dry_run=False, live_dir=LIVE_DIR, command=None):
+    """Renew only the served certificates that expire within days. Returns the renewal results."""
+    certs, _ = check_certificates(conf_paths, extra_domains, live_dir)
+    due = due_for_renewal(certs, days, include_unused)
+    if not due:
+        logging.info(f"No certificates expire within {days} days.")
+        return []
+    logging.info(f"Due for renewal: {', '.join(cert['name'] for cert in due)}")
+    if dry_run:
+        return [{'name': cert['name'], 'status': 'due', 'output': '', 'duration': 0} for cert in due]
+    variables = load_variables()
+    if server is None:
+        server = variables.get('ACME_SERVER') or None
+    command = command or variables.get('RENEW_COMMAND') or RENEW_COMMAND
+    return renew_certificates(due, parallel, server, no_verify_ssl, command,
+                              config_dir=os.path.dirname(os.path.abspath(live_dir)))
+
+def print_report(certs, uncovered=(), days=RENEW_BEFORE_DAYS):
+    """Print a per-certificate table followed by vhosts that have no certificate."""
+    print(f"{'CERTIFICATE':<32} {'DAYS':>6} {'KEY':<12} {'CHAIN':<6} {'ISSUER':<16} VHOSTS")
+    for cert in certs:
+        marker = '!' if cert['days_left'] <= days else ' '
+        chain = f"{cert['chain_length']}{'' if cert['chain_ok'] else '?'}"
+        vhosts = ', '.join(cert.get('vhosts', [])) or '(unused)'
+        print(f"{cert['name']:<32} {cert['days_left']:>5}{marker} {cert['key_type']:<12} {chain:<6} "
+              f"{(cert['issuer'] or '-'):<16} {vhosts}")
+    for host in uncovered:
+        print(f"No certificate covers {host}")
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        handlers=[logging.StreamHandler()]
+    )
+    parser = argparse.ArgumentParser(description="Inventory TLS certificates and renew the ones close to expiry.")
+    parser.add_argument('action', choices=['list', 'check', 'renew'])
+    parser.add_argument('--days', type=int, default=RENEW_BEFORE_DAYS, help="Renewal window in days")
+    parser.add_argument('--parallel', type=int, default=RENEW_PARALLEL, help="Maximum concurrent renewals")
+    parser.add_argument('--server', help="ACME directory URL (default: ACME_SERVER from variables.conf)")
+    parser.add_argument('--no-verify-ssl', action='store_true', help="Skip TLS verification of the ACME server")
+    parser.add_argument('--command', help="Renewal command with {name}, {domains}, {server} "
+                                          "(default: RENEW_COMMAND from variables.conf, else certbot)")
+    parser.add_argument('--all', action='store_true', help="Also renew certificates no vhost uses")
+    parser.add_argument('--dry-run', action='store_true', help="Only show what would be renewed")
+    parser.add_argument('--nginx-conf', action='append', help="nginx config file or directory to read vhosts from")
+    parser.add_argument('--domain', action='append', default=[], help="Extra vhost to match against certificates")
+    parser.add_argument('--live-dir', default=LIVE_DIR)
+    parser.add_argument('--json', action='store_true', help="Print the inventory as JSON")
+    args = parser.parse_args()
+
+    conf_paths = args.nginx_conf or NGINX_CONF_PATHS
+    if args.action == 'renew':
+        results = renew_due(conf_paths, args.domain, args.days, args.parallel, args.server,
+                            args.no_verify_ssl, args.all, args.dry_run, args.live_dir, args.command)
+        sys.exit(1 if any(result['status'] not in ('ok', 'due') for result in results) else 0)
+
+    certs, uncovered = check_certificates(conf_paths, args.domain, args.live_dir)
+    if args.json:
+        print(json.dumps({'certificates': certs, 'uncovered': uncovered}, indent=2))
+    else:
+        print_report(certs, uncovered, args.days)
+    if args.action == 'check' and (uncovered or due_for_renewal(certs, args.days)):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+
+import argparse
+import logging
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import urllib.request
+
+from utilities.getLatestCrsVersion import CRS_RELEASES_API, get_latest_crs_version
+
+MODSEC_DIR = '/etc/nginx/modsec'
+MODSEC_MAIN_CONF = os.path.join(MODSEC_DIR, 'main.conf')
+# Each version lives in CRS_ROOT/<version>; `current` and `previous` are symlinks into it
+CRS_ROOT = os.path.join(MODSEC_DIR, 'crs')
+CRS_ARCHIVE_URL = "https://github.com/coreruleset/coreruleset/archive/refs/tags/v{version}.tar.gz"
+CRS_KEEP = 3
+# Includes written by the old in-place installer, replaced by the `current` ones
+LEGACY_INCLUDES = re.compile(rf'^Include {re.escape(MODSEC_DIR)}/(crs-setup\.conf|rules/\*\.conf)\n', re.MULTILINE)
+VERSION_PATTERN = re.compile(r'^\d+\.\d+\.\d+[\w.-]*$')
+
+class CrsStoreError(Exception):
+    pass
+
+def current_link(root=CRS_ROOT):
+    return os.path.join(root, 'current')
+
+def previous_link(root=CRS_ROOT):
+    return os.path.join(root, 'previous')
+
+def link_target(link):
+    """Return the version a symlink in the store points at, or None."""
+    try:
+        return os.path.basename(os.readlink(link))
+    except OSError:
+        return None
+
+def installed_versions(root=CRS_ROOT):
+    if not os.path.isdir(root):
+        return []
+    versions = [name for name in os.listdir(root)
+                if VERSION_PATTERN.match(name) and os.path.isdir(os.path.join(root, name))]
+    return sorted(versions, key=lambda v: [int(p) if p.isdigit() else p for p in re.split(r'[.-]', v)])
+
+def safe_members(archive, prefix):
+    """Yield the members under prefix, refusing absolute paths, '..' and links leaving the tree."""
+    for member in archive.getmembers():
+        name = os.path.normpath(member.name)
+        if not name.startswith(prefix) or name.startswith(('/', '..')) or '..' in name.split(os.sep):
+            continue
+        if (member.issym() or member.islnk()) and (os.path.isabs(member.linkname) or '..' in member.linkname):
+            continue
+        yield member
+
+def install_version(version, archive_url=CRS_ARCHIVE_URL, root=CRS_ROOT, timeout=60):
+    """
+    Download and unpack a CRS release into root/<version>.
+
+    Everything is staged in a temporary directory inside root and renamed into
+    place at the end, so a version directory is either complete or absent.
+    crs-setup.conf is carried over from the current version when there is
+    one, so local tuning survives upgrades.
+    """
+    if not VERSION_PATTERN.match(version):
+        raise CrsStoreError(f"Invalid CRS version '{version}'.")
+    target = os.path.join(root, version)
+    if os.path.isdir(target):
+        logging.info(f"CRS {version} is already installed at {target}.")
+        return target
+    os.makedirs(root, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=root, prefix=f".staging-{version}-")
+    try:
+        url = archive_url.format(version=version)
+        logging.info(f"Downloading {url}")
+        archive_file = os.path.join(staging, 'crs.tar.gz')
+        with urllib.request.urlopen(url, timeout=timeout) as response, open(archive_file, 'wb') as f:
+            shutil.copyfileobj(response, f)
+        prefix = f"coreruleset-{version}"
+        with tarfile.open(archive_file, 'r:gz') as archive:
+            archive.extractall(staging, members=list(safe_members(archive, prefix)))
+        unpacked = os.path.join(staging, prefix)
+        if not os.path.isdir(os.path.join(unpacked, 'rules')):
+            raise CrsStoreError(f"{url} has no {prefix}/rules directory.")
+
+        setup_conf = os.path.join(unpacked, 'crs-setup.conf')
+        current_setup = os.path.join(current_link(root), 'crs-setup.conf')
+        if os.path.exists(current_setup):
+            shutil.copy2(current_setup, setup_conf)
+        else:
+            shutil.copy2(f"{setup_conf}.example", setup_conf)
+        os.rename(unpacked, target)
+        logging.info(f"Installed CRS {version} at {target}.")
+        return target
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+def point_link(link, version):
+    """Atomically repoint link at version: build the new symlink aside, then rename it over the old."""
+    staged = f"{link}.new"
+    if os.path.lexists(staged):
+        os.remove(staged)
+    os.symlink(version, staged)
+    os.replace(staged, link)
+
+def ensure_includes(main_conf=MODSEC_MAIN_CONF, root=CRS_ROOT):
+    """
+    Make main.conf include the rules through `current`, dropping the includes of the old installer.
+
+    Returns the previous content (None if main.conf did not exist) so a failed switch can restore it.
+    """
+    current = current_link(root)
+    includes = f"Include {current}/crs-setup.conf\nInclude {current}/rules/*.conf\n"
+    content = ''
+    original = None
+    if os.path.exists(main_conf):
+        with open(main_conf, 'r') as f:
+            content = original = f.read()
+    updated = LEGACY_INCLUDES.sub('', content)
+    if includes not in updated:
+        updated = updated.rstrip('\n') + ('\n' if updated.strip() else '') + includes
+    if updated != content:
+        with open(main_conf, 'w') as f:
+            f.write(updated)
+        logging.info(f"{main_conf} now includes the CRS through {current}.")
+    return original
+
+def restore_main_conf(main_conf, original):
+    """Put main.conf back as ensure_includes found it."""
+    if original is None:
+        if os.path.exists(main_conf):
+            os.remove(main_conf)
+        return
+    with open(main_conf, 'w') as f:
+        f.write(original)
+
+def nginx_test():
+    result = subprocess.run(['nginx', '-t'], capture_output=True, text=True)
+    return result.returncode == 0, result.stderr.strip()
+
+def switch_version(version, root=CRS_ROOT, main_conf=MODSEC_MAIN_CONF, reload=True):
+    """
+    Make version the active rule set.
+
+    `current` is swapped atomically, the config is checked with nginx -t, and
+    on success nginx reloads gracefully: old workers finish their requests
+    with the old rules. If the check fails `current` and main.conf go straight
+    back; on a first install `current` is removed again.
+    """
+    if not os.path.isdir(os.path.join(root, version)):
+        raise CrsStoreError(f"CRS {version} is not installed in {root}.")
+    before = link_target(current_link(root))
+    if before == version:
+        logging.info(f"CRS {version} is already current.")
+        return
+    original = ensure_includes(main_conf, root)
+    point_link(current_link(root), version)
+    ok, output = nginx_test()
+    if not ok:
+        if before:
+            point_link(current_link(root), before)
+        else:
+            os.remove(current_link(root))
+        restore_main_conf(main_conf, original)
+        raise CrsStoreError(f"nginx -t failed with CRS {version}, kept {before or 'none'}:\n{output}")
+    if before:
+        point_link(previous_link(root), before)
+    if reload:
+        subprocess.run(['nginx', '-s', 'reload'], check=True)
+    logging.info(f"Switched CRS from {before or 'none'} to {version}.")
+
+def rollback(root=CRS_ROOT, main_conf=MODSEC_MAIN_CONF):
+    """Switch back to the version that was current before the last switch."""
+    previous = link_target(previous_link(root))
+    if not previous or not os.path.isdir(os.path.join(root, previous)):
+        raise CrsStoreError("No previous CRS version to roll back to.")
+    switch_version(previous, root, main_conf)
+
+def prune_versions(keep=CRS_KEEP, root=CRS_ROOT):
+    """Remove the oldest versions beyond keep, never the current or previous one."""
+    pinned = {link_target(current_link(root)), link_target(previous_link(root))}
+    removable = [v for v in installed_versions(root) if v not in pinned]
+    excess = len(installed_versions(root)) - keep
+    removed = removable[:max(0, excess)]
+    for version in removed:
+        shutil.rmtree(os.path.join(root, version))
+        logging.info(f"Removed CRS {version}.")
+    return removed
+
+def setup_owasp_crs(version=None, api_url=CRS_RELEASES_API, archive_url=CRS_ARCHIVE_URL, root=CRS_ROOT,
+                    main_conf=MODSEC_MAIN_CONF):
+    """Install the given or latest CRS version side by side with the others and switch to it."""
+    version = version or get_latest_crs_version(api_url)
+    if not version:
+        raise CrsStoreError("Failed to determine the latest OWASP CRS version.")
+    install_version(version, archive_url, root)
+    switch_version(version, root, main_conf)
+    prune_versions(root=root)
+    return version
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Install, switch and roll back OWASP CRS versions.")
+    parser.add_argument('command', choices=['latest', 'list', 'install', 'switch', 'upgrade', 'rollback', 'prune'])
+    parser.add_argument('version', nargs='?')
+    parser.add_argument('--root', default=CRS_ROOT)
+    parser.add_argument('--main-conf', default=MODSEC_MAIN_CONF)
+    parser.add_argument('--api-url', default=CRS_RELEASES_API, help="Releases API (e.g. the local mock)")
+    parser.add_argument('--archive-url', default=CRS_ARCHIVE_URL, help="Archive URL with a {version} placeholder")
+    parser.add_argument('--keep', type=int, default=CRS_KEEP)
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'latest':
+            print(get_latest_crs_version(args.api_url))
+        elif args.command == 'list':
+            current, previous = link_target(current_link(args.root)), link_target(previous_link(args.root))
+            for version in installed_versions(args.root):
+                mark = ' (current)' if version == current else ' (previous)' if version == previous else ''
+                print(f"{version}{mark}")
+        elif args.command == 'install':
+            install_version(args.version or get_latest_crs_version(args.api_url), args.archive_url, args.root)
+        elif args.command == 'switch':
+            if not args.version:
+                parser.error("switch needs a version")
+            switch_version(args.version, args.root, args.main_conf)
+        elif args.command == 'upgrade':
+            setup_owasp_crs(args.version, args.api_url, args.archive_url, args.root, args.main_conf)
+        elif args.command == 'rollback':
+            rollback(args.root, args.main_conf)
+        elif args.command == 'prune':
+            prune_versions(args.keep, args.root)
+    except (CrsStoreError, OSError, tarfile.TarError, subprocess.CalledProcessError) as e:
+        logging.error(str(e))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
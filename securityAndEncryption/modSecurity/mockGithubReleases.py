@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import tarfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Stand-in for the GitHub releases API and tag archives crsStore.py uses. Every
+# release is served from the bundled rule set, re-rooted as coreruleset-<version>/.
+# Start it, then run:
+#   crsStore.py upgrade --root /tmp/crs --main-conf /tmp/main.conf \
+#       --api-url http://127.0.0.1:8054/releases/latest --archive-url http://127.0.0.1:8054/v{version}.tar.gz
+BUNDLED_CRS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'coreruleset-4.9.0')
+
+class MockState:
+    def __init__(self, versions, source=BUNDLED_CRS):
+        self.lock = threading.Lock()
+        self.versions = list(versions)
+        self.source = source
+        self.archives = {}
+        self.requests = 0
+        self.not_modified = 0
+
+    def latest(self):
+        return self.versions[-1]
+
+    def archive(self, version):
+        if version not in self.archives:
+            data = io.BytesIO()
+            with tarfile.open(fileobj=data, mode='w:gz') as archive:
+                archive.add(self.source, arcname=f"coreruleset-{version}")
+            self.archives[version] = data.getvalue()
+        return self.archives[version]
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, data=b'', content_type='application/json', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        with self.state.lock:
+            self.state.requests += 1
+            if self.path == '/releases/latest':
+                body = json.dumps({'tag_name': f"v{self.state.latest()}"}).encode()
+                etag = f'"{hashlib.sha1(body).hexdigest()}"'
+                if self.headers.get('If-None-Match') == etag:
+                    self.state.not_modified += 1
+                    self.reply(304, headers={'ETag': etag})
+                else:
+                    self.reply(200, body, headers={'ETag': etag})
+                return
+            match = re.match(r'^/v(.+)\.tar\.gz$', self.path)
+            if match and match.group(1) in self.state.versions:
+                self.reply(200, self.state.archive(match.group(1)), 'application/gzip')
+            else:
+                self.reply(404, json.dumps({'message': 'Not Found'}).encode())
+
+def make_server(versions, port=8054, source=BUNDLED_CRS):
+    handler = type('Handler', (MockHandler,), {'state': MockState(versions, source)})
+    return ThreadingHTTPServer(('127.0.0.1', port), handler)
+
+def serve_in_background(versions, port=8054, source=BUNDLED_CRS):
+    """Return a mock server running in a daemon thread; call .shutdown() to stop it."""
+    server = make_server(versions, port, source)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python3 -m securityAndEncryption.modSecurity.mockGithubReleases <version> [version ...] [--port 8054]  (the last version is latest)")
+        sys.exit(1)
+    args = sys.argv[1:]
+    port = 8054
+    if '--port' in args:
+        port = int(args[args.index('--port') + 1])
+        del args[args.index('--port'):args.index('--port') + 2]
+    server = make_server(args, port)
+    print(f"Mock GitHub releases for CRS {', '.join(args)} on http://127.0.0.1:{port}/releases/latest")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+
+import argparse
+import datetime
+import logging
+import os
+import re
+import subprocess
+import sys
+
+import yaml
+
+from backupAndRecovery.backupEngine import BackupError, backup_paths
+
+MODSEC_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PROFILE = os.path.join(MODSEC_DIR, 'modsecProfile.yaml')
+MODSEC_CONF = '/etc/nginx/modsec/modsecurity.conf'
+# Concurrent audit logging writes one file per transaction here, so nginx workers never share a lock
+AUDIT_STORAGE_DIR = '/var/log/modsec_audit'
+AUDIT_INDEX = '/var/log/modsec_audit.log'
+SNIPPET_DIR = '/etc/nginx/snippets/eos-modsec'
+# Worker user that writes concurrent audit files
+NGINX_USER = 'www-data'
+# Daily re-render, so detection-only sites start blocking on their warmup_until date
+WARMUP_CRON = '/etc/cron.d/eos-modsec-warmup'
+REPO_ROOT = os.path.abspath(os.path.join(MODSEC_DIR, '../..'))
+
+SIZE_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+SIZE_PATTERN = re.compile(r'^(\d+)([kmg]?)$', re.IGNORECASE)
+MODES = {'on': 'On', 'detection-only': 'DetectionOnly', 'off': 'Off'}
+
+class ProfileError(Exception):
+    pass
+
+def parse_size(value):
+    """Parse an nginx-style size (512k, 20m) into bytes."""
+    match = SIZE_PATTERN.match(str(value).strip())
+    if not match:
+        raise ProfileError(f"Invalid size '{value}', use e.g. 512k or 20m.")
+    return int(match.group(1)) * SIZE_UNITS[match.group(2).lower()]
+
+def load_profile(profile_file=DEFAULT_PROFILE):
+    """Return (engine settings, {site: settings}) with the defaults merged into each site."""
+    with open(profile_file, 'r') as f:
+        document = yaml.safe_load(f) or {}
+    defaults = document.get('defaults') or {}
+    sites = {}
+    for site, settings in (document.get('sites') or {}).items():
+        settings = dict(defaults, **(settings or {}))
+        if str(settings.get('mode', 'on')) not in MODES:
+            raise ProfileError(f"{site}: mode must be one of {', '.join(MODES)}.")
+        for key in ('body_limit', 'no_files_body_limit'):
+            if settings.get(key) is not None:
+                parse_size(settings[key])
+        sites[site] = settings
+    return document.get('engine') or {}, sites
+
+def engine_directives(engine):
+    """Return the modsecurity.conf directives of the throughput profile, in order."""
+    mime_types = ' '.join(engine.get('response_mime_types') or ['text/plain', 'text/html', 'text/xml'])
+    return [
+        ('SecRequestBodyAccess', 'On'),
+        # Over-limit bodies are rejected rather than partially inspected, so nothing slips past the rules
+        ('SecRequestBodyLimitAction', 'Reject'),
+        ('SecResponseBodyAccess', 'On'),
+        ('SecResponseBodyMimeType', mime_types),
+        ('SecResponseBodyLimit', str(int(engine.get('response_body_limit', 524288)))),
+        # Past the limit the rest of the response is streamed unchecked instead of being buffered
+        ('SecResponseBodyLimitAction', 'ProcessPartial'),
+        ('SecPcreMatchLimit', str(int(engine.get('pcre_match_limit', 100000)))),
+        ('SecPcreMatchLimitRecursion', str(int(engine.get('pcre_match_limit_recursion', 100000)))),
+        ('SecTmpSaveUploadedFiles', 'Off'),
+        ('SecDebugLogLevel', '0'),
+        ('SecAuditEngine', 'RelevantOnly'),
+        ('SecAuditLogRelevantStatus', f'"{engine.get("audit_relevant_status", "^(?:5|4(?!04))")}"'),
+        ('SecAuditLogParts', 'ABIJDEFHZ'),
+        ('SecAuditLogType', 'Concurrent'),
+        ('SecAuditLogFormat', str(engine.get('audit_format', 'JSON'))),
+        ('SecAuditLog', AUDIT_INDEX),
+        ('SecAuditLogStorageDir', AUDIT_STORAGE_DIR),
+    ]
+
+def set_directive(content, name, value):
+    """Replace the first active or commented-out occurrence of a directive, or append it."""
+    line = f"{name} {value}"
+    for pattern in (rf'^{name}\s.*$', rf'^#\s*{name}\s.*$'):
+        regex = re.compile(pattern, re.MULTILINE)
+        if regex.search(content):
+            return regex.sub(lambda _: line, content, count=1)
+    return content.rstrip('\n') + f"\n{line}\n"
+
+def render_engine_conf(content, engine, rule_engine='On'):
+    """Apply the throughput profile to the text of modsecurity.conf."""
+    content = set_directive(content, 'SecRuleEngine', rule_engine)
+    for name, value in engine_directives(engine):
+        content = set_directive(content, name, value)
+    return content
+
+def site_mode(settings, today=None):
+    """Return the SecRuleEngine value for a site; detection-only ends on its warmup_until date."""
+    mode = str(settings.get('mode', 'on'))
+    until = settings.get('warmup_until')
+    if mode == 'detection-only' and until:
+        today = today or datetime.date.today()
+        if today >= datetime.date.fromisoformat(str(until)):
+            mode = 'on'
+    return MODES[mode]
+
+def render_site_snippet(site, settings, today=None):
+    """Render the server-level nginx directives for a site's body limits and rule engine mode."""
+    body_limit = parse_size(settings.get('body_limit', '1m'))
+    no_files_limit = parse_size(settings.get('no_files_body_limit', '128k'))
+    rules = [
+        f"SecRequestBodyLimit {body_limit}",
+        f"SecRequestBodyNoFilesLimit {min(no_files_limit, body_limit)}",
+        f"SecRuleEngine {site_mode(settings, today)}",
+    ]
+    lines = [f"# Generated by modsecProfile.py for {site}",
+             # nginx refuses larger bodies before they are buffered for the WAF
+             f"client_max_body_size {settings.get('body_limit', '1m')};",
+             "modsecurity_rules '"]
+    lines += [f"    {rule}" for rule in rules]
+    lines.append("';")
+    return "\n".join(lines) + "\n"
+
+def snippet_path(site, snippet_dir=SNIPPET_DIR):
+    return os.path.join(snippet_dir, f"{site}.conf")
+
+def waf_include(site):
+    """Return the include line for a site's WAF snippet, or '' if none was generated."""
+    path = snippet_path(site)
+    return f"        include {path};\n\n" if os.path.exists(path) else ""
+
+def pending_warmups(sites, today=None):
+    """Sites still in detection-only that switch to blocking on a later warmup_until date."""
+    return [site for site, settings in sites.items()
+            if settings.get('warmup_until') and site_mode(settings, today) == 'DetectionOnly']
+
+def write_warmup_cron(profile_file, sites, cron_file=WARMUP_CRON):
+    """Install the daily refresh while a warmup is pending, and remove it once none is. Returns the path or None."""
+    if not pending_warmups(sites):
+        if os.path.exists(cron_file):
+            os.remove(cron_file)
+        return None
+    with open(cron_file, 'w') as f:
+        f.write("# Generated by modsecProfile.py: ends detection-only warmups on their warmup_until date\n"
+                f"10 0 * * * root cd {REPO_ROOT} && python3 -m securityAndEncryption.modSecurity.modsecProfile "
+                f"refresh {os.path.abspath(profile_file)}\n")
+    return cron_file
+
+def write_site_snippets(sites, snippet_dir=SNIPPET_DIR):
+    """Write one snippet per site. Returns (paths written, paths whose content changed)."""
+    os.makedirs(snippet_dir, exist_ok=True)
+    written, changed = [], []
+    for site, settings in sites.items():
+        path = snippet_path(site, snippet_dir)
+        content = render_site_snippet(site, settings)
+        previous = None
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                previous = f.read()
+        if previous != content:
+            with open(path, 'w') as f:
+                f.write(content)
+            changed.append(path)
+        written.append(path)
+    return written, changed
+
+def refresh_sites(profile_file=DEFAULT_PROFILE, snippet_dir=SNIPPET_DIR):
+    """Re-render the site snippets and reload nginx if a warmup ended. Returns the changed paths."""
+    _, sites = load_profile(profile_file)
+    _, changed = write_site_snippets(sites, snippet_dir)
+    if changed:
+        subprocess.run(['nginx', '-t'], check=True)
+        subprocess.run(['nginx', '-s', 'reload'], check=True)
+    write_warmup_cron(profile_file, sites)
+    return changed
+
+def prepare_audit_dir(storage_dir=AUDIT_STORAGE_DIR, user=NGINX_USER):
+    """Create the concurrent audit log directory writable by the nginx workers."""
+    import pwd
+    os.makedirs(storage_dir, mode=0o750, exist_ok=True)
+    try:
+        entry = pwd.getpwnam(user)
+        os.chown(storage_dir, entry.pw_uid, entry.pw_gid)
+    except (KeyError, PermissionError) as e:
+        logging.warning(f"Could not hand {storage_dir} to {user}: {e}")
+
+def write_atomic(path, content):
+    with open(f"{path}.tmp", 'w') as f:
+        f.write(content)
+    os.replace(f"{path}.tmp", path)
+
+def write_profile(profile_file=DEFAULT_PROFILE, modsec_conf=MODSEC_CONF, snippet_dir=SNIPPET_DIR,
+                  rule_engine='On'):
+    """
+    Rewrite modsecurity.conf with the engine profile and write one snippet per site. Returns the paths.
+
+    modsecurity.conf and main.conf are backed up first and restored when
+    nginx -t rejects the result.
+    """
+    engine, sites = load_profile(profile_file)
+    with open(modsec_conf, 'r') as f:
+        content = f.read()
+    changes = {modsec_conf: (content, render_engine_conf(content, engine, rule_engine))}
+    # setupModSecurity's main.conf sets SecRuleEngine after including modsecurity.conf, so it has the last word
+    main_conf = os.path.join(os.path.dirname(modsec_conf), 'main.conf')
+    if os.path.exists(main_conf):
+        with open(main_conf, 'r') as f:
+            content = f.read()
+        if re.search(r'^SecRuleEngine\s', content, re.MULTILINE):
+            changes[main_conf] = (content, set_directive(content, 'SecRuleEngine', rule_engine))
+    try:
+        manifest = backup_paths(list(changes), 'modsec-profile')
+        logging.info(f"Backed up {len(changes)} file(s) as snapshot {manifest['id']}.")
+    except (BackupError, OSError) as e:
+        logging.warning(f"Backup before writing the profile failed: {e}")
+    for path, (_, new) in changes.items():
+        write_atomic(path, new)
+    written = list(changes)
+    prepare_audit_dir()
+    written += write_site_snippets(sites, snippet_dir)[0]
+    result = subprocess.run(['nginx', '-t'], capture_output=True, text=True)
+    if result.returncode != 0:
+        for path, (old, _) in changes.items():
+            write_atomic(path, old)
+        raise ProfileError(f"nginx -t rejected the profile, restored {', '.join(changes)}:\n{result.stderr.strip()}")
+    cron_file = write_warmup_cron(profile_file, sites)
+    if cron_file:
+        written.append(cron_file)
+    return written
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Write the ModSecurity throughput profile and per-site WAF limits.")
+    parser.add_argument('command', choices=['render', 'write', 'refresh'],
+                        help="refresh re-renders only the site snippets and reloads nginx if one changed")
+    parser.add_argument('profile', nargs='?', default=DEFAULT_PROFILE)
+    parser.add_argument('--conf', default=MODSEC_CONF, help="modsecurity.conf to rewrite")
+    parser.add_argument('--detection-only', action='store_true',
+                        help="Run the whole engine in DetectionOnly, e.g. while warming up a new host")
+    args = parser.parse_args()
+    rule_engine = 'DetectionOnly' if args.detection_only else 'On'
+
+    try:
+        if args.command == 'render':
+            engine, sites = load_profile(args.profile)
+            print(f"# {args.conf}")
+            print(f"SecRuleEngine {rule_engine}")
+            for name, value in engine_directives(engine):
+                print(f"{name} {value}")
+            for site, settings in sites.items():
+                print(f"\n# {snippet_path(site)}\n{render_site_snippet(site, settings)}", end='')
+        elif args.command == 'refresh':
+            for path in refresh_sites(args.profile):
+                print(f"Updated {path}")
+        else:
+            for path in write_profile(args.profile, args.conf, rule_engine=rule_engine):
+                print(f"Wrote {path}")
+            print("Run: sudo nginx -s reload")
+    except (OSError, ProfileError, ValueError, yaml.YAMLError, subprocess.CalledProcessError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
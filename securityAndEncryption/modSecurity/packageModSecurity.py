@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+
+import datetime
+import hashlib
+import io
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tarfile
+import urllib.request
+
+from utilities.loadVariables import load_variables
+
+LIBMODSECURITY_PREFIX = "/usr/local/modsecurity"
+MODSEC_SRC_DIR = "/usr/local/src/ModSecurity"
+NGINX_MODULES_DIR = "/usr/share/nginx/modules"
+MODULE_NAME = "ngx_http_modsecurity_module.so"
+
+# Files from the ModSecurity source tree that load_connector_module() reads at install time
+MODSEC_SRC_FILES = ["modsecurity.conf-recommended", "unicode.mapping"]
+
+_variables = load_variables()
+ARTIFACT_DIR = _variables.get("MODSEC_ARTIFACT_DIR", "/opt/cyberMonkey/artifacts/modsecurity")
+ARTIFACT_URL = _variables.get("MODSEC_ARTIFACT_URL", "")
+
+def sha256sum(path):
+    """Return the hex sha256 of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def get_architecture():
+    """Return the Debian architecture name (amd64, arm64, ...)."""
+    try:
+        return subprocess.check_output(["dpkg", "--print-architecture"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return platform.machine()
+
+def get_installed_nginx_version():
+    """Return the version of the installed nginx binary, e.g. 1.24.0."""
+    try:
+        # nginx -v prints "nginx version: nginx/1.24.0 (Ubuntu)" to stderr
+        result = subprocess.run(["nginx", "-v"], capture_output=True, text=True)
+        return result.stderr.strip().split("/", 1)[1].split()[0]
+    except (OSError, IndexError):
+        return None
+
+def artifact_name(codename, nginx_version, arch):
+    return f"modsecurity-nginx_{nginx_version}_{codename}_{arch}.tar.gz"
+
+def git_revision(path):
+    try:
+        return subprocess.check_output(["git", "-C", path, "rev-parse", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def detect_runtime_packages(library):
+    """Map the shared libraries that library links against to the Debian packages providing them."""
+    packages = set()
+    try:
+        ldd_output = subprocess.check_output(["ldd", library], text=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        logging.warning(f"Could not inspect {library} with ldd: {e}")
+        return []
+    for line in ldd_output.splitlines():
+        if "=>" not in line:
+            continue
+        path = line.split("=>", 1)[1].split("(")[0].strip()
+        if not path.startswith("/"):
+            continue
+        result = subprocess.run(["dpkg", "-S", os.path.realpath(path)], capture_output=True, text=True)
+        if result.returncode == 0:
+            packages.add(result.stdout.split(":", 1)[0])
+    # libc is always present and pinning it would only cause spurious installs
+    packages.discard("libc6")
+    return sorted(packages)
+
+def collect_files(nginx_src_dir):
+    """Return (path on disk, path inside the artifact) pairs for everything the package ships."""
+    files = []
+    for root, dirs, names in os.walk(LIBMODSECURITY_PREFIX):
+        for name in names:
+            path = os.path.join(root, name)
+            files.append((path, path.lstrip("/")))
+    module_path = os.path.join(nginx_src_dir, "objs", MODULE_NAME)
+    if not os.path.exists(module_path):
+        module_path = os.path.join(NGINX_MODULES_DIR, MODULE_NAME)
+    files.append((module_path, os.path.join(NGINX_MODULES_DIR, MODULE_NAME).lstrip("/")))
+    for name in MODSEC_SRC_FILES:
+        path = os.path.join(MODSEC_SRC_DIR, name)
+        if os.path.exists(path):
+            files.append((path, path.lstrip("/")))
+    return files
+
+def build_package(codename, nginx_version, output_dir=ARTIFACT_DIR, compile_first=False):
+    """
+    Package libmodsecurity and the nginx connector for one (codename, nginx version).
+
+    The tarball holds the files at their install paths plus a manifest.json with
+    per-file checksums and the runtime packages they need. A sha256sum-style
+    sidecar sits next to it so hosts can verify the download before extracting.
+    """
+    if compile_first:
+        # Imported here so installing an artifact never pulls in the build steps
+        from securityAndEncryption.modSecurity.setupModSecurity import download_source, install_libmodsecurity, compile_nginx_connector
+        nginx_version = download_source()
+        install_libmodsecurity()
+        compile_nginx_connector(nginx_version)
+
+    nginx_src_dir = f"/usr/local/src/nginx/nginx-{nginx_version}"
+    library = os.path.join(LIBMODSECURITY_PREFIX, "lib", "libmodsecurity.so")
+    if not os.path.exists(library):
+        logging.error(f"libmodsecurity not found at {library}. Build it first or pass --build.")
+        return None
+
+    files = collect_files(nginx_src_dir)
+    missing = [src for src, _ in files if not os.path.lexists(src)]
+    if missing:
+        logging.error(f"Cannot package, missing build outputs: {', '.join(missing)}")
+        return None
+
+    arch = get_architecture()
+    manifest = {
+        "name": "modsecurity-nginx",
+        "codename": codename,
+        "nginx_version": nginx_version,
+        "arch": arch,
+        "modsecurity_revision": git_revision(MODSEC_SRC_DIR),
+        "connector_revision": git_revision("/usr/local/src/ModSecurity-nginx"),
+        "built_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "runtime_packages": detect_runtime_packages(library),
+        "files": {arcname: sha256sum(src) for src, arcname in files if not os.path.islink(src)},
+    }
+
+    os.makedirs(output_dir, exist_ok=True)
+    artifact = os.path.join(output_dir, artifact_name(codename, nginx_version, arch))
+    with tarfile.open(f"{artifact}.tmp", "w:gz") as tar:
+        manifest_bytes = json.dumps(manifest, indent=2).encode()
+        info = tarfile.TarInfo("manifest.json")
+        info.size = len(manifest_bytes)
+        tar.addfile(info, io.BytesIO(manifest_bytes))
+        for src, arcname in files:
+            tar.add(src, arcname=arcname, recursive=False)
+    os.replace(f"{artifact}.tmp", artifact)
+
+    with open(f"{artifact}.sha256", "w") as f:
+        f.write(f"{sha256sum(artifact)}  {os.path.basename(artifact)}\n")
+    with open(f"{artifact}.manifest.json", "w") as f:
+        json.dump(manifest, f, indent=2)
+    logging.info(f"Built {artifact} ({len(files)} files).")
+    return artifact
+
+def fetch_artifact(name, artifact_dir=ARTIFACT_DIR, artifact_url=ARTIFACT_URL):
+    """Return the local path of an artifact, downloading it from artifact_url if needed."""
+    artifact = os.path.join(artifact_dir, name)
+    if os.path.exists(artifact) and os.path.exists(f"{artifact}.sha256"):
+        return artifact
+    if not artifact_url:
+        return None
+    os.makedirs(artifact_dir, exist_ok=True)
+    try:
+        for suffix in (".sha256", ""):
+            url = f"{artifact_url.rstrip('/')}/{name}{suffix}"
+            with urllib.request.urlopen(url, timeout=30) as response, open(f"{artifact}{suffix}.part", "wb") as f:
+                shutil.copyfileobj(response, f)
+            os.replace(f"{artifact}{suffix}.part", f"{artifact}{suffix}")
+        logging.info(f"Downloaded {name} from {artifact_url}.")
+        return artifact
+    except OSError as e:
+        logging.info(f"No prebuilt artifact at {artifact_url} ({e}).")
+        return None
+
+def inside_install_dirs(name):
+    """True if the archive path lies in one of the directories an artifact may write to."""
+    name = os.path.normpath(name)
+    if os.path.isabs(name) or name == ".." or name.startswith("../"):
+        return False
+    return any(name == prefix.lstrip("/") or name.startswith(prefix.lstrip("/") + "/")
+               for prefix in (LIBMODSECURITY_PREFIX, NGINX_MODULES_DIR, MODSEC_SRC_DIR))
+
+def member_allowed(member):
+    """Regular files, directories and links inside the install directories, with links pointing inside too."""
+    if not inside_install_dirs(member.name):
+        return False
+    if member.issym():
+        # Relative targets resolve from the link's directory, absolute ones from / where the archive is unpacked
+        if os.path.isabs(member.linkname):
+            target = member.linkname.lstrip("/")
+        else:
+            target = os.path.join(os.path.dirname(member.name), member.linkname)
+        return inside_install_dirs(target)
+    if member.islnk():
+        return inside_install_dirs(member.linkname)
+    return member.isfile() or member.isdir()
+
+def install_package(artifact):
+    """Verify and unpack an artifact onto this host. Returns True on success."""
+    with open(f"{artifact}.sha256", "r") as f:
+        expected = f.read().split()[0]
+    if sha256sum(artifact) != expected:
+        logging.error(f"Checksum mismatch for {artifact}, refusing to install.")
+        return False
+
+    with tarfile.open(artifact, "r:gz") as tar:
+        manifest = json.load(tar.extractfile("manifest.json"))
+        members = []
+        for member in tar.getmembers():
+            if member.name == "manifest.json":
+                continue
+            if not member_allowed(member):
+                logging.error(f"Unexpected path {member.name} in {artifact}, refusing to install.")
+                return False
+            members.append(member)
+        tar.extractall("/", members=members)
+
+    for path, checksum in manifest["files"].items():
+        if sha256sum(os.path.join("/", path)) != checksum:
+            logging.error(f"Installed file /{path} does not match the manifest.")
+            return False
+
+    if manifest["runtime_packages"]:
+        # Fresh hosts have stale or empty package lists
+        subprocess.run(["apt", "update"], check=True)
+        subprocess.run(["apt", "install", "-y"] + manifest["runtime_packages"], check=True)
+    subprocess.run(["ldconfig"], check=True)
+    logging.info(f"Installed prebuilt ModSecurity {manifest['modsecurity_revision']} "
+                 f"for nginx {manifest['nginx_version']} ({manifest['codename']}).")
+    return True
+
+def install_prebuilt_module(codename, nginx_version):
+    """Install the artifact matching this host if one exists. Returns False on a miss."""
+    if not codename or not nginx_version:
+        return False
+    name = artifact_name(codename, nginx_version, get_architecture())
+    artifact = fetch_artifact(name)
+    if not artifact:
+        logging.info(f"No prebuilt artifact {name}, falling back to building from source.")
+        return False
+    try:
+        return install_package(artifact)
+    except (OSError, KeyError, tarfile.TarError, subprocess.CalledProcessError) as e:
+        logging.error(f"Failed to install {artifact}: {e}")
+        return False
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        handlers=[logging.StreamHandler()]
+    )
+    if len(sys.argv) < 2:
+        print("Usage: eos modsec-package [--build [--compile] [output_dir] | --install [artifact] | --list [artifact_dir]]")
+        sys.exit(1)
+
+    flag = sys.argv[1]
+    if flag == "--build":
+        from securityAndEncryption.modSecurity.setupModSecurity import get_ubuntu_codename
+        compile_first = "--compile" in sys.argv[2:]
+        args = [arg for arg in sys.argv[2:] if arg != "--compile"]
+        artifact = build_package(get_ubuntu_codename(), get_installed_nginx_version(),
+                                 args[0] if args else ARTIFACT_DIR, compile_first)
+        sys.exit(0 if artifact else 1)
+    elif flag == "--install":
+        if len(sys.argv) > 2:
+            installed = install_package(sys.argv[2])
+        else:
+            from securityAndEncryption.modSecurity.setupModSecurity import get_ubuntu_codename
+            installed = install_prebuilt_module(get_ubuntu_codename(), get_installed_nginx_version())
+        sys.exit(0 if installed else 1)
+    elif flag == "--list":
+        artifact_dir = sys.argv[2] if len(sys.argv) > 2 else ARTIFACT_DIR
+        for name in sorted(os.listdir(artifact_dir)) if os.path.isdir(artifact_dir) else []:
+            if name.endswith(".tar.gz"):
+                print(name)
+    else:
+        print(f"Unknown option: {flag}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,690 @@
+#!/usr/bin/env python3
+
+import argparse
+import glob
+import json
+import math
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from re import _constants as sre, _parser as sre_parse
+except ImportError:
+    import sre_constants as sre
+    import sre_parse
+
+from securityAndEncryption.modSecurity.modsecProfile import DEFAULT_PROFILE, load_profile
+from securityAndEncryption.modSecurity.wafBench import crs_dir
+
+# Possessive repeats and atomic groups only parse on Python 3.11+; older versions never produce them
+POSSESSIVE_REPEAT = getattr(sre, 'POSSESSIVE_REPEAT', None)
+ATOMIC_GROUP = getattr(sre, 'ATOMIC_GROUP', None)
+# Local rules are picked up next to the CRS, e.g. exclusions and site-specific SecRules
+CUSTOM_RULES = ['/etc/nginx/modsec/*.conf', '/etc/nginx/modsec/custom/*.conf']
+# Repeats allowing at least this many iterations are treated like unbounded ones
+WIDE_REPEAT = 8
+PROBE_LENGTH = 16
+LENGTHS = [8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096]
+# Five times the stock SecPcreMatchLimit: anything past it needs attention either way
+STEP_BUDGET = 500_000
+GROWTH = ['linear', 'quadratic', 'cubic', 'exponential']
+
+SECRULE_PATTERN = re.compile(r'^\s*SecRule\s+(\S+)\s+"((?:[^"\\]|\\.)*)"(?:\s+"((?:[^"\\]|\\.)*)")?', re.DOTALL)
+ID_PATTERN = re.compile(r'\bid:\'?(\d+)')
+ALPHABET = [chr(c) for c in range(256)]
+# Preferred characters when building inputs, so reports stay readable
+PREFERRED = "a0 !,;'\"<(/.-=&\\\n\x00"
+SUFFIXES = ['', '\x00', '!', ' ', "'", '"', '\n', '>', '=']
+REPEATS = (sre.MAX_REPEAT, sre.MIN_REPEAT)
+DIGITS = frozenset('0123456789')
+WORD = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_')
+SPACE = frozenset(' \t\n\r\f\v')
+CATEGORIES = {
+    sre.CATEGORY_DIGIT: lambda c: c in DIGITS, sre.CATEGORY_NOT_DIGIT: lambda c: c not in DIGITS,
+    sre.CATEGORY_WORD: lambda c: c in WORD, sre.CATEGORY_NOT_WORD: lambda c: c not in WORD,
+    sre.CATEGORY_SPACE: lambda c: c in SPACE, sre.CATEGORY_NOT_SPACE: lambda c: c not in SPACE,
+}
+
+class Unsupported(Exception):
+    pass
+
+class BudgetExceeded(Exception):
+    pass
+
+def extract_rules(paths):
+    """Return the @rx rules of the given files as dicts with id, file, line and pattern."""
+    rules = []
+    for path in paths:
+        with open(path, 'r', errors='replace') as f:
+            lines = f.read().split('\n')
+        parent = None
+        index = 0
+        while index < len(lines):
+            start = index
+            statement = lines[index]
+            while statement.endswith('\\') and index + 1 < len(lines):
+                index += 1
+                statement = statement[:-1] + lines[index]
+            index += 1
+            match = SECRULE_PATTERN.match(statement)
+            if not match:
+                continue
+            operator, actions = match.group(2), match.group(3) or ''
+            rule_id = ID_PATTERN.search(actions)
+            rule_id = rule_id.group(1) if rule_id else f"{parent or '?'}+chain"
+            parent = rule_id if re.search(r'\bchain\b', actions) else None
+            operator = operator.lstrip('!')
+            if operator.startswith('@') and not operator.startswith('@rx '):
+                continue
+            pattern = operator[4:] if operator.startswith('@rx ') else operator
+            rules.append({'id': rule_id, 'file': path, 'line': start + 1, 'pattern': pattern.replace('\\"', '"')})
+    return rules
+
+def to_python(pattern):
+    """Translate the PCRE-only syntax the CRS uses into its Python re equivalent."""
+    if '%{' in pattern:
+        raise Unsupported("pattern uses a macro expanded at runtime")
+    pattern = re.sub(r'\\x\{([0-9a-fA-F]+)\}', lambda m: f"\\U{int(m.group(1), 16):08x}", pattern)
+    pattern = re.sub(r'\(\?<([A-Za-z_])', r'(?P<\1', pattern)
+    # PCRE takes (?i) anywhere, e.g. ^(?i)...; Python only at the start, which is close enough here
+    inline = ''.join(re.findall(r'(?<!\\)\(\?([imsx]+)\)', pattern))
+    if inline:
+        pattern = f"(?{''.join(sorted(set(inline)))})" + re.sub(r'(?<!\\)\(\?[imsx]+\)', '', pattern)
+    return pattern.replace('\\z', '\\Z')
+
+def parse(pattern):
+    try:
+        tree = sre_parse.parse(to_python(pattern))
+    except (re.error, OverflowError, RecursionError) as e:
+        raise Unsupported(f"does not parse: {e}")
+    return tree, tree.state.flags
+
+def char_test(op, av, flags):
+    """Return a predicate for a single-character item, ASCII classes as PCRE uses them."""
+    if op == sre.LITERAL:
+        test = lambda c, ch=chr(av): c == ch
+    elif op == sre.NOT_LITERAL:
+        test = lambda c, ch=chr(av): c != ch
+    elif op == sre.ANY:
+        test = (lambda c: True) if flags & sre.SRE_FLAG_DOTALL else (lambda c: c != '\n')
+    elif op == sre.IN:
+        negate = False
+        literals, ranges, categories = set(), [], []
+        for item_op, item_av in av:
+            if item_op == sre.NEGATE:
+                negate = True
+            elif item_op == sre.LITERAL:
+                literals.add(chr(item_av))
+            elif item_op == sre.RANGE:
+                ranges.append((chr(item_av[0]), chr(item_av[1])))
+            elif item_op == sre.CATEGORY:
+                categories.append(CATEGORIES[item_av])
+            else:
+                raise Unsupported(f"character class item {item_op}")
+        literals = frozenset(literals)
+
+        def test(c):
+            found = c in literals or any(lo <= c <= hi for lo, hi in ranges) or any(t(c) for t in categories)
+            return found != negate
+    else:
+        return None
+    if flags & sre.SRE_FLAG_IGNORECASE:
+        return lambda c, test=test: test(c) or test(c.swapcase())
+    return test
+
+def scoped_flags(av, flags):
+    group, add_flags, del_flags, body = av
+    return body, (flags | add_flags) & ~del_flags
+
+def item_chars(item, flags):
+    """All characters an item can consume (over the 8-bit alphabet)."""
+    op, av = item
+    test = char_test(op, av, flags)
+    if test is not None:
+        return frozenset(c for c in ALPHABET if test(c))
+    if op == sre.BRANCH:
+        return frozenset().union(*(seq_chars(alt, flags) for alt in av[1]))
+    if op == sre.SUBPATTERN:
+        return seq_chars(*scoped_flags(av, flags))
+    if op in REPEATS or op == POSSESSIVE_REPEAT:
+        return seq_chars(av[2], flags) if av[1] else frozenset()
+    if op == ATOMIC_GROUP:
+        return seq_chars(av, flags)
+    if op in (sre.GROUPREF, sre.GROUPREF_EXISTS):
+        return frozenset(ALPHABET)
+    return frozenset()
+
+def seq_chars(seq, flags):
+    return frozenset().union(*(item_chars(item, flags) for item in seq))
+
+def item_min(item, flags=0):
+    op, av = item
+    if char_test(op, av, flags) is not None:
+        return 1
+    if op == sre.BRANCH:
+        return min(seq_min(alt) for alt in av[1])
+    if op == sre.SUBPATTERN:
+        return seq_min(av[3])
+    if op in REPEATS or op == POSSESSIVE_REPEAT:
+        return av[0] * seq_min(av[2])
+    if op == ATOMIC_GROUP:
+        return seq_min(av)
+    return 0
+
+def seq_min(seq):
+    return sum(item_min(item) for item in seq)
+
+def item_first(item, flags):
+    op, av = item
+    if char_test(op, av, flags) is not None:
+        return item_chars(item, flags)
+    if op == sre.BRANCH:
+        return frozenset().union(*(seq_first(alt, flags) for alt in av[1]))
+    if op == sre.SUBPATTERN:
+        return seq_first(*scoped_flags(av, flags))
+    if (op in REPEATS or op == POSSESSIVE_REPEAT) and av[1]:
+        return seq_first(av[2], flags)
+    if op == ATOMIC_GROUP:
+        return seq_first(av, flags)
+    return frozenset()
+
+def seq_first(seq, flags):
+    first = frozenset()
+    for item in seq:
+        first |= item_first(item, flags)
+        if item_min(item, flags):
+            break
+    return first
+
+def is_wide(item):
+    op, av = item
+    return op in REPEATS and av[1] - av[0] >= WIDE_REPEAT
+
+def sample_seq(seq, flags):
+    """A short string matching seq, used to reach the part of a pattern that backtracks."""
+    out = []
+    for op, av in seq:
+        test = char_test(op, av, flags)
+        if test is not None:
+            out.append(next((c for c in PREFERRED + ''.join(ALPHABET) if test(c)), ''))
+        elif op == sre.BRANCH:
+            out.append(min((sample_seq(alt, flags) for alt in av[1]), key=len))
+        elif op == sre.SUBPATTERN:
+            out.append(sample_seq(*scoped_flags(av, flags)))
+        elif op in REPEATS or op == POSSESSIVE_REPEAT:
+            out.append(sample_seq(av[2], flags) * av[0])
+        elif op == ATOMIC_GROUP:
+            out.append(sample_seq(av, flags))
+    return ''.join(out)
+
+def pick(chars, limit=3):
+    ordered = [c for c in PREFERRED if c in chars] + sorted(c for c in chars if c not in PREFERRED)
+    return ordered[:limit]
+
+def wide_repeats(seq, flags):
+    """Wide repeats inside seq, not looking into atomic groups or lookarounds which never backtrack into."""
+    for op, av in seq:
+        if op in REPEATS:
+            if av[1] - av[0] >= WIDE_REPEAT:
+                yield (op, av), flags
+            yield from wide_repeats(av[2], flags)
+        elif op == sre.SUBPATTERN:
+            yield from wide_repeats(*scoped_flags(av, flags))
+        elif op == sre.BRANCH:
+            for alt in av[1]:
+                yield from wide_repeats(alt, flags)
+
+def branches(seq, flags):
+    for op, av in seq:
+        if op == sre.BRANCH:
+            yield av[1], flags
+        elif op == sre.SUBPATTERN:
+            yield from branches(*scoped_flags(av, flags))
+
+def find_risks(seq, flags, prefix=''):
+    """
+    Statically flag constructs that can backtrack super-linearly.
+
+    nested-quantifier        a wide repeat inside a wide repeat that can also start the next
+                             outer iteration, e.g. (\\w+\\s?)+ : exponential
+    overlapping-alternation  alternatives of a repeated group that start with the same
+                             characters, e.g. (a|ab)+ : exponential
+    adjacent-quantifiers     wide repeats in a row (optionally around characters both accept)
+                             that can split the same run of input, e.g. \\s*\\w*\\s* or .*,.* :
+                             polynomial
+    Each finding carries a prefix that reaches the construct and the characters to pump it with.
+    The tree comes from Python's parser, which has already factored common prefixes out of
+    alternations and merged single-character alternatives into classes, so (\\w|\\d)+ is not seen.
+    """
+    findings = []
+    for index, (op, av) in enumerate(seq):
+        item = (op, av)
+        reach = prefix + sample_seq(seq[:index], flags)
+        if is_wide(item):
+            body = av[2]
+            first = seq_first(body, flags)
+            for inner, inner_flags in wide_repeats(body, flags):
+                overlap = seq_chars(inner[1][2], inner_flags) & first
+                if overlap:
+                    findings.append({'kind': 'nested-quantifier', 'growth': 'exponential',
+                                     'prefix': reach, 'pump': pick(overlap)})
+                    break
+            for alternatives, alt_flags in branches(body, flags):
+                for i, left in enumerate(alternatives):
+                    for right in alternatives[i + 1:]:
+                        overlap = seq_first(left, alt_flags) & seq_first(right, alt_flags)
+                        if overlap and seq_chars(left, alt_flags) & seq_chars(right, alt_flags):
+                            findings.append({'kind': 'overlapping-alternation', 'growth': 'exponential',
+                                             'prefix': reach, 'pump': pick(overlap)})
+                            break
+            chars = seq_chars(body, flags)
+            between = set()
+            for later in seq[index + 1:]:
+                if is_wide(later):
+                    overlap = chars & seq_chars(later[1][2], flags)
+                    if overlap:
+                        findings.append({'kind': 'adjacent-quantifiers', 'growth': 'polynomial', 'prefix': reach,
+                                         'pump': pick(between & overlap) + pick(overlap - between, 2)})
+                        break
+                    if item_min(later, flags):
+                        break
+                elif item_min(later, flags) == 0:
+                    continue
+                else:
+                    later_chars = item_chars(later, flags)
+                    if char_test(*later, flags) is None or not later_chars <= chars:
+                        break
+                    between |= later_chars
+            findings += find_risks(body, flags, reach)
+        elif op in REPEATS or op == POSSESSIVE_REPEAT:
+            findings += find_risks(av[2], flags, reach)
+        elif op == sre.SUBPATTERN:
+            body, inner_flags = scoped_flags(av, flags)
+            findings += find_risks(body, inner_flags, reach)
+        elif op == sre.BRANCH:
+            for alt in av[1]:
+                findings += find_risks(alt, flags, reach)
+        elif op == ATOMIC_GROUP:
+            findings += find_risks(av, flags, reach)
+    return findings
+
+# Instructions of the backtracking matcher
+CHAR, SPLIT, JMP, AT, LOOK, ATOMIC, LOOP_INIT, LOOP, LOOP_ENTER, LOOP_END, MATCH = range(11)
+
+class Program:
+    """A compiled pattern for the step-counting matcher; loops keep their counters in registers."""
+
+    def __init__(self):
+        self.code = []
+        self.registers = 0
+
+    def emit(self, *instruction):
+        self.code.append(list(instruction))
+        return len(self.code) - 1
+
+    def compile_seq(self, seq, flags):
+        for op, av in seq:
+            self.compile_item(op, av, flags)
+
+    def sub_program(self, seq, flags):
+        sub = Program()
+        sub.compile_seq(seq, flags)
+        sub.emit(MATCH)
+        return sub
+
+    def compile_item(self, op, av, flags):
+        test = char_test(op, av, flags)
+        if test is not None:
+            self.emit(CHAR, test)
+        elif op == sre.BRANCH:
+            jumps = []
+            alternatives = av[1]
+            for alt in alternatives[:-1]:
+                split = self.emit(SPLIT, None, None)
+                self.code[split][1] = len(self.code)
+                self.compile_seq(alt, flags)
+                jumps.append(self.emit(JMP, None))
+                self.code[split][2] = len(self.code)
+            self.compile_seq(alternatives[-1], flags)
+            for jump in jumps:
+                self.code[jump][1] = len(self.code)
+        elif op == sre.SUBPATTERN:
+            self.compile_seq(*scoped_flags(av, flags))
+        elif op in REPEATS:
+            lo, hi, body = av
+            slot = self.registers
+            self.registers += 2
+            self.emit(LOOP_INIT, slot)
+            head = self.emit(LOOP, slot, lo, hi, None, None, op == sre.MAX_REPEAT)
+            self.code[head][4] = self.emit(LOOP_ENTER, slot)
+            self.compile_seq(body, flags)
+            self.emit(LOOP_END, slot, lo, head)
+            self.code[head][5] = len(self.code)
+        elif op == POSSESSIVE_REPEAT:
+            self.emit(ATOMIC, self.sub_program([(sre.MAX_REPEAT, av)], flags))
+        elif op == ATOMIC_GROUP:
+            self.emit(ATOMIC, self.sub_program(av, flags))
+        elif op in (sre.ASSERT, sre.ASSERT_NOT):
+            direction, body = av
+            behind = 0
+            if direction < 0:
+                low, high = sre_parse.SubPattern(sre_parse.State(), list(body)).getwidth()
+                if low != high:
+                    raise Unsupported("variable width lookbehind")
+                behind = low
+            self.emit(LOOK, self.sub_program(body, flags), op == sre.ASSERT_NOT, behind)
+        elif op == sre.AT:
+            self.emit(AT, av, flags)
+        else:
+            raise Unsupported(f"{op} is not handled by the step counter")
+
+def at_holds(code, flags, text, pos):
+    size = len(text)
+    multiline = flags & sre.SRE_FLAG_MULTILINE
+    if code == sre.AT_BEGINNING:
+        return pos == 0 or (multiline and text[pos - 1] == '\n')
+    if code == sre.AT_BEGINNING_STRING:
+        return pos == 0
+    if code == sre.AT_END:
+        if multiline:
+            return pos == size or text[pos] == '\n'
+        return pos == size or (pos == size - 1 and text[pos] == '\n')
+    if code == sre.AT_END_STRING:
+        return pos == size
+    if code in (sre.AT_BOUNDARY, sre.AT_NON_BOUNDARY):
+        before = pos > 0 and text[pos - 1] in WORD
+        after = pos < size and text[pos] in WORD
+        return (before != after) == (code == sre.AT_BOUNDARY)
+    raise Unsupported(f"anchor {code}")
+
+class Matcher:
+    """
+    Backtracking matcher that counts backtracking points, the unit PCRE's match limit is
+    enforced in: every alternative or loop iteration left behind to come back to is one step.
+    """
+
+    def __init__(self, program, budget=STEP_BUDGET):
+        self.program = program
+        self.budget = budget
+        self.steps = 0
+
+    def run(self, program, text, pos, must_end=None):
+        code = program.code
+        size = len(text)
+        stack = [(0, pos, (0,) * program.registers)]
+        while stack:
+            pc, pos, regs = stack.pop()
+            while True:
+                instruction = code[pc]
+                kind = instruction[0]
+                if kind == CHAR:
+                    if pos < size and instruction[1](text[pos]):
+                        pos += 1
+                        pc += 1
+                        continue
+                    break
+                if kind == SPLIT:
+                    self.step()
+                    stack.append((instruction[2], pos, regs))
+                    pc = instruction[1]
+                elif kind == JMP:
+                    pc = instruction[1]
+                elif kind == LOOP_INIT:
+                    slot = instruction[1]
+                    regs = regs[:slot] + (0, -1) + regs[slot + 2:]
+                    pc += 1
+                elif kind == LOOP:
+                    slot, lo, hi, body, after, greedy = instruction[1:]
+                    count = regs[slot]
+                    if count < lo:
+                        pc = body
+                    elif count >= hi:
+                        pc = after
+                    else:
+                        self.step()
+                        if greedy:
+                            stack.append((after, pos, regs))
+                            pc = body
+                        else:
+                            stack.append((body, pos, regs))
+                            pc = after
+                elif kind == LOOP_ENTER:
+                    slot = instruction[1]
+                    regs = regs[:slot + 1] + (pos,) + regs[slot + 2:]
+                    pc += 1
+                elif kind == LOOP_END:
+                    slot, lo, head = instruction[1:]
+                    # An iteration that consumed nothing past the minimum can only repeat forever
+                    if pos == regs[slot + 1] and regs[slot] >= lo:
+                        break
+                    regs = regs[:slot] + (regs[slot] + 1,) + regs[slot + 1:]
+                    pc = head
+                elif kind == AT:
+                    if not at_holds(instruction[1], instruction[2], text, pos):
+                        break
+                    pc += 1
+                elif kind == LOOK:
+                    sub, negate, behind = instruction[1:]
+                    start = pos - behind
+                    found = start >= 0 and self.run(sub, text, start, pos if behind else None) is not None
+                    if found == negate:
+                        break
+                    pc += 1
+                elif kind == ATOMIC:
+                    end = self.run(instruction[1], text, pos)
+                    if end is None:
+                        break
+                    pos = end
+                    pc += 1
+                elif kind == MATCH:
+                    if must_end is None or pos == must_end:
+                        return pos
+                    break
+        return None
+
+    def step(self):
+        self.steps += 1
+        if self.steps > self.budget:
+            raise BudgetExceeded()
+
+    def search(self, text, first=None):
+        """Unanchored search like @rx; returns (matched, total steps, most steps from one start position)."""
+        worst = 0
+        for start in range(len(text) + 1):
+            if first is not None and (start == len(text) or text[start] not in first):
+                continue
+            before = self.steps
+            matched = self.run(self.program, text, start) is not None
+            worst = max(worst, self.steps - before)
+            if matched:
+                return True, self.steps, worst
+        return False, self.steps, worst
+
+def compile_pattern(pattern):
+    tree, flags = parse(pattern)
+    program = Program()
+    program.compile_seq(tree, flags)
+    program.emit(MATCH)
+    first = seq_first(tree, flags) if seq_min(tree) else None
+    return program, first, tree, flags
+
+def count_steps(program, first, text, budget):
+    matcher = Matcher(program, budget)
+    try:
+        return matcher.search(text, first)
+    except BudgetExceeded:
+        return None
+
+def attack_input(finding, pump, suffix, length):
+    return finding['prefix'] + pump * length + suffix
+
+def growth_exponent(points, budget_hit_at):
+    """Estimate k in steps ~ length**k from the step counts at the last two doubled lengths."""
+    if len(points) < 2:
+        # Blowing the budget before two lengths could be compared only happens on exponential patterns
+        return len(GROWTH) if budget_hit_at is not None else 1
+    (_, before), (_, after) = points[-2], points[-1]
+    # Doubling the input doubles linear work, quadruples quadratic work and so on
+    return max(1, round(math.log2(after / before))) if before and after else 1
+
+def analyse_rule(rule, lengths=LENGTHS, budget=STEP_BUDGET, confirm_all=False):
+    """Flag a rule statically, then confirm by pumping adversarial inputs and counting steps."""
+    result = dict(rule, findings=[], growth='linear', steps=None, limit=None, seconds=None, input=None)
+    try:
+        program, first, tree, flags = compile_pattern(rule['pattern'])
+    except (Unsupported, KeyError, RecursionError) as e:
+        result['skipped'] = str(e)
+        return result
+    findings = find_risks(tree, flags)
+    result['findings'] = sorted({f['kind'] for f in findings})
+    if not findings and not confirm_all:
+        return result
+    candidates = findings or [{'kind': 'none', 'growth': 'linear', 'prefix': '', 'pump': ['a', ' ', '0']}]
+
+    # Probe every pump/suffix combination at a short length and grow the worst one;
+    # a tenth of the budget is plenty to tell them apart, and overrunning it settles the choice
+    worst, worst_steps = None, -1
+    probe_budget = max(1, budget // 10)
+    for finding, pump, suffix in ((f, p, s) for f in candidates for p in f['pump'] for s in SUFFIXES):
+        counted = count_steps(program, first, attack_input(finding, pump, suffix, PROBE_LENGTH), probe_budget)
+        steps = probe_budget + 1 if counted is None else counted[1]
+        if steps > worst_steps:
+            worst, worst_steps = (finding, pump, suffix), steps
+        if counted is None:
+            break
+    finding, pump, suffix = worst
+
+    points, budget_hit_at = [], None
+    for index, length in enumerate(lengths):
+        text = attack_input(finding, pump, suffix, length)
+        counted = count_steps(program, first, text, budget)
+        if counted is None:
+            budget_hit_at = length
+            break
+        points.append((length, counted[1]))
+        result.update(steps=counted[1], limit=counted[2], length=length)
+        # Running into the budget costs as much as the budget itself; skip the run when the
+        # growth so far already puts the next length well past it
+        if len(points) >= 2 and index + 1 < len(lengths):
+            exponent = growth_exponent(points, None)
+            if counted[1] * (lengths[index + 1] / length) ** exponent > 2 * budget:
+                budget_hit_at = lengths[index + 1]
+                break
+    exponent = growth_exponent(points, budget_hit_at)
+    result['growth'] = GROWTH[min(exponent, len(GROWTH)) - 1]
+    result['budget_hit_at'] = budget_hit_at
+    if points and exponent < len(GROWTH):
+        # What one call would need at the longest input, had the budget allowed getting there
+        result['projected'] = int(result['limit'] * (lengths[-1] / result['length']) ** exponent)
+    result['input'] = {'prefix': finding['prefix'], 'pump': pump, 'suffix': suffix}
+
+    # Time the same input with Python's backtracking engine where the step count shows it terminates
+    if points:
+        length = points[-1][0]
+        try:
+            compiled = re.compile(to_python(rule['pattern']))
+            started = time.perf_counter()
+            compiled.search(attack_input(finding, pump, suffix, length))
+            result['seconds'] = round(time.perf_counter() - started, 6)
+        except re.error:
+            pass
+    return result
+
+def rule_paths(paths=None):
+    if paths:
+        found = []
+        for path in paths:
+            found += sorted(glob.glob(os.path.join(path, '*.conf'))) if os.path.isdir(path) else [path]
+        return found
+    found = sorted(glob.glob(os.path.join(crs_dir(), 'rules', '*.conf')))
+    for pattern in CUSTOM_RULES:
+        found += sorted(glob.glob(pattern))
+    return found
+
+def scan(paths, lengths=LENGTHS, budget=STEP_BUDGET, confirm_all=False, jobs=None):
+    """Analyse every @rx rule in paths, worst first."""
+    rules = extract_rules(paths)
+    # One rule per task: a few rules take seconds and most milliseconds, so batches would idle workers
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        results = list(pool.map(analyse_rule, rules, [lengths] * len(rules), [budget] * len(rules),
+                                [confirm_all] * len(rules)))
+    rank = {name: i for i, name in enumerate(GROWTH)}
+    results.sort(key=lambda r: (-rank[r['growth']], -(needed_limit(r) or 0)))
+    return results
+
+def configured_limit(profile_file=DEFAULT_PROFILE):
+    try:
+        engine, _ = load_profile(profile_file)
+    except OSError:
+        engine = {}
+    return int(engine.get('pcre_match_limit', 100000))
+
+def needed_limit(result):
+    """The match limit one call needs at the longest input, or None when it grows without bound."""
+    if result['growth'] == 'exponential':
+        return None
+    return result.get('projected', result['limit'])
+
+def safe_length(result, match_limit):
+    """The longest pumped input a rule handles within match_limit, from its measured growth."""
+    if result['limit'] is None:
+        return None
+    exponent = GROWTH.index(result['growth']) + 1
+    if result['growth'] == 'exponential' or not result['limit']:
+        return result['length'] if result['limit'] <= match_limit else None
+    return int(result['length'] * (match_limit / result['limit']) ** (1 / exponent))
+
+def print_report(results, match_limit, max_length, verbose=False):
+    flagged = [r for r in results if r['findings'] or r['steps'] is not None]
+    skipped = [r for r in results if r.get('skipped')]
+    print(f"{'rule':<14} {'growth':<12} {'steps':>9} {'at len':>6} {'re s':>8} {f'limit @{max_length}':>14} "
+          f"{'safe len':>8}  finding")
+    for r in flagged:
+        if not verbose and r['growth'] == 'linear':
+            continue
+        needed, safe = needed_limit(r), safe_length(r, match_limit)
+        seconds = f"{r['seconds']:.4f}" if r['seconds'] is not None else '-'
+        print(f"{r['id']:<14} {r['growth']:<12} {r['steps'] if r['steps'] is not None else '-'!s:>9} "
+              f"{r.get('length', '-')!s:>6} {seconds:>8} {needed if needed is not None else 'unbounded'!s:>14} "
+              f"{safe if safe is not None else '-'!s:>8}  {','.join(r['findings']) or '-'}  "
+              f"{os.path.basename(r['file'])}:{r['line']}")
+        if verbose and r['input']:
+            print(f"{'':<14} input: {r['input']['prefix']!r} + {r['input']['pump']!r} * n + {r['input']['suffix']!r}")
+    for r in skipped:
+        if verbose:
+            print(f"{r['id']:<14} not analysed: {r['skipped']}")
+    over = [r for r in flagged if needed_limit(r) is None or needed_limit(r) > match_limit]
+    print(f"\n{len(results)} @rx rules, {len(flagged)} flagged, {len(skipped)} not analysed.")
+    if over:
+        # Past the limit libmodsecurity gives up on the regex and the rule does not match: a bypass, not a block
+        print(f"{len(over)} rule(s) need more than SecPcreMatchLimit {match_limit} on crafted input of "
+              f"{max_length} characters; raise the limit for them, bound their input to the safe length "
+              f"or tune them: " + ", ".join(r['id'] for r in over))
+
+def main():
+    parser = argparse.ArgumentParser(description="Find CRS and local @rx rules that backtrack badly on crafted input.")
+    parser.add_argument('paths', nargs='*', help="Rule files or directories (default: the CRS rules and local rules)")
+    parser.add_argument('--all', action='store_true', help="Also pump rules without a static finding")
+    parser.add_argument('--max-length', type=int, default=LENGTHS[-1], help="Longest adversarial input")
+    parser.add_argument('--budget', type=int, default=STEP_BUDGET, help="Steps after which a run is abandoned")
+    parser.add_argument('--jobs', type=int)
+    parser.add_argument('--json', action='store_true')
+    parser.add_argument('-v', '--verbose', action='store_true', help="Show linear rules and the generated inputs")
+    args = parser.parse_args()
+
+    lengths = [length for length in LENGTHS if length <= args.max_length]
+    try:
+        results = scan(rule_paths(args.paths), lengths, args.budget, args.all, args.jobs)
+    except OSError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results, configured_limit(), lengths[-1], args.verbose)
+
+if __name__ == '__main__':
+    main()
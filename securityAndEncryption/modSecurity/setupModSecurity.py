@@ -6,26 +6,30 @@ import sys
 import shutil
 import re
 import logging
-import requests
 import pwd
-import datetime
+
+from securityAndEncryption.modSecurity.packageModSecurity import get_installed_nginx_version, install_prebuilt_module
+from securityAndEncryption.modSecurity.modsecProfile import write_profile
+from securityAndEncryption.modSecurity.crsStore import setup_owasp_crs
+from backupAndRecovery.backupEngine import BackupError, backup_paths
+from backupAndRecovery.pathSnapshot import prune_in_background, snapshot_path
 
 LOG_DIR = '/var/log/CodeMonkeyCyber'
 LOG_FILE = f'{LOG_DIR}/setupModSecurity.log'
 
-logging.info("Credit that to https://www.linuxbabe.com/security/modsecurity-nginx-debian-ubuntu for the amazing instructions which this script is based on")
-
-# Ensure log directory exists
-os.makedirs(LOG_DIR, exist_ok=True)
-
-logging.basicConfig(
-    level=logging.DEBUG,  # Set default log level to INFO
-    format="%(asctime)s [%(levelname)s] %(message)s",  # Format: timestamp, log level, and message
-    handlers=[
-        logging.StreamHandler(),  # Log to console
-        logging.FileHandler("script.log", mode="a"),  # Log to file
-    ]
-)
+def configure_logging():
+    # Ensure log directory exists
+    os.makedirs(LOG_DIR, exist_ok=True)
+
+    logging.basicConfig(
+        level=logging.DEBUG,  # Set default log level to INFO
+        format="%(asctime)s [%(levelname)s] %(message)s",  # Format: timestamp, log level, and message
+        handlers=[
+            logging.StreamHandler(),  # Log to console
+            logging.FileHandler("script.log", mode="a"),  # Log to file
+        ]
+    )
+    logging.info("Credit that to https://www.linuxbabe.com/security/modsecurity-nginx-debian-ubuntu for the amazing instructions which this script is based on")
 
 def check_sudo():
     if os.geteuid() != 0:
@@ -97,14 +101,11 @@ def add_official_deb_src():
 
     # Check if the sources file exists
     if os.path.exists(sources_file):
-        # Create backup filename with timestamp
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M")
-        backup_file = f'/etc/apt/sources.list.d/ubuntu.sources_{timestamp}.bak'
         try:
-            # Backup the current sources file
-            shutil.copy2(sources_file, backup_file)
-            logging.info(f"Backed up {sources_file} to {backup_file}")
-        except Exception as e:
+            # Snapshot the current sources file; a stray .bak in sources.list.d is also read by apt tooling
+            manifest = backup_paths([sources_file], 'apt-sources')
+            logging.info(f"Backed up {sources_file} as snapshot {manifest['id']}")
+        except (BackupError, OSError) as e:
             logging.info(f"Error backing up file: {e}")
             return
         try:
@@ -150,34 +151,17 @@ def add_official_deb_src():
         print(f"Error running 'apt update': {e}")
         return
 
-def get_latest_crs_version():
-    """Fetch the latest CRS version from GitHub releases."""
-    try:
-        response = requests.get("https://api.github.com/repos/coreruleset/coreruleset/releases/latest")
-        data = response.json()
-        latest_version = data['tag_name'].lstrip('v')
-        return latest_version
-    except Exception as e:
-        logging.error(f"Failed to fetch latest CRS version: {e}")
-        return None
-
 def check_and_create_path(path):
     """
     Ensure the specified path is a directory. If the path exists (file, symlink, or directory), handle it.
     """
     def backup_path(src_path):
-        """Create a timestamped backup of the specified path."""
+        """Move the path aside as a timestamped snapshot, then prune old ones in the background."""
         try:
-            # Generate a timestamp for the backup
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-            # Define the backup path
-            backup_name = f"{src_path}_{timestamp}.bak"
-            # Backup depending on the type
-            if os.path.isdir(src_path):
-                shutil.copytree(src_path, backup_name)  # Backup the directory
-            else:
-                shutil.copy2(src_path, backup_name)  # Backup files or symlinks
-            logging.info(f"Backed up '{src_path}' to '{backup_name}'.")
+            # A rename in place is instant; a clone is only needed when that is impossible (mount points)
+            backup_name, method = snapshot_path(src_path, move=True)
+            logging.info(f"Backed up '{src_path}' to '{backup_name}' ({method}).")
+            prune_in_background(src_path)
             return True
         except Exception as e:
             logging.error(f"Error creating backup for '{src_path}': {e}")
@@ -195,8 +179,7 @@ def check_and_create_path(path):
                 choice = input("Please enter your choice [1/2]: ").strip() or '1'
 
                 if choice == '1':
-                    if backup_path(path):  # Backup the symlink
-                        os.unlink(path)  # Remove the symlink
+                    if backup_path(path):  # Move the symlink aside
                         os.makedirs(path, exist_ok=True)  # Create the directory
                         logging.info(f"Replaced symlink at '{path}' with a directory.")
                 elif choice == '2':
@@ -216,8 +199,7 @@ def check_and_create_path(path):
                 choice = input("Please enter your choice [1/2]: ").strip() or '1'
 
                 if choice == '1':
-                    if backup_path(path):  # Backup the file
-                        os.remove(path)  # Remove the file
+                    if backup_path(path):  # Move the file aside
                         os.makedirs(path, exist_ok=True)  # Create the directory
                         logging.info(f"Replaced file at '{path}' with a directory.")
                 elif choice == '2':
@@ -240,8 +222,7 @@ def check_and_create_path(path):
                 if choice == '1':  # Skip and use existing directory
                     logging.info("Continuing with the existing directory.")
                 elif choice == '2':  # Backup and overwrite directory
-                    if backup_path(path):  # Backup the directory
-                        shutil.rmtree(path)  # Remove the directory and its contents
+                    if backup_path(path):  # Move the directory aside
                         os.makedirs(path, exist_ok=True)  # Create a new empty directory
                         logging.info(f"Directory '{path}' has been overwritten.")
                 elif choice == '3':  # Exit script
@@ -447,6 +428,10 @@ def load_connector_module():
     else:
         logging.info(f"ModSecurity configuration already exists at {modsec_conf_dst}, skipping copy.")
 
+    # The recommended file logs serially and inspects every response; apply the throughput profile
+    write_profile(modsec_conf=modsec_conf_dst)
+    logging.info(f"Applied the ModSecurity performance profile to {modsec_conf_dst}")
+
     # Create main.conf if it doesn't exist
     if not os.path.exists(modsec_main_conf):
         with open(modsec_main_conf, "w") as file:
@@ -462,20 +447,21 @@ def load_connector_module():
     
 # Main function
 def main():
+    configure_logging()
     logging.info("Starting the script...")
     check_sudo()
     check_dependencies()
     add_official_deb_src()
     install_nginx()
-    version_number = download_source()
-    install_libmodsecurity()
-    compile_nginx_connector(version_number)
+    # Prefer a prebuilt artifact for this codename and nginx version; only build on a miss
+    if not install_prebuilt_module(get_ubuntu_codename(), get_installed_nginx_version()):
+        version_number = download_source()
+        install_libmodsecurity()
+        compile_nginx_connector(version_number)
     load_connector_module()
     setup_owasp_crs()
-    print("[Success] ModSecurity with Nginx has been successfully set up.")
-    print("You should now download and enable the OWASP Core Rule Set.")
-    print("The OWASP Core Rule Set (CRS) is the standard rule set used with ModSecurity.")
-    print("The SetupOwaspCrs.py script can do this.")
+    print("[Success] ModSecurity with Nginx and the OWASP Core Rule Set (CRS) has been set up.")
+    print("Upgrade or roll back the CRS later with eos crs upgrade|rollback.")
 
 if __name__ == "__main__":
     main()
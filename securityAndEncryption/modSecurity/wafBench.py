@@ -0,0 +1,598 @@
+#!/usr/bin/env python3
+
+import argparse
+import datetime
+import fnmatch
+import glob
+import http.client
+import json
+import logging
+import os
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+
+from securityAndEncryption.modSecurity.crsStore import CRS_ROOT, current_link
+from securityAndEncryption.modSecurity.modsecProfile import DEFAULT_PROFILE, load_profile, render_engine_conf, set_directive
+from webServer.nginx.rateLimits import percentile
+
+MODSEC_DIR = os.path.dirname(os.path.abspath(__file__))
+BUNDLED_CRS = os.path.join(MODSEC_DIR, 'coreruleset-4.9.0')
+# Where compile_nginx_connector() installs the dynamic module; it is built --with-compat for the packaged nginx
+MODSEC_MODULE = '/usr/share/nginx/modules/ngx_http_modsecurity_module.so'
+RESULTS_DIR = '/var/log/eos/waf-bench'
+FRONT_PORT = 18080
+BACKEND_PORT = 18081
+
+# Rule files left out of the pruned configuration: no PHP, Java or IIS behind our proxies,
+# and response bodies are not what we block on
+PRUNED_RULES = ['REQUEST-933-*', 'REQUEST-944-*', 'RESPONSE-95*']
+CONFIGURATIONS = ['none', 'pl1', 'pl2', 'pl3', 'pl4', 'pruned']
+
+LARGE_BODY_BYTES = 512 * 1024
+UPLOAD_BYTES = 64 * 1024
+BOUNDARY = 'eosWafBenchBoundary'
+ATTACK_PATHS = [
+    "/search?q=" + urllib.parse.quote("1' OR '1'='1' --"),
+    "/search?q=" + urllib.parse.quote("<script>alert(document.cookie)</script>"),
+    "/download?file=" + urllib.parse.quote("../../../../etc/passwd"),
+    "/ping?host=" + urllib.parse.quote("127.0.0.1; cat /etc/shadow"),
+]
+# Share of each request kind in the mix, out of 100
+REQUEST_MIX = {'benign': 70, 'large-body': 10, 'multipart': 10, 'attack': 10}
+# --generator: wrk when installed (auto), else the Python client spread over one process per core
+GENERATORS = ['auto', 'wrk', 'processes']
+# wrk runs for a duration; each thread stops itself after its share of the requests, well before this
+WRK_DURATION = '600s'
+WRK_SCRIPT_TEMPLATE = """-- Generated by wafBench.py: the request mix, one connection per thread
+local catalog = {{
+{catalog}
+}}
+local schedule = {{{schedule}}}
+local prepared, sent, quota, last = {{}}, 0, 0, nil
+statuses = {{}}
+
+function init(args)
+  quota = tonumber(args[1])
+  for kind, variants in pairs(catalog) do
+    prepared[kind] = {{}}
+    for index, request in ipairs(variants) do
+      local body = nil
+      if request[3] then
+        local f = io.open(request[3], "rb")
+        body = f:read("*a")
+        f:close()
+      end
+      prepared[kind][index] = wrk.format(request[1], request[2], request[4], body)
+    end
+  end
+end
+
+function request()
+  last = schedule[sent % #schedule + 1]
+  local variants = prepared[last]
+  sent = sent + 1
+  return variants[sent % #variants + 1]
+end
+
+function response(status, headers, body)
+  local key = last .. " " .. status
+  statuses[key] = (statuses[key] or 0) + 1
+  if sent >= quota then
+    wrk.thread:stop()
+  end
+end
+
+local threads = {{}}
+
+function setup(thread)
+  table.insert(threads, thread)
+end
+
+function done(summary, latency, requests)
+  io.write(string.format("eos-totals %d %d %d %d %d\\n", summary.requests, summary.duration,
+                         latency:percentile(50), latency:percentile(95), latency:percentile(99)))
+  local merged = {{}}
+  for _, thread in ipairs(threads) do
+    for key, count in pairs(thread:get("statuses")) do
+      merged[key] = (merged[key] or 0) + count
+    end
+  end
+  for key, count in pairs(merged) do
+    io.write(string.format("eos-status %s %d\\n", key, count))
+  end
+end
+"""
+
+NGINX_CONF_TEMPLATE = """# Generated by wafBench.py for the {name} configuration
+{load_module}{user}worker_processes {workers};
+pid {prefix}/nginx.pid;
+error_log {prefix}/error.log warn;
+
+events {{
+    worker_connections 4096;
+}}
+
+http {{
+    access_log off;
+    client_body_temp_path {prefix}/client_body;
+    proxy_temp_path {prefix}/proxy;
+    fastcgi_temp_path {prefix}/fastcgi;
+    uwsgi_temp_path {prefix}/uwsgi;
+    scgi_temp_path {prefix}/scgi;
+    client_max_body_size 10m;
+
+    upstream bench_backend {{
+        server 127.0.0.1:{backend_port};
+        keepalive 64;
+    }}
+
+    # Trivial backend: answers everything without touching the body
+    server {{
+        listen 127.0.0.1:{backend_port};
+        location / {{
+            return 200 "ok\\n";
+        }}
+    }}
+
+    server {{
+        listen 127.0.0.1:{port};
+{modsecurity}        location / {{
+            proxy_pass http://bench_backend;
+            proxy_http_version 1.1;
+            proxy_set_header Connection "";
+        }}
+    }}
+}}
+"""
+
+class BenchError(Exception):
+    pass
+
+def crs_dir():
+    """Prefer the active rule set from the CRS store, fall back to the bundled copy."""
+    current = current_link(CRS_ROOT)
+    return current if os.path.isdir(os.path.join(current, 'rules')) else BUNDLED_CRS
+
+def rule_files(crs, prune=()):
+    files = sorted(glob.glob(os.path.join(crs, 'rules', '*.conf')))
+    return [path for path in files
+            if not any(fnmatch.fnmatch(os.path.basename(path), pattern) for pattern in prune)]
+
+def render_modsec_conf(crs, paranoia, prune=(), profile_file=DEFAULT_PROFILE):
+    """Engine profile plus CRS at a paranoia level; audit logging is off so disk I/O is not measured."""
+    engine, _ = load_profile(profile_file)
+    content = render_engine_conf('', engine)
+    content = set_directive(content, 'SecAuditEngine', 'Off')
+    # Large enough that the large-body and multipart requests are inspected rather than rejected
+    content = set_directive(content, 'SecRequestBodyLimit', str(10 * 1024 * 1024))
+    content = set_directive(content, 'SecRequestBodyNoFilesLimit', str(1024 * 1024))
+    setup = os.path.join(crs, 'crs-setup.conf')
+    if not os.path.exists(setup):
+        setup = f"{setup}.example"
+    lines = [content.strip('\n'), f"Include {setup}",
+             f'SecAction "id:900000,phase:1,pass,t:none,nolog,setvar:tx.blocking_paranoia_level={paranoia}"']
+    lines += [f"Include {path}" for path in rule_files(crs, prune)]
+    return "\n".join(lines) + "\n"
+
+def render_nginx_conf(name, prefix, workers, module, port=FRONT_PORT, backend_port=BACKEND_PORT):
+    waf = name != 'none'
+    modsecurity = ("        modsecurity on;\n"
+                   f"        modsecurity_rules_file {prefix}/modsec.conf;\n\n") if waf else ""
+    return NGINX_CONF_TEMPLATE.format(
+        name=name, prefix=prefix, workers=workers, port=port, backend_port=backend_port,
+        load_module=f"load_module {module};\n" if waf else "",
+        # Workers keep the master's identity unless started as root, where they would lose access to prefix
+        user="user root;\n" if os.geteuid() == 0 else "",
+        modsecurity=modsecurity)
+
+def prepare_configuration(name, prefix, workers, module, crs, prune, port=FRONT_PORT, backend_port=BACKEND_PORT):
+    """Write nginx.conf (and modsec.conf for WAF configurations) into prefix and return the nginx.conf path."""
+    for directory in ('client_body', 'proxy', 'fastcgi', 'uwsgi', 'scgi'):
+        os.makedirs(os.path.join(prefix, directory), exist_ok=True)
+    if name != 'none':
+        paranoia = 1 if name == 'pruned' else int(name[2:])
+        with open(os.path.join(prefix, 'modsec.conf'), 'w') as f:
+            f.write(render_modsec_conf(crs, paranoia, prune if name == 'pruned' else ()))
+    conf = os.path.join(prefix, 'nginx.conf')
+    with open(conf, 'w') as f:
+        f.write(render_nginx_conf(name, prefix, workers, module, port, backend_port))
+    return conf
+
+def build_requests():
+    """Return {kind: [(method, path, body, headers)]} for the request mix."""
+    large = json.dumps({'items': [{'id': i, 'name': f"item-{i}", 'note': 'x' * 48}
+                                  for i in range(LARGE_BODY_BYTES // 80)]}).encode()
+    upload = (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"title\"\r\n\r\nreport\r\n"
+              f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"report.txt\"\r\n"
+              f"Content-Type: text/plain\r\n\r\n").encode() + b'a' * UPLOAD_BYTES + f"\r\n--{BOUNDARY}--\r\n".encode()
+    return {
+        'benign': [('GET', '/', None, {}), ('GET', '/products?page=2&sort=price', None, {})],
+        'large-body': [('POST', '/api/items', large, {'Content-Type': 'application/json'})],
+        'multipart': [('POST', '/upload', upload, {'Content-Type': f"multipart/form-data; boundary={BOUNDARY}"})],
+        'attack': [('GET', path, None, {}) for path in ATTACK_PATHS],
+    }
+
+def request_schedule(mix=REQUEST_MIX):
+    """Interleave the kinds by weight so every slice of the run sees the same mix."""
+    total = sum(mix.values())
+    schedule, credit = [], {kind: 0 for kind in mix}
+    for _ in range(total):
+        for kind, weight in mix.items():
+            credit[kind] += weight
+        kind = max(credit, key=credit.get)
+        credit[kind] -= total
+        schedule.append(kind)
+    return schedule
+
+def mix_worker(host, port, count, catalog, schedule, results, lock):
+    connection = http.client.HTTPConnection(host, port, timeout=30)
+    while True:
+        with lock:
+            index = results['sent']
+            if index >= count:
+                break
+            results['sent'] += 1
+        kind = schedule[index % len(schedule)]
+        variants = catalog[kind]
+        method, path, body, headers = variants[index % len(variants)]
+        start = time.perf_counter()
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+            if response.getheader('Connection', '').lower() == 'close':
+                connection.close()
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            status = 'error'
+        elapsed = time.perf_counter() - start
+        with lock:
+            results['latencies'].setdefault(kind, []).append(elapsed)
+            statuses = results['statuses'].setdefault(kind, {})
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+    connection.close()
+
+def mix_client(host, port, requests, concurrency, mix=REQUEST_MIX):
+    """Send the request mix from this process over keep-alive connections; returns latencies and statuses."""
+    results = {'sent': 0, 'latencies': {}, 'statuses': {}}
+    lock = threading.Lock()
+    catalog, schedule = build_requests(), request_schedule(mix)
+    threads = [threading.Thread(target=mix_worker, args=(host, port, requests, catalog, schedule, results, lock))
+               for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def drive_processes(host, port, requests, concurrency, mix=REQUEST_MIX, processes=None):
+    """
+    Run mix_client in several processes and merge their results.
+
+    One Python process tops out at a few thousand requests per second on the
+    GIL, below what an unprotected nginx serves, so connections are spread
+    over one process per core.
+    """
+    processes = max(1, min(processes or os.cpu_count() or 1, concurrency, requests))
+    shares = [(requests // processes + (index < requests % processes),
+               concurrency // processes + (index < concurrency % processes)) for index in range(processes)]
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        parts = list(pool.map(mix_client, [host] * processes, [port] * processes, *zip(*shares),
+                              [mix] * processes))
+    results = {'latencies': {}, 'statuses': {}, 'duration': time.perf_counter() - started}
+    for part in parts:
+        for kind, values in part['latencies'].items():
+            results['latencies'].setdefault(kind, []).extend(values)
+        for kind, statuses in part['statuses'].items():
+            merged = results['statuses'].setdefault(kind, {})
+            for status, count in statuses.items():
+                merged[status] = merged.get(status, 0) + count
+    return summarize(results)
+
+def lua_string(value):
+    """Quote a str or bytes as a Lua string literal (decimal escapes, which LuaJIT and Lua 5.1 both read)."""
+    data = value.encode() if isinstance(value, str) else value
+    return '"' + ''.join(chr(byte) if 32 <= byte < 127 and byte not in (34, 92) else f"\\{byte:03d}"
+                         for byte in data) + '"'
+
+def wrk_script(catalog, schedule, body_dir):
+    """
+    Render the wrk Lua script sending the request mix.
+
+    Every wrk thread drives a single connection, so the response that follows
+    a request belongs to it and statuses can be counted per kind. Bodies are
+    read from body_dir once per thread.
+    """
+    variants = []
+    for kind, requests in catalog.items():
+        entries = []
+        for index, (method, path, body, headers) in enumerate(requests):
+            body_file = 'nil'
+            if body is not None:
+                body_file = os.path.join(body_dir, f"{kind}-{index}.body")
+                with open(body_file, 'wb') as f:
+                    f.write(body)
+                body_file = lua_string(body_file)
+            header_table = ', '.join(f"[{lua_string(name)}] = {lua_string(value)}" for name, value in headers.items())
+            entries.append(f"{{{lua_string(method)}, {lua_string(path)}, {body_file}, {{{header_table}}}}}")
+        variants.append(f"  [{lua_string(kind)}] = {{{', '.join(entries)}}},")
+    return WRK_SCRIPT_TEMPLATE.format(catalog="\n".join(variants),
+                                      schedule=', '.join(lua_string(kind) for kind in schedule))
+
+def drive_wrk(host, port, requests, concurrency, mix=REQUEST_MIX, wrk='wrk'):
+    """Send the request mix with wrk; returns the same summary as summarize(), without per-kind latencies."""
+    work_dir = tempfile.mkdtemp(prefix='eos-waf-bench-wrk-')
+    try:
+        script = os.path.join(work_dir, 'mix.lua')
+        with open(script, 'w') as f:
+            f.write(wrk_script(build_requests(), request_schedule(mix), work_dir))
+        quota = -(-requests // concurrency)
+        result = subprocess.run([wrk, '-t', str(concurrency), '-c', str(concurrency), '-d', WRK_DURATION,
+                                 '-s', script, f"http://{host}:{port}/", '--', str(quota)],
+                                capture_output=True, text=True)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    totals = kinds = None
+    for line in result.stdout.splitlines():
+        fields = line.split()
+        if fields[:1] == ['eos-totals']:
+            totals = [float(field) for field in fields[1:]]
+            kinds = {}
+        elif fields[:1] == ['eos-status'] and kinds is not None:
+            statuses = kinds.setdefault(fields[1], {'count': 0, 'statuses': {}})
+            statuses['count'] += int(fields[3])
+            statuses['statuses'][fields[2]] = int(fields[3])
+    if result.returncode != 0 or totals is None:
+        raise BenchError(f"wrk failed:\n{(result.stderr or result.stdout).strip()}")
+    count, duration_us, p50, p95, p99 = totals
+    return {'rps': round(count / (duration_us / 1e6), 1), 'count': int(count), 'p50_ms': round(p50 / 1000, 3),
+            'p95_ms': round(p95 / 1000, 3), 'p99_ms': round(p99 / 1000, 3), 'kinds': kinds}
+
+def choose_generator(generator='auto'):
+    """Return (name, wrk path or None): wrk when asked for or found on PATH, else Python processes."""
+    wrk = shutil.which('wrk')
+    if generator == 'wrk' and not wrk:
+        raise BenchError("wrk not found; install it (apt install wrk) or use --generator processes")
+    if generator in ('auto', 'wrk') and wrk:
+        return 'wrk', wrk
+    return 'processes', None
+
+def drive_mix(host, port, requests=5000, concurrency=16, mix=REQUEST_MIX, generator='auto'):
+    """Send the request mix with the chosen load generator; returns the summary (RPS, latencies, statuses)."""
+    name, wrk = choose_generator(generator)
+    if name == 'wrk':
+        return drive_wrk(host, port, requests, concurrency, mix, wrk)
+    return drive_processes(host, port, requests, concurrency, mix)
+
+def summarize(results):
+    """Reduce raw latencies to RPS and p50/p95/p99 in milliseconds, overall and per kind."""
+    def stats(values):
+        return {'count': len(values), 'p50_ms': round(statistics.median(values) * 1000, 3),
+                'p95_ms': round(percentile(values, 0.95) * 1000, 3),
+                'p99_ms': round(percentile(values, 0.99) * 1000, 3)}
+    everything = [value for values in results['latencies'].values() for value in values]
+    summary = {'rps': round(len(everything) / results['duration'], 1), **stats(everything), 'kinds': {}}
+    for kind, values in results['latencies'].items():
+        summary['kinds'][kind] = dict(stats(values), statuses=results['statuses'].get(kind, {}))
+    return summary
+
+def child_pids(parent):
+    children = []
+    for stat in glob.glob('/proc/[0-9]*/stat'):
+        try:
+            with open(stat, 'r') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        # Fields after the command name: state, ppid, ...
+        if int(fields[1]) == parent:
+            children.append(int(stat.split('/')[2]))
+    return children
+
+def rss_kb(pid):
+    try:
+        with open(f'/proc/{pid}/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+def wait_for_port(host, port, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise BenchError(f"nginx exited with status {process.returncode} during startup")
+        try:
+            socket.create_connection((host, port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.005)
+    raise BenchError(f"nginx did not listen on {host}:{port} within {timeout}s")
+
+def measure_reload(master, workers, timeout=60):
+    """Send SIGHUP and time until a full set of new workers is running, i.e. the new config is live."""
+    old = set(child_pids(master))
+    started = time.perf_counter()
+    os.kill(master, signal.SIGHUP)
+    while time.perf_counter() - started < timeout:
+        if len(set(child_pids(master)) - old) >= workers:
+            return time.perf_counter() - started
+        time.sleep(0.002)
+    raise BenchError(f"nginx did not start new workers within {timeout}s of a reload")
+
+def run_configuration(name, nginx_binary, module, crs, prune, workers, requests, concurrency, host='127.0.0.1',
+                      port=FRONT_PORT, backend_port=BACKEND_PORT, generator='auto'):
+    """Start nginx in one configuration, measure load, memory and reload, and stop it again."""
+    prefix = tempfile.mkdtemp(prefix=f"eos-waf-bench-{name}-")
+    process = None
+    try:
+        conf = prepare_configuration(name, prefix, workers, module, crs, prune, port, backend_port)
+        started = time.perf_counter()
+        check = subprocess.run([nginx_binary, '-t', '-q', '-p', prefix, '-c', conf], capture_output=True, text=True)
+        config_test = time.perf_counter() - started
+        if check.returncode != 0:
+            raise BenchError(f"{name}: nginx -t failed:\n{check.stderr.strip()}")
+
+        started = time.perf_counter()
+        process = subprocess.Popen([nginx_binary, '-p', prefix, '-c', conf, '-g', 'daemon off;'],
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        wait_for_port(host, port, process)
+        startup = time.perf_counter() - started
+
+        # Warm up connections and lazily built state before measuring
+        drive_mix(host, port, requests=min(200, requests), concurrency=concurrency, generator=generator)
+        summary = drive_mix(host, port, requests, concurrency, generator=generator)
+        worker_rss = [rss_kb(pid) for pid in child_pids(process.pid)]
+        summary.update({
+            'config': name,
+            'config_test_s': round(config_test, 4),
+            'startup_s': round(startup, 4),
+            'reload_s': round(measure_reload(process.pid, workers), 4),
+            'master_rss_kb': rss_kb(process.pid),
+            'worker_rss_kb': max(worker_rss, default=0),
+            'total_rss_kb': rss_kb(process.pid) + sum(worker_rss),
+        })
+        return summary
+    finally:
+        if process and process.poll() is None:
+            process.send_signal(signal.SIGQUIT)
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        shutil.rmtree(prefix, ignore_errors=True)
+
+def nginx_version(nginx_binary):
+    result = subprocess.run([nginx_binary, '-v'], capture_output=True, text=True)
+    return result.stderr.strip().rsplit('/', 1)[-1]
+
+def run_suite(configurations, nginx_binary='nginx', module=MODSEC_MODULE, crs=None, prune=PRUNED_RULES,
+              workers=2, requests=5000, concurrency=16, generator='auto'):
+    """Run each configuration in turn and return the run record."""
+    if any(name != 'none' for name in configurations) and not os.path.exists(module):
+        raise BenchError(f"{module} not found; build it with eos modsec or pass --module")
+    crs = crs or crs_dir()
+    generator, _ = choose_generator(generator)
+    run = {
+        'started': datetime.datetime.now().isoformat(timespec='seconds'),
+        'host': socket.gethostname(),
+        'nginx': nginx_version(nginx_binary),
+        'crs': os.path.basename(os.path.realpath(crs)),
+        'workers': workers, 'requests': requests, 'concurrency': concurrency, 'generator': generator,
+        'mix': REQUEST_MIX, 'pruned_rules': list(prune),
+        'results': [],
+    }
+    for name in configurations:
+        logging.info(f"Benchmarking {name}...")
+        run['results'].append(run_configuration(name, nginx_binary, module, crs, prune, workers, requests,
+                                                concurrency, generator=generator))
+    return run
+
+def save_run(run, results_dir=RESULTS_DIR):
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, f"{run['started'].replace(':', '')}.json")
+    with open(path, 'w') as f:
+        json.dump(run, f, indent=2)
+    return path
+
+def load_runs(paths=None, results_dir=RESULTS_DIR):
+    """Load the given result files, or the two most recent in results_dir."""
+    paths = paths or sorted(glob.glob(os.path.join(results_dir, '*.json')))[-2:]
+    runs = []
+    for path in paths:
+        with open(path, 'r') as f:
+            runs.append(json.load(f))
+    return runs
+
+def print_run(run):
+    print(f"{run['started']}  nginx {run['nginx']}  CRS {run['crs']}  "
+          f"{run['workers']} workers, {run['requests']} requests x {run['concurrency']} "
+          f"({run.get('generator', 'threads')})")
+    baseline = next((r['rps'] for r in run['results'] if r['config'] == 'none'), None)
+    print(f"{'config':<8} {'req/s':>9} {'cost':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'worker MB':>10} {'test s':>7} {'reload s':>8}  attacks blocked")
+    for r in run['results']:
+        cost = f"{100 * (1 - r['rps'] / baseline):.0f}%" if baseline and r['config'] != 'none' else '-'
+        attack = r['kinds'].get('attack', {})
+        blocked = attack.get('statuses', {}).get('403', 0)
+        print(f"{r['config']:<8} {r['rps']:>9.0f} {cost:>7} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} "
+              f"{r['p99_ms']:>8.2f} {r['worker_rss_kb'] / 1024:>10.1f} {r['config_test_s']:>7.2f} "
+              f"{r['reload_s']:>8.2f}  {blocked}/{attack.get('count', 0)}")
+
+def print_comparison(old, new):
+    print(f"{old['started']} -> {new['started']}")
+    previous = {r['config']: r for r in old['results']}
+    for r in new['results']:
+        before = previous.get(r['config'])
+        if not before:
+            print(f"{r['config']:<8} new")
+            continue
+        changes = []
+        for key, label in (('rps', 'req/s'), ('p99_ms', 'p99'), ('worker_rss_kb', 'worker RSS'),
+                           ('reload_s', 'reload')):
+            delta = 100 * (r[key] - before[key]) / before[key] if before[key] else 0
+            changes.append(f"{label} {before[key]:g} -> {r[key]:g} ({delta:+.1f}%)")
+        print(f"{r['config']:<8} " + ", ".join(changes))
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Measure what ModSecurity and the CRS cost per paranoia level.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run = subparsers.add_parser('run', help="Benchmark the configurations and store the results")
+    run.add_argument('configs', nargs='*', default=CONFIGURATIONS, help=f"Any of {', '.join(CONFIGURATIONS)}")
+    run.add_argument('--nginx-binary', default='nginx')
+    run.add_argument('--module', default=MODSEC_MODULE, help="ModSecurity dynamic module to load")
+    run.add_argument('--crs', help="CRS directory (default: the current CRS store version or the bundled copy)")
+    run.add_argument('--prune', action='append', help="Rule file pattern left out of 'pruned' (repeatable)")
+    run.add_argument('--workers', type=int, default=2)
+    run.add_argument('-n', '--requests', type=int, default=5000)
+    run.add_argument('-c', '--concurrency', type=int, default=16)
+    run.add_argument('--generator', choices=GENERATORS, default='auto',
+                     help="Load generator: wrk if installed (auto), or the Python client in one process per core")
+    run.add_argument('--results-dir', default=RESULTS_DIR)
+    show = subparsers.add_parser('show', help="Print a stored run (default: the latest)")
+    show.add_argument('file', nargs='?')
+    show.add_argument('--results-dir', default=RESULTS_DIR)
+    compare = subparsers.add_parser('compare', help="Compare two stored runs (default: the latest two)")
+    compare.add_argument('files', nargs='*')
+    compare.add_argument('--results-dir', default=RESULTS_DIR)
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'run':
+            unknown = set(args.configs) - set(CONFIGURATIONS)
+            if unknown:
+                parser.error(f"unknown configuration(s): {', '.join(sorted(unknown))}")
+            result = run_suite(args.configs, args.nginx_binary, args.module, args.crs, args.prune or PRUNED_RULES,
+                               args.workers, args.requests, args.concurrency, args.generator)
+            print_run(result)
+            print(f"Saved {save_run(result, args.results_dir)}")
+        elif args.command == 'show':
+            runs = load_runs([args.file] if args.file else None, args.results_dir)
+            if not runs:
+                raise BenchError(f"No results in {args.results_dir}")
+            print_run(runs[-1])
+        else:
+            runs = load_runs(args.files, args.results_dir)
+            if len(runs) != 2:
+                raise BenchError("Need two runs to compare")
+            print_comparison(*runs)
+    except (BenchError, OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
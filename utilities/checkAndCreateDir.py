@@ -1,3 +1,8 @@
+import logging
+import os
+import shutil
+import sys
+
 def check_and_create_directory(dir_path):
     """Ensure that the specified path is a directory. If it exists, handle according to user choice."""
     if os.path.islink(dir_path):
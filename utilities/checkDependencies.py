@@ -1,3 +1,6 @@
+from utilities.commandExists import command_exists
+from utilities.errorExit import error_exit
+
 def check_dependencies():
     required_commands = ["apt", "wget", "git"]
     missing_commands = [cmd for cmd in required_commands if not command_exists(cmd)]
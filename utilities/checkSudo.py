@@ -1,3 +1,8 @@
+import logging
+import os
+
+from utilities.errorExit import error_exit
+
 def check_sudo():
     if os.geteuid() != 0:
         error_exit("This script must be run as root or with sudo privileges.")        
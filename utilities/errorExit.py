@@ -1,3 +1,6 @@
+import logging
+import sys
+
 def error_exit(message):
     logging.error(message)
     sys.exit(1)
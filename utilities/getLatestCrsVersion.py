@@ -1,39 +1,60 @@
-def add_official_deb_src():
-    """
-    Add official Ubuntu deb-src entries to /etc/apt/sources.list.d/ubuntu.sources, ensuring no duplicates.
-    """
-    ubuntu_codename = get_ubuntu_codename()
-    sources_file = "/etc/apt/sources.list.d/ubuntu.sources"
-    deb_src_content = prepare_deb_src_entries(ubuntu_codename)
+import json
+import logging
+import os
+import time
+import urllib.error
+import urllib.request
 
-    try:
-        # Read existing content if the file exists
-        if os.path.exists(sources_file):
-            with open(sources_file, "r") as file:
-                existing_content = file.read()
-        else:
-            existing_content = ""
-            # Ensure the directory exists
-            os.makedirs(os.path.dirname(sources_file), exist_ok=True)
-            logging.info(f"Created directory {os.path.dirname(sources_file)} for sources file.")
+CRS_RELEASES_API = "https://api.github.com/repos/coreruleset/coreruleset/releases/latest"
+CRS_VERSION_CACHE = os.path.expanduser("~/.cache/eos/crs-latest.json")
+# Within this many seconds the cached answer is used without asking GitHub at all
+CRS_VERSION_TTL = 3600
 
-        # Check if the deb-src entries are already present
-        if deb_src_content in existing_content:
-            logging.info("deb-src entries already exist in ubuntu.sources. Skipping addition.")
-            return
+def get_latest_crs_version(api_url=CRS_RELEASES_API, cache_file=CRS_VERSION_CACHE, ttl=CRS_VERSION_TTL, timeout=10):
+    """
+    Fetch the latest CRS version from GitHub releases, cached with its ETag.
 
-        # Append deb-src entries to the file
-        with open(sources_file, "a") as file:
-            logging.info("Adding deb-src entries to ubuntu.sources.")
-            # Add a separator if the file is not empty
-            if existing_content.strip():
-                file.write("\n\n")
-            file.write(deb_src_content + "\n")
-        logging.info("deb-src entries added successfully.")
+    A fresh cache answers without a request; after that a conditional request
+    is made, and a 304 (which does not count against GitHub's rate limit) keeps
+    the cached version. Set GITHUB_TOKEN to use the authenticated rate limit.
+    If GitHub cannot be reached the last version known for api_url is returned.
+    """
+    try:
+        with open(cache_file, "r") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    if cache.get("api_url") != api_url:
+        # Answers for another endpoint (e.g. a mock) are neither fresh nor a fallback for this one
+        cache = {}
+    if cache and time.time() - cache.get("checked", 0) < ttl:
+        return cache.get("version")
 
-        # Update package list
-        run_command("apt update", "Failed to update package list.")
-    except Exception as e:
-        logging.error(f"Failed to add deb-src entries: {e}")
-        raise
+    headers = {"Accept": "application/vnd.github+json", "User-Agent": "eosWeb"}
+    if cache.get("etag"):
+        headers["If-None-Match"] = cache["etag"]
+    if os.environ.get("GITHUB_TOKEN"):
+        headers["Authorization"] = f"Bearer {os.environ['GITHUB_TOKEN']}"
+    try:
+        with urllib.request.urlopen(urllib.request.Request(api_url, headers=headers), timeout=timeout) as response:
+            data = json.load(response)
+            cache = {"api_url": api_url, "version": data["tag_name"].lstrip("v"),
+                     "etag": response.headers.get("ETag")}
+    except urllib.error.HTTPError as e:
+        if e.code != 304:
+            logging.error(f"Failed to fetch latest CRS version: HTTP {e.code}")
+            return cache.get("version")
+        logging.debug("Latest CRS version unchanged (304).")
+    except (OSError, ValueError, KeyError) as e:
+        logging.error(f"Failed to fetch latest CRS version: {e}")
+        return cache.get("version")
 
+    cache["checked"] = time.time()
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(f"{cache_file}.tmp", "w") as f:
+            json.dump(cache, f)
+        os.replace(f"{cache_file}.tmp", cache_file)
+    except OSError as e:
+        logging.debug(f"Could not write {cache_file}: {e}")
+    return cache.get("version")
@@ -1,3 +1,6 @@
+import os
+import re
+
 def get_nginx_version(nginx_source_dir):
     """Automatically get the Nginx version from the source directory name."""
     dirs = os.listdir(nginx_source_dir)
@@ -1,3 +1,8 @@
+import logging
+import subprocess
+
+from utilities.errorExit import error_exit
+
 def get_ubuntu_codename():
     """Get the Ubuntu codename (e.g., focal, jammy)."""
     try:
@@ -1,3 +1,5 @@
+import logging
+
 def get_valid_user(prompt):
     while True:
         user_input = input(prompt).strip()
@@ -0,0 +1,29 @@
+import os
+import re
+
+VARIABLES_CONF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "variables.conf")
+
+def load_variables(conf_file=VARIABLES_CONF):
+    """
+    Parse a shell-style variables.conf into a dict.
+
+    Both `KEY="value"` and `KEY = "value"` forms are accepted, and `$VAR` /
+    `${VAR}` references are expanded from earlier keys or the environment.
+    """
+    variables = {}
+    if not os.path.exists(conf_file):
+        return variables
+
+    def expand(match):
+        name = match.group(1) or match.group(2)
+        return variables.get(name, os.environ.get(name, ""))
+
+    with open(conf_file, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#") or "=" not in line:
+                continue
+            key, value = line.split("=", 1)
+            value = value.strip().strip('"').strip("'")
+            variables[key.strip()] = re.sub(r'\$\{(\w+)\}|\$(\w+)', expand, value)
+    return variables
@@ -1,3 +1,8 @@
+import logging
+import subprocess
+
+from utilities.errorExit import error_exit
+
 def run_command(command, error_message):
     logging.debug(f"Running command: {command}")
     # Run the command interactively
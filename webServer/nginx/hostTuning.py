@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+
+import argparse
+import difflib
+import glob
+import logging
+import os
+import re
+import resource
+import subprocess
+import sys
+
+from backupAndRecovery.backupEngine import BackupError, backup_paths
+from webServer.nginx.portIndex import PORT_RANGE
+
+NGINX_MAIN_CONF = '/etc/nginx/nginx.conf'
+# Files holding server blocks, in the order nginx.conf includes them
+NGINX_SITE_GLOBS = ['/etc/nginx/conf.d/*.conf', '/etc/nginx/sites-enabled/*']
+SYSCTL_DROPIN = '/etc/sysctl.d/60-eos-nginx.conf'
+
+# Memory nginx may spend on connection state: buffers, SSL and the upstream side of proxied requests
+CONNECTION_MEMORY_SHARE = 0.25
+CONNECTION_MEMORY = 32 * 1024
+MIN_WORKER_CONNECTIONS = 1024
+MAX_WORKER_CONNECTIONS = 65535
+# A proxied connection holds a client and an upstream descriptor, plus files and logs
+FDS_PER_CONNECTION = 2
+FD_MARGIN = 1024
+# Accept queue per listener; nginx defaults to 511 and ignores a larger somaxconn unless told
+LISTEN_BACKLOG_SMALL = 4096
+LISTEN_BACKLOG_LARGE = 65535
+LARGE_HOST_CORES = 8
+EPHEMERAL_PORT_RANGE = (10240, 65535)
+
+LISTEN_PATTERN = re.compile(r'^(\s*listen\s+)([^;]+);', re.MULTILINE)
+
+def read_first(path, default=None):
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return default
+
+def nic_queues():
+    """Return the largest number of receive queues on a physical-looking interface."""
+    queues = 1
+    for interface in glob.glob('/sys/class/net/*'):
+        name = os.path.basename(interface)
+        if name == 'lo' or not os.path.exists(os.path.join(interface, 'device')):
+            continue
+        queues = max(queues, len(glob.glob(os.path.join(interface, 'queues', 'rx-*'))))
+    return queues
+
+def detect_host():
+    """Collect what the tuning is derived from: cores, memory, descriptor limits, NIC queues and sysctls."""
+    meminfo = read_first('/proc/meminfo', '')
+    match = re.search(r'^MemTotal:\s+(\d+) kB', meminfo, re.MULTILINE)
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    return {
+        'cores': len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1,
+        'memory': int(match.group(1)) * 1024 if match else 1024 ** 3,
+        'nofile_hard': hard,
+        'nr_open': int(read_first('/proc/sys/fs/nr_open', '1048576')),
+        'file_max': int(read_first('/proc/sys/fs/file-max', '1048576')),
+        'nic_queues': nic_queues(),
+        'somaxconn': int(read_first('/proc/sys/net/core/somaxconn', '4096')),
+        'tcp_max_syn_backlog': int(read_first('/proc/sys/net/ipv4/tcp_max_syn_backlog', '1024')),
+        'netdev_max_backlog': int(read_first('/proc/sys/net/core/netdev_max_backlog', '1000')),
+        'ip_local_port_range': tuple(int(p) for p in read_first('/proc/sys/net/ipv4/ip_local_port_range',
+                                                                '32768 60999').split()),
+        'ip_local_reserved_ports': read_first('/proc/sys/net/ipv4/ip_local_reserved_ports', ''),
+    }
+
+def plan_tuning(host):
+    """
+    Derive nginx and kernel settings for a host.
+
+    Settings are only ever raised relative to the running kernel, never lowered.
+    """
+    workers = host['cores']
+    by_memory = int(host['memory'] * CONNECTION_MEMORY_SHARE / (workers * CONNECTION_MEMORY))
+    connections = max(MIN_WORKER_CONNECTIONS, min(MAX_WORKER_CONNECTIONS, by_memory))
+    connections -= connections % 1024 if connections >= 2048 else 0
+    nofile = min(host['nr_open'], connections * FDS_PER_CONNECTION + FD_MARGIN)
+    backlog = LISTEN_BACKLOG_LARGE if workers >= LARGE_HOST_CORES else LISTEN_BACKLOG_SMALL
+    low, high = host['ip_local_port_range']
+    return {
+        'nginx': {
+            'worker_processes': workers,
+            'worker_rlimit_nofile': nofile,
+            # Pin workers only when the NIC can spread interrupts over at least as many queues
+            'worker_cpu_affinity': 'auto' if host['nic_queues'] >= workers > 1 else None,
+            'worker_connections': min(connections, nofile // FDS_PER_CONNECTION),
+            'multi_accept': 'on',
+        },
+        'listen': {'reuseport': True, 'backlog': backlog},
+        'sysctl': {
+            'net.core.somaxconn': max(host['somaxconn'], backlog),
+            'net.ipv4.tcp_max_syn_backlog': max(host['tcp_max_syn_backlog'], backlog),
+            'net.core.netdev_max_backlog': max(host['netdev_max_backlog'], 1000 * host['nic_queues'] * 2),
+            'net.ipv4.ip_local_port_range': f"{min(low, EPHEMERAL_PORT_RANGE[0])} {max(high, EPHEMERAL_PORT_RANGE[1])}",
+            'net.ipv4.ip_local_reserved_ports': reserved_ports(host['ip_local_reserved_ports']),
+            'fs.file-max': max(host['file_max'], nofile * workers * 2),
+        },
+    }
+
+def reserved_ports(current):
+    """
+    Add PORT_RANGE to the kernel's reserved ports, keeping existing reservations.
+
+    The widened ephemeral range covers the ports services are assigned from,
+    so without the reservation an outgoing connection could take a port
+    before the service that was allocated it binds it.
+    """
+    entries = [entry for entry in current.split(',') if entry.strip()]
+    service_range = f"{PORT_RANGE[0]}-{PORT_RANGE[1]}"
+    if service_range not in entries:
+        entries.append(service_range)
+    return ','.join(entries)
+
+def set_directive(content, name, value, block=None):
+    """Set a directive in the main context, or in the named block (events), replacing any existing value."""
+    pattern = re.compile(rf'^(\s*){name}\s+[^;]*;', re.MULTILINE)
+    if value is None:
+        return content
+    line = f"{name} {value};"
+    if pattern.search(content):
+        return pattern.sub(lambda m: f"{m.group(1)}{line}", content, count=1)
+    if block:
+        match = re.search(rf'^{block}\s*\{{\n', content, re.MULTILINE)
+        if match:
+            return content[:match.end()] + f"    {line}\n" + content[match.end():]
+        return content + f"\n{block} {{\n    {line}\n}}\n"
+    # Main-context directives go after worker_processes, or at the top after load_module/user lines
+    anchor = re.search(r'^worker_processes\s+[^;]*;\n', content, re.MULTILINE)
+    position = anchor.end() if anchor else 0
+    return content[:position] + line + "\n" + content[position:]
+
+def tune_main_conf(content, settings):
+    for name in ('worker_processes', 'worker_rlimit_nofile', 'worker_cpu_affinity'):
+        content = set_directive(content, name, settings[name])
+    for name in ('worker_connections', 'multi_accept'):
+        content = set_directive(content, name, settings[name], block='events')
+    return content
+
+def listen_address(value):
+    """Return the address:port a listen directive binds, as nginx groups listeners."""
+    address = value.split()[0]
+    if address.startswith('unix:'):
+        return address
+    if address.isdigit():
+        return f"*:{address}"
+    if address.startswith('0.0.0.0:'):
+        return '*:' + address.split(':', 1)[1]
+    if ':' not in address.replace('[::]', '') and not address.startswith('['):
+        return f"{address}:80"
+    return address
+
+def tune_listeners(files, listen):
+    """
+    Add reuseport and backlog= to one listen directive per address:port.
+
+    nginx accepts socket options only once per address:port across all server
+    blocks, so the first listener wins and the rest are left alone. Returns
+    {path: new content} for files that change.
+    """
+    seen = set()
+    contents = {}
+    for path in files:
+        with open(path, 'r') as f:
+            contents[path] = f.read()
+    # Addresses that already carry options in any file keep them
+    for content in contents.values():
+        for match in LISTEN_PATTERN.finditer(content):
+            words = match.group(2).split()
+            if 'reuseport' in words or any(word.startswith('backlog=') for word in words):
+                seen.add(listen_address(match.group(2)))
+
+    def add_options(match):
+        value = match.group(2)
+        address = listen_address(value)
+        if address in seen or address.startswith('unix:'):
+            return match.group(0)
+        seen.add(address)
+        options = []
+        if listen['reuseport']:
+            options.append('reuseport')
+        options.append(f"backlog={listen['backlog']}")
+        return f"{match.group(1)}{value} {' '.join(options)};"
+
+    changed = {}
+    for path, content in contents.items():
+        updated = LISTEN_PATTERN.sub(add_options, content)
+        if updated != content:
+            changed[path] = updated
+    return changed
+
+def render_sysctl(settings):
+    lines = ["# Managed by hostTuning.py; rewritten on every run, do not edit",
+             "# Raised to match the nginx listen backlog, worker connections and upstream traffic"]
+    lines += [f"{name} = {value}" for name, value in settings.items()]
+    return "\n".join(lines) + "\n"
+
+def site_files():
+    files = []
+    for pattern in NGINX_SITE_GLOBS:
+        files += sorted(path for path in glob.glob(pattern) if os.path.isfile(path))
+    # sites-enabled entries are symlinks into sites-available; edit each target once
+    return list(dict.fromkeys(os.path.realpath(path) for path in files))
+
+def planned_changes(tuning, main_conf=NGINX_MAIN_CONF, sysctl_dropin=SYSCTL_DROPIN):
+    """Return {path: (old content, new content)} for every file the tuning would change."""
+    changes = {}
+    if not os.path.exists(main_conf):
+        raise FileNotFoundError(f"{main_conf} not found; install nginx first.")
+    with open(main_conf, 'r') as f:
+        old = f.read()
+    new = tune_main_conf(old, tuning['nginx'])
+    if new != old:
+        changes[main_conf] = (old, new)
+    for path, new in tune_listeners(site_files(), tuning['listen']).items():
+        with open(path, 'r') as f:
+            changes[path] = (f.read(), new)
+    old = read_first(sysctl_dropin, '') + '\n' if os.path.exists(sysctl_dropin) else ''
+    new = render_sysctl(tuning['sysctl'])
+    if new != old:
+        changes[sysctl_dropin] = (old, new)
+    return changes
+
+def print_diff(changes):
+    for path, (old, new) in changes.items():
+        sys.stdout.writelines(difflib.unified_diff(old.splitlines(True), new.splitlines(True),
+                                                   fromfile=path, tofile=f"{path} (tuned)"))
+
+def apply_changes(changes, sysctl_dropin=SYSCTL_DROPIN):
+    """Write the changes, roll the nginx files back if `nginx -t` fails, then reload nginx and sysctls."""
+    existing = [path for path in changes if os.path.exists(path)]
+    if existing:
+        try:
+            manifest = backup_paths(existing, 'nginx-tuning')
+            logging.info(f"Backed up {len(existing)} file(s) as snapshot {manifest['id']}.")
+        except (BackupError, OSError) as e:
+            logging.warning(f"Backup before tuning failed: {e}")
+    for path, (_, new) in changes.items():
+        with open(path, 'w') as f:
+            f.write(new)
+    result = subprocess.run(['nginx', '-t'], capture_output=True, text=True)
+    if result.returncode != 0:
+        for path, (old, _) in changes.items():
+            if path == sysctl_dropin and not old:
+                os.remove(path)
+                continue
+            with open(path, 'w') as f:
+                f.write(old)
+        raise RuntimeError(f"nginx -t rejected the tuned config, rolled back:\n{result.stderr.strip()}")
+    if sysctl_dropin in changes:
+        subprocess.run(['sysctl', '-q', '-p', sysctl_dropin], check=True)
+    subprocess.run(['systemctl', 'reload', 'nginx'], check=True)
+
+def run_benchmark(command, url):
+    """Run the benchmark hook: a shell command (e.g. wrk), or a keep-alive load test against url."""
+    if command:
+        logging.info(f"Benchmark: {command}")
+        return subprocess.run(command, shell=True, capture_output=True, text=True).stdout.strip()
+    from webServer.nginx.rateLimits import load_test
+    results = load_test(url, requests=20000, concurrency=64)
+    served = sum(len(values) for values in results['latencies'].values())
+    return f"{served / results['duration']:.0f} req/s over {served} requests"
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        handlers=[logging.StreamHandler()]
+    )
+    parser = argparse.ArgumentParser(description="Tune nginx workers, listeners and kernel limits for this host.")
+    parser.add_argument('command', choices=['detect', 'diff', 'apply'])
+    parser.add_argument('--conf', default=NGINX_MAIN_CONF)
+    parser.add_argument('--bench-command', help="Shell command run before and after apply, e.g. wrk ...")
+    parser.add_argument('--bench-url', help="URL for the built-in keep-alive load test before and after apply")
+    args = parser.parse_args()
+
+    host = detect_host()
+    tuning = plan_tuning(host)
+    if args.command == 'detect':
+        for name, value in host.items():
+            print(f"{name:<22} {value}")
+        for section, settings in tuning.items():
+            for name, value in settings.items():
+                print(f"{section + '.' + name:<40} {value}")
+        return
+
+    try:
+        changes = planned_changes(tuning, args.conf)
+    except OSError as e:
+        logging.error(str(e))
+        sys.exit(1)
+    if not changes:
+        print("Already tuned, nothing to change.")
+        return
+    print_diff(changes)
+    if args.command == 'diff':
+        return
+
+    benchmark = args.bench_command or args.bench_url
+    before = run_benchmark(args.bench_command, args.bench_url) if benchmark else None
+    try:
+        apply_changes(changes)
+    except (RuntimeError, subprocess.CalledProcessError) as e:
+        logging.error(str(e))
+        sys.exit(1)
+    logging.info(f"Applied tuning to {len(changes)} file(s).")
+    if benchmark:
+        after = run_benchmark(args.bench_command, args.bench_url)
+        print(f"Before: {before}\nAfter:  {after}")
+
+if __name__ == '__main__':
+    main()
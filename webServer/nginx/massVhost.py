@@ -0,0 +1,528 @@
+#!/usr/bin/env python3
+
+import argparse
+import http.client
+import ipaddress
+import logging
+import os
+import random
+import re
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from webServer.nginx.hostTuning import NGINX_MAIN_CONF
+from webServer.nginx.portIndex import SERVER_NAME_PATTERN, TENANTS_MAP, build_index, conf_files, load_tenants
+from webServer.nginx.rateLimits import percentile
+from securityAndEncryption.modSecurity.wafBench import BenchError, child_pids, measure_reload, rss_kb, wait_for_port
+
+# Tenants live in one map file, one "<host> <upstream>;" line each, included by the
+# map block in HTTP_CONF. Adding a tenant appends a line there and reloads; the single
+# server block and its wildcard server_names only change when a new parent domain appears.
+HTTP_CONF = '/etc/nginx/conf.d/eos-mass-vhost.conf'
+NGINX_SITE_PATHS = ['/etc/nginx/sites-enabled', '/etc/nginx/conf.d']
+MAP_VARIABLE = '$eos_tenant_upstream'
+
+# ngx_hash_init(): every element takes a pointer, a 2-byte length and the key padded to the
+# pointer size; each bucket ends with a NULL pointer. Buckets are sized in cache lines.
+POINTER_BYTES = 8
+CACHE_LINE = 64
+MAX_BUCKET_SIZE = 4096
+# Average keys a bucket should have room for
+BUCKET_ELEMENTS = 4
+# max_size in table slots per key, so tenants can be added without retuning
+HASH_HEADROOM = 2
+# Above 10000, and under 100 slots per key, nginx probes only the last 1000 table sizes
+FAST_START_KEYS = 200
+FAST_START_SIZE = 16384
+# nginx's own defaults, kept as floors
+MAP_HASH_MAX_SIZE = 2048
+SERVER_NAMES_HASH_MAX_SIZE = 512
+
+HOST_PATTERN = re.compile(r'^(?:\*\.|\.)?(?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z][a-z0-9-]{0,62}$')
+
+HTTP_CONF_TEMPLATE = """# Generated by massVhost.py from {tenants_map}; change tenants with `eos vhosts add|remove`
+{hash_directives}
+map $host {variable} {{
+    hostnames;
+    default "";
+    include {tenants_map};
+}}
+
+server {{
+    listen {listen};
+    server_name {server_names};
+
+    # Host under a tenant domain but not in the map
+    if ({variable} = "") {{
+        return 404;
+    }}
+
+    location / {{
+        proxy_pass http://{variable};
+        proxy_set_header Host $host;
+        proxy_set_header X-Real-IP $remote_addr;
+        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+        proxy_set_header X-Forwarded-Proto $scheme;
+    }}
+}}
+"""
+
+BENCH_CONF_TEMPLATE = """# Generated by massVhost.py for the {layout} benchmark layout
+{user}worker_processes {workers};
+pid {prefix}/nginx.pid;
+error_log {prefix}/error.log warn;
+
+events {{
+    worker_connections 4096;
+}}
+
+http {{
+    access_log off;
+    client_body_temp_path {prefix}/client_body;
+    proxy_temp_path {prefix}/proxy;
+    fastcgi_temp_path {prefix}/fastcgi;
+    uwsgi_temp_path {prefix}/uwsgi;
+    scgi_temp_path {prefix}/scgi;
+{hash_directives}
+    server {{
+        listen 127.0.0.1:{backend_port};
+        location / {{
+            return 200 "ok\\n";
+        }}
+    }}
+
+    include {prefix}/http.d/*.conf;
+}}
+"""
+BENCH_PORT = 18090
+BENCH_BACKEND_PORT = 18091
+BENCH_DOMAIN = 'tenants.bench.test'
+LAYOUTS = ['files', 'map']
+
+class MassVhostError(Exception):
+    pass
+
+def normalize_upstream(upstream):
+    """
+    Reduce http://host:port to an IP:port map value.
+
+    The map value ends up in `proxy_pass http://$var`, which nginx resolves at
+    request time; an address needs no resolver, a host name would.
+    """
+    address = re.sub(r'^https?://', '', upstream.strip()).rstrip('/')
+    if address.startswith('localhost:'):
+        address = '127.0.0.1:' + address.split(':', 1)[1]
+    host, _, port = address.rpartition(':')
+    if not port.isdigit() or not 0 < int(port) < 65536:
+        raise MassVhostError(f"{upstream}: upstream needs a port, e.g. 127.0.0.1:3000")
+    try:
+        ipaddress.ip_address(host.strip('[]'))
+    except ValueError:
+        raise MassVhostError(f"{upstream}: upstream must be an IP address; host names need a resolver per request")
+    return address
+
+def normalize_host(host):
+    host = host.strip().lower().rstrip('.')
+    if not HOST_PATTERN.match(host):
+        raise MassVhostError(f"{host}: not a host name (wildcards are .example.com or *.example.com)")
+    return host
+
+def render_tenants(tenants):
+    lines = ["# Generated by massVhost.py: one tenant per line, <host> <upstream>;"]
+    lines += [f"{host} {upstream};" for host, upstream in tenants.items()]
+    return "\n".join(lines) + "\n"
+
+def parent_domain(host):
+    """The wildcard server_name covering host: .example.com for shop.example.com, .example.com for .example.com."""
+    host = (host[1:] if host.startswith('*') else host).lstrip('.')
+    labels = host.split('.')
+    return '.' + ('.'.join(labels[1:]) if len(labels) > 2 else host)
+
+def wildcard_names(tenants):
+    return sorted({parent_domain(host) for host in tenants}, key=lambda name: name[::-1])
+
+def align(value, boundary):
+    return (value + boundary - 1) & ~(boundary - 1)
+
+def element_size(key):
+    """NGX_HASH_ELT_SIZE: value pointer, 2-byte length, key padded to the pointer size."""
+    return POINTER_BYTES + align(len(key) + 2, POINTER_BYTES)
+
+def hash_key(key):
+    """ngx_hash_key_lc() with a 64-bit ngx_uint_t."""
+    value = 0
+    for byte in key.lower().encode():
+        value = (value * 31 + byte) & 0xFFFFFFFFFFFFFFFF
+    return value
+
+def hash_table_size(keys, bucket_size, max_size):
+    """
+    Replay ngx_hash_init()'s search and return (table size, sizes probed), or (None, probes).
+
+    nginx runs this loop on every start and reload, once per hash; the number of
+    sizes probed times the key count is what a badly tuned hash costs at reload.
+    """
+    entries = [(hash_key(key), element_size(key)) for key in keys]
+    if not entries:
+        return 1, 0
+    usable = bucket_size - POINTER_BYTES
+    if max(size for _, size in entries) > usable:
+        return None, 0
+    start = max(1, len(entries) // (usable // (2 * POINTER_BYTES)))
+    if max_size > 10000 and max_size // len(entries) < 100:
+        start = max_size - 1000
+    probes = 0
+    for size in range(start, max_size + 1):
+        probes += 1
+        buckets = [0] * size
+        for key, length in entries:
+            slot = key % size
+            buckets[slot] += length
+            if buckets[slot] > usable:
+                break
+        else:
+            return size, probes
+    return None, probes
+
+def size_hash(keys, floor):
+    """Pick (max_size, bucket_size, table size, probes) so ngx_hash_init() succeeds fast with room to grow."""
+    keys = list(keys)
+    sizes = [element_size(key) for key in keys] or [0]
+    # A bucket that fits only one key needs a collision-free table: large, and slow to find on every reload
+    needed = max(max(sizes), BUCKET_ELEMENTS * sum(sizes) // len(sizes))
+    bucket_size = CACHE_LINE
+    while bucket_size < needed + POINTER_BYTES:
+        bucket_size *= 2
+    max_size = floor
+    while max_size < HASH_HEADROOM * len(keys):
+        max_size *= 2
+    if len(keys) >= FAST_START_KEYS:
+        # nginx then starts its search at max_size - 1000 instead of walking up from a small table
+        max_size = max(max_size, FAST_START_SIZE)
+    while bucket_size <= MAX_BUCKET_SIZE:
+        size, probes = hash_table_size(keys, bucket_size, max_size)
+        if size:
+            return max_size, bucket_size, size, probes
+        bucket_size *= 2
+    raise MassVhostError(f"No hash layout fits {len(keys)} keys with buckets up to {MAX_BUCKET_SIZE} bytes")
+
+def map_keys(tenants):
+    """Keys of the map's exact-match hash; wildcard tenants go to nginx's per-label wildcard hashes."""
+    return [host for host in tenants if not host.startswith(('.', '*.'))]
+
+def site_server_names(site_paths=NGINX_SITE_PATHS, exclude=HTTP_CONF):
+    names = set()
+    for path in conf_files(site_paths):
+        if os.path.realpath(path) == os.path.realpath(exclude):
+            continue
+        try:
+            with open(path, 'r') as f:
+                content = f.read()
+        except (OSError, UnicodeDecodeError):
+            continue
+        for match in SERVER_NAME_PATTERN.finditer(content):
+            names.update(name for name in match.group(1).split() if name != '_' and not name.startswith('~'))
+    return names
+
+def hash_settings(tenants, server_names):
+    """map_hash_* and server_names_hash_* values for these tenants and the other sites' server names."""
+    map_max, map_bucket, map_table, map_probes = size_hash(map_keys(tenants), MAP_HASH_MAX_SIZE)
+    names = {name.lstrip('*').lstrip('.') for name in server_names}
+    server_max, server_bucket, server_table, server_probes = size_hash(sorted(names), SERVER_NAMES_HASH_MAX_SIZE)
+    return {
+        'map_hash_max_size': map_max, 'map_hash_bucket_size': map_bucket,
+        'server_names_hash_max_size': server_max, 'server_names_hash_bucket_size': server_bucket,
+        'stats': {'map': {'keys': len(map_keys(tenants)), 'table': map_table, 'probes': map_probes},
+                  'server_names': {'keys': len(names), 'table': server_table, 'probes': server_probes}},
+    }
+
+def main_conf_directives(main_conf=NGINX_MAIN_CONF):
+    """Hash directives already set (uncommented) in nginx.conf; repeating them in conf.d would fail nginx -t."""
+    try:
+        with open(main_conf, 'r') as f:
+            content = f.read()
+    except OSError:
+        return set()
+    return {name for name in ('map_hash_max_size', 'map_hash_bucket_size', 'server_names_hash_max_size',
+                              'server_names_hash_bucket_size')
+            if re.search(rf'^\s*{name}\s+[^;]*;', content, re.MULTILINE)}
+
+def render_hash_directives(settings, skip=(), indent=''):
+    lines = [f"{indent}{name} {value};" for name, value in settings.items()
+             if name != 'stats' and name not in skip]
+    return "\n".join(lines) + "\n" if lines else ""
+
+def render_http_conf(tenants, settings, skip=(), listen='80', tenants_map=TENANTS_MAP):
+    return HTTP_CONF_TEMPLATE.format(
+        tenants_map=tenants_map, variable=MAP_VARIABLE, listen=listen,
+        hash_directives=render_hash_directives(settings, skip),
+        server_names=' '.join(wildcard_names(tenants)) or 'mass-vhost.invalid')
+
+def write_atomic(path, content):
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(prefix='.eos-', dir=directory)
+    with os.fdopen(descriptor, 'w') as f:
+        f.write(content)
+    os.chmod(temporary, 0o644)
+    os.replace(temporary, path)
+
+def read_or_none(path):
+    try:
+        with open(path, 'r') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+class MassVhost:
+    """The tenant map plus the one server block serving it."""
+
+    def __init__(self, tenants_map=TENANTS_MAP, http_conf=HTTP_CONF, main_conf=NGINX_MAIN_CONF,
+                 site_paths=NGINX_SITE_PATHS, nginx_binary='nginx', reload=True):
+        self.tenants_map = tenants_map
+        self.http_conf = http_conf
+        self.main_conf = main_conf
+        self.site_paths = site_paths
+        self.nginx_binary = nginx_binary
+        self.reload = reload
+
+    def tenants(self):
+        return load_tenants(self.tenants_map)
+
+    def settings(self, tenants):
+        return hash_settings(tenants, site_server_names(self.site_paths, self.http_conf) | set(wildcard_names(tenants)))
+
+    def render(self, tenants):
+        """Return {path: content} for the map file and the server block."""
+        settings = self.settings(tenants)
+        return {
+            self.tenants_map: render_tenants(tenants),
+            self.http_conf: render_http_conf(tenants, settings, main_conf_directives(self.main_conf),
+                                             tenants_map=self.tenants_map),
+        }
+
+    def apply(self, tenants):
+        """Write only the files that change, roll back if `nginx -t` fails, then reload; returns the changed paths."""
+        changed = {path: (read_or_none(path), content) for path, content in self.render(tenants).items()
+                   if read_or_none(path) != content}
+        for path, (_, content) in changed.items():
+            write_atomic(path, content)
+        if not changed or not self.reload:
+            return list(changed)
+        result = subprocess.run([self.nginx_binary, '-t'], capture_output=True, text=True)
+        if result.returncode != 0:
+            for path, (old, _) in changed.items():
+                if old is None:
+                    os.remove(path)
+                else:
+                    write_atomic(path, old)
+            raise MassVhostError(f"nginx -t rejected the tenant map, rolled back:\n{result.stderr.strip()}")
+        subprocess.run([self.nginx_binary, '-s', 'reload'], check=True)
+        return list(changed)
+
+    def add(self, host, upstream):
+        host, upstream = normalize_host(host), normalize_upstream(upstream)
+        tenants = self.tenants()
+        if host in tenants:
+            raise MassVhostError(f"{host} is already a tenant (-> {tenants[host]})")
+        index = build_index(listeners=False, tenants_map=self.tenants_map)
+        # Our own wildcard server_names cover every tenant domain; only other owners conflict
+        owners = [f"{source} {where}" for source, where in index.domain_owners(host.lstrip('*.'))
+                  if where != self.http_conf]
+        if owners:
+            raise MassVhostError(f"{host} is already served by {', '.join(owners)}")
+        tenants[host] = upstream
+        return self.apply(tenants)
+
+    def remove(self, host):
+        host = normalize_host(host)
+        tenants = self.tenants()
+        if tenants.pop(host, None) is None:
+            raise MassVhostError(f"{host} is not a tenant")
+        return self.apply(tenants)
+
+def write_bench_layout(prefix, layout, tenants, workers, port=BENCH_PORT, backend_port=BENCH_BACKEND_PORT):
+    """Write nginx.conf for one layout: a server block file per tenant, or one map and one server block."""
+    for directory in ('client_body', 'proxy', 'fastcgi', 'uwsgi', 'scgi', 'http.d'):
+        os.makedirs(os.path.join(prefix, directory), exist_ok=True)
+    if layout == 'files':
+        for host, upstream in tenants.items():
+            with open(os.path.join(prefix, 'http.d', f"{host}.conf"), 'w') as f:
+                f.write(f"server {{\n    listen 127.0.0.1:{port};\n    server_name {host};\n\n"
+                        f"    location / {{\n        proxy_pass http://{upstream};\n"
+                        f"        proxy_set_header Host $host;\n    }}\n}}\n")
+        settings = hash_settings({}, tenants)
+    else:
+        tenants_map = os.path.join(prefix, 'tenants.map')
+        with open(tenants_map, 'w') as f:
+            f.write(render_tenants(tenants))
+        settings = hash_settings(tenants, wildcard_names(tenants))
+        with open(os.path.join(prefix, 'http.d', 'mass-vhost.conf'), 'w') as f:
+            f.write(render_http_conf(tenants, settings, skip=settings.keys(), listen=f"127.0.0.1:{port}",
+                                     tenants_map=tenants_map))
+    conf = os.path.join(prefix, 'nginx.conf')
+    with open(conf, 'w') as f:
+        f.write(BENCH_CONF_TEMPLATE.format(
+            layout=layout, prefix=prefix, workers=workers, backend_port=backend_port,
+            user="user root;\n" if os.geteuid() == 0 else "",
+            hash_directives=render_hash_directives(settings, indent='    ')))
+    return conf, settings['stats']
+
+def lookup_worker(port, count, hosts, results, lock):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    chooser = random.Random(threading.get_ident())
+    while True:
+        with lock:
+            if results['sent'] >= count:
+                break
+            results['sent'] += 1
+        start = time.perf_counter()
+        try:
+            connection.request('GET', '/', headers={'Host': chooser.choice(hosts)})
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            status = 'error'
+        elapsed = time.perf_counter() - start
+        with lock:
+            results['latencies'].append(elapsed)
+            results['statuses'][str(status)] = results['statuses'].get(str(status), 0) + 1
+    connection.close()
+
+def drive_lookups(port, hosts, requests, concurrency):
+    """Requests with a random tenant Host each, so every request pays a fresh host lookup."""
+    results = {'sent': 0, 'latencies': [], 'statuses': {}}
+    lock = threading.Lock()
+    threads = [threading.Thread(target=lookup_worker, args=(port, requests, hosts, results, lock))
+               for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - started
+    latencies = results['latencies']
+    return {'rps': round(len(latencies) / duration, 1),
+            'p50_ms': round(statistics.median(latencies) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+            'statuses': results['statuses']}
+
+def bench_layout(layout, tenant_count, nginx_binary='nginx', workers=2, requests=5000, concurrency=16,
+                 port=BENCH_PORT, backend_port=BENCH_BACKEND_PORT):
+    """Start nginx with tenant_count synthetic tenants in one layout and measure parse, reload and lookups."""
+    tenants = {f"t{index}.{BENCH_DOMAIN}": f"127.0.0.1:{backend_port}" for index in range(tenant_count)}
+    prefix = tempfile.mkdtemp(prefix=f"eos-mass-vhost-{layout}-")
+    process = None
+    try:
+        started = time.perf_counter()
+        conf, stats = write_bench_layout(prefix, layout, tenants, workers, port, backend_port)
+        generate = time.perf_counter() - started
+        started = time.perf_counter()
+        check = subprocess.run([nginx_binary, '-t', '-q', '-p', prefix, '-c', conf], capture_output=True, text=True)
+        config_test = time.perf_counter() - started
+        if check.returncode != 0:
+            raise MassVhostError(f"{layout}: nginx -t failed:\n{check.stderr.strip()}")
+
+        process = subprocess.Popen([nginx_binary, '-p', prefix, '-c', conf, '-g', 'daemon off;'],
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        wait_for_port('127.0.0.1', port, process)
+        hosts = list(tenants)
+        drive_lookups(port, hosts, min(200, requests), concurrency)
+        result = drive_lookups(port, hosts, requests, concurrency)
+        result.update({
+            'layout': layout, 'tenants': tenant_count, 'hash': stats,
+            'generate_s': round(generate, 4),
+            'config_test_s': round(config_test, 4),
+            'reload_s': round(measure_reload(process.pid, workers), 4),
+            'master_rss_kb': rss_kb(process.pid),
+            'worker_rss_kb': max((rss_kb(pid) for pid in child_pids(process.pid)), default=0),
+        })
+        return result
+    finally:
+        if process and process.poll() is None:
+            process.send_signal(signal.SIGQUIT)
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        shutil.rmtree(prefix, ignore_errors=True)
+
+def print_bench(results):
+    print(f"{'layout':<6} {'tenants':>8} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'test s':>8} {'reload s':>9} "
+          f"{'master MB':>10} {'worker MB':>10}  hash probes")
+    for r in results:
+        probes = r['hash']['map' if r['layout'] == 'map' else 'server_names']['probes']
+        print(f"{r['layout']:<6} {r['tenants']:>8} {r['rps']:>9.0f} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} "
+              f"{r['config_test_s']:>8.3f} {r['reload_s']:>9.3f} {r['master_rss_kb'] / 1024:>10.1f} "
+              f"{r['worker_rss_kb'] / 1024:>10.1f}  {probes}")
+
+def print_settings(settings):
+    for name, value in settings.items():
+        if name != 'stats':
+            print(f"{name} {value};")
+    for hash_name, stats in settings['stats'].items():
+        print(f"# {hash_name}: {stats['keys']} keys in a {stats['table']}-bucket table, "
+              f"{stats['probes']} size(s) probed per reload")
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Serve many tenant domains from one map-driven nginx server block.")
+    parser.add_argument('--tenants-map', default=TENANTS_MAP)
+    parser.add_argument('--http-conf', default=HTTP_CONF)
+    parser.add_argument('--main-conf', default=NGINX_MAIN_CONF)
+    parser.add_argument('--nginx-binary', default='nginx')
+    parser.add_argument('--no-reload', action='store_true', help="Write the files without nginx -t and reload")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    add = subparsers.add_parser('add', help="Add a tenant: one map line and a reload")
+    add.add_argument('host', help="shop.example.com, or .example.com for a domain and its subdomains")
+    add.add_argument('upstream', help="IP:port, e.g. 127.0.0.1:3000")
+    remove = subparsers.add_parser('remove', help="Remove a tenant")
+    remove.add_argument('host')
+    subparsers.add_parser('list', help="List tenants")
+    subparsers.add_parser('render', help="Print the generated server block and hash sizes")
+    subparsers.add_parser('tune', help="Show the hash sizes the current tenants need")
+    bench = subparsers.add_parser('bench', help="Compare per-tenant server blocks with the map layout")
+    bench.add_argument('-t', '--tenants', type=int, action='append', help="Tenant count (repeatable, default 1000)")
+    bench.add_argument('--layout', choices=LAYOUTS, action='append')
+    bench.add_argument('--workers', type=int, default=2)
+    bench.add_argument('-n', '--requests', type=int, default=5000)
+    bench.add_argument('-c', '--concurrency', type=int, default=16)
+    args = parser.parse_args()
+
+    manager = MassVhost(args.tenants_map, args.http_conf, args.main_conf, nginx_binary=args.nginx_binary,
+                        reload=not args.no_reload)
+    try:
+        if args.command == 'add':
+            changed = manager.add(args.host, args.upstream)
+            logging.info(f"Added {args.host}; wrote {', '.join(changed)}")
+        elif args.command == 'remove':
+            changed = manager.remove(args.host)
+            logging.info(f"Removed {args.host}; wrote {', '.join(changed)}")
+        elif args.command == 'list':
+            tenants = manager.tenants()
+            if not tenants:
+                print("No tenants configured.")
+            for host, upstream in tenants.items():
+                print(f"{host} -> {upstream}")
+        elif args.command == 'render':
+            print(manager.render(manager.tenants())[manager.http_conf], end='')
+        elif args.command == 'tune':
+            print_settings(manager.settings(manager.tenants()))
+        else:
+            results = [bench_layout(layout, count, args.nginx_binary, args.workers, args.requests, args.concurrency)
+                       for count in args.tenants or [1000] for layout in args.layout or LAYOUTS]
+            print_bench(results)
+    except (MassVhostError, BenchError, OSError, subprocess.CalledProcessError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -1,23 +1,63 @@
 #!/usr/bin/env python3
 
+import fnmatch
+import logging
 import os
+import re
 import subprocess
-import shutil
 import sys
-import yaml
+
+from containersAndOrchestration.docker.dockerEngine import (
+    DockerEngineClient, DockerEngineError, compose_down, compose_plan, compose_status, compose_up,
+)
+from containersAndOrchestration.docker.composeState import ComposeStateError, load_compose_state, save_compose_state
+from containersAndOrchestration.docker.blueGreenSwap import active_container, swap_service
+from backupAndRecovery.backupEngine import backup_paths
+from webServer.nginx.portIndex import PortIndexError, build_index
+from securityAndEncryption.certInventory import NGINX_CONF_PATHS, check_certificates, print_report, renew_due
 
 NGINX_DIR = os.path.expanduser('~/nginx-docker')
 DOCKER_COMPOSE_FILE = os.path.join(NGINX_DIR, 'docker-compose.yaml')
-BACKUP_DIR = '/etc/eos/nginx-docker'
 LOG_DIR = '/var/log/eos/nginx-docker'
+LOG_FILE = os.path.join(LOG_DIR, 'nginx.log')
+USAGE = "Usage: eos nginx [--list|--ssl|--start|--stop|--status|--swap|--enable-swap|--check-configs|--backup-configs|--plan|--implement|--connect-plan|--connect-implement|--connect-check]"
 
-if not os.path.exists(LOG_DIR):
-    os.makedirs(LOG_DIR)
+# Swap mode: each nginx container answers on its own unix socket so health checks
+# reach the new container even while both share ports 80/443 via reuseport.
+NGINX_CONF = os.path.join(NGINX_DIR, 'nginx.conf')
+HEALTH_CONF = os.path.join(NGINX_DIR, 'eos-health.conf')
+HEALTH_SOCKET = '/run/eos-health.sock'
+# Where the health listener is mounted inside the container
+HEALTH_CONF_TARGET = '/etc/nginx/conf.d/eos-health.conf'
+HEALTH_CONF_CONTENT = f"""server {{
+    listen unix:{HEALTH_SOCKET};
+    access_log off;
+    location = /eos-health {{
+        return 200 "ok\\n";
+    }}
+}}
+"""
+SWAP_VALIDATE_COMMAND = ['nginx', '-t']
+SWAP_HEALTH_COMMAND = ['curl', '-fsS', '--unix-socket', HEALTH_SOCKET, 'http://localhost/eos-health']
+# A swapped-in container first runs a config with only the health listener, so it takes no
+# traffic on the shared ports until it passed its checks. It runs nginx from eos-active.conf,
+# a container-local file that starts as the standby config and is pointed at nginx.conf on
+# activation; restarts of an activated container therefore come up serving.
+STANDBY_CONF = os.path.join(NGINX_DIR, 'eos-standby.conf')
+STANDBY_CONF_TARGET = '/etc/nginx/eos-standby.conf'
+ACTIVE_CONF_TARGET = '/etc/nginx/eos-active.conf'
+SWAP_STANDBY_COMMAND = ['sh', '-c', f"[ -f {ACTIVE_CONF_TARGET} ] || cp {STANDBY_CONF_TARGET} {ACTIVE_CONF_TARGET}; "
+                                    f"exec nginx -c {ACTIVE_CONF_TARGET} -g 'daemon off;'"]
+SWAP_ACTIVATE_COMMAND = ['sh', '-c', f"echo 'include /etc/nginx/nginx.conf;' > {ACTIVE_CONF_TARGET} && "
+                                     f"nginx -c {ACTIVE_CONF_TARGET} -s reload"]
 
-LOG_FILE = os.path.join(LOG_DIR, 'nginx.log')
+def ensure_log_dir():
+    # Created on first use rather than at import, so `eos --help` never touches /var/log
+    os.makedirs(LOG_DIR, exist_ok=True)
 
 def log_message(message):
     """Logs a message to the log file."""
+    ensure_log_dir()
     with open(LOG_FILE, 'a') as log:
         log.write(f"{message}\n")
     print(message)
@@ -33,56 +73,203 @@ def run_command(command):
         log_message(e.output)
         sys.exit(1)
 
+def compose_domains():
+    """Returns the domains configured on the nginx service in the compose file."""
+    if not os.path.exists(DOCKER_COMPOSE_FILE):
+        return []
+    config = load_compose_config()
+    return config.get('services', {}).get('nginx', {}).get('domains', [])
+
 def list_domains():
     """Lists domains and subdomains."""
     if os.path.exists(DOCKER_COMPOSE_FILE):
-        with open(DOCKER_COMPOSE_FILE, 'r') as f:
-            config = yaml.safe_load(f)
-            if 'services' in config and 'nginx' in config['services']:
-                log_message("Domains and subdomains in Nginx config:")
-                for domain in config['services']['nginx'].get('domains', []):
-                    log_message(f"- {domain}")
-            else:
-                log_message("No domains found in Nginx service.")
+        config = load_compose_config()
+        if 'services' in config and 'nginx' in config['services']:
+            log_message("Domains and subdomains in Nginx config:")
+            for domain in config['services']['nginx'].get('domains', []):
+                log_message(f"- {domain}")
+        else:
+            log_message("No domains found in Nginx service.")
     else:
         log_message(f"{DOCKER_COMPOSE_FILE} not found!")
 
 def manage_ssl(action):
     """Manages SSL certificates."""
+    conf_paths = NGINX_CONF_PATHS + [NGINX_CONF]
     if action == 'get':
         log_message("Fetching SSL certificates...")
         run_command("certbot certonly --nginx")
     elif action == 'check':
         log_message("Checking SSL certificates...")
-        run_command("certbot certificates")
+        certs, uncovered = check_certificates(conf_paths, compose_domains())
+        print_report(certs, uncovered)
     elif action == 'renew':
-        log_message("Renewing SSL certificates...")
-        run_command("certbot renew")
+        log_message("Renewing SSL certificates close to expiry...")
+        results = renew_due(conf_paths, compose_domains())
+        failed = [result['name'] for result in results if result['status'] != 'ok']
+        if failed:
+            log_message(f"Renewal failed for: {', '.join(failed)}")
+            sys.exit(1)
+        log_message(f"Renewed {len(results)} certificate(s).")
     else:
         log_message("Unknown SSL action. Use 'get', 'check', or 'renew'.")
 
+def run_engine(action, *args):
+    """Runs a Docker Engine API action, exiting with a logged error if it fails."""
+    client = DockerEngineClient()
+    try:
+        return action(client, *args)
+    except DockerEngineError as e:
+        log_message(f"Docker Engine error: {e}")
+        sys.exit(1)
+    finally:
+        client.close()
+
 def start_nginx():
     """Starts Nginx."""
     log_message("Starting Nginx...")
-    run_command(f"docker-compose -f {DOCKER_COMPOSE_FILE} up -d")
+    run_engine(compose_up, DOCKER_COMPOSE_FILE)
 
 def stop_nginx():
     """Stops Nginx."""
     log_message("Stopping Nginx...")
-    run_command(f"docker-compose -f {DOCKER_COMPOSE_FILE} down")
+    run_engine(compose_down, DOCKER_COMPOSE_FILE)
+
+def status_nginx():
+    """Shows the state of each service in the compose file."""
+    for service, state in run_engine(compose_status, DOCKER_COMPOSE_FILE).items():
+        log_message(f"{service}: {state}")
+
+def load_compose_config():
+    """Loads the Nginx docker-compose file; parsed once per change, then served from the cache."""
+    try:
+        return load_compose_state(DOCKER_COMPOSE_FILE)
+    except ComposeStateError as e:
+        log_message(f"Invalid compose file {DOCKER_COMPOSE_FILE}: {e}")
+        sys.exit(1)
+
+def listeners_without_reuseport(conf_file):
+    """Returns TCP listen directives in conf_file that cannot be shared between two containers."""
+    if not os.path.exists(conf_file):
+        return []
+    with open(conf_file, 'r') as f:
+        listens = re.findall(r'^\s*listen\s+([^;]+);', f.read(), re.MULTILINE)
+    return [listen for listen in listens if 'reuseport' not in listen.split() and not listen.startswith('unix:')]
+
+def includes_health_conf(conf_file):
+    """Returns True if conf_file includes the mounted health listener (the image's default nginx.conf does)."""
+    if not os.path.exists(conf_file):
+        return True
+    with open(conf_file, 'r') as f:
+        content = re.sub(r'#[^\n]*', '', f.read())
+    for pattern in re.findall(r'(?:^|[;{}])\s*include\s+([^;\s]+)\s*;', content, re.MULTILINE):
+        # Relative includes resolve against the config prefix, /etc/nginx in the official image
+        if fnmatch.fnmatch(HEALTH_CONF_TARGET, os.path.join('/etc/nginx', pattern.strip('"\''))):
+            return True
+    return False
+
+def swap_mode_enabled():
+    """Returns True if the Nginx service runs with host networking for swaps."""
+    if not os.path.exists(DOCKER_COMPOSE_FILE):
+        return False
+    return load_compose_config().get('services', {}).get('nginx', {}).get('network_mode') == 'host'
+
+def standby_conf_content(conf_file=NGINX_CONF):
+    """The standby config: nginx.conf's user and pid, and only the health listener."""
+    main_lines = []
+    if os.path.exists(conf_file):
+        with open(conf_file, 'r') as f:
+            main_lines = re.findall(r'^\s*((?:user|pid)\s+[^;]+;)', f.read(), re.MULTILINE)
+    lines = ["# Generated by nginx.py: a swapped-in container serves only its health listener until activated"]
+    lines += main_lines + ["events {}", "http {", f"    include {HEALTH_CONF_TARGET};", "}"]
+    return "\n".join(lines) + "\n"
+
+def swap_volumes():
+    return [f"./{os.path.basename(HEALTH_CONF)}:{HEALTH_CONF_TARGET}",
+            f"./{os.path.basename(STANDBY_CONF)}:{STANDBY_CONF_TARGET}"]
+
+def apply_swap_mode():
+    """Rewrites the compose file with host networking, the health listener and the standby config."""
+    config = load_compose_config()
+    nginx_config = config['services']['nginx']
+    nginx_config['network_mode'] = 'host'
+    for volume in swap_volumes():
+        if volume not in nginx_config.setdefault('volumes', []):
+            nginx_config['volumes'].append(volume)
+
+    with open(HEALTH_CONF, 'w') as f:
+        f.write(HEALTH_CONF_CONTENT)
+    with open(STANDBY_CONF, 'w') as f:
+        f.write(standby_conf_content())
+    save_compose_state(DOCKER_COMPOSE_FILE, config)
+
+def enable_swap_mode():
+    """Switches the Nginx service to host networking so it can be swapped without downtime."""
+    apply_swap_mode()
+    log_message(f"Swap mode enabled in {DOCKER_COMPOSE_FILE}.")
+
+    shared = listeners_without_reuseport(NGINX_CONF)
+    if shared:
+        log_message(f"Add 'reuseport' to these listen directives in {NGINX_CONF} before swapping: {', '.join(shared)}")
+    if not includes_health_conf(NGINX_CONF):
+        log_message(f"Add 'include /etc/nginx/conf.d/*.conf;' to the http block of {NGINX_CONF} before swapping; "
+                    f"swaps health-check the listener mounted at {HEALTH_CONF_TARGET}.")
+    # The network mode and health volume change the container config, so compose_up recreates it
+    log_message("Recreating Nginx once to apply host networking...")
+    start_nginx()
+
+def swap_nginx():
+    """Replaces the running Nginx container with one using the current config, without dropping connections."""
+    if not swap_mode_enabled():
+        log_message("Swap mode is not enabled. Run 'eos nginx --enable-swap' once first.")
+        sys.exit(1)
+    shared = listeners_without_reuseport(NGINX_CONF)
+    if shared:
+        log_message(f"Cannot swap: listeners without 'reuseport' in {NGINX_CONF}: {', '.join(shared)}")
+        sys.exit(1)
+    if not includes_health_conf(NGINX_CONF):
+        log_message(f"Cannot swap: {NGINX_CONF} does not include {HEALTH_CONF_TARGET}, "
+                    "so the new container's health check would never answer.")
+        sys.exit(1)
+    volumes = load_compose_config()['services']['nginx'].get('volumes', [])
+    if not all(volume in volumes for volume in swap_volumes()):
+        log_message("Cannot swap: the compose file predates the standby config. Run 'eos nginx --enable-swap' again.")
+        sys.exit(1)
+    # user/pid may have changed since swap mode was enabled
+    with open(STANDBY_CONF, 'w') as f:
+        f.write(standby_conf_content())
+
+    ensure_log_dir()
+    logging.basicConfig(level=logging.INFO, format="%(message)s",
+                        handlers=[logging.StreamHandler(), logging.FileHandler(LOG_FILE, mode='a')])
+    log_message("Swapping Nginx container...")
+    container = run_engine(lambda client: swap_service(
+        client, DOCKER_COMPOSE_FILE, 'nginx', SWAP_VALIDATE_COMMAND, SWAP_HEALTH_COMMAND,
+        standby_command=SWAP_STANDBY_COMMAND, activate_command=SWAP_ACTIVATE_COMMAND))
+    log_message(f"Nginx is now served by {container}.")
+
+def nginx_running():
+    """Returns True if a container for the Nginx service is running."""
+    project, _ = compose_plan(DOCKER_COMPOSE_FILE)
+    return run_engine(active_container, project, 'nginx') is not None
 
 def check_configs():
     """Checks Nginx configurations."""
     log_message("Checking Nginx configurations...")
-    run_command(f"docker-compose -f {DOCKER_COMPOSE_FILE} config")
+    try:
+        project, plan = compose_plan(DOCKER_COMPOSE_FILE)
+    except (OSError, ComposeStateError, DockerEngineError) as e:
+        log_message(f"Invalid compose file {DOCKER_COMPOSE_FILE}: {e}")
+        sys.exit(1)
+    for service, container, config in plan:
+        log_message(f"{project}/{service}: {container} ({config['Image']})")
 
 def backup_configs():
-    """Backs up Nginx configurations."""
-    if not os.path.exists(BACKUP_DIR):
-        os.makedirs(BACKUP_DIR)
-    log_message(f"Backing up Nginx configs to {BACKUP_DIR}...")
-    shutil.copy(DOCKER_COMPOSE_FILE, BACKUP_DIR)
-    log_message("Backup completed.")
+    """Snapshots the Nginx configurations into the deduplicating backup store."""
+    paths = [path for path in (DOCKER_COMPOSE_FILE, NGINX_CONF, HEALTH_CONF, STANDBY_CONF) if os.path.exists(path)]
+    log_message("Backing up Nginx configs...")
+    manifest = backup_paths(paths, 'nginx-docker')
+    log_message(f"Backup completed: snapshot {manifest['id']}.")
 
 def plan_deployment():
     """Plans the deployment of Nginx on Docker."""
@@ -96,69 +283,84 @@ def implement_deployment():
     log_message("Implementing Nginx deployment...")
     if not os.path.exists(NGINX_DIR):
         os.makedirs(NGINX_DIR)
+    swap_mode = swap_mode_enabled()
     
-    # Sample Docker Compose content for Nginx
-    docker_compose_content = """
-    version: '3'
-    services:
-      nginx:
-        image: nginx
-        ports:
-          - "80:80"
-          - "443:443"
-        volumes:
-          - ./nginx.conf:/etc/nginx/nginx.conf
-    """
-    
-    with open(DOCKER_COMPOSE_FILE, 'w') as f:
-        f.write(docker_compose_content)
-    
+    # Sample Docker Compose model for Nginx
+    model = {
+        'version': '3',
+        'services': {
+            'nginx': {
+                'image': 'nginx',
+                'ports': ['80:80', '443:443'],
+                'volumes': ['./nginx.conf:/etc/nginx/nginx.conf'],
+            },
+        },
+    }
+    save_compose_state(DOCKER_COMPOSE_FILE, model)
     log_message(f"Docker Compose file created at {DOCKER_COMPOSE_FILE}.")
+    if swap_mode:
+        apply_swap_mode()
+        if nginx_running():
+            # Replace the live container instead of taking Nginx down
+            swap_nginx()
+            return
     log_message("Starting Nginx deployment...")
-    run_command(f"docker-compose -f {DOCKER_COMPOSE_FILE} up -d")
+    run_engine(compose_up, DOCKER_COMPOSE_FILE)
 
 def get_user_input(prompt):
     """Gets input from the user."""
     return input(prompt)
 
-def check_if_configured(subdomain, port):
-    """Checks if the subdomain and port are already configured."""
-    if os.path.exists(DOCKER_COMPOSE_FILE):
-        with open(DOCKER_COMPOSE_FILE, 'r') as f:
-            config = yaml.safe_load(f)
-            nginx_config = config.get('services', {}).get('nginx', {})
-            domains = nginx_config.get('domains', [])
-            ports = nginx_config.get('ports', [])
-            if subdomain in domains or any(str(port) in p for p in ports):
-                log_message(f"Error: Subdomain '{subdomain}' or port '{port}' is already configured.")
-                sys.exit(1)
+def check_if_configured(subdomain, port, index=None):
+    """Checks the subdomain and port against compose files, nginx configs and live listeners."""
+    index = index or build_index()
+    conflicts = index.conflicts(domain=subdomain, port=port)
+    for kind, value, source, where in conflicts:
+        log_message(f"Error: {kind} '{value}' is already used by {source} {where}.")
+    if conflicts:
+        sys.exit(1)
+
+def get_port(index):
+    """Asks for a port; an empty answer takes the next free one from the allocation range."""
+    port = get_user_input("Enter the port to listen on (empty to pick a free one): ").strip()
+    if not port:
+        try:
+            port = index.allocate()
+        except PortIndexError as e:
+            log_message(str(e))
+            sys.exit(1)
+        log_message(f"Allocated free port {port}.")
+        return port
+    if not port.isdigit() or not 0 < int(port) < 65536:
+        log_message(f"Invalid port: {port}")
+        sys.exit(1)
+    check_if_configured(None, port, index)
+    return int(port)
 
 def connect_plan():
     """Plans the Nginx reverse proxy setup."""
+    index = build_index()
     subdomain = get_user_input("Enter the subdomain: ")
-    port = get_user_input("Enter the port to listen on: ")
+    check_if_configured(subdomain, None, index)
+    port = get_port(index)
     
     log_message(f"Planning Nginx reverse proxy for subdomain: {subdomain} on port: {port}")
-    check_if_configured(subdomain, port)
     log_message(f"Subdomain and port are available for configuration.")
 
 def connect_implement():
     """Implements the Nginx reverse proxy setup."""
+    index = build_index()
     subdomain = get_user_input("Enter the subdomain: ")
-    port = get_user_input("Enter the port to listen on: ")
-    
-    check_if_configured(subdomain, port)
+    check_if_configured(subdomain, None, index)
+    port = get_port(index)
     
     if os.path.exists(DOCKER_COMPOSE_FILE):
-        with open(DOCKER_COMPOSE_FILE, 'r') as f:
-            config = yaml.safe_load(f)
-            nginx_config = config.get('services', {}).get('nginx', {})
-            nginx_config.setdefault('domains', []).append(subdomain)
-            nginx_config.setdefault('ports', []).append(f"{port}:{port}")
-            config['services']['nginx'] = nginx_config
-        
-        with open(DOCKER_COMPOSE_FILE, 'w') as f:
-            yaml.safe_dump(config, f)
+        config = load_compose_config()
+        nginx_config = config.get('services', {}).get('nginx', {})
+        nginx_config.setdefault('domains', []).append(subdomain)
+        nginx_config.setdefault('ports', []).append(f"{port}:{port}")
+        config.setdefault('services', {})['nginx'] = nginx_config
+        save_compose_state(DOCKER_COMPOSE_FILE, config)
         
         log_message(f"Nginx reverse proxy implemented for subdomain: {subdomain} on port: {port}")
     
@@ -169,10 +371,11 @@ def connect_check():
     log_message("Checking Nginx reverse proxy configuration...")
     check_configs()
 
-if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        log_message("Usage: nginx.py [--list|--ssl|--start|--stop|--check-configs|--backup-configs|--plan|--implement|--connect-plan|--connect-implement|--connect-check]")
-        sys.exit(1)
+def main():
+    # Usage errors are printed, not logged: log_message needs a writable LOG_DIR, which --help must not
+    if len(sys.argv) < 2 or sys.argv[1] in ('-h', '--help'):
+        print(USAGE)
+        sys.exit(0 if len(sys.argv) >= 2 else 1)
 
     flag = sys.argv[1]
     
@@ -180,13 +383,19 @@ if __name__ == '__main__':
         list_domains()
     elif flag == '--ssl':
         if len(sys.argv) < 3:
-            log_message("Specify an SSL action: get, check, or renew.")
+            print("Specify an SSL action: get, check, or renew.")
         else:
             manage_ssl(sys.argv[2])
     elif flag == '--start':
         start_nginx()
     elif flag == '--stop':
         stop_nginx()
+    elif flag == '--status':
+        status_nginx()
+    elif flag == '--swap':
+        swap_nginx()
+    elif flag == '--enable-swap':
+        enable_swap_mode()
     elif flag == '--check-configs':
         check_configs()
     elif flag == '--backup-configs':
@@ -202,5 +411,8 @@ if __name__ == '__main__':
     elif flag == '--connect-check':
         connect_check()
     else:
-        log_message("Unknown flag.")
+        print(f"Unknown flag {flag}.\n{USAGE}")
         sys.exit(1)
+
+if __name__ == '__main__':
+    main()
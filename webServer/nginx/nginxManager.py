@@ -1,35 +1,80 @@
 import os
 import subprocess
+import sys
+
+from webServer.nginx.massVhost import MassVhost, MassVhostError
+from webServer.nginx.staticAssets import nginx_has_brotli, static_location
+from webServer.nginx.portIndex import build_index
+from webServer.nginx.rateLimits import site_include
+from securityAndEncryption.modSecurity.modsecProfile import waf_include
+from webServer.nginx.tlsProfile import (
+    ACME_WEBROOT, TLS_CONF, TlsProfileError, acme_location, certificate_pairs, tls_server_blocks, write_tls_conf,
+)
+from webServer.nginx.wafScope import (
+    LOCATION_CLASSES, modsecurity_loaded, parse_location_specs, scoped_locations, waf_directives,
+)
 
 NGINX_CONF_DIR = '/etc/nginx/sites-available'
 NGINX_SITES_ENABLED_DIR = '/etc/nginx/sites-enabled'
 
-def create_proxy_config(domain_name, proxy_pass, config_file):
-    config_content = f"""
-    server {{
-        listen 80;
-        server_name {domain_name};
-
-        location / {{
+def create_proxy_config(domain_name, proxy_pass, config_file, static_root=None, static_prefix='/static/', tls=False,
+                        locations=()):
+    # modsecurity is on for the whole http block; locations opt out or lighten it by class (wafScope.py)
+    waf_enabled = modsecurity_loaded()
+    # Fingerprinted assets prepared by staticAssets.py are served from disk, not proxied, and skip the WAF
+    static_block = ""
+    if static_root:
+        static_block = static_location(static_prefix, static_root, nginx_has_brotli(),
+                                       extra=waf_directives('off', waf_enabled=waf_enabled)) + "\n\n"
+    scoped_block = scoped_locations(locations, proxy_pass, waf_enabled)
+    # Rate limits (rateLimits.py) and WAF body limits/mode (modsecProfile.py), if generated
+    body = f"""{site_include(domain_name)}{waf_include(domain_name)}{static_block}{scoped_block}        location / {{
             proxy_pass {proxy_pass};
             proxy_set_header Host $host;
             proxy_set_header X-Real-IP $remote_addr;
             proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
             proxy_set_header X-Forwarded-Proto $scheme;
         }}
-    }}
+"""
+    acme_block = ""
+    if tls and not certificate_pairs(domain_name):
+        # No lineage yet: serve HTTP with the challenge location so certbot can issue, then rerun with --tls
+        print(f"No certificate covers {domain_name} yet; writing HTTP only. Issue one with "
+              f"'certbot certonly --webroot -w {ACME_WEBROOT} -d {domain_name}', then --remove and --add it with --tls.")
+        tls = False
+        acme_block = acme_location() + "\n"
+    if tls:
+        # HTTPS with HTTP/2 and the shared session cache/ticket keys, plus an HTTP redirect
+        if not os.path.exists(TLS_CONF):
+            write_tls_conf()
+        config_content = tls_server_blocks(domain_name, body)
+    else:
+        config_content = f"""
+    server {{
+        listen 80;
+        server_name {domain_name};
+
+{acme_block}{body}    }}
     """
     with open(config_file, 'w') as f:
         f.write(config_content)
 
-def add_reverse_proxy(domain_name, proxy_pass):
+def add_reverse_proxy(domain_name, proxy_pass, static_root=None, tls=False, locations=()):
     config_file = os.path.join(NGINX_CONF_DIR, domain_name)
 
     if os.path.exists(config_file):
         print(f"Config for {domain_name} already exists.")
         return
+    owners = build_index(listeners=False).domain_owners(domain_name)
+    if owners:
+        print(f"{domain_name} is already served by {', '.join(f'{source} {where}' for source, where in owners)}.")
+        return
 
-    create_proxy_config(domain_name, proxy_pass, config_file)
+    try:
+        create_proxy_config(domain_name, proxy_pass, config_file, static_root, tls=tls, locations=locations)
+    except TlsProfileError as e:
+        print(e)
+        return
 
     # Enable the site
     enabled_site = os.path.join(NGINX_SITES_ENABLED_DIR, domain_name)
@@ -63,7 +108,61 @@ def list_reverse_proxies():
         for proxy in proxies:
             print(proxy)
 
+def run_mass_flags(flag, argv):
+    manager = MassVhost()
+    try:
+        if flag == '--add' and len(argv) == 3:
+            manager.add(argv[1], argv[2])
+            print(f"Added tenant {argv[1]} -> {argv[2]}")
+        elif flag == '--remove' and len(argv) == 2:
+            manager.remove(argv[1])
+            print(f"Removed tenant {argv[1]}")
+        elif flag == '--list':
+            for host, upstream in manager.tenants().items():
+                print(f"{host} -> {upstream}")
+        else:
+            print("Usage: eos proxy --mass [--add <domain> <ip:port> | --remove <domain> | --list]")
+            sys.exit(1)
+    except (MassVhostError, OSError, subprocess.CalledProcessError) as e:
+        print(e)
+        sys.exit(1)
+
+def run_flags(argv):
+    """Non-interactive entry point used by automation such as the fleet runner."""
+    tls = '--tls' in argv
+    # Tenants of the map-driven mass-vhost server block instead of a file per domain
+    mass = '--mass' in argv
+    argv = [arg for arg in argv if arg not in ('--tls', '--mass')] or ['--help']
+    flag = argv[0]
+    specs = []
+    while '--location' in argv and argv.index('--location') + 1 < len(argv):
+        position = argv.index('--location')
+        specs.append(argv[position + 1])
+        del argv[position:position + 2]
+    try:
+        locations = parse_location_specs(specs)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    if mass and flag in ('--add', '--remove', '--list'):
+        run_mass_flags(flag, argv)
+    elif flag == '--add' and len(argv) in (3, 4):
+        add_reverse_proxy(argv[1], argv[2], argv[3] if len(argv) == 4 else None, tls, locations)
+    elif flag == '--remove' and len(argv) == 2:
+        remove_reverse_proxy(argv[1])
+    elif flag == '--list':
+        list_reverse_proxies()
+    else:
+        print("Usage: eos proxy [--add <domain> <proxy_pass> [static_root] [--tls] [--location class:/path ...] "
+              "| --remove <domain> | --list] [--mass]")
+        print(f"Location classes: {', '.join(LOCATION_CLASSES)}")
+        sys.exit(1)
+
 def main():
+    if len(sys.argv) > 1:
+        run_flags(sys.argv[1:])
+        return
+
     print("Nginx Reverse Proxy Manager")
     print("===========================")
     print("1. Add reverse proxy")
@@ -76,7 +175,15 @@ def main():
     if choice == '1':
         domain_name = input("Enter domain name: ")
         proxy_pass = input("Enter proxy_pass (e.g., http://localhost:3000): ")
-        add_reverse_proxy(domain_name, proxy_pass)
+        tls = input("Serve over HTTPS with the TLS profile? [y/N]: ").strip().lower() == 'y'
+        specs = input(f"Location classes ({', '.join(LOCATION_CLASSES)}), e.g. health:/healthz api:/api/ "
+                      "[none]: ").split()
+        try:
+            locations = parse_location_specs(specs)
+        except ValueError as e:
+            print(e)
+            return
+        add_reverse_proxy(domain_name, proxy_pass, tls=tls, locations=locations)
     elif choice == '2':
         domain_name = input("Enter domain name to remove: ")
         remove_reverse_proxy(domain_name)
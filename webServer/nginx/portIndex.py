@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+
+import argparse
+import glob
+import ipaddress
+import os
+import re
+import socket
+import sys
+
+from utilities.loadVariables import load_variables
+from containersAndOrchestration.docker.composeState import ComposeStateError, load_compose_state
+
+# Compose projects eosWeb generates (nginx.py, Node.py) and the nginx configs it writes
+COMPOSE_FILES = [
+    os.path.expanduser('~/nginx-docker/docker-compose.yaml'),
+    os.path.expanduser('~/node-docker/docker-compose.yaml'),
+]
+NGINX_CONF_PATHS = [
+    '/etc/nginx/nginx.conf',
+    '/etc/nginx/sites-available',
+    '/etc/nginx/sites-enabled',
+    '/etc/nginx/conf.d',
+    os.path.expanduser('~/nginx-docker/nginx.conf'),
+    os.path.expanduser('~/node-docker/nginx.conf'),
+]
+# Tenant domains served by the single mass-vhost server block (massVhost.py)
+TENANTS_MAP = '/etc/nginx/eos-tenants.map'
+PROC_NET_TCP = ['/proc/net/tcp', '/proc/net/tcp6']
+# Addresses of this host's interfaces: IPv4 from the LOCAL routes, IPv6 one per line
+PROC_FIB_TRIE = '/proc/net/fib_trie'
+PROC_IF_INET6 = '/proc/net/if_inet6'
+# /proc/net/tcp state of a listening socket
+TCP_LISTEN = '0A'
+
+_variables = load_variables()
+# New services are handed ports from this range, e.g. "20000-20999"
+PORT_RANGE = tuple(int(part) for part in (_variables.get('PORT_RANGE') or '20000-20999').split('-', 1))
+
+# Directives start a line or follow another statement/block on the same line
+LISTEN_PATTERN = re.compile(r'(?:^|(?<=[;{]))\s*listen\s+([^;]+);', re.MULTILINE)
+SERVER_NAME_PATTERN = re.compile(r'(?:^|(?<=[;{]))\s*server_name\s+([^;]+);', re.MULTILINE)
+PROXY_PASS_PATTERN = re.compile(r'(?:^|(?<=[;{]))\s*(?:proxy|fastcgi|uwsgi|grpc)_pass\s+(?:\w+://)?([^\s;/]+)',
+                                re.MULTILINE)
+UPSTREAM_BLOCK_PATTERN = re.compile(r'(?:^|(?<=[;}]))\s*upstream\s+\S+\s*\{([^}]*)\}', re.MULTILINE)
+UPSTREAM_SERVER_PATTERN = re.compile(r'(?:^|(?<=[;{]))\s*server\s+([^\s;]+)', re.MULTILINE)
+TENANT_LINE_PATTERN = re.compile(r'^\s*(\S+)\s+(\S+)\s*;')
+
+class PortIndexError(Exception):
+    """Raised when no free port is left in the allocation range."""
+
+class PortIndex:
+    """
+    Ports and domains in use on this host, each mapped to who uses it.
+
+    Owners are (source, where) pairs such as ('compose', '~/nginx-docker/docker-compose.yaml:nginx')
+    or ('listening', 'tcp6 [::]'). Lookups are exact dict hits, so port 80 does
+    not collide with 8080.
+    """
+
+    def __init__(self):
+        self.ports = {}
+        self.domains = {}
+
+    def add_port(self, port, source, where):
+        self.ports.setdefault(int(port), []).append((source, where))
+
+    def add_domain(self, domain, source, where):
+        self.domains.setdefault(domain.lower().rstrip('.'), []).append((source, where))
+
+    def port_owners(self, port):
+        return self.ports.get(int(port), [])
+
+    def domain_owners(self, domain):
+        return self.domains.get(domain.lower().rstrip('.'), [])
+
+    def conflicts(self, domain=None, port=None):
+        """Return the owners that already hold domain or port."""
+        owners = []
+        if domain:
+            owners += [('domain', domain, source, where) for source, where in self.domain_owners(domain)]
+        if port:
+            owners += [('port', int(port), source, where) for source, where in self.port_owners(port)]
+        return owners
+
+    def allocate(self, port_range=PORT_RANGE, owner='allocated'):
+        """
+        Return the lowest port in port_range that nothing holds and that can be bound now.
+
+        The port is recorded in the index, so allocating again from the same
+        index hands out a different one.
+        """
+        start, end = port_range
+        for port in range(start, end + 1):
+            if port in self.ports or not bindable(port):
+                continue
+            self.add_port(port, owner, 'port index')
+            return port
+        raise PortIndexError(f"No free port left in {start}-{end}.")
+
+def bindable(port):
+    """Check that nothing outside the index (another netns view, a racing process) holds port."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        try:
+            sock.bind(('0.0.0.0', port))
+            return True
+        except OSError:
+            return False
+
+def compose_port_numbers(entry):
+    """Return the host ports a compose `ports` entry publishes (short or long syntax, ranges included)."""
+    if isinstance(entry, dict):
+        published = entry.get('published')
+        return expand_ports(str(published)) if published is not None else []
+    entry = str(entry).split('/', 1)[0]
+    parts = entry.rsplit(':', 2)
+    if len(parts) == 1:
+        # Container port only: docker picks an ephemeral host port
+        return []
+    return expand_ports(parts[-2])
+
+def expand_ports(spec):
+    if not spec:
+        return []
+    if '-' in spec:
+        low, high = spec.split('-', 1)
+        return list(range(int(low), int(high) + 1))
+    return [int(spec)] if spec.isdigit() else []
+
+def index_compose(index, compose_file):
+    try:
+        services = load_compose_state(compose_file).get('services') or {}
+    except FileNotFoundError:
+        return
+    except (OSError, ComposeStateError) as e:
+        print(f"Skipping {compose_file}: {e}")
+        return
+    for name, service in services.items():
+        where = f"{compose_file}:{name}"
+        for entry in (service or {}).get('ports', []):
+            for port in compose_port_numbers(entry):
+                index.add_port(port, 'compose', where)
+        for domain in (service or {}).get('domains', []):
+            index.add_domain(domain, 'compose', where)
+
+def listen_port(value):
+    """Return the TCP port of an nginx listen directive, or None for unix sockets."""
+    address = value.split()[0]
+    if address.startswith('unix:'):
+        return None
+    port = address.rsplit(':', 1)[-1] if not address.endswith(']') else '80'
+    return int(port) if port.isdigit() else 80
+
+def host_port(address):
+    """Return the port of a host:port upstream address, or None if it has none."""
+    if address.startswith('unix:') or ':' not in address.lstrip('['):
+        return None
+    port = address.rsplit(':', 1)[1]
+    return int(port) if port.isdigit() else None
+
+def local_addresses(fib_trie=PROC_FIB_TRIE, if_inet6=PROC_IF_INET6):
+    """Return the IP addresses assigned to this host's interfaces."""
+    addresses = set()
+    try:
+        with open(fib_trie, 'r') as f:
+            previous = ''
+            for line in f:
+                if '/32 host LOCAL' in line and previous.strip().startswith('|--'):
+                    addresses.add(ipaddress.ip_address(previous.split()[-1]))
+                previous = line
+    except OSError:
+        pass
+    try:
+        with open(if_inet6, 'r') as f:
+            for line in f:
+                hex_address = line.split()[0]
+                addresses.add(ipaddress.ip_address(':'.join(hex_address[i:i + 4] for i in range(0, 32, 4))))
+    except (OSError, IndexError, ValueError):
+        pass
+    return addresses
+
+def is_local_host(host, addresses):
+    """Whether an upstream host is this machine: localhost, loopback, a local address or our hostname."""
+    host = host.strip('[]')
+    if host == 'localhost' or host in (socket.gethostname(), socket.getfqdn()):
+        return True
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        # Container or service names live on other hosts' ports
+        return False
+    return address.is_loopback or address.is_unspecified or address in addresses
+
+def conf_files(conf_paths):
+    files = []
+    for path in conf_paths:
+        if os.path.isdir(path):
+            files += sorted(p for p in glob.glob(os.path.join(path, '*')) if os.path.isfile(p))
+        elif os.path.isfile(path):
+            files.append(path)
+    # sites-enabled entries are usually symlinks into sites-available; index each file once
+    unique = {}
+    for path in files:
+        unique.setdefault(os.path.realpath(path), path)
+    return list(unique.values())
+
+def index_nginx(index, conf_paths, addresses=None):
+    """Add nginx listen ports, server names and the ports of upstreams on this host."""
+    addresses = local_addresses() if addresses is None else addresses
+    for path in conf_files(conf_paths):
+        try:
+            with open(path, 'r') as f:
+                content = f.read()
+        except (OSError, UnicodeDecodeError):
+            continue
+        for match in LISTEN_PATTERN.finditer(content):
+            port = listen_port(match.group(1))
+            if port is not None:
+                index.add_port(port, 'nginx-listen', path)
+        for match in SERVER_NAME_PATTERN.finditer(content):
+            for name in match.group(1).split():
+                if name != '_' and not name.startswith('~'):
+                    index.add_domain(name.lstrip('.'), 'nginx', path)
+        upstreams = [m.group(1) for m in PROXY_PASS_PATTERN.finditer(content)]
+        for block in UPSTREAM_BLOCK_PATTERN.finditer(content):
+            upstreams += [m.group(1) for m in UPSTREAM_SERVER_PATTERN.finditer(block.group(1))]
+        for address in upstreams:
+            port = host_port(address)
+            # Only upstreams on this host take up a port here; remote backends do not
+            if port is not None and is_local_host(address.rsplit(':', 1)[0], addresses):
+                index.add_port(port, 'upstream', f"{path} ({address})")
+
+def load_tenants(tenants_map=TENANTS_MAP):
+    """Return the mass-vhost map as {host: upstream}, in file order."""
+    tenants = {}
+    try:
+        with open(tenants_map, 'r') as f:
+            for line in f:
+                match = TENANT_LINE_PATTERN.match(line.split('#', 1)[0])
+                if match:
+                    tenants[match.group(1)] = match.group(2)
+    except (FileNotFoundError, UnicodeDecodeError):
+        pass
+    return tenants
+
+def index_tenants(index, tenants_map=TENANTS_MAP, addresses=None):
+    addresses = local_addresses() if addresses is None else addresses
+    for host, upstream in load_tenants(tenants_map).items():
+        domain = (host[1:] if host.startswith('*') else host).lstrip('.')
+        index.add_domain(domain, 'mass-vhost', tenants_map)
+        port = host_port(upstream)
+        if port is not None and is_local_host(upstream.rsplit(':', 1)[0], addresses):
+            index.add_port(port, 'upstream', f"{tenants_map} ({upstream})")
+
+def index_listeners(index, proc_files=PROC_NET_TCP):
+    """Add the TCP sockets in LISTEN state from /proc/net/tcp and tcp6."""
+    for proc_file in proc_files:
+        family = os.path.basename(proc_file)
+        try:
+            with open(proc_file, 'r') as f:
+                lines = f.readlines()[1:]
+        except OSError:
+            continue
+        seen = set()
+        for line in lines:
+            fields = line.split()
+            if len(fields) < 4 or fields[3] != TCP_LISTEN:
+                continue
+            address, port = fields[1].split(':')
+            port = int(port, 16)
+            if port in seen:
+                continue
+            seen.add(port)
+            index.add_port(port, 'listening', f"{family} {format_address(address)}")
+
+def format_address(hex_address):
+    """Render the little-endian hex address /proc/net/tcp{,6} uses."""
+    raw = bytes.fromhex(hex_address)
+    if len(raw) == 4:
+        return socket.inet_ntop(socket.AF_INET, raw[::-1])
+    words = b''.join(raw[i:i + 4][::-1] for i in range(0, 16, 4))
+    return f"[{socket.inet_ntop(socket.AF_INET6, words)}]"
+
+def build_index(compose_files=COMPOSE_FILES, conf_paths=NGINX_CONF_PATHS, listeners=True, tenants_map=TENANTS_MAP):
+    """Merge compose port mappings, nginx listen/server_name/upstreams, mass-vhost tenants and live listeners."""
+    index = PortIndex()
+    addresses = local_addresses()
+    for compose_file in compose_files:
+        index_compose(index, compose_file)
+    index_nginx(index, conf_paths, addresses)
+    index_tenants(index, tenants_map, addresses)
+    if listeners:
+        index_listeners(index)
+    return index
+
+def describe(owners):
+    return '; '.join(f"{source} {where}" for source, where in owners)
+
+def main():
+    parser = argparse.ArgumentParser(description="Show which ports and domains are taken and hand out free ports.")
+    parser.add_argument('command', choices=['list', 'check', 'allocate'])
+    parser.add_argument('target', nargs='?', help="Port or domain for 'check'")
+    parser.add_argument('--range', help=f"Port range for 'allocate' (default {PORT_RANGE[0]}-{PORT_RANGE[1]})")
+    parser.add_argument('--compose', action='append', help="Compose file to index (default: eosWeb's)")
+    parser.add_argument('--conf', action='append', help="nginx config file or directory (default: /etc/nginx)")
+    args = parser.parse_args()
+
+    index = build_index(args.compose or COMPOSE_FILES, args.conf or NGINX_CONF_PATHS)
+    if args.command == 'list':
+        for port in sorted(index.ports):
+            print(f"{port:>6}  {describe(index.ports[port])}")
+        for domain in sorted(index.domains):
+            print(f"{domain}  {describe(index.domains[domain])}")
+    elif args.command == 'check':
+        if not args.target:
+            parser.error("check needs a port or a domain")
+        conflicts = index.conflicts(port=args.target) if args.target.isdigit() else index.conflicts(domain=args.target)
+        if not conflicts:
+            print(f"{args.target} is free.")
+            return
+        for kind, value, source, where in conflicts:
+            print(f"{kind} {value} is used by {source} {where}")
+        sys.exit(1)
+    elif args.command == 'allocate':
+        port_range = tuple(int(part) for part in args.range.split('-', 1)) if args.range else PORT_RANGE
+        try:
+            print(index.allocate(port_range))
+        except PortIndexError as e:
+            print(e)
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+
+import argparse
+import http.client
+import math
+import os
+import re
+import statistics
+import sys
+import threading
+import time
+import urllib.parse
+
+import yaml
+
+NGINX_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_POLICY = os.path.join(NGINX_DIR, 'rateLimits.yaml')
+# Zones and path-class maps live at http level; each site includes its own snippet in its server block
+HTTP_CONF = '/etc/nginx/conf.d/eos-rate-limits.conf'
+SNIPPET_DIR = '/etc/nginx/snippets/eos-rate-limits'
+
+# Approximate bytes per zone entry on 64-bit builds: a limit_req state is 128 bytes
+# with a 4-byte IPv4 key, a limit_conn state 64; longer keys grow them in slab-sized steps
+LIMIT_REQ_STATE = 124
+LIMIT_CONN_STATE = 60
+KEY_BYTES = {'ip': 16}
+DEFAULT_KEY_BYTES = 64
+# Zones under 8 pages are rejected by nginx; leave headroom so the LRU rarely evicts live clients
+MIN_ZONE_BYTES = 64 * 1024
+ZONE_HEADROOM = 1.5
+REJECT_STATUS = 429
+
+RATE_PATTERN = re.compile(r'^\d+r/[sm]$')
+NAME_PATTERN = re.compile(r'[^a-z0-9_]')
+
+class PolicyError(Exception):
+    pass
+
+def slug(value):
+    return NAME_PATTERN.sub('_', value.lower())
+
+def key_variable(key):
+    """Translate a policy key into the nginx variable it limits on."""
+    if key == 'ip':
+        return '$binary_remote_addr'
+    if key.startswith('header:'):
+        return '$http_' + slug(key.split(':', 1)[1])
+    raise PolicyError(f"Unknown key '{key}', use 'ip' or 'header:<Name>'.")
+
+def state_size(base, key_bytes):
+    """Bytes one zone entry takes: the fixed state plus the key, rounded to the slab size class."""
+    return 2 ** math.ceil(math.log2(base + key_bytes))
+
+def zone_size(clients, key, base=LIMIT_REQ_STATE, key_bytes=None):
+    """
+    Size a shared-memory zone to hold one state per expected client.
+
+    When a limit_req zone fills up nginx evicts the least recently used states,
+    and a full limit_conn zone rejects new keys outright, so the zone gets
+    ZONE_HEADROOM on top. Returned as an nginx size string.
+    """
+    if key_bytes is None:
+        key_bytes = KEY_BYTES.get(key, DEFAULT_KEY_BYTES)
+    size = max(MIN_ZONE_BYTES, int(clients * state_size(base, key_bytes) * ZONE_HEADROOM))
+    megabytes = math.ceil(size / 2 ** 20)
+    return f"{megabytes}m" if size >= 2 ** 20 else f"{math.ceil(size / 1024)}k"
+
+def load_policies(policy_file=DEFAULT_POLICY):
+    """Return {site: policy} with the defaults merged into each site and the rules checked."""
+    with open(policy_file, 'r') as f:
+        document = yaml.safe_load(f) or {}
+    defaults = document.get('defaults') or {}
+    sites = {}
+    for site, policy in (document.get('sites') or {}).items():
+        policy = dict(defaults, **(policy or {}))
+        policy['timeouts'] = dict(defaults.get('timeouts') or {}, **(policy.get('timeouts') or {}))
+        for rule in policy.get('rules') or []:
+            if not RATE_PATTERN.match(str(rule.get('rate', ''))):
+                raise PolicyError(f"{site}: rule '{rule.get('name')}' needs a rate like 20r/s or 30r/m.")
+            if rule.get('nodelay') and rule.get('delay') is not None:
+                raise PolicyError(f"{site}: rule '{rule.get('name')}' sets both nodelay and delay.")
+            key_variable(rule.get('key', 'ip'))
+        sites[site] = policy
+    return sites
+
+def zone_name(site, rule):
+    return f"eos_{slug(site)}_{slug(rule['name'])}"
+
+def render_http_conf(sites):
+    """Render the http-level zones, plus a $uri map for each rule limited to a path class."""
+    lines = ["# Generated by rateLimits.py; one zone per site and rule"]
+    for site, policy in sites.items():
+        clients = int(policy.get('clients') or 10000)
+        lines.append(f"\n# {site}")
+        for rule in policy.get('rules') or []:
+            zone = zone_name(site, rule)
+            variable = key_variable(rule.get('key', 'ip'))
+            if rule.get('paths'):
+                # An empty key is not counted, so the zone only sees requests in the path class
+                lines.append(f"map $uri ${zone}_key {{")
+                lines.append('    default "";')
+                lines += [f'    "~{path}" {variable};' for path in rule['paths']]
+                lines.append("}")
+                variable = f"${zone}_key"
+            size = zone_size(clients, rule.get('key', 'ip'), key_bytes=rule.get('key_bytes'))
+            lines.append(f"limit_req_zone {variable} zone={zone}:{size} rate={rule['rate']};")
+        if policy.get('connections_per_ip'):
+            size = zone_size(clients, 'ip', base=LIMIT_CONN_STATE)
+            lines.append(f"limit_conn_zone $binary_remote_addr zone=eos_{slug(site)}_conn:{size};")
+    return "\n".join(lines) + "\n"
+
+def render_site_snippet(site, policy):
+    """Render the server-level directives that apply a site's zones and slow-client timeouts."""
+    lines = [f"# Generated by rateLimits.py for {site}"]
+    for rule in policy.get('rules') or []:
+        directive = f"limit_req zone={zone_name(site, rule)}"
+        if rule.get('burst'):
+            directive += f" burst={int(rule['burst'])}"
+        if rule.get('nodelay'):
+            directive += " nodelay"
+        elif rule.get('delay') is not None:
+            directive += f" delay={int(rule['delay'])}"
+        lines.append(directive + ";")
+    if policy.get('connections_per_ip'):
+        lines.append(f"limit_conn eos_{slug(site)}_conn {int(policy['connections_per_ip'])};")
+    lines.append(f"limit_req_status {REJECT_STATUS};")
+    lines.append(f"limit_conn_status {REJECT_STATUS};")
+    lines.append("limit_req_log_level warn;")
+
+    # Slow clients (slowloris, stalled uploads/downloads) give their connection back quickly
+    timeouts = policy.get('timeouts') or {}
+    for name, directive in (('client_header', 'client_header_timeout'), ('client_body', 'client_body_timeout'),
+                            ('send', 'send_timeout'), ('keepalive', 'keepalive_timeout')):
+        if timeouts.get(name):
+            lines.append(f"{directive} {timeouts[name]};")
+    lines.append("reset_timedout_connection on;")
+    return "\n".join(lines) + "\n"
+
+def snippet_path(site):
+    return os.path.join(SNIPPET_DIR, f"{site}.conf")
+
+def site_include(site):
+    """Return the include line for a site's rate-limit snippet, or '' if none was generated."""
+    path = snippet_path(site)
+    return f"        include {path};\n\n" if os.path.exists(path) else ""
+
+def write_policies(policy_file=DEFAULT_POLICY, http_conf=HTTP_CONF, snippet_dir=SNIPPET_DIR):
+    """Write the http-level zones file and one snippet per site; returns the written paths."""
+    sites = load_policies(policy_file)
+    os.makedirs(os.path.dirname(http_conf), exist_ok=True)
+    os.makedirs(snippet_dir, exist_ok=True)
+    written = [http_conf]
+    with open(http_conf, 'w') as f:
+        f.write(render_http_conf(sites))
+    for site, policy in sites.items():
+        path = os.path.join(snippet_dir, f"{site}.conf")
+        with open(path, 'w') as f:
+            f.write(render_site_snippet(site, policy))
+        written.append(path)
+    return written
+
+def load_worker(url, count, headers, results, lock):
+    parts = urllib.parse.urlsplit(url)
+    connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+    connection = connection_class(parts.hostname, parts.port, timeout=10)
+    path = parts.path or '/'
+    if parts.query:
+        path += f"?{parts.query}"
+    while True:
+        with lock:
+            if results['sent'] >= count:
+                break
+            results['sent'] += 1
+        start = time.perf_counter()
+        try:
+            connection.request('GET', path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+            if response.getheader('Connection', '').lower() == 'close':
+                connection.close()
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            status = 'error'
+        elapsed = time.perf_counter() - start
+        with lock:
+            results['latencies'].setdefault(status, []).append(elapsed)
+    connection.close()
+
+def load_test(url, requests=2000, concurrency=16, headers=None):
+    """
+    Fire requests at url over keep-alive connections and return latencies by status.
+
+    Run it against a rate-limited site: the 429s are answered by nginx from
+    shared memory, the 200s make the backend round trip, and the two latency
+    distributions show what early rejection saves.
+    """
+    results = {'sent': 0, 'latencies': {}}
+    lock = threading.Lock()
+    threads = [threading.Thread(target=load_worker, args=(url, requests, headers or {}, results, lock))
+               for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results['duration'] = time.perf_counter() - started
+    return results
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def print_load_test(results):
+    total = sum(len(values) for values in results['latencies'].values())
+    print(f"{total} requests in {results['duration']:.2f}s ({total / results['duration']:.0f} req/s)")
+    for status, values in sorted(results['latencies'].items(), key=lambda item: str(item[0])):
+        print(f"  {status!s:>5}  {len(values):>7}  p50 {statistics.median(values) * 1e6:>9.0f} us  "
+              f"p99 {percentile(values, 0.99) * 1e6:>9.0f} us")
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate nginx limit_req/limit_conn policies and load test them.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    render = subparsers.add_parser('render', help="Print the generated configuration")
+    render.add_argument('policy', nargs='?', default=DEFAULT_POLICY)
+    write = subparsers.add_parser('write', help=f"Write {HTTP_CONF} and the per-site snippets")
+    write.add_argument('policy', nargs='?', default=DEFAULT_POLICY)
+    write.add_argument('--http-conf', default=HTTP_CONF)
+    write.add_argument('--snippet-dir', default=SNIPPET_DIR)
+    bench = subparsers.add_parser('load-test', help="Compare latency of rejected and served requests")
+    bench.add_argument('url')
+    bench.add_argument('-n', '--requests', type=int, default=2000)
+    bench.add_argument('-c', '--concurrency', type=int, default=16)
+    bench.add_argument('-H', '--header', action='append', default=[], help="Extra header, e.g. 'X-API-Key: abc'")
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'render':
+            sites = load_policies(args.policy)
+            print(f"# {HTTP_CONF}\n{render_http_conf(sites)}")
+            for site, policy in sites.items():
+                print(f"# {snippet_path(site)}\n{render_site_snippet(site, policy)}")
+        elif args.command == 'write':
+            for path in write_policies(args.policy, args.http_conf, args.snippet_dir):
+                print(f"Wrote {path}")
+            print("Re-add or edit the sites to include their snippet, then run: sudo nginx -t && sudo nginx -s reload")
+        elif args.command == 'load-test':
+            headers = dict(header.split(':', 1) for header in args.header)
+            headers = {name.strip(): value.strip() for name, value in headers.items()}
+            print_load_test(load_test(args.url, args.requests, args.concurrency, headers))
+    except (OSError, PolicyError, yaml.YAMLError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
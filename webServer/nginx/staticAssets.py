@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATE_FILE = '.eos-static-state.json'
+MANIFEST_FILE = 'asset-manifest.json'
+
+# Extensions worth precompressing; images and fonts are already compressed
+COMPRESSIBLE_EXTENSIONS = {
+    '.js', '.mjs', '.css', '.svg', '.json', '.map', '.txt', '.xml', '.wasm', '.ico', '.webmanifest',
+}
+# Below this size the compressed copy saves less than the extra lookup costs
+MIN_COMPRESS_SIZE = 1024
+# HTML must stay revalidated and is left to the app
+SKIP_EXTENSIONS = {'.html', '.htm'}
+
+FINGERPRINT_PATTERN = re.compile(r'[.-][0-9a-f]{8,}\.[^.]+$')
+# The same test in nginx: the request path ends in a fingerprinted file name
+NGINX_FINGERPRINT_REGEX = r'.*[.-][0-9a-f]{8,}\.[^./]+'
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Files under their original name can change in place, so clients revalidate them
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+NGINX_MODULES_DIR = '/usr/share/nginx/modules'
+
+def file_hash(path):
+    """Return the hex sha256 of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def fingerprinted_name(relpath, digest):
+    """Insert a content hash before the extension, unless the bundler already did."""
+    if FINGERPRINT_PATTERN.search(os.path.basename(relpath)):
+        return relpath
+    root, ext = os.path.splitext(relpath)
+    return f"{root}.{digest[:10]}{ext}"
+
+def compress_file(job):
+    """Copy one asset into place and write .gz/.br siblings. Runs in a worker process."""
+    source, target, use_brotli = job
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    shutil.copy2(source, target)
+    sizes = {'original': os.path.getsize(target), 'gzip': None, 'brotli': None}
+    if os.path.splitext(target)[1].lower() not in COMPRESSIBLE_EXTENSIONS or sizes['original'] < MIN_COMPRESS_SIZE:
+        return target, sizes
+
+    with open(source, 'rb') as f:
+        data = f.read()
+    mtime = os.path.getmtime(source)
+    compressed = gzip.compress(data, compresslevel=9, mtime=mtime)
+    if len(compressed) < len(data):
+        with open(f"{target}.gz", 'wb') as f:
+            f.write(compressed)
+        # gzip_static serves the .gz only if it is not older than the original
+        os.utime(f"{target}.gz", (mtime, mtime))
+        sizes['gzip'] = len(compressed)
+    if use_brotli and brotli:
+        compressed = brotli.compress(data, quality=11)
+        if len(compressed) < len(data):
+            with open(f"{target}.br", 'wb') as f:
+                f.write(compressed)
+            os.utime(f"{target}.br", (mtime, mtime))
+            sizes['brotli'] = len(compressed)
+    return target, sizes
+
+def load_state(output_dir):
+    state_path = os.path.join(output_dir, STATE_FILE)
+    if os.path.exists(state_path):
+        with open(state_path, 'r') as f:
+            return json.load(f)
+    return {'files': {}}
+
+def build_static(source_dir, output_dir, fingerprint=True, use_brotli=None, workers=None):
+    """
+    Fingerprint and precompress the static build output of an app.
+
+    Every asset is written under its original name and, when fingerprinting,
+    also under name.<hash>.ext. References in HTML, CSS and JS are not
+    rewritten, so existing URLs keep working (and are revalidated, see
+    static_location()); an app opts into immutable caching by looking its
+    URLs up in asset-manifest.json, which maps original to fingerprinted
+    paths relative to the static prefix.
+
+    Files whose content hash is unchanged since the last run (and whose outputs
+    still exist) are skipped. Outputs of the previous run are kept so clients
+    holding older HTML can still load their assets; anything older is pruned.
+    Returns a summary dict.
+    """
+    if use_brotli is None:
+        use_brotli = brotli is not None
+    os.makedirs(output_dir, exist_ok=True)
+    state = load_state(output_dir)
+
+    manifest = {}
+    files = {}
+    jobs = []
+    skipped = 0
+    for root, dirs, names in os.walk(source_dir):
+        for name in names:
+            source = os.path.join(root, name)
+            relpath = os.path.relpath(source, source_dir)
+            if os.path.splitext(name)[1].lower() in SKIP_EXTENSIONS:
+                continue
+            digest = file_hash(source)
+            output_rel = fingerprinted_name(relpath, digest) if fingerprint else relpath
+            manifest[relpath] = output_rel
+            files[relpath] = {'sha256': digest, 'output': output_rel}
+
+            targets = [os.path.join(output_dir, path) for path in {relpath, output_rel}]
+            previous = state['files'].get(relpath)
+            if previous and previous['sha256'] == digest and previous['output'] == output_rel \
+                    and all(os.path.exists(target) for target in targets):
+                skipped += 1
+                continue
+            jobs += [(source, target, use_brotli) for target in targets]
+
+    totals = {'original': 0, 'gzip': 0, 'brotli': 0}
+    if jobs:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Count each asset once, by its fingerprinted copy
+            primary = {os.path.join(output_dir, entry['output']) for entry in files.values()}
+            for target, sizes in executor.map(compress_file, jobs, chunksize=8):
+                if target not in primary:
+                    continue
+                totals['original'] += sizes['original']
+                totals['gzip'] += sizes['gzip'] or sizes['original']
+                totals['brotli'] += sizes['brotli'] or sizes['original']
+
+    # Keep this run's and the previous run's outputs, prune everything else
+    current_outputs = {entry['output'] for entry in files.values()} | set(files)
+    keep = current_outputs | {entry['output'] for entry in state['files'].values()}
+    keep_paths = {MANIFEST_FILE, STATE_FILE}
+    for output in keep:
+        keep_paths.update({output, f"{output}.gz", f"{output}.br"})
+    pruned = 0
+    for root, dirs, names in os.walk(output_dir):
+        for name in names:
+            relpath = os.path.relpath(os.path.join(root, name), output_dir)
+            if relpath not in keep_paths:
+                os.remove(os.path.join(root, name))
+                pruned += 1
+
+    with open(os.path.join(output_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    with open(os.path.join(output_dir, STATE_FILE), 'w') as f:
+        json.dump({'files': files}, f)
+
+    return {'processed': len({job[0] for job in jobs}), 'skipped': skipped, 'pruned': pruned,
+            'brotli_enabled': bool(use_brotli and brotli), 'bytes': totals}
+
+def nginx_has_brotli(modules_dir=NGINX_MODULES_DIR):
+    """Check whether the host nginx has the brotli_static module available."""
+    return os.path.exists(os.path.join(modules_dir, 'ngx_http_brotli_static_module.so'))
+
+def static_location(url_prefix, root, use_brotli=False, indent='        ', extra=()):
+    """
+    Return nginx location blocks serving static assets straight from disk, plus extra lines in each.
+
+    Fingerprinted names are cached as immutable by a regex location; the
+    original names fall through to the prefix location and are revalidated.
+    """
+    url_prefix = '/' + url_prefix.strip('/') + '/'
+    root = root.rstrip('/')
+
+    def block(location, alias, cache_control):
+        lines = [f"location {location} {{", f"    alias {alias};", "    gzip_static on;"]
+        if use_brotli:
+            lines.append("    brotli_static on;")
+        lines += [f'    add_header Cache-Control "{cache_control}";', "    access_log off;"]
+        lines += [f"    {line}" for line in extra]
+        lines.append("}")
+        return lines
+
+    lines = block(f'~ "^{re.escape(url_prefix)}({NGINX_FINGERPRINT_REGEX})$"', f"{root}/$1",
+                  IMMUTABLE_CACHE_CONTROL)
+    lines += [""] + block(url_prefix, f"{root}/", REVALIDATE_CACHE_CONTROL)
+    return "\n".join(indent + line if line else line for line in lines)
+
+def main():
+    if len(sys.argv) < 3:
+        print("Usage: eos static <build_dir> <output_dir> [--prefix /static/] [--no-fingerprint] [--workers N]")
+        sys.exit(1)
+
+    source_dir, output_dir = sys.argv[1], sys.argv[2]
+    args = sys.argv[3:]
+    prefix = args[args.index('--prefix') + 1] if '--prefix' in args else '/static/'
+    workers = int(args[args.index('--workers') + 1]) if '--workers' in args else None
+
+    if not os.path.isdir(source_dir):
+        print(f"Build directory {source_dir} not found.")
+        sys.exit(1)
+    summary = build_static(source_dir, output_dir, fingerprint='--no-fingerprint' not in args, workers=workers)
+    print(f"Processed {summary['processed']} file(s), skipped {summary['skipped']} unchanged, "
+          f"pruned {summary['pruned']} stale.")
+    totals = summary['bytes']
+    if totals['original']:
+        print(f"Processed bytes: {totals['original']} -> gzip {totals['gzip']}"
+              + (f", brotli {totals['brotli']}" if summary['brotli_enabled'] else ""))
+    print("\nNginx locations:\n")
+    print(static_location(prefix, os.path.abspath(output_dir), summary['brotli_enabled'] and nginx_has_brotli(),
+                          indent=''))
+
+if __name__ == '__main__':
+    main()
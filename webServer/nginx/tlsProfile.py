@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+
+import logging
+import math
+import os
+import re
+import socket
+import ssl
+import subprocess
+import sys
+import threading
+import time
+
+from backupAndRecovery.backupEngine import BackupError, backup_paths
+from securityAndEncryption.certInventory import LIVE_DIR, covers, load_inventory
+from securityAndEncryption.modSecurity.packageModSecurity import get_installed_nginx_version
+from webServer.nginx.hostTuning import NGINX_MAIN_CONF, set_directive
+
+TLS_CONF = '/etc/nginx/conf.d/eos-tls.conf'
+TICKET_KEY_DIR = '/etc/nginx/tls/tickets'
+# The first key encrypts new tickets, the rest still decrypt tickets issued before a rotation
+TICKET_KEY_COUNT = 3
+TICKET_KEY_BYTES = 80
+ACME_WEBROOT = '/var/www/html'
+# OCSP stapling resolves the responder through the host's first nameserver
+RESOLV_CONF = '/etc/resolv.conf'
+DEFAULT_RESOLVER = '127.0.0.53'
+
+SESSION_TIMEOUT = '4h'
+# nginx fits about 4000 sessions in one megabyte of shared cache
+SESSIONS_PER_MB = 4000
+# Cached sessions outlive the connections that created them; hold several per connection slot
+SESSIONS_PER_CONNECTION = 4
+# Directives nginx allows once per http block (or ORs together, like ssl_protocols); when nginx.conf
+# already sets one, its value is updated there instead of repeated in TLS_CONF
+SINGLE_DIRECTIVES = ['ssl_protocols', 'ssl_ecdh_curve', 'ssl_ciphers', 'ssl_prefer_server_ciphers',
+                     'ssl_session_cache', 'ssl_session_timeout', 'ssl_session_tickets']
+DIRECTIVE_PATTERN = re.compile(r'^(\s*)(\w+)\s+([^;]*);$', re.MULTILINE)
+
+TLS_CONF_TEMPLATE = """# Generated by tlsProfile.py; shared by every TLS server block on this host
+ssl_protocols TLSv1.2 TLSv1.3;
+ssl_ecdh_curve X25519:prime256v1:secp384r1;
+ssl_ciphers ECDHE-ECDSA-AES128-GCM-SHA256:ECDHE-RSA-AES128-GCM-SHA256:ECDHE-ECDSA-CHACHA20-POLY1305:ECDHE-RSA-CHACHA20-POLY1305:ECDHE-ECDSA-AES256-GCM-SHA384:ECDHE-RSA-AES256-GCM-SHA384;
+ssl_prefer_server_ciphers off;
+
+# Sized for {connections} connections ({sessions} sessions)
+ssl_session_cache shared:EOS_TLS:{cache_mb}m;
+ssl_session_timeout {timeout};
+
+# Ticket keys are rotated on one node and pushed to the whole fleet, so any node can resume any session
+ssl_session_tickets on;
+{ticket_keys}
+"""
+
+class TlsProfileError(Exception):
+    pass
+
+def connection_budget(nginx_conf=NGINX_MAIN_CONF):
+    """Return worker_processes * worker_connections from the main nginx config."""
+    workers = os.cpu_count() or 1
+    connections = 512
+    if os.path.exists(nginx_conf):
+        with open(nginx_conf, 'r') as f:
+            content = f.read()
+        match = re.search(r'^\s*worker_processes\s+(\d+)\s*;', content, re.MULTILINE)
+        if match:
+            workers = int(match.group(1))
+        match = re.search(r'^\s*worker_connections\s+(\d+)\s*;', content, re.MULTILINE)
+        if match:
+            connections = int(match.group(1))
+    return workers * connections
+
+def session_cache_size(connections):
+    """Return (sessions, megabytes) of shared session cache for a connection budget."""
+    sessions = connections * SESSIONS_PER_CONNECTION
+    return sessions, max(1, math.ceil(sessions / SESSIONS_PER_MB))
+
+def ticket_key_paths(key_dir=TICKET_KEY_DIR):
+    return [os.path.join(key_dir, f"ticket.{index}.key") for index in range(TICKET_KEY_COUNT)]
+
+def rotate_ticket_keys(key_dir=TICKET_KEY_DIR):
+    """
+    Shift every ticket key down one slot and write a fresh encryption key.
+
+    Run it on one node (e.g. every 12 hours), then push key_dir to the fleet
+    with `eos fleet nginx-reload --push <key_dir>`.
+    """
+    os.makedirs(key_dir, mode=0o700, exist_ok=True)
+    paths = ticket_key_paths(key_dir)
+    for older, newer in reversed(list(zip(paths[1:], paths[:-1]))):
+        if os.path.exists(newer):
+            os.replace(newer, older)
+    # Fill every slot on first use so nginx always finds all the files it is configured with
+    for path in paths:
+        if not os.path.exists(path):
+            fd = os.open(f"{path}.tmp", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(os.urandom(TICKET_KEY_BYTES))
+            os.replace(f"{path}.tmp", path)
+    return paths
+
+def main_conf_directives(main_conf=NGINX_MAIN_CONF):
+    """SINGLE_DIRECTIVES that nginx.conf sets itself (Ubuntu's sets ssl_protocols and ssl_prefer_server_ciphers)."""
+    if not os.path.exists(main_conf):
+        return set()
+    with open(main_conf, 'r') as f:
+        content = f.read()
+    return {name for name in SINGLE_DIRECTIVES if re.search(rf'^\s*{name}\s+[^;]*;', content, re.MULTILINE)}
+
+def split_main_conf_directives(content, main_conf=NGINX_MAIN_CONF):
+    """
+    Return (content without the directives nginx.conf already sets, {name: value} to set there instead).
+
+    Repeating them in conf.d fails nginx -t as a duplicate, or for
+    ssl_protocols silently adds our protocols to the older ones.
+    """
+    owned = main_conf_directives(main_conf)
+    moved = {}
+
+    def take(match):
+        if match.group(2) in owned:
+            moved[match.group(2)] = match.group(3)
+            return f"{match.group(1)}# {match.group(2)} is set in {main_conf}"
+        return match.group(0)
+
+    return DIRECTIVE_PATTERN.sub(take, content), moved
+
+def write_tls_conf(conf_file=TLS_CONF, connections=None, key_dir=TICKET_KEY_DIR, main_conf=NGINX_MAIN_CONF):
+    """Write the http-level TLS settings: protocols, session cache and ticket keys."""
+    connections = connections or connection_budget(main_conf)
+    sessions, cache_mb = session_cache_size(connections)
+    if not all(os.path.exists(path) for path in ticket_key_paths(key_dir)):
+        rotate_ticket_keys(key_dir)
+    content = TLS_CONF_TEMPLATE.format(
+        connections=connections, sessions=sessions, cache_mb=cache_mb, timeout=SESSION_TIMEOUT,
+        ticket_keys="\n".join(f"ssl_session_ticket_key {path};" for path in ticket_key_paths(key_dir)),
+    )
+    content, moved = split_main_conf_directives(content, main_conf)
+    changes = {}
+    if moved:
+        with open(main_conf, 'r') as f:
+            main_content = f.read()
+        updated = main_content
+        for name, value in moved.items():
+            updated = set_directive(updated, name, value)
+        if updated != main_content:
+            changes[main_conf] = (main_content, updated)
+    old = None
+    if os.path.exists(conf_file):
+        with open(conf_file, 'r') as f:
+            old = f.read()
+    changes[conf_file] = (old, content)
+    apply_changes(changes)
+    if main_conf in changes:
+        print(f"Updated {', '.join(sorted(moved))} in {main_conf}")
+    return conf_file
+
+def write_atomic(path, content):
+    with open(f"{path}.tmp", 'w') as f:
+        f.write(content)
+    os.replace(f"{path}.tmp", path)
+
+def apply_changes(changes):
+    """Back up and write {path: (old, new)}, restoring the old files (removing new ones) if `nginx -t` fails."""
+    existing = [path for path, (old, _) in changes.items() if old is not None]
+    if existing:
+        try:
+            manifest = backup_paths(existing, 'nginx-tls')
+            logging.info(f"Backed up {len(existing)} file(s) as snapshot {manifest['id']}.")
+        except (BackupError, OSError) as e:
+            logging.warning(f"Backup before writing the TLS profile failed: {e}")
+    for path, (_, new) in changes.items():
+        write_atomic(path, new)
+    result = subprocess.run(['nginx', '-t'], capture_output=True, text=True)
+    if result.returncode != 0:
+        for path, (old, _) in changes.items():
+            if old is None:
+                os.remove(path)
+            else:
+                write_atomic(path, old)
+        raise TlsProfileError(f"nginx -t rejected the TLS profile, rolled back:\n{result.stderr.strip()}")
+
+def resolver_address(resolv_conf=RESOLV_CONF):
+    """Return the first nameserver from resolv.conf in nginx resolver syntax (IPv6 in brackets)."""
+    try:
+        with open(resolv_conf, 'r') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0] == 'nameserver':
+                    address = parts[1].split('%')[0]
+                    return f"[{address}]" if ':' in address else address
+    except OSError:
+        pass
+    return DEFAULT_RESOLVER
+
+def certificate_pairs(domain_name, live_dir=LIVE_DIR):
+    """
+    Return the certbot lineages covering domain_name, ECDSA first.
+
+    nginx offers every configured certificate and picks per client, so listing
+    an ECDSA certificate before the RSA one gives modern clients the cheaper
+    handshake while old clients still get RSA. Empty until a certificate has
+    been issued: pointing nginx at a lineage that does not exist breaks reloads.
+    """
+    certs = [cert for cert in load_inventory(live_dir)
+             if any(covers(domain, domain_name) for domain in cert['domains'])]
+    best = {}
+    for cert in sorted(certs, key=lambda cert: -cert['expires']):
+        family = cert['key_type'].split()[0]
+        best.setdefault(family, cert)
+    return [best[family] for family in ('ECDSA', 'RSA', 'Ed25519', 'unknown') if family in best]
+
+def http2_directives(nginx_version=None):
+    """nginx 1.25.1 moved http2 from a listen parameter to its own directive."""
+    version = nginx_version or get_installed_nginx_version() or '0'
+    parts = tuple(int(part) for part in re.findall(r'\d+', version)[:3])
+    if parts >= (1, 25, 1):
+        return ("listen 443 ssl;\n        listen [::]:443 ssl;\n        http2 on;")
+    return "listen 443 ssl http2;\n        listen [::]:443 ssl http2;"
+
+def acme_location():
+    """The HTTP-01 challenge location; certbot --webroot writes its tokens under ACME_WEBROOT."""
+    return f"""        location /.well-known/acme-challenge/ {{
+            root {ACME_WEBROOT};
+        }}
+"""
+
+def tls_server_blocks(domain_name, body, live_dir=LIVE_DIR, nginx_version=None):
+    """Return the HTTPS server block wrapping body plus the HTTP redirect block."""
+    certs = certificate_pairs(domain_name, live_dir)
+    if not certs:
+        raise ValueError(f"No certificate covers {domain_name} yet")
+    cert_lines = []
+    for cert in certs:
+        cert_lines.append(f"ssl_certificate {cert['path']}/fullchain.pem;")
+        cert_lines.append(f"ssl_certificate_key {cert['path']}/privkey.pem;")
+    # Stapling only helps when the certificate names an OCSP responder
+    stapling = ""
+    if any(cert.get('ocsp') for cert in certs):
+        stapling = (f"\n        ssl_stapling on;\n        ssl_stapling_verify on;"
+                    f"\n        ssl_trusted_certificate {certs[0]['path']}/chain.pem;"
+                    f"\n        resolver {resolver_address()} valid=300s;\n        resolver_timeout 5s;")
+    certificates = "\n        ".join(cert_lines)
+    return f"""
+    server {{
+        {http2_directives(nginx_version)}
+        server_name {domain_name};
+
+        {certificates}{stapling}
+
+{body}    }}
+
+    server {{
+        listen 80;
+        listen [::]:80;
+        server_name {domain_name};
+
+{acme_location()}
+        location / {{
+            return 301 https://$host$request_uri;
+        }}
+    }}
+    """
+
+def handshake_worker(host, port, server_name, deadline, resume, results, lock):
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    session = None
+    done = resumed = failed = 0
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=5) as sock:
+                with context.wrap_socket(sock, server_hostname=server_name,
+                                         session=session if resume else None) as tls:
+                    if tls.session_reused:
+                        resumed += 1
+                    if resume and session is None:
+                        # TLS 1.3 tickets arrive after the handshake, so read a response first
+                        tls.sendall(f"GET / HTTP/1.1\r\nHost: {server_name}\r\nConnection: close\r\n\r\n".encode())
+                        tls.recv(1)
+                        session = tls.session
+            done += 1
+        except (OSError, ssl.SSLError):
+            failed += 1
+    with lock:
+        results['handshakes'] += done
+        results['resumed'] += resumed
+        results['failed'] += failed
+
+def benchmark_handshakes(host, port=443, server_name=None, duration=10, concurrency=8, resume=False):
+    """
+    Measure TLS handshakes per second against host:port from this machine.
+
+    With resume=True every client reuses its first session, which shows what
+    the session cache and shared ticket keys save compared to full handshakes.
+    """
+    results = {'handshakes': 0, 'resumed': 0, 'failed': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    threads = [threading.Thread(target=handshake_worker,
+                                args=(host, port, server_name or host, deadline, resume, results, lock))
+               for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results['per_second'] = round(results['handshakes'] / duration, 1)
+    return results
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: eos tls [--write-conf [connections] | --rotate-tickets | "
+              "--benchmark <host[:port]> [seconds] [concurrency] [server_name]]")
+        sys.exit(1)
+
+    flag = sys.argv[1]
+    if flag == '--write-conf':
+        connections = int(sys.argv[2]) if len(sys.argv) > 2 else None
+        try:
+            print(f"Wrote {write_tls_conf(connections=connections)}")
+        except TlsProfileError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+    elif flag == '--rotate-tickets':
+        rotate_ticket_keys()
+        print(f"Rotated session ticket keys in {TICKET_KEY_DIR}. Push it to the fleet and reload nginx.")
+    elif flag == '--benchmark' and len(sys.argv) > 2:
+        host, _, port = sys.argv[2].partition(':')
+        duration = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+        concurrency = int(sys.argv[4]) if len(sys.argv) > 4 else 8
+        server_name = sys.argv[5] if len(sys.argv) > 5 else None
+        for mode, resume in (('full', False), ('resumed', True)):
+            results = benchmark_handshakes(host, int(port or 443), server_name, duration, concurrency, resume)
+            print(f"{mode:<8} {results['per_second']:>8} handshakes/s  "
+                  f"({results['resumed']} resumed, {results['failed']} failed)")
+    else:
+        print(f"Unknown option: {flag}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+
+import argparse
+import glob
+import gzip
+import re
+import sys
+
+NGINX_MAIN_CONF = '/etc/nginx/nginx.conf'
+NGINX_MODULE_CONFS = '/etc/nginx/modules-enabled/*.conf'
+ACCESS_LOG = '/var/log/nginx/access.log'
+MODSEC_MODULE = 'ngx_http_modsecurity_module'
+
+# How much of ModSecurity a location class runs:
+#   full   every phase, the default for dynamic routes
+#   light  request line, headers and args are still checked, bodies are not buffered for the rules
+#   off    no rule evaluation; only where nginx answers itself or serves files from disk
+LOCATION_CLASSES = {
+    'static': {
+        'waf': 'light',
+        # Proxied assets may still be rendered by the app, so the request line and headers stay checked;
+        # assets served from disk (staticAssets.py) get `modsecurity off` instead
+        'rules': ['SecRequestBodyAccess Off', 'SecResponseBodyAccess Off'],
+    },
+    'health': {
+        'match': '=',
+        'waf': 'off',
+        'directives': ['access_log off;'],
+    },
+    'api': {
+        'waf': 'full',
+    },
+    'upload': {
+        # Multipart parts are still inspected; the response is a short status page
+        'waf': 'light',
+        'rules': ['SecResponseBodyAccess Off'],
+    },
+    'websocket': {
+        # Only the upgrade request is HTTP; frames never reach the rules, so skip buffering bodies
+        'waf': 'light',
+        'rules': ['SecRequestBodyAccess Off', 'SecResponseBodyAccess Off'],
+        'directives': [
+            'proxy_http_version 1.1;',
+            'proxy_set_header Upgrade $http_upgrade;',
+            'proxy_set_header Connection "upgrade";',
+            'proxy_read_timeout 1h;',
+        ],
+    },
+}
+
+PROXY_HEADERS = [
+    'proxy_set_header Host $host;',
+    'proxy_set_header X-Real-IP $remote_addr;',
+    'proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;',
+    'proxy_set_header X-Forwarded-Proto $scheme;',
+]
+
+# Regex locations may be quoted (staticAssets writes location ~ "^/static/(...)$" { ... }); the quotes are stripped
+LOCATION_PATTERN = re.compile(r'\blocation\s+(=|\^~|~\*|~)?\s*("[^"]*"|\'[^\']*\'|\S+)\s*\{')
+REQUEST_PATTERN = re.compile(r'"(?:[A-Z]+) (\S+) HTTP/[\d.]+"')
+
+def modsecurity_loaded(main_conf=NGINX_MAIN_CONF, module_confs=NGINX_MODULE_CONFS):
+    """Check whether nginx loads the ModSecurity module; its directives are unknown otherwise."""
+    for path in [main_conf] + glob.glob(module_confs):
+        try:
+            with open(path, 'r') as f:
+                if MODSEC_MODULE in f.read():
+                    return True
+        except OSError:
+            continue
+    return False
+
+def parse_location_specs(specs):
+    """Turn ['health:/healthz', 'api:/api/'] into [(class, path)], checking the class names."""
+    locations = []
+    for spec in specs:
+        name, _, path = spec.partition(':')
+        if name not in LOCATION_CLASSES or not path.startswith('/'):
+            raise ValueError(f"Invalid location '{spec}', use <{'|'.join(LOCATION_CLASSES)}>:/path")
+        locations.append((name, path))
+    return locations
+
+def waf_directives(waf, rules=(), waf_enabled=True):
+    """Return the ModSecurity override lines for a scope, or none if the module is not loaded."""
+    if not waf_enabled or waf == 'full':
+        return []
+    if waf == 'off':
+        return ['modsecurity off;']
+    return ["modsecurity_rules '"] + [f"    {rule}" for rule in rules] + ["';"]
+
+def proxy_location(path, proxy_pass, location_class='api', waf_enabled=True, indent='        '):
+    """Return a proxied location block scoped for its class."""
+    settings = LOCATION_CLASSES[location_class]
+    match = settings.get('match')
+    lines = [f"location {match + ' ' if match else ''}{path} {{",
+             f"    # {location_class}: WAF {settings['waf'] if waf_enabled else 'not loaded'}",
+             f"    proxy_pass {proxy_pass};"]
+    lines += [f"    {line}" for line in PROXY_HEADERS + settings.get('directives', [])]
+    lines += [f"    {line}" for line in waf_directives(settings['waf'], settings.get('rules', ()), waf_enabled)]
+    lines.append("}")
+    return "\n".join(indent + line for line in lines)
+
+def scoped_locations(locations, proxy_pass, waf_enabled=True):
+    """Return the location blocks for [(class, path)], followed by a blank line if there are any."""
+    blocks = [proxy_location(path, proxy_pass, name, waf_enabled) for name, path in locations]
+    return "\n\n".join(blocks) + "\n\n" if blocks else ""
+
+def block_body(content, start):
+    """Return the text between the brace opened just before start and its matching close."""
+    depth = 1
+    position = start
+    while position < len(content) and depth:
+        if content[position] == '{':
+            depth += 1
+        elif content[position] == '}':
+            depth -= 1
+        position += 1
+    return content[start:position - 1]
+
+def config_locations(content, waf_enabled=True):
+    """Return [(modifier, path, waf scope, logged)] for the location blocks of a site config."""
+    locations = []
+    for match in LOCATION_PATTERN.finditer(content):
+        body = block_body(content, match.end())
+        if not waf_enabled or re.search(r'\bmodsecurity\s+off\s*;', body):
+            scope = 'off'
+        elif 'modsecurity_rules' in body:
+            scope = 'light'
+        else:
+            scope = 'full'
+        logged = not re.search(r'\baccess_log\s+off\s*;', body)
+        path = match.group(2)
+        if len(path) > 1 and path[0] == path[-1] and path[0] in '"\'':
+            path = path[1:-1]
+        locations.append((match.group(1) or '', path, scope, logged))
+    return locations
+
+def match_location(uri, locations):
+    """Pick the location nginx would use for uri: exact, then longest prefix unless ^~, then regexes in order."""
+    path = uri.split('?', 1)[0]
+    best = None
+    for location in locations:
+        modifier, pattern = location[0], location[1]
+        if modifier == '=' and path == pattern:
+            return location
+        if modifier in ('', '^~') and path.startswith(pattern):
+            if best is None or len(pattern) > len(best[1]):
+                best = location
+    if best is not None and best[0] == '^~':
+        return best
+    for location in locations:
+        modifier, pattern = location[0], location[1]
+        if modifier in ('~', '~*') and re.search(pattern, path, re.IGNORECASE if modifier == '~*' else 0):
+            return location
+    return best
+
+def read_log_lines(paths):
+    for path in paths:
+        opener = gzip.open if path.endswith('.gz') else open
+        try:
+            with opener(path, 'rt', errors='replace') as f:
+                yield from f
+        except OSError as e:
+            print(f"Skipping {path}: {e}")
+
+def inspection_report(config_file, log_files, waf_enabled=None):
+    """Count logged requests per location of a site config and how many of them the WAF inspected."""
+    if waf_enabled is None:
+        waf_enabled = modsecurity_loaded()
+    with open(config_file, 'r') as f:
+        locations = config_locations(f.read(), waf_enabled)
+    counts = {}
+    unmatched = 0
+    for line in read_log_lines(log_files):
+        request = REQUEST_PATTERN.search(line)
+        if not request:
+            continue
+        location = match_location(request.group(1), locations)
+        if location is None:
+            unmatched += 1
+            continue
+        counts[location] = counts.get(location, 0) + 1
+    return {'locations': locations, 'counts': counts, 'unmatched': unmatched}
+
+def print_report(report):
+    total = sum(report['counts'].values())
+    by_scope = {}
+    for location in report['locations']:
+        count = report['counts'].get(location, 0)
+        by_scope[location[2]] = by_scope.get(location[2], 0) + count
+        share = 100 * count / total if total else 0
+        logged = '' if location[3] else '  (access_log off: undercounted)'
+        print(f"{(location[0] + ' ' + location[1]).strip():<32} {location[2]:<6} {count:>9} {share:>6.1f}%{logged}")
+    for scope in ('full', 'light', 'off'):
+        share = 100 * by_scope.get(scope, 0) / total if total else 0
+        print(f"WAF {scope:<5} {share:>6.1f}% of {total} requests")
+    if report['unmatched']:
+        print(f"{report['unmatched']} request(s) matched no location (other sites in a shared log?)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Report what share of a site's traffic ModSecurity inspects.")
+    parser.add_argument('config', help="Site config, e.g. /etc/nginx/sites-available/example.com")
+    parser.add_argument('--log', action='append', help=f"Access log(s) of the site (default {ACCESS_LOG}*)")
+    args = parser.parse_args()
+    logs = args.log or sorted(glob.glob(ACCESS_LOG + '*'))
+    try:
+        print_report(inspection_report(args.config, logs))
+    except OSError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()